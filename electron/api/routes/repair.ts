@@ -41,7 +41,9 @@ export function createRepairRouter(deps: ServerDependencies): Router {
                 job_id: jobId,
                 original_path: body.filePath,
                 strategy: body.strategy,
-                reference_path: body.referenceFilePath || (body.candidateReferences ? body.candidateReferences[0] : undefined) // Naive selection for now
+                reference_path: body.referenceFilePath,
+                // The engine grafts every candidate and keeps the best-scoring output
+                reference_paths: body.candidateReferences
             });
             deps.repository.updateJob(jobId, {
                 status: 'queued',
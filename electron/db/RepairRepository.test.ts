@@ -48,6 +48,18 @@ describe('RepairRepository', () => {
         expect(job?.percent).toBe(50);
     });
 
+    it('should keep every candidate reference', () => {
+        const job = repo.createJob({
+            job_id: 'test-uuid-3',
+            original_path: '/corrupt.jpg',
+            strategy: 'header-grafting',
+            reference_paths: ['/refs/a.jpg', '/refs/b.jpg']
+        });
+
+        expect(job.reference_path).toBeNull();
+        expect(JSON.parse(job.reference_paths_json!)).toEqual(['/refs/a.jpg', '/refs/b.jpg']);
+    });
+
     it('should retrieve only active jobs', () => {
         repo.createJob({ job_id: 'active-1', original_path: '/a.jpg', strategy: 'header-grafting' });
         repo.createJob({ job_id: 'active-2', original_path: '/b.jpg', strategy: 'header-grafting' });
@@ -7,6 +7,7 @@ export interface JobStatus {
     source_app: string;
     original_path: string;
     reference_path: string | null;
+    reference_paths_json: string | null;
     repaired_path: string | null;
     strategy: string;
     status: 'queued' | 'analyzing' | 'repairing' | 'verifying' | 'done' | 'failed';
@@ -28,6 +29,7 @@ export interface CreateJobInput {
     original_path: string;
     strategy: string;
     reference_path?: string;
+    reference_paths?: string[];
     source_photo_id?: number;
     source_app?: string;
     auto_enhance?: boolean;
@@ -39,8 +41,8 @@ export class RepairRepository {
     createJob(job: CreateJobInput): RepairOperation {
         const stmt = this.db.prepare(`
       INSERT INTO repair_operations (
-        job_id, source_photo_id, source_app, original_path, reference_path, strategy, auto_enhance
-      ) VALUES (?, ?, ?, ?, ?, ?, ?)
+        job_id, source_photo_id, source_app, original_path, reference_path, reference_paths_json, strategy, auto_enhance
+      ) VALUES (?, ?, ?, ?, ?, ?, ?, ?)
     `);
 
         stmt.run(
@@ -49,6 +51,7 @@ export class RepairRepository {
             job.source_app ?? 'manual',
             job.original_path,
             job.reference_path ?? null,
+            job.reference_paths && job.reference_paths.length > 0 ? JSON.stringify(job.reference_paths) : null,
             job.strategy,
             job.auto_enhance ? 1 : 0
         );
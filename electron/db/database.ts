@@ -12,6 +12,7 @@ export function initializeDatabase(dbPath: string): Database.Database {
       source_app       TEXT DEFAULT 'manual',
       original_path    TEXT NOT NULL,
       reference_path   TEXT,
+      reference_paths_json TEXT,
       repaired_path    TEXT,
       strategy         TEXT NOT NULL,
       status           TEXT NOT NULL DEFAULT 'queued',
@@ -45,5 +46,11 @@ export function initializeDatabase(dbPath: string): Database.Database {
     // Column already exists, ignore
   }
 
+  try {
+    db.exec("ALTER TABLE repair_operations ADD COLUMN reference_paths_json TEXT;");
+  } catch (e) {
+    // Column already exists, ignore
+  }
+
   return db;
 }
@@ -70,7 +70,10 @@ const jobQueue = new JobQueue(repository, async (jobId: string) => {
                 jobId: job.job_id,
                 filePath: job.original_path,
                 strategy: job.strategy || 'unknown',
-                referencePath: job.reference_path || undefined
+                referencePath: job.reference_path || undefined,
+                referencePaths: job.reference_paths_json ? JSON.parse(job.reference_paths_json) : undefined,
+                // API jobs already know their destination; skip the temp-file round trip
+                outputPath: job.repaired_path || undefined
             },
             (progress) => {
                 const updatePayload: any = {
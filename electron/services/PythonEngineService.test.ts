@@ -73,3 +73,52 @@ test('PythonEngineService passes temporary directory as output-dir', async () =>
         expect.arrayContaining(['--output-dir', os.tmpdir()])
     );
 });
+
+test('PythonEngineService writes straight to outputPath when provided', async () => {
+    const service = new PythonEngineService(process.cwd());
+
+    const mockProc = new EventEmitter() as any;
+    mockProc.stdout = new EventEmitter();
+    mockProc.stderr = new EventEmitter();
+
+    vi.mocked(spawn).mockReturnValue(mockProc);
+
+    const executePromise = service.executeRepair({
+        jobId: 'job-direct-1',
+        filePath: 'test-3.jpg',
+        strategy: 'marker-sanitization',
+        outputPath: '/final/test-3_repaired.jpg'
+    }, vi.fn());
+
+    mockProc.emit('close', 0);
+    await executePromise;
+
+    const args = vi.mocked(spawn).mock.calls.at(-1)![1] as string[];
+    expect(args).toEqual(expect.arrayContaining(['--output-path', '/final/test-3_repaired.jpg']));
+    expect(args).not.toContain('--output-dir');
+});
+
+test('PythonEngineService passes every candidate reference', async () => {
+    const service = new PythonEngineService(process.cwd());
+
+    const mockProc = new EventEmitter() as any;
+    mockProc.stdout = new EventEmitter();
+    mockProc.stderr = new EventEmitter();
+
+    vi.mocked(spawn).mockReturnValue(mockProc);
+
+    const executePromise = service.executeRepair({
+        jobId: 'job-ensemble-1',
+        filePath: 'test-4.jpg',
+        strategy: 'header-grafting',
+        referencePaths: ['/refs/a.jpg', '/refs/b.jpg']
+    }, vi.fn());
+
+    mockProc.emit('close', 0);
+    await executePromise;
+
+    const args = vi.mocked(spawn).mock.calls.at(-1)![1] as string[];
+    const index = args.indexOf('--reference-paths');
+    expect(args.slice(index + 1, index + 3)).toEqual(['/refs/a.jpg', '/refs/b.jpg']);
+    expect(args).not.toContain('--reference-path');
+});
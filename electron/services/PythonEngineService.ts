@@ -7,6 +7,10 @@ export interface EngineConfig {
     filePath: string;
     strategy: string;
     referencePath?: string;
+    /** Several candidate references: the engine grafts each and keeps the best-scoring output. */
+    referencePaths?: string[];
+    /** Final destination; when set the engine writes there directly instead of os.tmpdir(). */
+    outputPath?: string;
 }
 
 export interface EngineProgressEvent {
@@ -16,6 +20,8 @@ export interface EngineProgressEvent {
     status: string;
     error_message?: string;
     repaired_path?: string;
+    /** Extra report sent with the final event (e.g. the reference ranking of an ensemble run). */
+    details?: Record<string, unknown>;
 }
 
 export interface IRepairEngine {
@@ -51,11 +57,18 @@ export class PythonEngineService implements IRepairEngine {
                 this.engineScript,
                 '--job-id', config.jobId,
                 '--file-path', config.filePath,
-                '--strategy', config.strategy,
-                '--output-dir', os.tmpdir()
+                '--strategy', config.strategy
             ];
 
-            if (config.referencePath) {
+            if (config.outputPath) {
+                args.push('--output-path', config.outputPath);
+            } else {
+                args.push('--output-dir', os.tmpdir());
+            }
+
+            if (config.referencePaths && config.referencePaths.length > 0) {
+                args.push('--reference-paths', ...config.referencePaths);
+            } else if (config.referencePath) {
                 args.push('--reference-path', config.referencePath);
             }
 
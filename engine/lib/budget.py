@@ -0,0 +1,92 @@
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Iterator, Optional
+
+# Limits of one repair job. Real photos stay far below them; garbage or
+# hostile inputs (lengths and counts read from corrupt fields) hit them and
+# fail fast instead of stalling a worker or allocating gigabytes.
+DEFAULT_MAX_SCAN_BYTES = 4 * 1024 * 1024 * 1024
+DEFAULT_MAX_ENTRIES = 2_000_000
+DEFAULT_MAX_ALLOC = 512 * 1024 * 1024
+# Wall-clock seconds a single job may take
+DEFAULT_JOB_TIMEOUT = 120.0
+
+
+class BudgetExceededError(Exception):
+    """A parser hit one of the limits of the active ParseBudget."""
+
+
+class ParseBudget:
+    """
+    Work allowance of one job, charged by the parsers as they go: bytes
+    scanned, structural entries read (IFD entries, chunks, segments, NAL
+    units), the size of any single allocation driven by a length field, and
+    a wall-clock deadline. Cumulative limits of None are unlimited.
+    """
+
+    def __init__(
+        self,
+        max_scan_bytes: Optional[int] = DEFAULT_MAX_SCAN_BYTES,
+        max_entries: Optional[int] = DEFAULT_MAX_ENTRIES,
+        max_alloc: int = DEFAULT_MAX_ALLOC,
+        timeout: Optional[float] = None
+    ):
+        self.max_scan_bytes = max_scan_bytes
+        self.max_entries = max_entries
+        self.max_alloc = max_alloc
+        self.deadline = time.monotonic() + timeout if timeout is not None else None
+        self.scanned = 0
+        self.entries = 0
+
+    def remaining(self) -> Optional[float]:
+        """Seconds left before the deadline (None without one), to hand to worker processes."""
+        return None if self.deadline is None else self.deadline - time.monotonic()
+
+    def check_deadline(self) -> None:
+        if self.deadline is not None and time.monotonic() > self.deadline:
+            raise BudgetExceededError("Job deadline exceeded")
+
+    def scan(self, length: int) -> None:
+        """Charges `length` bytes about to be scanned."""
+        self.scanned += length
+        if self.max_scan_bytes is not None and self.scanned > self.max_scan_bytes:
+            raise BudgetExceededError(f"Scanned more than {self.max_scan_bytes} bytes")
+        self.check_deadline()
+
+    def count(self, entries: int, what: str = 'entries') -> None:
+        """Charges `entries` structural entries about to be read."""
+        self.entries += entries
+        if self.max_entries is not None and self.entries > self.max_entries:
+            raise BudgetExceededError(f"More than {self.max_entries} {what}")
+        self.check_deadline()
+
+    def alloc(self, size: int, what: str = 'buffer') -> None:
+        """Rejects a single allocation of `size` bytes above the limit."""
+        if size > self.max_alloc:
+            raise BudgetExceededError(f"Declared {what} size {size} exceeds {self.max_alloc} bytes")
+
+
+# Outside a job only the per-allocation limit applies
+_UNBOUNDED = ParseBudget(max_scan_bytes=None, max_entries=None)
+_active: ContextVar[Optional[ParseBudget]] = ContextVar('parse_budget', default=None)
+
+
+def current_budget() -> ParseBudget:
+    """
+    The budget of the running job. The ContextVar does not follow work handed
+    to a thread or process pool: capture the budget before submitting and pass
+    it (or, across processes, its remaining() time) to the workers.
+    """
+    return _active.get() or _UNBOUNDED
+
+
+@contextmanager
+def parse_budget(timeout: Optional[float] = None, **limits) -> Iterator[ParseBudget]:
+    """Runs the enclosed job under a fresh ParseBudget (see its arguments)."""
+    budget = ParseBudget(timeout=timeout, **limits)
+    token = _active.set(budget)
+    try:
+        yield budget
+    finally:
+        _active.reset(token)
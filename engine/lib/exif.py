@@ -0,0 +1,55 @@
+from typing import Dict, Any, Optional, List
+
+from strategies.tiff_ifd_rebuilder import (
+    _detect_byte_order,
+    _read_u32,
+    _read_ifd_entries,
+    _get_entry_values,
+)
+
+TAG_IMAGE_WIDTH = 0x0100
+TAG_IMAGE_LENGTH = 0x0101
+TAG_MAKE = 0x010F
+TAG_MODEL = 0x0110
+
+TYPE_ASCII = 2
+
+
+def _ascii_value(tiff: bytes, entry: Dict, byte_order: str) -> Optional[str]:
+    if entry['type'] != TYPE_ASCII:
+        return None
+    values = _get_entry_values(tiff, entry, byte_order)
+    if not values:
+        return None
+    text = bytes(values).split(b'\x00', 1)[0].decode('latin-1').strip()
+    return text or None
+
+
+def _first_int(tiff: bytes, entry: Optional[Dict], byte_order: str) -> Optional[int]:
+    if not entry:
+        return None
+    values = _get_entry_values(tiff, entry, byte_order)
+    return values[0] if values else None
+
+
+def read_ifd0_tags(tiff: bytes) -> Dict[str, Any]:
+    """
+    Reads make, model and dimensions from IFD0 of a TIFF structure (a bare
+    TIFF/RAW file head, or the payload of a JPEG EXIF APP1 segment).
+    Missing or unreadable tags come back as None.
+    """
+    tags: Dict[str, Any] = {'make': None, 'model': None, 'width': None, 'height': None}
+    byte_order = _detect_byte_order(tiff)
+    if not byte_order or len(tiff) < 8:
+        return tags
+
+    entries: List[Dict] = _read_ifd_entries(tiff, _read_u32(tiff, 4, byte_order), byte_order)
+    by_tag = {e['tag']: e for e in entries}
+
+    if TAG_MAKE in by_tag:
+        tags['make'] = _ascii_value(tiff, by_tag[TAG_MAKE], byte_order)
+    if TAG_MODEL in by_tag:
+        tags['model'] = _ascii_value(tiff, by_tag[TAG_MODEL], byte_order)
+    tags['width'] = _first_int(tiff, by_tag.get(TAG_IMAGE_WIDTH), byte_order)
+    tags['height'] = _first_int(tiff, by_tag.get(TAG_IMAGE_LENGTH), byte_order)
+    return tags
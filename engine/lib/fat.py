@@ -0,0 +1,295 @@
+import struct
+from typing import Dict, Any, Optional, List, Tuple, Iterator
+
+# MBR partition types that can hold a FAT32 or exFAT volume
+FAT32_PARTITION_TYPES = {0x0B, 0x0C}
+EXFAT_PARTITION_TYPES = {0x07}
+
+ATTR_DIRECTORY = 0x10
+ATTR_VOLUME_LABEL = 0x08
+ATTR_LFN = 0x0F
+DELETED_MARK = 0xE5
+
+FAT32_MASK = 0x0FFFFFFF
+FAT32_BAD = 0x0FFFFFF7
+FAT32_EOC = 0x0FFFFFF8
+EXFAT_BAD = 0xFFFFFFF7
+EXFAT_EOC = 0xFFFFFFF8
+
+# exFAT directory entry types (bit 0x80 set = in use)
+EXFAT_FILE = 0x05
+EXFAT_STREAM = 0x40
+EXFAT_NAME = 0x41
+EXFAT_IN_USE = 0x80
+EXFAT_NO_FAT_CHAIN = 0x02
+
+# Deepest directory nesting walked; real cards are a few levels deep
+MAX_DEPTH = 32
+
+
+def _detect(view, offset: int) -> Optional[str]:
+    if offset + 512 > len(view):
+        return None
+    if view[offset + 3:offset + 11] == b'EXFAT   ':
+        return 'exfat'
+    if view[offset + 82:offset + 90] == b'FAT32   ' and view[offset + 510:offset + 512] == b'\x55\xaa':
+        return 'fat32'
+    return None
+
+
+def find_volumes(view) -> List[Tuple[int, str]]:
+    """
+    Returns (byte offset, 'fat32'|'exfat') for every volume found: a bare
+    volume image, or the primary partitions of an MBR-partitioned card.
+    """
+    fs_type = _detect(view, 0)
+    if fs_type:
+        return [(0, fs_type)]
+    if len(view) < 512 or view[510:512] != b'\x55\xaa':
+        return []
+
+    volumes = []
+    for i in range(4):
+        entry = 0x1BE + i * 16
+        part_type = view[entry + 4]
+        lba_start = struct.unpack_from('<I', view, entry + 8)[0]
+        if part_type in FAT32_PARTITION_TYPES | EXFAT_PARTITION_TYPES and lba_start:
+            fs_type = _detect(view, lba_start * 512)
+            if fs_type:
+                volumes.append((lba_start * 512, fs_type))
+    return volumes
+
+
+class FatVolume:
+    """
+    Read-only view of a FAT32 or exFAT volume inside a disk image. Nothing is
+    read up front: FAT entries and directory clusters are decoded on demand
+    from the (mmapped) image, so walking a card costs only its metadata.
+    """
+
+    def __init__(self, view, offset: int = 0, fs_type: Optional[str] = None):
+        self.view = view
+        self.offset = offset
+        self.fs_type = fs_type or _detect(view, offset)
+        if self.fs_type == 'fat32':
+            self._read_fat32_boot()
+        elif self.fs_type == 'exfat':
+            self._read_exfat_boot()
+        else:
+            raise ValueError("No FAT32/exFAT boot sector found")
+
+    def _read_fat32_boot(self):
+        bytes_per_sector, sectors_per_cluster, reserved, num_fats = struct.unpack_from('<HBHB', self.view, self.offset + 11)
+        total_sectors, fat_size, _flags, _version, root_cluster = struct.unpack_from('<IIHHI', self.view, self.offset + 32)
+        if not bytes_per_sector or not sectors_per_cluster or not fat_size:
+            raise ValueError("Invalid FAT32 boot sector")
+        self.sector_size = bytes_per_sector
+        self.cluster_size = bytes_per_sector * sectors_per_cluster
+        self.fat_offset = self.offset + reserved * bytes_per_sector
+        self.heap_offset = self.fat_offset + num_fats * fat_size * bytes_per_sector
+        data_sectors = total_sectors - (self.heap_offset - self.offset) // bytes_per_sector
+        self.cluster_count = data_sectors // sectors_per_cluster
+        self.root_cluster = root_cluster
+
+    def _read_exfat_boot(self):
+        fat_offset, _fat_length, heap_offset, cluster_count, root_cluster = struct.unpack_from('<IIIII', self.view, self.offset + 80)
+        sector_shift, cluster_shift = struct.unpack_from('<BB', self.view, self.offset + 108)
+        self.sector_size = 1 << sector_shift
+        self.cluster_size = self.sector_size << cluster_shift
+        self.fat_offset = self.offset + fat_offset * self.sector_size
+        self.heap_offset = self.offset + heap_offset * self.sector_size
+        self.cluster_count = cluster_count
+        self.root_cluster = root_cluster
+
+    def _valid_cluster(self, cluster: int) -> bool:
+        return 2 <= cluster < self.cluster_count + 2
+
+    def cluster_offset(self, cluster: int) -> int:
+        return self.heap_offset + (cluster - 2) * self.cluster_size
+
+    def _next_cluster(self, cluster: int) -> Optional[int]:
+        value = struct.unpack_from('<I', self.view, self.fat_offset + cluster * 4)[0]
+        if self.fs_type == 'fat32':
+            value &= FAT32_MASK
+            if value >= FAT32_BAD:
+                return None
+        elif value >= EXFAT_BAD:
+            return None
+        return value if self._valid_cluster(value) else None
+
+    def chain(self, first_cluster: int, max_clusters: Optional[int] = None) -> List[int]:
+        """Follows a FAT chain; stops at end-of-chain, a bad/free entry or a loop."""
+        limit = max_clusters if max_clusters is not None else self.cluster_count
+        clusters = []
+        seen = set()
+        cluster = first_cluster
+        while cluster is not None and self._valid_cluster(cluster) and cluster not in seen and len(clusters) < limit:
+            clusters.append(cluster)
+            seen.add(cluster)
+            cluster = self._next_cluster(cluster)
+        return clusters
+
+    def _contiguous(self, first_cluster: int, count: int) -> List[int]:
+        last = min(first_cluster + count, self.cluster_count + 2)
+        return list(range(first_cluster, last)) if self._valid_cluster(first_cluster) else []
+
+    def extents(self, clusters: List[int], size: int) -> List[Tuple[int, int]]:
+        """Collapses a cluster list into (image offset, length) runs covering `size` bytes."""
+        runs: List[List[int]] = []
+        remaining = size
+        for cluster in clusters:
+            if remaining <= 0:
+                break
+            length = min(self.cluster_size, remaining)
+            start = self.cluster_offset(cluster)
+            if runs and runs[-1][0] + runs[-1][1] == start:
+                runs[-1][1] += length
+            else:
+                runs.append([start, length])
+            remaining -= length
+        return [(start, length) for start, length in runs]
+
+    def _file_clusters(self, first_cluster: int, size: int, deleted: bool, contiguous: bool) -> Tuple[List[int], bool]:
+        """
+        Clusters of a file. Deleting a file frees its FAT chain, so deleted
+        files are assumed contiguous from their first cluster (the usual
+        undelete heuristic); the result says whether that was assumed.
+        """
+        needed = -(-size // self.cluster_size)
+        if deleted or contiguous:
+            return self._contiguous(first_cluster, needed), deleted
+        return self.chain(first_cluster, needed), False
+
+    def _directory_bytes(self, first_cluster: int, size: int, deleted: bool, contiguous: bool) -> bytes:
+        if size:
+            # exFAT records directory sizes
+            clusters, _assumed = self._file_clusters(first_cluster, size, deleted, contiguous)
+        elif deleted:
+            # A deleted FAT32 directory lost its chain: only its first cluster is certain
+            clusters = self._contiguous(first_cluster, 1)
+        else:
+            clusters = self.chain(first_cluster)
+        return b''.join(self.view[self.cluster_offset(c):self.cluster_offset(c) + self.cluster_size] for c in clusters)
+
+    def walk(self, include_deleted: bool = True) -> Iterator[Dict[str, Any]]:
+        """
+        Yields every file on the volume (depth first) as
+        {path, name, size, deleted, first_cluster, extents, contiguous_assumed}.
+        """
+        parse = self._fat32_entries if self.fs_type == 'fat32' else self._exfat_entries
+        visited = set()
+        stack = [(self.root_cluster, 0, False, '', False, 0)]
+        while stack:
+            cluster, dir_size, dir_contiguous, parent, parent_deleted, depth = stack.pop()
+            if cluster in visited or not self._valid_cluster(cluster):
+                continue
+            visited.add(cluster)
+            entries = []
+            for entry in parse(self._directory_bytes(cluster, dir_size, parent_deleted, dir_contiguous)):
+                deleted = entry['deleted'] or parent_deleted
+                if deleted and not include_deleted:
+                    continue
+                path = f"{parent}/{entry['name']}"
+                if entry['directory']:
+                    if depth + 1 < MAX_DEPTH:
+                        entries.append((entry['first_cluster'], entry['size'], entry.get('contiguous', False), path, deleted, depth + 1))
+                    continue
+                clusters, assumed = self._file_clusters(entry['first_cluster'], entry['size'], deleted, entry.get('contiguous', False))
+                yield {
+                    'path': path,
+                    'name': entry['name'],
+                    'size': entry['size'],
+                    'deleted': deleted,
+                    'first_cluster': entry['first_cluster'],
+                    'extents': self.extents(clusters, entry['size']),
+                    'contiguous_assumed': assumed
+                }
+            stack.extend(reversed(entries))
+
+    def read(self, entry: Dict[str, Any]) -> memoryview:
+        """File contents: a zero-copy slice when the file is one extent, else a joined copy."""
+        view = memoryview(self.view)
+        if len(entry['extents']) == 1:
+            start, length = entry['extents'][0]
+            return view[start:start + length]
+        return memoryview(b''.join(view[start:start + length] for start, length in entry['extents']))
+
+    def _fat32_entries(self, data: bytes) -> Iterator[Dict[str, Any]]:
+        lfn_parts: List[Tuple[int, str]] = []
+        for pos in range(0, len(data) - 31, 32):
+            raw = data[pos:pos + 32]
+            if raw[0] == 0x00:
+                return
+            attr = raw[11]
+            if attr == ATTR_LFN:
+                # Deleted LFN entries keep their order byte only as 0xE5
+                # (deleted LFN parts lose their order byte but are still stored last part first)
+                order = raw[0] & 0x1F if raw[0] != DELETED_MARK else -len(lfn_parts)
+                chars = raw[1:11] + raw[14:26] + raw[28:32]
+                lfn_parts.append((order, chars.decode('utf-16-le', 'replace').split('\x00')[0]))
+                continue
+
+            long_name = ''.join(part for _order, part in sorted(lfn_parts)) if lfn_parts else None
+            lfn_parts = []
+            if attr & ATTR_VOLUME_LABEL or raw[0:2] in (b'. ', b'..'):
+                continue
+
+            deleted = raw[0] == DELETED_MARK
+            if long_name:
+                name = long_name
+            else:
+                # The first character of a deleted short name is gone for good
+                base = ('_' + raw[1:8].decode('ascii', 'replace') if deleted else raw[0:8].decode('ascii', 'replace')).rstrip()
+                ext = raw[8:11].decode('ascii', 'replace').rstrip()
+                name = f"{base}.{ext}" if ext else base
+            hi, = struct.unpack_from('<H', raw, 20)
+            lo, size = struct.unpack_from('<HI', raw, 26)
+            yield {
+                'name': name,
+                'deleted': deleted,
+                'directory': bool(attr & ATTR_DIRECTORY),
+                'first_cluster': hi << 16 | lo,
+                'size': size
+            }
+
+    def _exfat_entries(self, data: bytes) -> Iterator[Dict[str, Any]]:
+        count = len(data) // 32
+        pos = 0
+        while pos < count:
+            entry_type = data[pos * 32]
+            if entry_type == 0x00:
+                return
+            if entry_type & 0x7F != EXFAT_FILE:
+                pos += 1
+                continue
+
+            deleted = not entry_type & EXFAT_IN_USE
+            secondary_count = data[pos * 32 + 1]
+            attributes, = struct.unpack_from('<H', data, pos * 32 + 4)
+            stream = None
+            name_chars = []
+            for i in range(pos + 1, min(pos + 1 + secondary_count, count)):
+                raw = data[i * 32:i * 32 + 32]
+                if raw[0] & 0x7F == EXFAT_STREAM:
+                    stream = raw
+                elif raw[0] & 0x7F == EXFAT_NAME:
+                    name_chars.append(raw[2:32])
+                # A live set has every secondary in use; a deleted one none
+                if bool(raw[0] & EXFAT_IN_USE) == deleted:
+                    stream = None
+                    break
+            pos += 1 + secondary_count
+            if stream is None:
+                continue
+
+            flags, _reserved, name_length = struct.unpack_from('<BBB', stream, 1)
+            first_cluster, data_length = struct.unpack_from('<IQ', stream, 20)
+            name = b''.join(name_chars).decode('utf-16-le', 'replace')[:name_length]
+            yield {
+                'name': name,
+                'deleted': deleted,
+                'directory': bool(attributes & ATTR_DIRECTORY),
+                'first_cluster': first_cluster,
+                'size': data_length,
+                'contiguous': bool(flags & EXFAT_NO_FAT_CHAIN)
+            }
@@ -0,0 +1,75 @@
+import struct
+from typing import List, Optional, Tuple, BinaryIO
+
+from strategies.heic_box_recovery import _read_boxes, _find_box
+
+# The meta box of a camera HEIC is a few KB; refuse to buffer anything absurd.
+META_READ_LIMIT = 4 * 1024 * 1024
+
+
+def read_meta_payload(f: BinaryIO, max_bytes: int = META_READ_LIMIT) -> Optional[bytes]:
+    """
+    Walks top-level ISOBMFF box headers with seeks and returns the payload of
+    the `meta` box. The (large) mdat payload is never read.
+    """
+    f.seek(0, 2)
+    file_size = f.tell()
+    offset = 0
+    while offset + 8 <= file_size:
+        f.seek(offset)
+        head = f.read(8)
+        if len(head) < 8:
+            return None
+        size = struct.unpack('>I', head[:4])[0]
+        box_type = head[4:8]
+        header_len = 8
+        if size == 1:
+            large = f.read(8)
+            if len(large) < 8:
+                return None
+            size = struct.unpack('>Q', large)[0]
+            header_len = 16
+        elif size == 0:
+            size = file_size - offset
+        if size < header_len:
+            return None
+
+        if box_type == b'meta':
+            payload_len = size - header_len
+            if payload_len > max_bytes:
+                return None
+            payload = f.read(payload_len)
+            return payload if len(payload) == payload_len else None
+
+        offset += size
+    return None
+
+
+def find_ispe_sizes(meta_payload: bytes) -> List[Tuple[int, int]]:
+    """Returns every (width, height) declared by ispe properties in meta/iprp/ipco."""
+    # meta is a FullBox: skip version + flags
+    children = _read_boxes(meta_payload[4:])
+    iprp = _find_box(children, 'iprp')
+    if not iprp:
+        return []
+    ipco = _find_box(_read_boxes(iprp['payload']), 'ipco')
+    if not ipco:
+        return []
+
+    sizes = []
+    for box in _read_boxes(ipco['payload']):
+        if box['type'] == 'ispe' and len(box['payload']) >= 12:
+            width, height = struct.unpack_from('>II', box['payload'], 4)
+            sizes.append((width, height))
+    return sizes
+
+
+def read_primary_dimensions(f: BinaryIO) -> Optional[Tuple[int, int]]:
+    """Largest ispe declared in the file, which is the main image (or its grid)."""
+    meta = read_meta_payload(f)
+    if not meta:
+        return None
+    sizes = find_ispe_sizes(meta)
+    if not sizes:
+        return None
+    return max(sizes, key=lambda s: s[0] * s[1])
@@ -0,0 +1,270 @@
+import re
+import struct
+from collections import Counter
+from typing import Dict, Any, Optional, List, Tuple
+
+try:
+    import numpy as np
+except ImportError:  # Optional: resync candidates fall back to a regex scan
+    np = None
+
+from lib.budget import current_budget
+
+NAL_VPS, NAL_SPS, NAL_PPS = 32, 33, 34
+PARAMETER_SETS = (NAL_VPS, NAL_SPS, NAL_PPS)
+# VCL (slice) NAL unit types: 0-9 and the IRAP types 16-21
+VCL_TYPES = set(range(0, 10)) | set(range(16, 22))
+MAX_NAL_TYPE = 40
+# NAL units in HEIF items are 4-byte length prefixed; larger units are not plausible
+MAX_NAL_LENGTH = 1 << 24
+# Bytes searched per vectorized pass when resynchronizing after a break
+RESYNC_WINDOW = 256 * 1024
+
+# Length prefix (top byte 0) + NAL header with forbidden bit 0, layer 0, temporal id >= 1
+_CANDIDATE = re.compile(
+    rb'(?=\x00[\x00-\xff]{3}[' + b''.join(re.escape(bytes([b])) for b in range(0, 2 * MAX_NAL_TYPE + 1, 2)) + rb'][\x01-\x07])'
+)
+
+
+def _header_ok(view, pos: int) -> bool:
+    b0, b1 = view[pos], view[pos + 1]
+    return b0 & 0x81 == 0 and (b0 >> 1) <= MAX_NAL_TYPE and b1 & 0xF8 == 0 and b1 & 0x07 != 0
+
+
+def _unit_at(view, pos: int, end: int) -> Optional[int]:
+    """Length of a plausible length-prefixed NAL unit at pos, else None."""
+    if pos + 6 > end:
+        return None
+    length = struct.unpack_from('>I', view, pos)[0]
+    if length < 2 or length > MAX_NAL_LENGTH or pos + 4 + length > end or not _header_ok(view, pos + 4):
+        return None
+    return length
+
+
+def _candidates(view, start: int, end: int) -> List[int]:
+    """Offsets in [start, end) whose bytes look like a length prefix plus NAL header."""
+    if np is not None and end - start > 6:
+        arr = np.frombuffer(view, dtype=np.uint8, count=end - start, offset=start)
+        head, b0, b1 = arr[:-5], arr[4:-1], arr[5:]
+        mask = (head == 0) & ((b0 & 0x81) == 0) & ((b0 >> 1) <= MAX_NAL_TYPE) & ((b1 & 0xF8) == 0) & ((b1 & 0x07) != 0)
+        return (np.flatnonzero(mask) + start).tolist()
+    return [m.start() + start for m in _CANDIDATE.finditer(bytes(view[start:end]))]
+
+
+def _resync(view, pos: int, end: int) -> Optional[int]:
+    """First offset after pos that starts a chain of two units (or one ending exactly at end)."""
+    window_start = pos + 1
+    while window_start < end:
+        window_end = min(window_start + RESYNC_WINDOW, end)
+        current_budget().scan(window_end - window_start)
+        for candidate in _candidates(view, window_start, min(window_end + 5, end)):
+            length = _unit_at(view, candidate, end)
+            if length is None:
+                continue
+            after = candidate + 4 + length
+            if after == end or _unit_at(view, after, end) is not None:
+                return candidate
+        window_start = window_end
+    return None
+
+
+def index_nal_units(view, start: int = 0, end: Optional[int] = None) -> Dict[str, Any]:
+    """
+    Indexes the length-prefixed HEVC NAL units in view[start:end] (an mdat
+    payload) as [(offset, length, nal_type)], offsets pointing at the 4-byte
+    length. Units are followed by their length chain; where the chain breaks
+    (another item's data, damage), scanning resumes at the next candidate
+    that starts a chain of two units. Candidates come from a vectorized pass
+    over the bytes after the break, one window at a time.
+    """
+    view = memoryview(view)
+    end = len(view) if end is None else end
+    units: List[Tuple[int, int, int]] = []
+    resyncs = 0
+    skipped = 0
+    pos = start
+    budget = current_budget()
+    while pos < end:
+        length = _unit_at(view, pos, end)
+        if length is not None:
+            budget.count(1, 'NAL units')
+            units.append((pos, length, (view[pos + 4] >> 1) & 0x3F))
+            pos += 4 + length
+            continue
+        found = _resync(view, pos, end)
+        if found is None:
+            skipped += end - pos
+            break
+        skipped += found - pos
+        resyncs += 1
+        pos = found
+    return {'units': units, 'resyncs': resyncs, 'skipped_bytes': skipped}
+
+
+def unescape_rbsp(nal) -> bytes:
+    """Drops emulation-prevention bytes (00 00 03 -> 00 00)."""
+    data = bytes(nal)
+    if b'\x00\x00\x03' not in data:
+        return data
+    out = bytearray()
+    zeros = 0
+    for byte in data:
+        if zeros >= 2 and byte == 3:
+            zeros = 0
+            continue
+        out.append(byte)
+        zeros = zeros + 1 if byte == 0 else 0
+    return bytes(out)
+
+
+class _Bits:
+    __slots__ = ('data', 'pos')
+
+    def __init__(self, data: bytes, pos: int = 0):
+        self.data = data
+        self.pos = pos
+
+    def u(self, n: int) -> int:
+        value = 0
+        for _ in range(n):
+            byte = self.pos >> 3
+            if byte >= len(self.data):
+                raise ValueError("SPS truncated")
+            value = (value << 1) | ((self.data[byte] >> (7 - (self.pos & 7))) & 1)
+            self.pos += 1
+        return value
+
+    def ue(self) -> int:
+        zeros = 0
+        while self.u(1) == 0:
+            zeros += 1
+            if zeros > 31:
+                raise ValueError("Invalid Exp-Golomb code")
+        return (1 << zeros) - 1 + self.u(zeros)
+
+
+def parse_sps(nal) -> Optional[Dict[str, Any]]:
+    """
+    Fields of an SPS NAL unit (2-byte header included) needed for HEIF
+    properties: cropped width/height, chroma format, bit depths, sub-layers
+    and the 12-byte general profile_tier_level. None if it does not parse.
+    """
+    rbsp = unescape_rbsp(nal)[2:]
+    if len(rbsp) < 13:
+        return None
+    try:
+        bits = _Bits(rbsp)
+        bits.u(4)
+        max_sub_layers_minus1 = bits.u(3)
+        nesting = bits.u(1)
+        bits.u(96)  # general profile_tier_level
+        sub_profile, sub_level = [], []
+        for _ in range(max_sub_layers_minus1):
+            sub_profile.append(bits.u(1))
+            sub_level.append(bits.u(1))
+        if max_sub_layers_minus1 > 0:
+            bits.u(2 * (8 - max_sub_layers_minus1))
+        for i in range(max_sub_layers_minus1):
+            bits.u((88 if sub_profile[i] else 0) + (8 if sub_level[i] else 0))
+        bits.ue()  # sps_seq_parameter_set_id
+        chroma = bits.ue()
+        if chroma == 3:
+            bits.u(1)
+        width = bits.ue()
+        height = bits.ue()
+        sub_width = 2 if chroma in (1, 2) else 1
+        sub_height = 2 if chroma == 1 else 1
+        if bits.u(1):
+            left, right, top, bottom = bits.ue(), bits.ue(), bits.ue(), bits.ue()
+            width -= sub_width * (left + right)
+            height -= sub_height * (top + bottom)
+        bit_depth_luma = bits.ue() + 8
+        bit_depth_chroma = bits.ue() + 8
+    except ValueError:
+        return None
+    if chroma > 3 or width <= 0 or height <= 0:
+        return None
+    return {
+        'width': width,
+        'height': height,
+        'chroma_format': chroma,
+        'bit_depth_luma': bit_depth_luma,
+        'bit_depth_chroma': bit_depth_chroma,
+        'max_sub_layers': max_sub_layers_minus1 + 1,
+        'temporal_id_nesting': nesting,
+        'profile_tier_level': rbsp[1:13]
+    }
+
+
+def build_hvcc(vps: List[bytes], sps: List[bytes], pps: List[bytes], info: Dict[str, Any]) -> bytes:
+    """HEVCDecoderConfigurationRecord (hvcC payload) carrying the parameter sets, 4-byte NAL lengths."""
+    record = bytearray([1])
+    record += info['profile_tier_level']
+    record += struct.pack('>HBBBBH', 0xF000, 0xFC, 0xFC | info['chroma_format'],
+                          0xF8 | (info['bit_depth_luma'] - 8), 0xF8 | (info['bit_depth_chroma'] - 8), 0)
+    record.append((info['max_sub_layers'] << 3) | (info['temporal_id_nesting'] << 2) | 3)
+    arrays = [(NAL_VPS, vps), (NAL_SPS, sps), (NAL_PPS, pps)]
+    record.append(sum(1 for _t, nals in arrays if nals))
+    for nal_type, nals in arrays:
+        if not nals:
+            continue
+        record.append(0x80 | nal_type)
+        record += struct.pack('>H', len(nals))
+        for nal in nals:
+            record += struct.pack('>H', len(nal)) + nal
+    return bytes(record)
+
+
+def split_pictures(view, units: List[Tuple[int, int, int]]) -> List[Dict[str, Any]]:
+    """
+    Groups indexed NAL units into coded pictures (HEIF image items). A slice
+    with first_slice_segment_in_pic_flag set starts a new picture. Each
+    picture gets the parameter sets in force for it and the extents of its
+    non-parameter-set units (adjacent units merged), as (offset, length).
+    """
+    active: Dict[int, List[bytes]] = {NAL_VPS: [], NAL_SPS: [], NAL_PPS: []}
+    pending_params = False
+    pictures: List[Dict[str, Any]] = []
+    current = None
+    for offset, length, nal_type in units:
+        if nal_type in PARAMETER_SETS:
+            nal = bytes(view[offset + 4:offset + 4 + length])
+            if not pending_params:
+                # A new run of parameter sets replaces the previous ones
+                active = {NAL_VPS: [], NAL_SPS: [], NAL_PPS: []}
+                pending_params = True
+            active[nal_type].append(nal)
+            continue
+        pending_params = False
+        first_slice = nal_type in VCL_TYPES and length > 2 and view[offset + 6] & 0x80
+        if current is None or first_slice:
+            current = {'extents': [], 'params': {k: list(v) for k, v in active.items()}, 'slices': 0}
+            pictures.append(current)
+        if nal_type in VCL_TYPES:
+            current['slices'] += 1
+        extents = current['extents']
+        if extents and extents[-1][0] + extents[-1][1] == offset:
+            extents[-1][1] += 4 + length
+        else:
+            extents.append([offset, 4 + length])
+    return [p for p in pictures if p['slices']]
+
+
+def guess_grid(count: int, tile_width: int, tile_height: int, aspect: float = 4 / 3) -> Tuple[int, int]:
+    """(rows, columns) for `count` equal tiles: the landscape factorization closest to `aspect`."""
+    best = (1, count)
+    best_error = None
+    for rows in range(1, count + 1):
+        if count % rows:
+            continue
+        columns = count // rows
+        ratio = (columns * tile_width) / (rows * tile_height)
+        error = abs(ratio - aspect) + (0 if ratio >= 1 else 1)
+        if best_error is None or error < best_error:
+            best, best_error = (rows, columns), error
+    return best
+
+
+def most_common_size(pictures: List[Dict[str, Any]]) -> Optional[Tuple[int, int]]:
+    sizes = Counter((p['info']['width'], p['info']['height']) for p in pictures if p.get('info'))
+    return sizes.most_common(1)[0][0] if sizes else None
@@ -0,0 +1,280 @@
+from typing import Dict, Any, Optional, List, Tuple
+
+from lib.jpeg_header import parse_jpeg_header, HEADER_READ_LIMIT
+
+# Baseline/extended sequential Huffman frames the walker understands
+SEQUENTIAL_SOF = {0xC0, 0xC1}
+# MCUs decoded per sample; enough to expose wrong tables or a bad splice
+DEFAULT_MAX_MCUS = 256
+# Restart segments sampled across the image when the file has RST markers
+DEFAULT_SAMPLES = 8
+# Zero bytes a decoder may borrow past the end of the data before it counts as truncation
+MAX_PADDING_BYTES = 2
+
+LOOKAHEAD = 8
+
+
+class DecodeError(Exception):
+    pass
+
+
+class _HuffmanTable:
+    """Canonical Huffman table with an 8-bit lookahead and the T.81 MAXCODE/VALPTR slow path."""
+
+    def __init__(self, counts: List[int], symbols: bytes):
+        self.symbols = symbols
+        self.lookup: List[Optional[Tuple[int, int]]] = [None] * (1 << LOOKAHEAD)
+        self.maxcode = [-1] * 17
+        self.mincode = [0] * 17
+        self.valptr = [0] * 17
+        code = 0
+        k = 0
+        for length in range(1, 17):
+            n = counts[length - 1]
+            if n:
+                self.valptr[length] = k
+                self.mincode[length] = code
+                for _ in range(n):
+                    if length <= LOOKAHEAD:
+                        shift = LOOKAHEAD - length
+                        for fill in range(code << shift, (code + 1) << shift):
+                            self.lookup[fill] = (length, symbols[k])
+                    code += 1
+                    k += 1
+                self.maxcode[length] = code - 1
+            code <<= 1
+
+
+def parse_huffman_tables(dht_payloads: List[bytes]) -> Dict[Tuple[int, int], _HuffmanTable]:
+    """(class, id) -> table for every table in the DHT segments; malformed tables raise DecodeError."""
+    tables = {}
+    for payload in dht_payloads:
+        pos = 0
+        while pos + 17 <= len(payload):
+            tc, th = payload[pos] >> 4, payload[pos] & 0x0F
+            counts = list(payload[pos + 1:pos + 17])
+            total = sum(counts)
+            symbols = payload[pos + 17:pos + 17 + total]
+            if tc > 1 or len(symbols) < total or total == 0:
+                raise DecodeError("Malformed Huffman table")
+            tables[(tc, th)] = _HuffmanTable(counts, symbols)
+            pos += 17 + total
+    return tables
+
+
+class _BitReader:
+    """Reads entropy-coded bits, removing byte stuffing and stopping at the first marker."""
+    __slots__ = ('data', 'pos', 'end', 'acc', 'bits', 'marker', 'marker_pos', 'padding')
+
+    def __init__(self, data, pos: int, end: int):
+        self.data = data
+        self.end = end
+        self.reset(pos)
+
+    def reset(self, pos: int) -> None:
+        self.pos = pos
+        self.acc = 0
+        self.bits = 0
+        self.marker = None
+        self.marker_pos = -1
+        self.padding = 0
+
+    def _fill(self, need: int) -> None:
+        while self.bits < need:
+            byte = 0
+            if self.marker is None and self.pos < self.end:
+                byte = self.data[self.pos]
+                if byte != 0xFF:
+                    self.pos += 1
+                elif self.pos + 1 < self.end and self.data[self.pos + 1] == 0x00:
+                    self.pos += 2
+                else:
+                    # A marker (or the end of the data): feed zeros from here on
+                    self.marker = self.data[self.pos + 1] if self.pos + 1 < self.end else 0xD9
+                    self.marker_pos = self.pos
+                    byte = 0
+                    self.padding += 1
+            else:
+                self.padding += 1
+            self.acc = (self.acc << 8) | byte
+            self.bits += 8
+
+    def receive(self, n: int) -> int:
+        if n == 0:
+            return 0
+        self._fill(n)
+        self.bits -= n
+        value = self.acc >> self.bits
+        self.acc &= (1 << self.bits) - 1
+        return value
+
+    def decode(self, table: _HuffmanTable) -> int:
+        self._fill(16)
+        entry = table.lookup[self.acc >> (self.bits - LOOKAHEAD)]
+        if entry is not None:
+            length, symbol = entry
+        else:
+            for length in range(LOOKAHEAD + 1, 17):
+                code = self.acc >> (self.bits - length)
+                if code <= table.maxcode[length]:
+                    symbol = table.symbols[table.valptr[length] + code - table.mincode[length]]
+                    break
+            else:
+                raise DecodeError("Invalid Huffman code")
+        self.bits -= length
+        self.acc &= (1 << self.bits) - 1
+        if self.padding > MAX_PADDING_BYTES:
+            raise DecodeError("Entropy data ends before the last MCU")
+        return symbol
+
+    def at_restart(self, expected: int) -> bool:
+        """Byte-aligns and checks that the next thing in the stream is RST`expected`."""
+        if self.marker is None:
+            # Only the partial byte may be left before the marker
+            if self.bits >= 8 or self.pos + 1 >= self.end or self.data[self.pos] != 0xFF:
+                return False
+            marker, marker_pos = self.data[self.pos + 1], self.pos
+        else:
+            if self.bits - 8 * self.padding >= 8:
+                return False
+            marker, marker_pos = self.marker, self.marker_pos
+        if marker != 0xD0 + expected:
+            return False
+        self.reset(marker_pos + 2)
+        return True
+
+
+def _decode_block(reader: _BitReader, dc: _HuffmanTable, ac: _HuffmanTable, max_dc: int, max_ac: int) -> None:
+    s = reader.decode(dc)
+    if s > max_dc:
+        raise DecodeError("DC category out of range")
+    reader.receive(s)
+    k = 1
+    while k < 64:
+        rs = reader.decode(ac)
+        r, s = rs >> 4, rs & 0x0F
+        if s == 0:
+            if r != 15:
+                return
+            k += 16
+            continue
+        k += r
+        if k > 63 or s > max_ac:
+            raise DecodeError("AC coefficient out of range")
+        reader.receive(s)
+        k += 1
+    if k > 64:
+        raise DecodeError("Zero run past the end of the block")
+
+
+def _scan_layout(header: Dict[str, Any], tables) -> Optional[Tuple[List[Tuple[int, _HuffmanTable, _HuffmanTable]], int]]:
+    """Blocks of one MCU as (count, dc table, ac table) per component, and the MCU count."""
+    sos = header['sos']
+    frame = {c['id']: c for c in header['components']}
+    if not sos or not frame:
+        return None
+    count = sos[0]
+    if len(sos) < 1 + 2 * count or count == 0:
+        return None
+    h_max = max(c['h'] for c in frame.values())
+    v_max = max(c['v'] for c in frame.values())
+
+    layout = []
+    for i in range(count):
+        component = frame.get(sos[1 + 2 * i])
+        td, ta = sos[2 + 2 * i] >> 4, sos[2 + 2 * i] & 0x0F
+        if component is None or (0, td) not in tables or (1, ta) not in tables:
+            return None
+        blocks = component['h'] * component['v'] if count > 1 else 1
+        layout.append((blocks, tables[(0, td)], tables[(1, ta)]))
+
+    if count > 1:
+        mcus = -(-header['width'] // (8 * h_max)) * -(-header['height'] // (8 * v_max))
+    elif len(frame) == 1:
+        mcus = -(-header['width'] // 8) * -(-header['height'] // 8)
+    else:
+        # Non-interleaved scan of a multi-scan sequential file: not sampled
+        return None
+    return layout, mcus
+
+
+def _rst_positions(data, start: int, end: int) -> List[int]:
+    positions = []
+    i = data.find(b'\xff', start, end - 1)
+    while i != -1:
+        if 0xD0 <= data[i + 1] <= 0xD7:
+            positions.append(i)
+        i = data.find(b'\xff', i + 2, end - 1)
+    return positions
+
+
+def decodability(data, header: Optional[Dict[str, Any]] = None,
+                 max_mcus: int = DEFAULT_MAX_MCUS, samples: int = DEFAULT_SAMPLES) -> Optional[Dict[str, Any]]:
+    """
+    Fast decodability metric for a sequential Huffman JPEG: Huffman-decodes
+    MCUs (no IDCT, no pixels) and reports the fraction that decoded cleanly.
+    Files with restart markers are sampled at several restart segments spread
+    across the image (each restart resets the decoder); others are decoded
+    from the start of the scan for up to max_mcus.
+
+    `data` needs find()/rfind() (bytes, bytearray, mmap). Returns {score,
+    mcus_decoded, mcus_attempted, error, error_offset}, or None for files the
+    walker does not handle (progressive, lossless, no tables).
+    """
+    if header is None:
+        header = parse_jpeg_header(bytes(data[:HEADER_READ_LIMIT]))
+    if not header or header['bitstream_offset'] == -1 or header['sof_marker'] not in SEQUENTIAL_SOF:
+        return None
+    try:
+        tables = parse_huffman_tables(header['dht'])
+    except DecodeError:
+        return None
+    scan = _scan_layout(header, tables)
+    if scan is None:
+        return None
+    layout, total_mcus = scan
+    max_dc, max_ac = (11, 10) if header['precision'] == 8 else (15, 14)
+
+    start = header['bitstream_offset']
+    end = data.rfind(b'\xff\xd9', start)
+    end = end if end != -1 else len(data)
+    interval = header['restart_interval']
+
+    # (stream offset, first MCU index) of every segment to decode
+    plan = [(start, 0)]
+    if interval:
+        rst = _rst_positions(data, start, end)
+        step = max(1, len(rst) // max(1, samples - 1))
+        # A sample is only usable if its RST carries the number its position implies
+        plan += [(rst[i] + 2, (i + 1) * interval) for i in range(step - 1, len(rst), step)
+                 if data[rst[i] + 1] == 0xD0 + i % 8][:samples - 1]
+
+    reader = _BitReader(data, start, end)
+    decoded = attempted = 0
+    error = None
+    error_offset = -1
+    for k, (offset, first_mcu) in enumerate(plan):
+        reader.reset(offset)
+        next_mcu = plan[k + 1][1] if k + 1 < len(plan) else total_mcus
+        budget = max(0, min(max_mcus, next_mcu - first_mcu))
+        attempted += budget
+        try:
+            for n in range(budget):
+                mcu = first_mcu + n
+                if interval and n and mcu % interval == 0 and not reader.at_restart((mcu // interval - 1) % 8):
+                    raise DecodeError("Restart marker out of place")
+                for blocks, dc, ac in layout:
+                    for _ in range(blocks):
+                        _decode_block(reader, dc, ac, max_dc, max_ac)
+                decoded += 1
+        except DecodeError as e:
+            if error is None:
+                error, error_offset = str(e), reader.pos
+
+    return {
+        'score': round(decoded / attempted, 4) if attempted else 0.0,
+        'mcus_decoded': decoded,
+        'mcus_attempted': attempted,
+        'error': error,
+        'error_offset': error_offset
+    }
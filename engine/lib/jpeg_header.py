@@ -0,0 +1,146 @@
+import io
+from typing import Dict, Any, Optional, BinaryIO
+
+from lib.budget import current_budget
+
+# Never read further than this while looking for the main SOS marker. Real
+# headers (EXIF + thumbnail, ICC, tables) stay well below it.
+HEADER_READ_LIMIT = 1024 * 1024
+
+EXIF_PREFIX = b'Exif\x00\x00'
+
+# SOF markers (baseline, extended, progressive, lossless; Huffman and arithmetic)
+SOF_MARKERS = {0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF}
+MARKER_DHT = 0xC4
+MARKER_DQT = 0xDB
+MARKER_DRI = 0xDD
+MARKER_SOS = 0xDA
+MARKER_APP1 = 0xE1
+
+# Markers with no length field
+STANDALONE_MARKERS = {0x01, 0xD8, 0xD9} | set(range(0xD0, 0xD8))
+
+
+def _parse_sof(header: Dict[str, Any], marker: int, payload: bytes) -> None:
+    if len(payload) < 6:
+        return
+    header['sof_marker'] = marker
+    header['precision'] = payload[0]
+    header['height'] = (payload[1] << 8) | payload[2]
+    header['width'] = (payload[3] << 8) | payload[4]
+    components = []
+    for i in range(payload[5]):
+        base = 6 + i * 3
+        if base + 3 > len(payload):
+            break
+        components.append({
+            'id': payload[base],
+            'h': payload[base + 1] >> 4,
+            'v': payload[base + 1] & 0x0F,
+            'tq': payload[base + 2]
+        })
+    header['components'] = components
+
+
+def read_jpeg_header(f: BinaryIO, max_bytes: int = HEADER_READ_LIMIT) -> Optional[Dict[str, Any]]:
+    """
+    Walks the marker segments of a JPEG up to (and including) the main SOS,
+    reading only the payloads we care about (SOF, DQT, DHT, DRI, EXIF APP1)
+    and seeking over everything else. The entropy-coded bitstream is never read.
+
+    Returns None if the stream does not start with SOI. `bitstream_offset` is
+    -1 when the walk broke down before reaching SOS.
+    """
+    if f.read(2) != b'\xff\xd8':
+        return None
+
+    header: Dict[str, Any] = {
+        'sof_marker': None,
+        'precision': None,
+        'width': None,
+        'height': None,
+        'components': [],
+        'dqt': [],
+        'dht': [],
+        'restart_interval': 0,
+        'exif': None,
+        'exif_offset': -1,
+        'sos': None,
+        'bitstream_offset': -1,
+        'header_bytes_read': 2
+    }
+
+    pos = 2
+    budget = current_budget()
+    while pos < max_bytes:
+        budget.count(1, 'JPEG segments')
+        f.seek(pos)
+        head = f.read(2)
+        if len(head) < 2 or head[0] != 0xFF:
+            # Lost the marker stream
+            break
+
+        marker = head[1]
+        if marker == 0xFF:
+            # Fill byte
+            pos += 1
+            continue
+        if marker in STANDALONE_MARKERS:
+            pos += 2
+            continue
+
+        length_bytes = f.read(2)
+        if len(length_bytes) < 2:
+            break
+        seg_len = (length_bytes[0] << 8) | length_bytes[1]
+        if seg_len < 2:
+            break
+        payload_len = seg_len - 2
+
+        wanted = (
+            marker in SOF_MARKERS
+            or marker in (MARKER_DQT, MARKER_DHT, MARKER_DRI, MARKER_SOS)
+        )
+        if marker == MARKER_APP1 and header['exif'] is None:
+            wanted = f.read(len(EXIF_PREFIX)) == EXIF_PREFIX
+            f.seek(pos + 4)
+
+        if wanted:
+            payload = f.read(payload_len)
+            if len(payload) < payload_len:
+                break
+
+            if marker == MARKER_SOS:
+                header['sos'] = payload
+                header['bitstream_offset'] = pos + 2 + seg_len
+                pos += 2 + seg_len
+                break
+            if marker in SOF_MARKERS:
+                _parse_sof(header, marker, payload)
+            elif marker == MARKER_DQT:
+                header['dqt'].append(payload)
+            elif marker == MARKER_DHT:
+                header['dht'].append(payload)
+            elif marker == MARKER_DRI and len(payload) >= 2:
+                header['restart_interval'] = (payload[0] << 8) | payload[1]
+            elif marker == MARKER_APP1:
+                header['exif'] = payload[len(EXIF_PREFIX):]
+                header['exif_offset'] = pos + 4 + len(EXIF_PREFIX)
+
+        pos += 2 + seg_len
+
+    header['header_bytes_read'] = pos
+    return header
+
+
+def parse_jpeg_header(data: bytes, max_bytes: int = HEADER_READ_LIMIT) -> Optional[Dict[str, Any]]:
+    """In-memory variant of read_jpeg_header."""
+    return read_jpeg_header(io.BytesIO(data), max_bytes)
+
+
+def sampling_signature(header: Dict[str, Any]) -> Optional[str]:
+    """Compact HxV sampling description, e.g. '2x2,1x1,1x1'."""
+    components = header.get('components') or []
+    if not components:
+        return None
+    return ','.join(f"{c['h']}x{c['v']}" for c in components)
@@ -0,0 +1,143 @@
+import os
+import zlib
+import struct
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional, Tuple
+
+from lib.budget import ParseBudget, current_budget
+
+# Uncompressed bytes per deflate block (one thread task each)
+DEFAULT_BLOCK_SIZE = 1024 * 1024
+# Payload of each emitted IDAT chunk
+DEFAULT_IDAT_SIZE = 1024 * 1024
+# Deflate window: the dictionary each block primes from the previous one
+WINDOW_SIZE = 32 * 1024
+
+ADLER_BASE = 65521
+
+
+def adler32_combine(adler1: int, adler2: int, len2: int) -> int:
+    """Adler-32 of A + B from adler32(A), adler32(B) and len(B) (zlib's adler32_combine)."""
+    rem = len2 % ADLER_BASE
+    sum1 = adler1 & 0xFFFF
+    sum2 = (rem * sum1) % ADLER_BASE
+    sum1 += (adler2 & 0xFFFF) + ADLER_BASE - 1
+    sum2 += (adler1 >> 16) + (adler2 >> 16) + ADLER_BASE - rem
+    sum1 %= ADLER_BASE
+    sum2 %= ADLER_BASE
+    return sum1 | (sum2 << 16)
+
+
+def _deflate_block(raw, start: int, end: int, level: int, last: bool, budget: ParseBudget) -> Tuple[bytes, int]:
+    budget.check_deadline()
+    compressor = zlib.compressobj(level, zlib.DEFLATED, -15,
+                                  zdict=bytes(raw[max(0, start - WINDOW_SIZE):start]) if start else b'')
+    block = raw[start:end]
+    body = compressor.compress(block) + compressor.flush(zlib.Z_FINISH if last else zlib.Z_SYNC_FLUSH)
+    return body, zlib.adler32(block)
+
+
+def _zlib_header(level: int) -> bytes:
+    level = 6 if level == -1 else level
+    flevel = 0 if level < 2 else 1 if level < 6 else 2 if level == 6 else 3
+    cmf = 0x78
+    flg = flevel << 6
+    flg += 31 - ((cmf << 8) | flg) % 31
+    return bytes([cmf, flg])
+
+
+def parallel_deflate(raw, level: int = 6, block_size: int = DEFAULT_BLOCK_SIZE,
+                     pool: Optional[ThreadPoolExecutor] = None) -> List[bytes]:
+    """
+    pigz-style zlib stream of `raw` as a list of parts: every block is
+    deflated on its own thread, primed with the previous 32 KB as a preset
+    dictionary, and ends on a sync flush so the blocks concatenate into one
+    valid deflate stream. The Adler-32 trailer is combined from per-block
+    checksums. zlib releases the GIL, so threads scale across cores.
+    Blocks check the caller's job deadline before they start.
+    """
+    raw = memoryview(raw)
+    budget = current_budget()
+    bounds = [(start, min(start + block_size, len(raw))) for start in range(0, max(len(raw), 1), block_size)]
+    own_pool = pool is None
+    pool = pool or ThreadPoolExecutor(max_workers=os.cpu_count() or 1)
+    try:
+        futures = [pool.submit(_deflate_block, raw, start, end, level, i == len(bounds) - 1, budget)
+                   for i, (start, end) in enumerate(bounds)]
+        parts = [_zlib_header(level)]
+        adler = 1
+        for (start, end), future in zip(bounds, futures):
+            body, block_adler = future.result()
+            parts.append(body)
+            adler = adler32_combine(adler, block_adler, end - start)
+    finally:
+        if own_pool:
+            pool.shutdown()
+    parts.append(struct.pack('>I', adler))
+    return parts
+
+
+def _crc_chunk(chunk_type: bytes, payload, budget: ParseBudget) -> int:
+    budget.check_deadline()
+    return zlib.crc32(payload, zlib.crc32(chunk_type)) & 0xFFFFFFFF
+
+
+def idat_chunks(stream: bytes, chunk_size: int = DEFAULT_IDAT_SIZE,
+                pool: Optional[ThreadPoolExecutor] = None) -> List[bytes]:
+    """
+    Splits a zlib stream into fixed-size IDAT chunks, serialized as output
+    parts (length+type, payload view, CRC). CRCs are computed on the pool.
+    """
+    view = memoryview(stream)
+    budget = current_budget()
+    payloads = [view[start:start + chunk_size] for start in range(0, max(len(view), 1), chunk_size)]
+    own_pool = pool is None
+    pool = pool or ThreadPoolExecutor(max_workers=os.cpu_count() or 1)
+    try:
+        crcs = list(pool.map(lambda payload: _crc_chunk(b'IDAT', payload, budget), payloads))
+    finally:
+        if own_pool:
+            pool.shutdown()
+    parts = []
+    for payload, crc in zip(payloads, crcs):
+        parts += [struct.pack('>I', len(payload)) + b'IDAT', payload, struct.pack('>I', crc)]
+    return parts
+
+
+def inflated_length(stream, piece_size: int = 1024 * 1024) -> Tuple[int, bool]:
+    """(raw length, ended cleanly) of a zlib stream, without holding the raw data."""
+    inflater = zlib.decompressobj()
+    length = 0
+    try:
+        length += len(inflater.decompress(stream, piece_size))
+        while inflater.unconsumed_tail and not inflater.eof:
+            current_budget().check_deadline()
+            length += len(inflater.decompress(inflater.unconsumed_tail, piece_size))
+        length += len(inflater.flush())
+    except zlib.error:
+        return length, False
+    return length, inflater.eof
+
+
+def inflate_partial(stream, piece_size: int = 64 * 1024, limit: Optional[int] = None) -> Tuple[bytearray, bool]:
+    """
+    Inflates as much of a (possibly truncated or corrupt) zlib stream as
+    decodes. Returns (raw bytes recovered, whether the stream ended cleanly).
+    With `limit`, stops once that many raw bytes are out (a stream that
+    inflates far beyond the image is a bomb, not image data).
+    """
+    inflater = zlib.decompressobj()
+    raw = bytearray()
+    view = memoryview(stream)
+    budget = current_budget()
+    try:
+        for start in range(0, len(view), piece_size):
+            raw += inflater.decompress(view[start:start + piece_size])
+            budget.alloc(len(raw), 'inflated data')
+            budget.check_deadline()
+            if inflater.eof or (limit is not None and len(raw) >= limit):
+                break
+        raw += inflater.flush()
+    except zlib.error:
+        return raw, False
+    return raw, inflater.eof
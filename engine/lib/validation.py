@@ -0,0 +1,141 @@
+import struct
+import zlib
+from typing import Dict, Any, Optional
+
+from lib.jpeg_header import parse_jpeg_header, HEADER_READ_LIMIT
+from lib.exif import read_ifd0_tags
+from strategies.heic_box_recovery import _read_boxes, _find_box
+from strategies.marker_sanitization import VALID_FOLLOWERS, plan_entropy_ranges
+
+PNG_SIGNATURE = b'\x89PNG\r\n\x1a\n'
+# Inflate IDAT data in pieces of this size so validation never holds the raw image
+INFLATE_CHUNK = 1024 * 1024
+
+# Strategy output extension (or its spelling variants) -> validated format
+EXTENSION_FORMATS = {
+    '.jpg': 'jpeg', '.jpeg': 'jpeg', '.png': 'png',
+    '.heic': 'heic', '.heif': 'heic', '.tiff': 'tiff', '.tif': 'tiff'
+}
+
+
+def _result(fmt: str, checks: Dict[str, bool], reason: Optional[str] = None) -> Dict[str, Any]:
+    passed = sum(1 for ok in checks.values() if ok)
+    return {
+        'format': fmt,
+        'valid': passed == len(checks),
+        'score': round(passed / len(checks), 3),
+        'checks': checks,
+        'reason': reason or next((name for name, ok in checks.items() if not ok), None)
+    }
+
+
+def count_invalid_markers(data, start: int, end: int) -> int:
+    """0xFF bytes in [start, end) followed by anything but stuffing, RSTn or EOI."""
+    count = 0
+    i = data.find(b'\xff', start, end - 1)
+    while i != -1:
+        if data[i + 1] not in VALID_FOLLOWERS:
+            count += 1
+        i = data.find(b'\xff', i + 2, end - 1)
+    return count
+
+
+def validate_jpeg(data) -> Dict[str, Any]:
+    header = parse_jpeg_header(bytes(data[:HEADER_READ_LIMIT])) if bytes(data[:2]) == b'\xff\xd8' else None
+    checks = {
+        'soi': header is not None,
+        'frame': bool(header and header['sof_marker'] is not None and header['width'] and header['height']),
+        'tables': bool(header and header['dqt'] and header['dht']),
+        'scan': bool(header and header['bitstream_offset'] != -1),
+    }
+    if not checks['scan']:
+        checks.update({'entropy': False, 'eoi': False})
+        return _result('jpeg', checks)
+
+    # Trailing padding after the EOI is common and harmless
+    eoi = data.rfind(b'\xff\xd9')
+    end = eoi if eoi >= header['bitstream_offset'] else len(data)
+    # Tables and SOS segments between the scans of a progressive file are not damage
+    scans = plan_entropy_ranges(data, header['bitstream_offset'], end)
+    checks['entropy'] = not any(count_invalid_markers(data, start, stop) for start, stop in scans)
+    checks['eoi'] = eoi >= header['bitstream_offset']
+    return _result('jpeg', checks)
+
+
+def validate_png(data) -> Dict[str, Any]:
+    checks = {'signature': bytes(data[:8]) == PNG_SIGNATURE, 'ihdr': False, 'crc': True, 'idat': False, 'inflate': False, 'iend': False}
+    if not checks['signature']:
+        return _result('png', checks)
+
+    inflater = zlib.decompressobj()
+    offset = 8
+    first = True
+    try:
+        while offset + 12 <= len(data):
+            length, = struct.unpack_from('>I', data, offset)
+            chunk_type = bytes(data[offset + 4:offset + 8])
+            end = offset + 8 + length
+            if end + 4 > len(data):
+                checks['crc'] = False
+                break
+            body = data[offset + 8:end]
+            if zlib.crc32(body, zlib.crc32(chunk_type)) & 0xFFFFFFFF != struct.unpack_from('>I', data, end)[0]:
+                checks['crc'] = False
+            if first:
+                checks['ihdr'] = chunk_type == b'IHDR' and length == 13
+                first = False
+            if chunk_type == b'IDAT':
+                checks['idat'] = True
+                inflater.decompress(body, INFLATE_CHUNK)
+                while inflater.unconsumed_tail:
+                    inflater.decompress(inflater.unconsumed_tail, INFLATE_CHUNK)
+            elif chunk_type == b'IEND':
+                checks['iend'] = True
+                break
+            offset = end + 4
+        checks['inflate'] = checks['idat'] and inflater.eof
+    except zlib.error:
+        checks['inflate'] = False
+    return _result('png', checks)
+
+
+def validate_heic(data) -> Dict[str, Any]:
+    boxes = _read_boxes(data)
+    checks = {
+        'ftyp': bool(boxes) and boxes[0]['type'] == 'ftyp',
+        'meta': _find_box(boxes, 'meta') is not None,
+        'mdat': _find_box(boxes, 'mdat') is not None,
+        # Every byte belongs to a box: nothing truncated or trailing
+        'boxes': bool(boxes) and boxes[-1]['offset'] + boxes[-1]['size'] == len(data),
+    }
+    return _result('heic', checks)
+
+
+def validate_tiff(data) -> Dict[str, Any]:
+    tags = read_ifd0_tags(bytes(data[:HEADER_READ_LIMIT]))
+    checks = {
+        'byte_order': bytes(data[:4]) in (b'II*\x00', b'MM\x00*'),
+        'dimensions': bool(tags['width'] and tags['height']),
+    }
+    return _result('tiff', checks)
+
+
+VALIDATORS = {'jpeg': validate_jpeg, 'png': validate_png, 'heic': validate_heic, 'tiff': validate_tiff}
+
+
+def validate_output(data, fmt: str) -> Dict[str, Any]:
+    """
+    Cheap structural check of a repaired file: container structure, tables
+    and (for JPEG/PNG) the integrity of the compressed stream. No pixels are
+    decoded. `data` is bytes-like or a strategy's list of output parts.
+    Returns {format, valid, score in [0, 1], checks, reason}.
+    """
+    validator = VALIDATORS.get(fmt)
+    if not validator:
+        raise ValueError(f"No validator for format: {fmt}")
+    if isinstance(data, memoryview):
+        # The validators search with find()/rfind()
+        data = data.tobytes()
+    elif not isinstance(data, (bytes, bytearray)):
+        data = b''.join(data)
+    return validator(data)
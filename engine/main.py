@@ -6,15 +6,10 @@ import os
 # Ensure the engine directory is in the Python path regardless of the working directory
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
-from strategies.preview_extraction import PreviewExtractionStrategy
-from strategies.header_grafting import HeaderGraftingStrategy
-from strategies.marker_sanitization import MarkerSanitizationStrategy
-from strategies.mcu_alignment import McuAlignmentStrategy
-from strategies.png_chunk_rebuilder import PngChunkRebuilderStrategy
-from strategies.heic_box_recovery import HeicBoxRecoveryStrategy
-from strategies.tiff_ifd_rebuilder import TiffIfdRebuilderStrategy
-
-def send_progress(job_id: str, percent: int, stage: str, status: str = "running", error_message: str = None, repaired_path: str = None):
+# Strategy modules are imported lazily through the registry; keep top-level imports light.
+from strategies.registry import get_extension, list_strategies, load_strategy
+
+def send_progress(job_id: str, percent: int, stage: str, status: str = "running", error_message: str = None, repaired_path: str = None, details: dict = None):
     # Sends a JSON message back to the Node backend via stdout
     msg = {
         "job_id": job_id,
@@ -26,72 +21,559 @@ def send_progress(job_id: str, percent: int, stage: str, status: str = "running"
         msg["error_message"] = error_message
     if repaired_path:
         msg["repaired_path"] = repaired_path
+    if details:
+        msg["details"] = details
         
     print(json.dumps(msg))
     sys.stdout.flush()
 
+def record_run(telemetry, command, strategy, fmt, input_size, succeeded, stages, peak_delta=None,
+               bytes_read=None, bytes_written=None):
+    """Appends one run to the telemetry store, if any. Telemetry errors are logged, never raised."""
+    from services.telemetry import record_runs, run_record
+
+    record_runs([run_record(
+        command, strategy, fmt, input_size, "done" if succeeded else "failed", stages,
+        bytes_read=input_size if bytes_read is None else bytes_read,
+        bytes_written=bytes_written, peak_delta=peak_delta
+    )], telemetry)
+
+def file_size(path):
+    return os.path.getsize(path) if path and os.path.exists(path) else None
+
+def record_repair_run(args, extension, stages, result, output_path, peak_delta):
+    from lib.validation import EXTENSION_FORMATS
+
+    succeeded = bool(result.get("success"))
+    input_size = file_size(args.file_path) or 0
+    record_run(
+        args.telemetry, "repair", args.strategy, EXTENSION_FORMATS.get(extension), input_size, succeeded, stages,
+        peak_delta=peak_delta,
+        bytes_read=input_size + (file_size(args.reference_path) or 0),
+        bytes_written=file_size(result.get("output_path", output_path)) if succeeded else None
+    )
+
+def run_rank_references(argv):
+    parser = argparse.ArgumentParser(prog="main.py rank-references", description="Rank references from the fingerprint index")
+    parser.add_argument("--index", required=True, help="Path to the SQLite reference index")
+    parser.add_argument("--target", required=True, help="Path to the damaged file to match")
+    parser.add_argument("--library", required=False, help="Reference library to (incrementally) index first")
+    parser.add_argument("--limit", type=int, default=10, help="Maximum number of references returned")
+    args = parser.parse_args(argv)
+
+    from services.reference_index import ReferenceIndex
+
+    index = ReferenceIndex(args.index)
+    try:
+        scan_stats = index.scan(args.library) if args.library else None
+        ranked = index.rank(args.target, args.limit)
+    finally:
+        index.close()
+
+    print(json.dumps({"references": ranked, "scan": scan_stats}))
+    sys.stdout.flush()
+
+def run_cluster(argv):
+    parser = argparse.ArgumentParser(prog="main.py cluster", description="Group damaged JPEGs by header signature")
+    parser.add_argument("--input-dir", required=True, help="Directory of damaged JPEGs")
+    parser.add_argument("--strategy", required=False, help="Repair strategy to run across every group")
+    parser.add_argument("--output-dir", required=False, help="Directory to save repaired files")
+    parser.add_argument("--index", required=False, help="SQLite reference index used to pick one reference per group")
+    parser.add_argument("--library", required=False, help="Reference library to (incrementally) index first")
+    parser.add_argument("--telemetry", required=False, help="SQLite store the run's timings are appended to (default: $PHOTO_REPAIR_TELEMETRY)")
+    args = parser.parse_args(argv)
+
+    from services.batch_clustering import cluster_files, collect_jpegs, repair_clusters, index_reference_resolver
+
+    grouping = cluster_files(collect_jpegs(args.input_dir))
+    summary = {
+        "clusters": [{**c, "file_count": len(c["files"])} for c in grouping["clusters"]],
+        "unclustered": grouping["unclustered"]
+    }
+
+    if args.strategy:
+        try:
+            ext_to_use = get_extension(args.strategy)
+        except ValueError as e:
+            parser.error(str(e))
+        strategy = load_strategy(args.strategy)
+
+        index = None
+        reference_for = None
+        if args.index:
+            from services.reference_index import ReferenceIndex
+            index = ReferenceIndex(args.index)
+            if args.library:
+                index.scan(args.library)
+            reference_for = index_reference_resolver(index)
+
+        from services.telemetry import StageTimer, JobPeak
+
+        timer, memory = StageTimer(), JobPeak()
+        try:
+            with timer.stage('repair'):
+                summary["results"] = repair_clusters(
+                    grouping["clusters"],
+                    strategy,
+                    args.output_dir or args.input_dir,
+                    ext_to_use,
+                    reference_for,
+                    input_dir=args.input_dir
+                )
+        finally:
+            if index:
+                index.close()
+
+    print(json.dumps(summary))
+    sys.stdout.flush()
+    if summary.get("results"):
+        # One row for the whole run: done only if every file was repaired
+        results = summary["results"]
+        record_run(
+            args.telemetry, "cluster", args.strategy, "jpeg",
+            sum(file_size(r["input_path"]) or 0 for r in results), all(r.get("success") for r in results),
+            timer.stages, peak_delta=memory.delta(),
+            bytes_written=sum(file_size(r.get("output_path")) or 0 for r in results if r.get("success"))
+        )
+
+def run_carve(argv):
+    parser = argparse.ArgumentParser(prog="main.py carve", description="Carve JPEGs out of a disk image")
+    parser.add_argument("--image", required=True, help="Path to the disk/card image")
+    parser.add_argument("--output-dir", required=False, help="Directory to write carved files to")
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes (default: all cores)")
+    parser.add_argument("--sector-size", type=int, default=0, help="Only test headers at multiples of this sector/cluster size")
+    parser.add_argument("--no-skip-blank", action="store_true", help="Scan zero/0xFF-filled and sparse regions too")
+    parser.add_argument("--blank-map", required=False, help="Where to keep the blank-region map (default: in the output directory)")
+    parser.add_argument("--telemetry", required=False, help="SQLite store the run's timings are appended to (default: $PHOTO_REPAIR_TELEMETRY)")
+    args = parser.parse_args(argv)
+
+    from services.carver import carve_image
+    from services.telemetry import StageTimer
+
+    timer = StageTimer()
+    with timer.stage('repair'):
+        result = carve_image(
+            args.image,
+            output_dir=args.output_dir,
+            workers=args.workers,
+            sector_size=args.sector_size,
+            skip_blank=not args.no_skip_blank,
+            blank_map_path=args.blank_map
+        )
+    print(json.dumps(result))
+    sys.stdout.flush()
+    # Ranges are scanned in worker processes: no peak for this one
+    record_run(
+        args.telemetry, "carve", "carve", None, os.path.getsize(args.image), True, timer.stages,
+        bytes_read=result["bytes_scanned"],
+        bytes_written=sum(item["length"] for item in result["files"]) if args.output_dir else None
+    )
+
+def run_carve_fragments(argv):
+    parser = argparse.ArgumentParser(prog="main.py carve-fragments", description="Carve JPEGs split in two across a disk image")
+    parser.add_argument("--image", required=True, help="Path to the disk/card image")
+    parser.add_argument("--output-dir", required=False, help="Directory to write carved files to")
+    parser.add_argument("--cluster-size", type=int, default=32 * 1024, help="Filesystem cluster size of the card")
+    parser.add_argument("--search-window", type=int, default=2048, help="Clusters searched for the second fragment")
+    parser.add_argument("--no-skip-blank", action="store_true", help="Consider zero/0xFF-filled and sparse regions too")
+    args = parser.parse_args(argv)
+
+    from services.fragment_carver import carve_fragmented
+
+    result = carve_fragmented(
+        args.image,
+        output_dir=args.output_dir,
+        cluster_size=args.cluster_size,
+        search_window=args.search_window,
+        skip_blank=not args.no_skip_blank
+    )
+    print(json.dumps(result))
+    sys.stdout.flush()
+
+def run_race(argv):
+    parser = argparse.ArgumentParser(prog="main.py race", description="Race several strategies on one file; the first verified output wins")
+    parser.add_argument("--file-path", required=True, help="Path to the corrupted file")
+    parser.add_argument("--strategies", required=False, help="Comma-separated strategy names (default: all applicable)")
+    parser.add_argument("--reference-path", required=False, help="Reference file for strategies that need one")
+    parser.add_argument("--output-path", required=False, help="Exact path of the output file")
+    parser.add_argument("--timeout", type=float, default=None, help="Give up (and cancel every worker) after this many seconds")
+    parser.add_argument("--telemetry", required=False, help="SQLite store the run's timings are appended to (default: $PHOTO_REPAIR_TELEMETRY)")
+    args = parser.parse_args(argv)
+
+    from services.race import race_strategies, applicable_strategies
+
+    names = args.strategies.split(",") if args.strategies else applicable_strategies(args.file_path, bool(args.reference_path))
+    if not names:
+        parser.error("No applicable strategy for this file")
+    try:
+        ext_to_use = get_extension(names[0])
+    except ValueError as e:
+        parser.error(str(e))
+
+    output_path = args.output_path
+    if not output_path:
+        name, _ext = os.path.splitext(args.file_path)
+        output_path = f"{name}_repaired{ext_to_use}"
+
+    from lib.validation import EXTENSION_FORMATS
+    from services.telemetry import StageTimer
+
+    timer = StageTimer()
+    with timer.stage('repair'):
+        # Without --strategies the race also falls back to the last-resort strategies
+        result = race_strategies(args.file_path, output_path, names if args.strategies else None, args.reference_path, args.timeout)
+    print(json.dumps(result))
+    sys.stdout.flush()
+    # Recorded under the winning strategy; the strategies run in worker processes, so no peak
+    record_run(
+        args.telemetry, "race", result.get("winner") or "race", EXTENSION_FORMATS.get(ext_to_use),
+        os.path.getsize(args.file_path), result.get("success"), timer.stages,
+        bytes_written=file_size(output_path) if result.get("success") else None
+    )
+    if not result.get("success"):
+        sys.exit(1)
+
+def run_dedupe(argv):
+    parser = argparse.ArgumentParser(prog="main.py dedupe", description="Group duplicate and near-duplicate recovered images by perceptual hash")
+    parser.add_argument("--input-dir", required=True, help="Directory of recovered/repaired outputs")
+    parser.add_argument("--collapse-dir", required=False, help="Move every duplicate here, keeping one image per group (default: only report)")
+    parser.add_argument("--dhash-distance", type=int, default=10, help="Largest dHash distance (of 64 bits) for a candidate pair")
+    parser.add_argument("--phash-distance", type=int, default=12, help="Largest pHash distance (of 64 bits) confirming a pair")
+    parser.add_argument("--workers", type=int, default=None, help="Decoding processes (default: all cores)")
+    args = parser.parse_args(argv)
+
+    from services.dedupe import dedupe_outputs
+
+    result = dedupe_outputs(
+        args.input_dir,
+        collapse_dir=args.collapse_dir,
+        dhash_distance=args.dhash_distance,
+        phash_distance=args.phash_distance,
+        workers=args.workers
+    )
+    print(json.dumps(result))
+    sys.stdout.flush()
+
+def _watch_parser(command, description):
+    parser = argparse.ArgumentParser(prog=f"main.py {command}", description=description)
+    parser.add_argument("--input-dir", required=True, help="Directory (share) that recovered files are dropped into")
+    parser.add_argument("--strategy", required=True, help="Repair strategy applied to new and changed files")
+    parser.add_argument("--output-dir", required=True, help="Directory to save repaired files")
+    parser.add_argument("--index", required=False, help="SQLite processed-file index (default: .watch-index.sqlite in the output directory)")
+    parser.add_argument("--reference-path", required=False, help="Reference file for strategies that need one")
+    parser.add_argument("--settle-seconds", type=float, default=2.0, help="Leave files modified more recently than this for the next pass")
+    parser.add_argument("--triage-below", type=float, default=None, help="Skip TIFF/RAW files whose sensor-data integrity score is below this (0-1)")
+    parser.add_argument("--job-timeout", type=float, default=120.0, help="Fail any single file that takes longer than this many seconds")
+    parser.add_argument("--telemetry", required=False, help="SQLite store that every repair's timings are appended to (default: $PHOTO_REPAIR_TELEMETRY)")
+    return parser
+
+def _run_watch(parser, args, interval, passes):
+    try:
+        get_extension(args.strategy)
+    except ValueError as e:
+        parser.error(str(e))
+
+    from services.watch_index import watch
+
+    def report(result):
+        print(json.dumps(result))
+        sys.stdout.flush()
+
+    count, last = watch(
+        args.input_dir,
+        args.strategy,
+        args.output_dir,
+        index_path=args.index,
+        reference_path=args.reference_path,
+        interval=interval,
+        passes=passes,
+        settle_seconds=args.settle_seconds,
+        triage_below=args.triage_below,
+        job_timeout=args.job_timeout,
+        on_pass=report,
+        telemetry_path=args.telemetry
+    )
+    if not count:
+        report(last)
+        sys.exit(1)
+
+def run_scan(argv):
+    parser = _watch_parser("scan", "One incremental pass: repair only files that are new or changed since the last pass")
+    args = parser.parse_args(argv)
+    _run_watch(parser, args, 0, 1)
+
+def run_watch(argv):
+    parser = _watch_parser("watch", "Poll a folder and repair new or changed files as they arrive")
+    parser.add_argument("--interval", type=float, default=10.0, help="Seconds between passes")
+    parser.add_argument("--passes", type=int, default=None, help="Stop after this many passes (default: run until interrupted)")
+    args = parser.parse_args(argv)
+    _run_watch(parser, args, args.interval, args.passes)
+
+def run_fs_recover(argv):
+    parser = argparse.ArgumentParser(prog="main.py fs-recover", description="Recover photos through a card's FAT32/exFAT directory tree")
+    parser.add_argument("--image", required=True, help="Path to the disk/card image")
+    parser.add_argument("--output-dir", required=False, help="Directory to write recovered files to (omit to only list them)")
+    parser.add_argument("--strategy", required=False, help="Repair strategy applied to every recovered file of its format")
+    parser.add_argument("--reference-path", required=False, help="Reference file for strategies that need one")
+    parser.add_argument("--no-deleted", action="store_true", help="Skip deleted directory entries")
+    parser.add_argument("--telemetry", required=False, help="SQLite store the run's timings are appended to (default: $PHOTO_REPAIR_TELEMETRY)")
+    args = parser.parse_args(argv)
+
+    strategy = None
+    ext_to_use = None
+    if args.strategy:
+        try:
+            ext_to_use = get_extension(args.strategy)
+        except ValueError as e:
+            parser.error(str(e))
+        strategy = load_strategy(args.strategy)
+
+    from services.fs_recovery import recover_from_filesystem
+    from services.telemetry import StageTimer, JobPeak
+
+    timer, memory = StageTimer(), JobPeak()
+    with timer.stage('repair'):
+        result = recover_from_filesystem(
+            args.image,
+            output_dir=args.output_dir,
+            include_deleted=not args.no_deleted,
+            strategy=strategy,
+            strategy_extension=ext_to_use,
+            reference_path=args.reference_path
+        )
+    print(json.dumps(result))
+    sys.stdout.flush()
+    recovered = [item for item in result["files"] if item.get("output_path")]
+    record_run(
+        args.telemetry, "fs-recover", args.strategy or "fs-recover", None, os.path.getsize(args.image),
+        all(item.get("success", True) for item in result["files"]), timer.stages, peak_delta=memory.delta(),
+        bytes_read=sum(item["size"] for item in result["files"]),
+        bytes_written=sum(file_size(item["output_path"]) or 0 for item in recovered) if args.output_dir else None
+    )
+
+def run_batch(argv):
+    parser = argparse.ArgumentParser(prog="main.py batch", description="Repair a folder with one strategy; resumable through a job journal")
+    parser.add_argument("--input-dir", required=True, help="Directory of files to repair")
+    parser.add_argument("--strategy", required=True, help="Repair strategy applied to every file")
+    parser.add_argument("--output-dir", required=True, help="Directory to save repaired files")
+    parser.add_argument("--journal", required=False, help="Job journal (default: .repair-journal.jsonl in the output directory)")
+    parser.add_argument("--reference-path", required=False, help="Reference file for strategies that need one")
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes (default: all cores)")
+    parser.add_argument("--memory-budget-mb", type=int, default=None, help="Estimated peak memory allowed across running jobs (default: half of RAM)")
+    parser.add_argument("--read-ahead", type=int, default=2, help="Single worker: inputs read ahead of the one being repaired")
+    parser.add_argument("--write-behind", type=int, default=2, help="Single worker: outputs queued for writing while repairs continue")
+    parser.add_argument("--triage-below", type=float, default=None, help="Skip TIFF/RAW files whose sensor-data integrity score is below this (0-1)")
+    parser.add_argument("--job-timeout", type=float, default=120.0, help="Fail any single file that takes longer than this many seconds")
+    parser.add_argument("--telemetry", required=False, help="SQLite store that every job's timings are appended to (default: $PHOTO_REPAIR_TELEMETRY)")
+    args = parser.parse_args(argv)
+
+    try:
+        get_extension(args.strategy)
+    except ValueError as e:
+        parser.error(str(e))
+
+    from services.batch_runner import run_batch as run_batch_jobs
+
+    result = run_batch_jobs(
+        args.input_dir,
+        args.strategy,
+        args.output_dir,
+        journal_path=args.journal,
+        reference_path=args.reference_path,
+        workers=args.workers or os.cpu_count() or 1,
+        memory_budget=args.memory_budget_mb * 1024 * 1024 if args.memory_budget_mb else None,
+        read_ahead=args.read_ahead,
+        write_behind=args.write_behind,
+        triage_below=args.triage_below,
+        job_timeout=args.job_timeout,
+        telemetry_path=args.telemetry
+    )
+    print(json.dumps(result))
+    sys.stdout.flush()
+    if not result.get("success"):
+        sys.exit(1)
+
+def run_tiff_scan(argv):
+    parser = argparse.ArgumentParser(prog="main.py tiff-scan", description="Per-strip/tile integrity scan of a TIFF/RAW's sensor data")
+    parser.add_argument("--file-path", required=True, help="Path to the TIFF/RAW file")
+    parser.add_argument("--reference-path", required=False, help="Take the strip/tile table from this healthy file of the same camera")
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes (default: all cores)")
+    parser.add_argument("--summary", action="store_true", help="Leave out the per-segment statistics")
+    args = parser.parse_args(argv)
+
+    import mmap
+    from services.tiff_integrity import scan_tiff
+
+    reference = None
+    if args.reference_path:
+        with open(args.reference_path, "rb") as f:
+            reference = f.read()
+    with open(args.file_path, "rb") as f:
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as view:
+            result = scan_tiff(view, reference, path=args.file_path, workers=args.workers)
+    if args.summary:
+        result.pop("segments", None)
+    print(json.dumps(result))
+    sys.stdout.flush()
+
+def run_perf_report(argv):
+    parser = argparse.ArgumentParser(prog="main.py perf-report", description="Percentiles per strategy and size bucket from the telemetry store")
+    parser.add_argument("--store", required=False, help="Telemetry store (default: $PHOTO_REPAIR_TELEMETRY)")
+    parser.add_argument("--strategy", required=False, help="Only this strategy")
+    parser.add_argument("--release", required=False, help="Only runs recorded under this release")
+    parser.add_argument("--days", type=float, default=None, help="Only runs from the last N days")
+    parser.add_argument("--baseline", required=False, help="Saved baseline to flag regressions against")
+    parser.add_argument("--save-baseline", required=False, help="Save this summary as a baseline file")
+    parser.add_argument("--tolerance", type=float, default=0.15, help="Relative slowdown counted as a regression")
+    args = parser.parse_args(argv)
+
+    import time
+    from services.telemetry import perf_report, default_store_path
+
+    store = args.store or default_store_path()
+    if not store:
+        parser.error("--store is required when PHOTO_REPAIR_TELEMETRY is not set")
+    result = perf_report(
+        store,
+        strategy=args.strategy,
+        release=args.release,
+        since=time.time() - args.days * 86400 if args.days else None,
+        baseline_path=args.baseline,
+        save_baseline=args.save_baseline,
+        tolerance=args.tolerance
+    )
+    print(json.dumps(result))
+    sys.stdout.flush()
+    if result.get("regressions"):
+        sys.exit(1)
+
+def run_diff_strategies(argv):
+    parser = argparse.ArgumentParser(prog="main.py diff-strategies", description="Compare engine strategies with their TypeScript counterparts on generated corrupt corpora")
+    parser.add_argument("--work-dir", required=True, help="Directory for the generated corpus and both sides' outputs")
+    parser.add_argument("--strategy", action="append", default=None, help="Strategy to compare (repeatable; default: every shared strategy)")
+    parser.add_argument("--sizes", type=float, nargs="+", default=[1, 8, 32], help="Corpus file sizes in MB")
+    parser.add_argument("--iterations", type=int, default=3, help="Timed runs per case on each side")
+    parser.add_argument("--node-command", required=False, help="Command that runs the TypeScript runner (default: npx --no-install vite-node)")
+    parser.add_argument("--runner", required=False, help="Node runner script (default: scripts/strategy-diff-runner.ts)")
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the corpus generator")
+    args = parser.parse_args(argv)
+
+    import shlex
+    from services.differential import run_differential, SHARED_STRATEGIES, DEFAULT_NODE_COMMAND, DEFAULT_RUNNER
+
+    result = run_differential(
+        args.work_dir,
+        strategy_names=args.strategy or SHARED_STRATEGIES,
+        sizes_mb=args.sizes,
+        iterations=args.iterations,
+        node_command=shlex.split(args.node_command) if args.node_command else DEFAULT_NODE_COMMAND,
+        runner=args.runner or DEFAULT_RUNNER,
+        seed=args.seed
+    )
+    print(json.dumps(result))
+    sys.stdout.flush()
+
+# Sub-commands other than the default single-file repair
+COMMANDS = {
+    "rank-references": run_rank_references,
+    "cluster": run_cluster,
+    "carve": run_carve,
+    "carve-fragments": run_carve_fragments,
+    "fs-recover": run_fs_recover,
+    "race": run_race,
+    "batch": run_batch,
+    "tiff-scan": run_tiff_scan,
+    "scan": run_scan,
+    "watch": run_watch,
+    "dedupe": run_dedupe,
+    "perf-report": run_perf_report,
+    "diff-strategies": run_diff_strategies,
+}
+
 def main():
+    if len(sys.argv) > 1 and sys.argv[1] in COMMANDS:
+        COMMANDS[sys.argv[1]](sys.argv[2:])
+        return
+
     parser = argparse.ArgumentParser(description="Photo Repair Engine")
-    parser.add_argument("--job-id", required=True, help="Job ID")
-    parser.add_argument("--file-path", required=True, help="Path to the corrupted file")
-    parser.add_argument("--strategy", required=True, help="Repair strategy name")
+    parser.add_argument("--list-strategies", action="store_true", help="Print the available strategies as JSON and exit")
+    parser.add_argument("--job-id", required=False, help="Job ID")
+    parser.add_argument("--file-path", required=False, help="Path to the corrupted file")
+    parser.add_argument("--strategy", required=False, help="Repair strategy name")
     parser.add_argument("--reference-path", required=False, help="Path to the reference file (if required by strategy)")
+    parser.add_argument("--reference-paths", nargs="+", required=False, help="Candidate references: try each and keep the best-scoring output")
     parser.add_argument("--output-dir", required=False, help="Directory to save the output file")
+    parser.add_argument("--output-path", required=False, help="Exact path of the output file (overrides --output-dir)")
+    parser.add_argument("--job-timeout", type=float, default=120.0, help="Fail the repair if it takes longer than this many seconds")
+    parser.add_argument("--telemetry", required=False, help="SQLite store the run's timings are appended to (default: $PHOTO_REPAIR_TELEMETRY)")
 
     args = parser.parse_args()
 
+    if args.list_strategies:
+        print(json.dumps({"strategies": list_strategies()}))
+        sys.stdout.flush()
+        return
+
+    missing = [flag for flag, value in (("--job-id", args.job_id), ("--file-path", args.file_path), ("--strategy", args.strategy)) if not value]
+    if missing:
+        parser.error(f"the following arguments are required: {', '.join(missing)}")
+
     # Inform the backend that we've started
     send_progress(args.job_id, 5, f"Engine initialized for strategy: {args.strategy}")
 
     try:
-        strategies_ext_map = {
-            "preview-extraction": (".jpg", PreviewExtractionStrategy()),
-            "header-grafting": (".jpg", HeaderGraftingStrategy()),
-            "marker-sanitization": (".jpg", MarkerSanitizationStrategy()),
-            "mcu-alignment": (".jpg", McuAlignmentStrategy()),
-            "png-chunk-rebuilder": (".png", PngChunkRebuilderStrategy()),
-            "heic-box-recovery": (".heic", HeicBoxRecoveryStrategy()),
-            "tiff-ifd-rebuilder": (".tiff", TiffIfdRebuilderStrategy())
-        }
-        
-        map_entry = strategies_ext_map.get(args.strategy)
-        
-        if not map_entry:
-            raise ValueError(f"Unknown strategy requested: {args.strategy}")
-
-        ext_to_use, strategy = map_entry
+        ext_to_use = get_extension(args.strategy)
+        strategy = load_strategy(args.strategy)
 
-        # Compute a default output path
-        directory = args.output_dir if args.output_dir else os.path.dirname(args.file_path)
-        filename = os.path.basename(args.file_path)
-        name, ext = os.path.splitext(filename)
-        output_path = os.path.join(directory, f"{name}_repaired{ext_to_use}")
+        if args.output_path:
+            output_path = args.output_path
+        else:
+            # Compute a default output path
+            directory = args.output_dir if args.output_dir else os.path.dirname(args.file_path)
+            filename = os.path.basename(args.file_path)
+            name, ext = os.path.splitext(filename)
+            output_path = os.path.join(directory, f"{name}_repaired{ext_to_use}")
 
         send_progress(args.job_id, 25, f"Executing {strategy.name} repair logic...", "running")
         
-        result = strategy.repair(input_path=args.file_path, output_path=output_path, reference_path=args.reference_path)
-        
-        if result.get("success"):
-            send_progress(
-                args.job_id, 
-                100, 
-                "Complete.", 
-                status="done", 
-                repaired_path=result.get("output_path", output_path)
-            )
-        else:
-            send_progress(
-                args.job_id, 
-                0, 
-                "Failed", 
-                status="failed", 
-                error_message=result.get("error", "Unknown error returned by strategy")
-            )
-            sys.exit(1)
-            
+        from lib.budget import parse_budget
+        from services.telemetry import StageTimer, JobPeak
+
+        timer, memory = StageTimer(), JobPeak()
+        details = None
+        with parse_budget(timeout=args.job_timeout), timer.stage('repair'):
+            if args.reference_paths:
+                from services.ensemble import graft_ensemble
+                result = graft_ensemble(args.file_path, args.reference_paths, output_path, args.strategy)
+                if "ranking" in result:
+                    details = {"reference_path": result.get("reference_path"), "ranking": result["ranking"]}
+            else:
+                result = strategy.repair(input_path=args.file_path, output_path=output_path, reference_path=args.reference_path)
     except Exception as e:
         send_progress(args.job_id, 0, "Failed", "failed", str(e))
         sys.exit(1)
 
+    if result.get("success"):
+        send_progress(
+            args.job_id, 
+            100, 
+            "Complete.", 
+            status="done", 
+            repaired_path=result.get("output_path", output_path),
+            details=details
+        )
+    else:
+        send_progress(
+            args.job_id, 
+            0, 
+            "Failed", 
+            status="failed", 
+            error_message=result.get("error", "Unknown error returned by strategy")
+        )
+    # Only once the outcome is reported: telemetry cannot change it
+    record_repair_run(args, ext_to_use, timer.stages, result, output_path, memory.delta())
+    if not result.get("success"):
+        sys.exit(1)
+
 if __name__ == "__main__":
     main()
@@ -0,0 +1,131 @@
+import os
+import hashlib
+import struct
+from typing import Dict, Any, Optional, List, Callable
+
+from lib.jpeg_header import read_jpeg_header, sampling_signature
+from lib.exif import read_ifd0_tags
+from services.batch_runner import output_path_for
+from strategies.base import BaseStrategy
+
+JPEG_EXTENSIONS = {'.jpg', '.jpeg'}
+
+
+def header_signature(path: str) -> Optional[Dict[str, Any]]:
+    """
+    Hashes the encoder-relevant header structure of a JPEG: frame geometry,
+    sampling, quantization/Huffman tables, restart interval and camera
+    make/model. Only the bytes before the bitstream offset (the same offset
+    MarkerSanitizationStrategy._find_bitstream_offset finds) are read.
+
+    Per-shot data such as EXIF timestamps is deliberately left out, so every
+    file written by the same camera/encoder settings shares a signature.
+    Returns None when the header is too damaged to reach the SOS marker.
+    """
+    with open(path, 'rb') as f:
+        header = read_jpeg_header(f)
+    if not header or header['bitstream_offset'] == -1 or header['sof_marker'] is None:
+        return None
+
+    make = model = None
+    if header['exif']:
+        tags = read_ifd0_tags(header['exif'])
+        make, model = tags['make'], tags['model']
+
+    digest = hashlib.blake2b(digest_size=12)
+    digest.update(struct.pack('>BBHHH', header['sof_marker'], header['precision'],
+                              header['width'], header['height'], header['restart_interval']))
+    digest.update((sampling_signature(header) or '').encode())
+    for table in header['dqt'] + [b'|'] + header['dht']:
+        digest.update(table)
+    digest.update(f"|{make}|{model}".encode('utf-8', 'replace'))
+
+    return {
+        'signature': digest.hexdigest(),
+        'make': make,
+        'model': model,
+        'width': header['width'],
+        'height': header['height'],
+        'header_bytes': header['bitstream_offset']
+    }
+
+
+def cluster_files(paths: List[str]) -> Dict[str, Any]:
+    """Groups JPEGs by header signature, largest group first."""
+    groups: Dict[str, Dict[str, Any]] = {}
+    unclustered = []
+
+    for path in paths:
+        try:
+            sig = header_signature(path)
+        except OSError:
+            sig = None
+        if sig is None:
+            unclustered.append(path)
+            continue
+        group = groups.setdefault(sig['signature'], {
+            'signature': sig['signature'],
+            'make': sig['make'],
+            'model': sig['model'],
+            'width': sig['width'],
+            'height': sig['height'],
+            'files': []
+        })
+        group['files'].append(path)
+
+    clusters = sorted(groups.values(), key=lambda g: (-len(g['files']), g['signature']))
+    return {'clusters': clusters, 'unclustered': unclustered}
+
+
+def collect_jpegs(input_dir: str) -> List[str]:
+    paths = []
+    for dirpath, _dirnames, filenames in os.walk(input_dir):
+        for filename in filenames:
+            if os.path.splitext(filename)[1].lower() in JPEG_EXTENSIONS:
+                paths.append(os.path.join(dirpath, filename))
+    return sorted(paths)
+
+
+def index_reference_resolver(index) -> Callable[[Dict[str, Any]], Optional[str]]:
+    """Reference lookup for a cluster: rank once, using its first member as the target."""
+    def resolve(cluster: Dict[str, Any]) -> Optional[str]:
+        ranked = index.rank(cluster['files'][0], limit=1)
+        return ranked[0]['file_path'] if ranked else None
+    return resolve
+
+
+def repair_clusters(
+    clusters: List[Dict[str, Any]],
+    strategy: BaseStrategy,
+    output_dir: str,
+    output_ext: str,
+    reference_for: Optional[Callable[[Dict[str, Any]], Optional[str]]] = None,
+    input_dir: Optional[str] = None
+) -> List[Dict[str, Any]]:
+    """
+    Runs one strategy instance across every file of every cluster. The
+    reference is looked up once per cluster, and strategies that cache their
+    parsed reference (HeaderGraftingStrategy) only parse it once per cluster.
+
+    With input_dir, outputs mirror each input's place under it, so
+    same-named files from different subfolders do not overwrite each other.
+    """
+
+    results = []
+    for cluster in clusters:
+        reference_path = reference_for(cluster) if reference_for else None
+        if strategy.requires_reference and not reference_path:
+            for path in cluster['files']:
+                results.append({'input_path': path, 'success': False,
+                                'error': 'No compatible reference found for this header group.'})
+            continue
+
+        for path in cluster['files']:
+            output_path = output_path_for(path, input_dir or os.path.dirname(path), output_dir, output_ext)
+            os.makedirs(os.path.dirname(output_path), exist_ok=True)
+            try:
+                result = strategy.repair(input_path=path, output_path=output_path, reference_path=reference_path)
+            except Exception as e:
+                result = {'success': False, 'error': str(e)}
+            results.append({'input_path': path, 'reference_path': reference_path, **result})
+    return results
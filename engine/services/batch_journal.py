@@ -0,0 +1,102 @@
+import os
+import json
+import time
+import hashlib
+from typing import Dict, Any, Optional, Tuple
+
+# Read size when hashing inputs and outputs
+HASH_CHUNK = 1024 * 1024
+
+# HOPELESS: skipped by triage as not worth a repair attempt
+DONE, FAILED, HOPELESS = 'done', 'failed', 'hopeless'
+
+
+def file_digest(path: str, limit: Optional[int] = None) -> str:
+    """
+    BLAKE2b-128 of a file's content: identifies an input across renames and
+    restarts. With `limit`, only the file size and its first `limit` bytes
+    are hashed, which is all a head-only strategy's output depends on.
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    remaining = limit
+    with open(path, 'rb') as f:
+        if limit is not None:
+            digest.update(str(os.fstat(f.fileno()).st_size).encode() + b':')
+        while remaining is None or remaining > 0:
+            chunk = f.read(HASH_CHUNK if remaining is None else min(HASH_CHUNK, remaining))
+            if not chunk:
+                break
+            digest.update(chunk)
+            if remaining is not None:
+                remaining -= len(chunk)
+    return digest.hexdigest()
+
+
+def job_key(input_hash: str, strategy: str, reference_hash: Optional[str] = None) -> Tuple[str, str, Optional[str]]:
+    return (input_hash, strategy, reference_hash)
+
+
+class BatchJournal:
+    """
+    Append-only JSONL record of finished batch jobs, one line per job:
+    {input_path, input_hash, strategy, reference_hash, output_path,
+    output_size, output_hash, status, error, finished_at}. Each line is
+    flushed and synced before the next job starts, so a crash loses at most
+    the job in flight. The last record for a job wins; a torn final line from
+    a crash is ignored on load.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._latest: Dict[Tuple[str, str, Optional[str]], Dict[str, Any]] = {}
+        if os.path.exists(path):
+            with open(path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        continue
+                    if isinstance(entry, dict) and 'input_hash' in entry and 'strategy' in entry:
+                        self._latest[job_key(entry['input_hash'], entry['strategy'], entry.get('reference_hash'))] = entry
+        self._file = open(path, 'a', encoding='utf-8')
+
+    def __len__(self) -> int:
+        return len(self._latest)
+
+    def latest(self, key: Tuple[str, str, Optional[str]]) -> Optional[Dict[str, Any]]:
+        return self._latest.get(key)
+
+    def record(self, entry: Dict[str, Any]) -> Dict[str, Any]:
+        entry = {**entry, 'finished_at': time.time()}
+        self._file.write(json.dumps(entry) + '\n')
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._latest[job_key(entry['input_hash'], entry['strategy'], entry.get('reference_hash'))] = entry
+        return entry
+
+    def completed_output(self, key: Tuple[str, str, Optional[str]]) -> Optional[Dict[str, Any]]:
+        """
+        The journaled entry if the job is done and its output is still on
+        disk exactly as written (same size and hash); None means run it again.
+        """
+        entry = self._latest.get(key)
+        if not entry or entry['status'] != DONE:
+            return None
+        path = entry.get('output_path')
+        try:
+            if not path or os.path.getsize(path) != entry['output_size']:
+                return None
+            if file_digest(path) != entry['output_hash']:
+                return None
+        except OSError:
+            return None
+        return entry
+
+    def close(self) -> None:
+        self._file.close()
+
+    def __enter__(self) -> 'BatchJournal':
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
@@ -0,0 +1,304 @@
+import os
+from contextlib import nullcontext
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Any, Optional, List, Tuple
+
+from lib.budget import parse_budget, DEFAULT_JOB_TIMEOUT
+from lib.validation import validate_output, EXTENSION_FORMATS
+from services.batch_journal import BatchJournal, file_digest, job_key, DONE, FAILED, HOPELESS
+from services.pipeline import run_pipelined, read_input, DEFAULT_READ_AHEAD, DEFAULT_WRITE_BEHIND
+from services.scheduler import run_within_budget, default_memory_budget
+from services.telemetry import StageTimer, JobPeak, run_record, open_store
+from strategies.base import write_output_atomic, PARTIAL_SUFFIX
+from strategies.registry import get_extension, get_head_bytes, load_strategy, estimate_job_memory
+
+JOURNAL_NAME = '.repair-journal.jsonl'
+
+# Worker-process state, set once per worker by _init_worker
+_worker: Dict[str, Any] = {}
+
+
+def collect_inputs(input_dir: str, exclude_dir: Optional[str] = None) -> List[str]:
+    """Every non-hidden file under input_dir, skipping exclude_dir (the output tree)."""
+    exclude = os.path.abspath(exclude_dir) if exclude_dir else None
+    paths = []
+    for dirpath, dirnames, filenames in os.walk(input_dir):
+        dirnames[:] = [d for d in dirnames if not d.startswith('.') and os.path.abspath(os.path.join(dirpath, d)) != exclude]
+        for filename in filenames:
+            if not filename.startswith('.'):
+                paths.append(os.path.join(dirpath, filename))
+    return sorted(paths)
+
+
+def remove_partials(output_dir: str) -> List[str]:
+    """Deletes temporary files left by atomic writes that a crash interrupted."""
+    removed = []
+    for dirpath, _dirnames, filenames in os.walk(output_dir):
+        for filename in filenames:
+            if filename.startswith('.') and filename.endswith(PARTIAL_SUFFIX):
+                path = os.path.join(dirpath, filename)
+                os.remove(path)
+                removed.append(path)
+    return removed
+
+
+def output_path_for(input_path: str, input_dir: str, output_dir: str, extension: str) -> str:
+    """Mirrors the input's place under input_dir, so same-named files in subfolders do not collide."""
+    relative = os.path.relpath(input_path, input_dir)
+    name = os.path.splitext(relative)[0]
+    return os.path.join(output_dir, f"{name}_repaired{extension}")
+
+
+def triage(data, reference: Optional[bytes], fmt: Optional[str], triage_below: Optional[float]) -> Optional[Dict[str, Any]]:
+    """Failed outcome for an input whose sensor data scores below triage_below (TIFF/RAW only)."""
+    if triage_below is None or fmt != 'tiff':
+        return None
+    from services.tiff_integrity import scan_tiff
+    report = scan_tiff(data, reference)
+    if report['score'] >= triage_below:
+        return None
+    return {
+        'status': HOPELESS,
+        'error': f"Recoverability {report['score']} is below {triage_below}",
+        'triage': {k: report.get(k) for k in ('score', 'verdict', 'status_counts', 'damage')}
+    }
+
+
+def repair_data(strategy, data, reference: Optional[bytes], fmt: Optional[str],
+                triage_below: Optional[float] = None,
+                job_timeout: Optional[float] = DEFAULT_JOB_TIMEOUT,
+                input_path: Optional[str] = None) -> Tuple[Optional[Any], Dict[str, Any]]:
+    """
+    Processing stage of a job: (output, outcome); output is None when the
+    repair failed. Triage and repair run under one ParseBudget, so a garbage
+    input fails once it exceeds the parser limits or job_timeout seconds.
+
+    When `data` is only the head of input_path and the strategy reports that
+    it needs more of it (needs_bytes), the repair runs once more on a read
+    that long, as the strategy's own file-based repair would.
+    """
+    try:
+        with parse_budget(timeout=job_timeout):
+            hopeless = triage(data, reference, fmt, triage_below)
+            if hopeless:
+                return None, hopeless
+            output, result = strategy.repair_buffer(data, reference)
+            needed = result.get('needs_bytes') if output is None else None
+            if needed and input_path and needed > len(data):
+                output, result = strategy.repair_buffer(read_input(input_path, needed), reference)
+    except Exception as e:
+        output, result = None, {'success': False, 'error': str(e)}
+    if output is None:
+        return None, {'status': FAILED, 'error': result.get('error') or 'Strategy produced no output'}
+    return output, {'status': DONE, 'validation': validate_output(output, fmt) if fmt else None}
+
+
+def write_job(output, outcome: Dict[str, Any], output_path: str) -> Dict[str, Any]:
+    """Write stage of a job: stores the output atomically and fingerprints it for the journal."""
+    if output is None:
+        return outcome
+    os.makedirs(os.path.dirname(output_path), exist_ok=True)
+    write_output_atomic(output, output_path)
+    return {
+        'status': DONE,
+        'output_path': output_path,
+        'output_size': os.path.getsize(output_path),
+        'output_hash': file_digest(output_path),
+        'validation': outcome['validation']
+    }
+
+
+def run_job(strategy, input_path: str, output_path: str, reference: Optional[bytes], fmt: Optional[str],
+            triage_below: Optional[float] = None, head_bytes: Optional[int] = None,
+            job_timeout: Optional[float] = DEFAULT_JOB_TIMEOUT) -> Dict[str, Any]:
+    """Repairs one file through the buffer API and writes the output atomically."""
+    timer = StageTimer()
+    memory = JobPeak()
+    with timer.stage('read'):
+        data = read_input(input_path, head_bytes)
+    with timer.stage('repair'):
+        output, outcome = repair_data(strategy, data, reference, fmt, triage_below, job_timeout, input_path)
+    with timer.stage('write'):
+        outcome = write_job(output, outcome, output_path)
+    # Measured here: in a pool this is the worker's own time and memory
+    return {**outcome, 'telemetry': {'stages': timer.stages, 'bytes_read': len(data), 'peak_rss_delta': memory.delta()}}
+
+
+def _init_worker(strategy_name: str, reference_path: Optional[str], fmt: Optional[str], triage_below: Optional[float],
+                 job_timeout: Optional[float]) -> None:
+    _worker['strategy'] = load_strategy(strategy_name)
+    _worker['head_bytes'] = get_head_bytes(strategy_name)
+    _worker['reference'] = None
+    if reference_path:
+        with open(reference_path, 'rb') as f:
+            _worker['reference'] = f.read()
+    _worker['format'] = fmt
+    _worker['triage_below'] = triage_below
+    _worker['job_timeout'] = job_timeout
+
+
+def _run_pooled(job: Dict[str, Any]) -> Dict[str, Any]:
+    return run_job(_worker['strategy'], job['input_path'], job['output_path'], _worker['reference'],
+                   _worker['format'], _worker['triage_below'], _worker['head_bytes'], _worker['job_timeout'])
+
+
+def run_batch(
+    input_dir: str,
+    strategy_name: str,
+    output_dir: str,
+    journal_path: Optional[str] = None,
+    reference_path: Optional[str] = None,
+    workers: int = 1,
+    memory_budget: Optional[int] = None,
+    read_ahead: int = DEFAULT_READ_AHEAD,
+    write_behind: int = DEFAULT_WRITE_BEHIND,
+    triage_below: Optional[float] = None,
+    job_timeout: Optional[float] = DEFAULT_JOB_TIMEOUT,
+    telemetry_path: Optional[str] = None
+) -> Dict[str, Any]:
+    """
+    Runs one strategy over every file under input_dir and journals each job
+    as it finishes. Restarting with the same journal skips jobs already done
+    whose output is still intact (size and hash match), reruns everything
+    else, and removes temporary files left by an interrupted write. Outputs
+    are written to a temporary file and renamed, so an output path never
+    holds a half-written file.
+
+    With workers > 1 jobs run in a process pool, admitted by the memory
+    scheduler: each job's peak is estimated from its file size and the
+    strategy's memory factor, and running jobs stay within memory_budget
+    (default: half of physical memory). A single worker runs the jobs as a
+    pipeline instead: the next `read_ahead` inputs are read while the current
+    one is repaired, and up to `write_behind` outputs are written behind it.
+
+    With triage_below, TIFF/RAW inputs whose sensor data scores below it in
+    the integrity scan (strip/tile table from the reference when one is
+    given) are journaled as hopeless instead of repaired.
+
+    Strategies registered with head_bytes only get (and are keyed in the
+    journal by) that much of each input, so the rest is only read when the
+    strategy reports that what it needs lies further in.
+
+    Every job runs under a parse budget (bytes scanned, entries read,
+    allocation sizes) and fails after job_timeout seconds, so one hostile
+    or garbage file cannot stall a worker. The deadline is cooperative: it
+    is only checked where the parsers charge the budget, so a job overruns
+    by at most the work between two such checks, and code that charges
+    nothing (e.g. a strategy that never consults the budget) is not bounded.
+
+    With a telemetry store (telemetry_path, or $PHOTO_REPAIR_TELEMETRY),
+    every job appends its stage times, bytes and peak memory above its
+    starting RSS to it (the repair stage only when jobs are pipelined).
+    """
+    if not os.path.isdir(input_dir):
+        raise FileNotFoundError(f"Input directory not found: {input_dir}")
+    extension = get_extension(strategy_name)
+    strategy = load_strategy(strategy_name)
+    head_bytes = get_head_bytes(strategy_name)
+    if strategy.requires_reference and not reference_path:
+        return {"success": False, "error": f"Strategy {strategy_name} requires a reference file"}
+
+    reference = None
+    reference_hash = None
+    if reference_path:
+        with open(reference_path, 'rb') as f:
+            reference = f.read()
+        reference_hash = file_digest(reference_path)
+
+    os.makedirs(output_dir, exist_ok=True)
+    removed = remove_partials(output_dir)
+    fmt = EXTENSION_FORMATS.get(extension)
+
+    results = []
+    counts = {'done': 0, 'skipped': 0, 'failed': 0, 'hopeless': 0}
+    scheduling = None
+    with BatchJournal(journal_path or os.path.join(output_dir, JOURNAL_NAME)) as journal, \
+            (open_store(telemetry_path) or nullcontext()) as telemetry:
+        jobs = []
+        for input_path in collect_inputs(input_dir, exclude_dir=output_dir):
+            try:
+                input_hash = file_digest(input_path, head_bytes)
+                input_size = os.path.getsize(input_path)
+            except OSError as e:
+                # Vanished or unreadable since the listing: fail this job, not the batch
+                outcome = {'status': FAILED, 'error': str(e)}
+                journal.record({'input_path': input_path, 'input_hash': None, 'strategy': strategy_name,
+                                'reference_hash': reference_hash, **outcome})
+                counts['failed'] += 1
+                results.append({'input_path': input_path, **outcome})
+                continue
+            previous = journal.completed_output(job_key(input_hash, strategy_name, reference_hash))
+            if previous:
+                counts['skipped'] += 1
+                results.append({'input_path': input_path, 'status': 'skipped', 'output_path': previous['output_path']})
+                continue
+            jobs.append({
+                'input_path': input_path,
+                'input_hash': input_hash,
+                'input_size': input_size,
+                'output_path': output_path_for(input_path, input_dir, output_dir, extension)
+            })
+
+        def finish(job: Dict[str, Any], outcome: Optional[Dict[str, Any]], error: Optional[BaseException]) -> None:
+            if error is not None:
+                outcome = {'status': FAILED, 'error': str(error)}
+            metrics = outcome.pop('telemetry', None) or {
+                'stages': job['timer'].stages if 'timer' in job else {},
+                'peak_rss_delta': job.get('peak_rss_delta')
+            }
+            if telemetry is not None:
+                telemetry.append(run_record(
+                    'batch', strategy_name, fmt, job['input_size'], outcome['status'], metrics['stages'],
+                    bytes_read=metrics.get('bytes_read', min(job['input_size'], head_bytes or job['input_size'])),
+                    bytes_written=outcome.get('output_size'),
+                    peak_delta=metrics.get('peak_rss_delta')
+                ))
+            journal.record({
+                'input_path': job['input_path'],
+                'input_hash': job['input_hash'],
+                'strategy': strategy_name,
+                'reference_hash': reference_hash,
+                **outcome
+            })
+            counts[outcome['status']] += 1
+            results.append({'input_path': job['input_path'], **outcome})
+
+        workers = min(max(1, workers), len(jobs))
+        if workers > 1:
+            reference_size = len(reference) if reference is not None else 0
+            costs = [estimate_job_memory(strategy_name, job['input_size'], reference_size) for job in jobs]
+            with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                     initargs=(strategy_name, reference_path, fmt, triage_below, job_timeout)) as pool:
+                scheduling = run_within_budget(pool, _run_pooled, jobs, costs,
+                                               memory_budget or default_memory_budget(), workers, finish)
+        else:
+            def timed(job: Dict[str, Any], stage: str, fn, *args):
+                with job.setdefault('timer', StageTimer()).stage(stage):
+                    return fn(*args)
+
+            def repair(job: Dict[str, Any], data):
+                # Reads and writes of neighbouring jobs overlap this one, so
+                # only the repair stage (which runs alone) is measured
+                memory = JobPeak()
+                processed = timed(job, 'repair', repair_data, strategy, data, reference, fmt, triage_below, job_timeout,
+                                  job['input_path'])
+                job['peak_rss_delta'] = memory.delta()
+                return processed
+
+            run_pipelined(
+                jobs,
+                read=lambda job: timed(job, 'read', read_input, job['input_path'], head_bytes),
+                process=repair,
+                write=lambda job, processed: timed(job, 'write', write_job, *processed, job['output_path']),
+                on_result=finish,
+                read_ahead=read_ahead,
+                write_behind=write_behind
+            )
+
+    return {
+        "success": counts['failed'] == 0,
+        **counts,
+        "partials_removed": removed,
+        "scheduling": scheduling,
+        "results": results
+    }
@@ -0,0 +1,190 @@
+import os
+import json
+import mmap
+from typing import Dict, Any, Optional, List, Tuple
+
+try:
+    import numpy as np
+except ImportError:  # Optional: uniform-block detection falls back to memcmp per block
+    np = None
+
+# Granularity of uniform-fill detection. Blank regions on cards are erased
+# erase-blocks/clusters, far larger than this.
+DEFAULT_BLOCK_SIZE = 64 * 1024
+# Blocks compared per NumPy batch (bounds the temporary boolean array)
+NUMPY_BATCH_BLOCKS = 256
+
+FILL_HOLE = 'hole'
+FILLS = (0x00, 0xFF)
+
+SIDECAR_SUFFIX = '.blankmap.json'
+
+
+def _data_extents(fd: int, size: int) -> List[Tuple[int, int]]:
+    """Allocated extents of a sparse file via SEEK_DATA/SEEK_HOLE, or the whole file if unsupported."""
+    if not hasattr(os, 'SEEK_DATA'):
+        return [(0, size)]
+    extents = []
+    pos = 0
+    try:
+        while pos < size:
+            try:
+                data = os.lseek(fd, pos, os.SEEK_DATA)
+            except OSError:
+                # ENXIO: no data after pos
+                break
+            hole = os.lseek(fd, data, os.SEEK_HOLE)
+            extents.append((data, min(hole, size)))
+            pos = hole
+    except OSError:
+        return [(0, size)]
+    return extents
+
+
+def _uniform_blocks_numpy(view, start: int, end: int, block_size: int) -> List[Tuple[int, int, int]]:
+    found = []
+    first_block = -(-start // block_size)
+    last_block = end // block_size
+    for batch in range(first_block, last_block, NUMPY_BATCH_BLOCKS):
+        count = min(NUMPY_BATCH_BLOCKS, last_block - batch)
+        blocks = np.frombuffer(view, dtype=np.uint8, count=count * block_size, offset=batch * block_size)
+        blocks = blocks.reshape(count, block_size)
+        firsts = blocks[:, 0]
+        uniform = (blocks == firsts[:, None]).all(axis=1) & ((firsts == 0x00) | (firsts == 0xFF))
+        for i in np.flatnonzero(uniform):
+            offset = (batch + int(i)) * block_size
+            found.append((offset, offset + block_size, int(firsts[i])))
+    return found
+
+
+def _uniform_blocks_bytes(view, start: int, end: int, block_size: int) -> List[Tuple[int, int, int]]:
+    patterns = {fill: bytes([fill]) * block_size for fill in FILLS}
+    found = []
+    offset = -(-start // block_size) * block_size
+    while offset + block_size <= end:
+        first = view[offset]
+        if first in patterns and view[offset:offset + block_size] == patterns[first]:
+            found.append((offset, offset + block_size, first))
+        offset += block_size
+    return found
+
+
+def _merge(ranges: List[Tuple[int, int, Any]]) -> List[List[Any]]:
+    merged: List[List[Any]] = []
+    for start, end, fill in sorted(ranges, key=lambda r: r[0]):
+        if merged and merged[-1][1] == start and merged[-1][2] == fill:
+            merged[-1][1] = end
+        else:
+            merged.append([start, end, fill])
+    return merged
+
+
+def sidecar_path(image_path: str, output_dir: str) -> str:
+    """Where a pass writing to output_dir keeps the image's blank map: never next to the evidence."""
+    return os.path.join(output_dir, os.path.basename(image_path) + SIDECAR_SUFFIX)
+
+
+def sparse_layout(image_path: str) -> Tuple[List[Tuple[int, int]], List[Tuple[int, int, Any]]]:
+    """(data extents, holes) of the image, from the filesystem alone: nothing is read."""
+    size = os.path.getsize(image_path)
+    with open(image_path, 'rb') as f:
+        extents = _data_extents(f.fileno(), size)
+    holes: List[Tuple[int, int, Any]] = []
+    pos = 0
+    for start, end in extents:
+        if start > pos:
+            holes.append((pos, start, FILL_HOLE))
+        pos = end
+    if pos < size:
+        holes.append((pos, size, FILL_HOLE))
+    return extents, holes
+
+
+def find_uniform_blocks(view, start: int, end: int, block_size: int = DEFAULT_BLOCK_SIZE) -> List[Tuple[int, int, int]]:
+    """Block-aligned blocks inside [start, end) filled entirely with 0x00 or 0xFF, as (start, end, fill)."""
+    finder = _uniform_blocks_numpy if np is not None else _uniform_blocks_bytes
+    return finder(view, start, end, block_size)
+
+
+def assemble_blank_map(image_path: str, block_size: int, blank: List[Tuple[int, int, Any]]) -> Dict[str, Any]:
+    """A blank map of the image as it is now, from holes and uniform blocks found separately."""
+    st = os.stat(image_path)
+    return {
+        'size': st.st_size,
+        'mtime_ns': st.st_mtime_ns,
+        'block_size': block_size,
+        'blank': _merge(blank)
+    }
+
+
+def build_blank_map(image_path: str, block_size: int = DEFAULT_BLOCK_SIZE) -> Dict[str, Any]:
+    """
+    Maps the blank regions of an image: holes of a sparse file (found without
+    reading them) plus block-aligned runs of 0x00 or 0xFF fill. Each entry is
+    [start, end, fill] with fill 0, 255 or 'hole'.
+    """
+    extents, blank = sparse_layout(image_path)
+    if os.path.getsize(image_path):
+        with open(image_path, 'rb') as f:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as view:
+                for start, end in extents:
+                    blank += find_uniform_blocks(view, start, end, block_size)
+    return assemble_blank_map(image_path, block_size, blank)
+
+
+def read_blank_map(image_path: str, block_size: int, map_path: str) -> Optional[Dict[str, Any]]:
+    """The map saved at map_path if it still describes the image, else None."""
+    st = os.stat(image_path)
+    try:
+        with open(map_path, 'r') as f:
+            saved = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if (saved.get('size'), saved.get('mtime_ns'), saved.get('block_size')) != (st.st_size, st.st_mtime_ns, block_size):
+        return None
+    saved['reused'] = True
+    return saved
+
+
+def save_blank_map(blank_map: Dict[str, Any], map_path: str) -> None:
+    try:
+        with open(map_path, 'w') as f:
+            json.dump({key: value for key, value in blank_map.items() if key != 'reused'}, f)
+    except OSError:
+        # Unwritable destination: the map is still usable for this pass
+        pass
+
+
+def load_blank_map(image_path: str, block_size: int = DEFAULT_BLOCK_SIZE, map_path: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Returns the blank map for an image, reusing the one saved at map_path
+    when the image is unchanged. With a map_path, a freshly built map is
+    saved there so later passes skip blank regions without reading them.
+    """
+    if map_path:
+        saved = read_blank_map(image_path, block_size, map_path)
+        if saved is not None:
+            return saved
+
+    blank_map = build_blank_map(image_path, block_size)
+    if map_path:
+        save_blank_map(blank_map, map_path)
+    blank_map['reused'] = False
+    return blank_map
+
+
+def data_ranges(blank_map: Dict[str, Any]) -> List[Tuple[int, int]]:
+    """The complement of the blank regions: byte ranges that still need scanning."""
+    ranges = []
+    pos = 0
+    for start, end, _fill in blank_map['blank']:
+        if start > pos:
+            ranges.append((pos, start))
+        pos = max(pos, end)
+    if pos < blank_map['size']:
+        ranges.append((pos, blank_map['size']))
+    return ranges
+
+
+def blank_bytes(blank_map: Dict[str, Any]) -> int:
+    return sum(end - start for start, end, _fill in blank_map['blank'])
@@ -0,0 +1,303 @@
+import os
+import mmap
+import struct
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Any, Optional, List, Tuple
+
+from services.blank_map import (
+    DEFAULT_BLOCK_SIZE, assemble_blank_map, blank_bytes, data_ranges, find_uniform_blocks,
+    read_blank_map, save_blank_map, sidecar_path, sparse_layout
+)
+
+try:
+    import numpy as np
+except ImportError:  # Optional: aligned scans fall back to strided byte slices
+    np = None
+
+# SOI followed by the first byte of the next marker; a bare FF D8 is far too
+# common inside entropy-coded data to be worth following.
+SOI = b'\xff\xd8\xff'
+EOI = b'\xff\xd9'
+
+# Bytes of the image each worker owns
+DEFAULT_RANGE_SIZE = 64 * 1024 * 1024
+# How far past its range a worker may look for an EOI before it hands the
+# candidate off to reconciliation
+DEFAULT_OVERLAP = 8 * 1024 * 1024
+# Reconciliation gives up on an SOI with no EOI this far away
+MAX_FILE_SIZE = 64 * 1024 * 1024
+# Same floor as PreviewExtractionStrategy: skip thumbnails and noise
+MIN_FILE_SIZE = 10 * 1024
+
+# Headers checked at sector/cluster starts in aligned mode: (offset in sector, bytes)
+ALIGNED_SIGNATURES = {
+    'jpeg': [(0, SOI)],
+    'png': [(0, b'\x89PNG\r\n\x1a\n')],
+    'heic': [(4, b'ftyp')],
+    'tiff': [(0, b'II*\x00'), (0, b'MM\x00*')],
+}
+SIGNATURE_SPAN = 12
+
+PNG_IEND = b'IEND\xaeB`\x82'
+
+EXTENSIONS = {'jpeg': '.jpg', 'png': '.png', 'heic': '.heic', 'tiff': '.tif'}
+
+
+def _aligned_headers_numpy(view, start: int, end: int, sector_size: int) -> List[Tuple[int, str]]:
+    count = (end - start) // sector_size
+    if count == 0:
+        return []
+    sectors = np.frombuffer(view, dtype=np.uint8, count=count * sector_size, offset=start)
+    # Strided view of just the first bytes of every sector: no copy, one comparison per signature
+    heads = sectors.reshape(count, sector_size)[:, :SIGNATURE_SPAN]
+    found = []
+    for fmt, signatures in ALIGNED_SIGNATURES.items():
+        for sig_offset, sig in signatures:
+            expected = np.frombuffer(sig, dtype=np.uint8)
+            mask = (heads[:, sig_offset:sig_offset + len(sig)] == expected).all(axis=1)
+            found += [(start + int(i) * sector_size, fmt) for i in np.flatnonzero(mask)]
+    return found
+
+
+def _aligned_headers_bytes(view, start: int, end: int, sector_size: int) -> List[Tuple[int, str]]:
+    count = (end - start) // sector_size
+    found = []
+    for fmt, signatures in ALIGNED_SIGNATURES.items():
+        for sig_offset, sig in signatures:
+            # The byte at sig_offset of every sector, gathered by a strided slice
+            column = bytes(memoryview(view)[start + sig_offset: start + count * sector_size: sector_size])
+            i = column.find(sig[:1])
+            while i != -1:
+                pos = start + i * sector_size
+                if view[pos + sig_offset: pos + sig_offset + len(sig)] == sig:
+                    found.append((pos, fmt))
+                i = column.find(sig[:1], i + 1)
+    return found
+
+
+def find_aligned_headers(view, start: int, end: int, sector_size: int) -> List[Tuple[int, str]]:
+    """
+    Tests only the sector-aligned offsets in [start, end) for JPEG, PNG,
+    ISOBMFF (ftyp) and TIFF headers. `start` must be aligned. A trailing
+    partial sector is ignored; headers never start there on a real card.
+    """
+    if sector_size < SIGNATURE_SPAN:
+        raise ValueError(f"Sector size must be at least {SIGNATURE_SPAN} bytes")
+    end = start + min(end - start, (len(view) - start) // sector_size * sector_size)
+    finder = _aligned_headers_numpy if np is not None else _aligned_headers_bytes
+    return sorted(finder(view, start, end, sector_size))
+
+
+def _isobmff_end(view, offset: int) -> int:
+    """Walks top-level boxes from an ftyp; the file ends where the box chain stops making sense."""
+    pos = offset
+    while pos + 8 <= len(view):
+        size, box_type = struct.unpack('>I4s', view[pos:pos + 8])
+        if not box_type.isalnum() and box_type != b'    ':
+            break
+        if size == 1 and pos + 16 <= len(view):
+            size = struct.unpack('>Q', view[pos + 8:pos + 16])[0]
+        if size < 8 or pos + size > len(view):
+            break
+        pos += size
+    return pos if pos > offset else -1
+
+
+def _find_end(view, offset: int, fmt: str, window_end: int) -> int:
+    """
+    End offset of a carved file, -1 if not found before window_end or within
+    MAX_FILE_SIZE of the header: workers and reconciliation apply the same
+    limit, so the range split cannot change the result. TIFF is resolved in
+    reconciliation.
+    """
+    window_end = min(window_end, offset + MAX_FILE_SIZE)
+    if fmt == 'jpeg':
+        e = view.find(EOI, offset + 2, window_end)
+        return e + 2 if e != -1 else -1
+    if fmt == 'png':
+        e = view.find(PNG_IEND, offset + 8, window_end)
+        return e + len(PNG_IEND) if e != -1 else -1
+    if fmt == 'heic':
+        return _isobmff_end(view, offset)
+    return -1
+
+
+def _scan_range(image_path: str, start: int, end: int, window_end: int, sector_size: int = 0,
+                block_size: int = 0) -> Tuple[List[Tuple[int, str, int]], List[Tuple[int, int, int]]]:
+    """
+    Worker: returns (offset, format, end_offset) for every header that starts
+    in [start, end). end_offset is just past the end marker if it lies before
+    window_end, or -1 when the file runs past the window and must be reconciled.
+    Without a sector size every byte offset is tested, for JPEG SOIs only.
+
+    With a block_size the range's whole 0x00/0xFF blocks are found first and
+    not searched; they are returned alongside for the image's blank map.
+    """
+    candidates = []
+    with open(image_path, 'rb') as f:
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as view:
+            blank = find_uniform_blocks(view, start, end, block_size) if block_size else []
+            spans = []
+            pos = start
+            for blank_start, blank_end, _fill in blank:
+                if blank_start > pos:
+                    spans.append((pos, blank_start))
+                pos = blank_end
+            if pos < end:
+                spans.append((pos, end))
+
+            if sector_size:
+                for span_start, span_end in _align_spans(spans, sector_size, len(view)):
+                    for offset, fmt in find_aligned_headers(view, span_start, span_end, sector_size):
+                        candidates.append((offset, fmt, _find_end(view, offset, fmt, window_end)))
+                return candidates, blank
+
+            for span_start, span_end in spans:
+                soi_bound = min(span_end + len(SOI) - 1, len(view))
+                i = view.find(SOI, span_start, soi_bound)
+                while i != -1:
+                    candidates.append((i, 'jpeg', _find_end(view, i, 'jpeg', window_end)))
+                    i = view.find(SOI, i + 1, soi_bound)
+    return candidates, blank
+
+
+def _align_spans(spans: List[Tuple[int, int]], sector_size: int, size: int) -> List[Tuple[int, int]]:
+    """Widens spans to whole sectors and merges any that then touch."""
+    aligned: List[Tuple[int, int]] = []
+    for start, end in spans:
+        start -= start % sector_size
+        end = min(-(-end // sector_size) * sector_size, size)
+        if aligned and start <= aligned[-1][1]:
+            aligned[-1] = (aligned[-1][0], max(aligned[-1][1], end))
+        else:
+            aligned.append((start, end))
+    return aligned
+
+
+def _plan_ranges(size: int, range_size: int, overlap: int, spans: Optional[List[Tuple[int, int]]] = None) -> List[Tuple[int, int, int]]:
+    """Chops the spans that need scanning (default: the whole image) into worker ranges."""
+    planned = []
+    for span_start, span_end in spans if spans is not None else [(0, size)]:
+        for start in range(span_start, span_end, range_size):
+            end = min(start + range_size, span_end)
+            planned.append((start, end, min(end + overlap, size)))
+    return planned
+
+
+def _reconcile(view, candidates: List[Tuple[int, str, int]], min_size: int) -> List[Dict[str, Any]]:
+    """
+    Single serial pass over all candidates in offset order. Resolves handed-off
+    candidates with an unbounded (MAX_FILE_SIZE) end search, then applies the
+    same rule as a serial scan: a header inside an already carved file is skipped.
+    TIFF has no end marker, so a TIFF runs up to the next header.
+    """
+    files = []
+    cursor = 0
+    for index, (offset, fmt, end) in enumerate(candidates):
+        if offset < cursor:
+            continue
+        limit = min(offset + MAX_FILE_SIZE, len(view))
+        if fmt == 'tiff':
+            end = candidates[index + 1][0] if index + 1 < len(candidates) else len(view)
+            end = min(end, limit)
+        elif end == -1:
+            end = _find_end(view, offset, fmt, limit)
+            if end == -1:
+                continue
+        cursor = end
+        if end - offset > min_size:
+            files.append({'offset': offset, 'length': end - offset, 'format': fmt})
+    return files
+
+
+def carve_image(
+    image_path: str,
+    output_dir: Optional[str] = None,
+    workers: Optional[int] = None,
+    range_size: int = DEFAULT_RANGE_SIZE,
+    overlap: int = DEFAULT_OVERLAP,
+    min_size: int = MIN_FILE_SIZE,
+    sector_size: int = 0,
+    skip_blank: bool = True,
+    blank_map_path: Optional[str] = None,
+    blank_block_size: int = DEFAULT_BLOCK_SIZE
+) -> Dict[str, Any]:
+    """
+    Carves files out of a disk image. The image is split into ranges that are
+    scanned by a process pool over read-only mmaps; files crossing a range
+    boundary are resolved in one reconciliation step. The result does not
+    depend on the number of workers or the range size.
+
+    With a sector_size (the card's sector or cluster size) only aligned
+    offsets are tested, for JPEG, PNG, HEIC/ftyp and TIFF headers. Files on
+    FAT32/exFAT start on cluster boundaries, so this drops the false SOIs
+    inside bitstreams and thumbnails and scans far fewer offsets.
+
+    With skip_blank, holes and 0x00/0xFF-filled blocks are never searched for
+    headers. Holes come from the filesystem; filled blocks are found by each
+    worker in its own range, so there is no serial pre-pass. The resulting
+    map is saved to blank_map_path (default: the output directory, never
+    next to the image) and reused by later passes.
+    """
+    if not os.path.exists(image_path):
+        raise FileNotFoundError(f"Image not found: {image_path}")
+    if output_dir:
+        os.makedirs(output_dir, exist_ok=True)
+
+    size = os.path.getsize(image_path)
+    if size == 0:
+        return {'files': [], 'ranges': 0, 'bytes_scanned': 0, 'blank_bytes_skipped': 0, 'blank_map_reused': False}
+
+    blank_map = None
+    spans = None
+    holes: List[Tuple[int, int, Any]] = []
+    block_size = 0
+    map_path = blank_map_path or (sidecar_path(image_path, output_dir) if output_dir else None)
+    if skip_blank:
+        blank_map = read_blank_map(image_path, blank_block_size, map_path) if map_path else None
+        if blank_map is not None:
+            spans = data_ranges(blank_map)
+        else:
+            spans, holes = sparse_layout(image_path)
+            block_size = blank_block_size
+
+    if sector_size:
+        # Keep every range aligned so each sector is tested by exactly one worker
+        range_size = max(sector_size, range_size // sector_size * sector_size)
+        if spans is not None:
+            spans = _align_spans(spans, sector_size, size)
+    ranges = [r + (sector_size, block_size) for r in _plan_ranges(size, range_size, overlap, spans)]
+    workers = min(workers or os.cpu_count() or 1, len(ranges))
+
+    if workers > 1:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            per_range = list(pool.map(_scan_range, [image_path] * len(ranges), *zip(*ranges)))
+    else:
+        per_range = [_scan_range(image_path, *r) for r in ranges]
+
+    candidates = [c for found, _blank in per_range for c in found]
+    found_blank = [b for _found, blank in per_range for b in blank]
+    bytes_scanned = sum(end - start for start, end, _window, _sector, _block in ranges)
+    bytes_scanned -= sum(end - start for start, end, _fill in found_blank)
+    if skip_blank and blank_map is None:
+        blank_map = assemble_blank_map(image_path, blank_block_size, holes + found_blank)
+        if map_path:
+            save_blank_map(blank_map, map_path)
+        blank_map['reused'] = False
+
+    with open(image_path, 'rb') as f:
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as view:
+            files = _reconcile(view, candidates, min_size)
+            if output_dir:
+                for item in files:
+                    item['output_path'] = os.path.join(output_dir, f"carved_{item['offset']:012x}{EXTENSIONS[item['format']]}")
+                    with open(item['output_path'], 'wb') as out_f:
+                        out_f.write(view[item['offset']:item['offset'] + item['length']])
+
+    return {
+        'files': files,
+        'ranges': len(ranges),
+        'bytes_scanned': bytes_scanned,
+        'blank_bytes_skipped': blank_bytes(blank_map) if blank_map else 0,
+        'blank_map_reused': blank_map['reused'] if blank_map else False
+    }
@@ -0,0 +1,290 @@
+import os
+import math
+import shutil
+import statistics
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Any, Optional, List, Tuple
+
+try:
+    import numpy as np
+except ImportError:  # Optional: hashes fall back to a per-image pure-Python path
+    np = None
+
+try:
+    from PIL import Image
+except ImportError:  # Needed to decode outputs; everything else works without it
+    Image = None
+
+from services.batch_runner import collect_inputs
+
+DHASH_SIZE = 8
+PHASH_SIZE = 32
+PHASH_LOW = 8
+# Largest Hamming distances (of 64 bits) at which two images count as the same picture
+DEFAULT_DHASH_DISTANCE = 10
+DEFAULT_PHASH_DISTANCE = 12
+# Paths decoded per worker task
+PATHS_PER_TASK = 32
+
+IMAGE_EXTENSIONS = {'.jpg', '.jpeg', '.png', '.tif', '.tiff', '.heic', '.heif'}
+
+# Orthonormal DCT-II basis rows needed for the low-frequency block
+_DCT = [
+    [math.sqrt((1 if k == 0 else 2) / PHASH_SIZE) * math.cos(math.pi * (2 * n + 1) * k / (2 * PHASH_SIZE)) for n in range(PHASH_SIZE)]
+    for k in range(PHASH_LOW)
+]
+
+
+def hamming(a: int, b: int) -> int:
+    return bin(a ^ b).count('1')
+
+
+def load_thumbnails(path: str) -> Optional[Dict[str, Any]]:
+    """
+    Greyscale PHASH_SIZE^2 and (DHASH_SIZE+1)xDHASH_SIZE thumbnails of an image.
+    JPEGs are draft-decoded at 1/2-1/8 scale, so the full image is never
+    decoded. None if the file does not decode.
+    """
+    if Image is None:
+        raise RuntimeError("Pillow is required to fingerprint images")
+    try:
+        with Image.open(path) as image:
+            width, height = image.size
+            image.draft('L', (PHASH_SIZE * 4, PHASH_SIZE * 4))
+            grey = image.convert('L')
+            return {
+                'path': path,
+                'width': width,
+                'height': height,
+                'phash_pixels': grey.resize((PHASH_SIZE, PHASH_SIZE), Image.BILINEAR).tobytes(),
+                'dhash_pixels': grey.resize((DHASH_SIZE + 1, DHASH_SIZE), Image.BILINEAR).tobytes()
+            }
+    except Exception:
+        return None
+
+
+def _load_task(paths: List[str]) -> List[Optional[Dict[str, Any]]]:
+    return [load_thumbnails(path) for path in paths]
+
+
+def _bits_to_int(bits) -> int:
+    value = 0
+    for bit in bits:
+        value = (value << 1) | int(bit)
+    return value
+
+
+def dhash_python(pixels: bytes) -> int:
+    """Difference hash: each pixel brighter than its right neighbour, row by row."""
+    width = DHASH_SIZE + 1
+    return _bits_to_int(
+        pixels[row * width + col] > pixels[row * width + col + 1]
+        for row in range(DHASH_SIZE) for col in range(DHASH_SIZE)
+    )
+
+
+def phash_python(pixels: bytes) -> int:
+    """Perceptual hash: low-frequency DCT coefficients above their median (DC excluded from the median)."""
+    rows = [pixels[y * PHASH_SIZE:(y + 1) * PHASH_SIZE] for y in range(PHASH_SIZE)]
+    partial = [[sum(d * p for d, p in zip(basis, row)) for basis in _DCT] for row in rows]
+    low = [sum(_DCT[u][y] * partial[y][v] for y in range(PHASH_SIZE)) for u in range(PHASH_LOW) for v in range(PHASH_LOW)]
+    median = statistics.median(low[1:])
+    return _bits_to_int(c > median for c in low)
+
+
+def _pack_rows(bits) -> List[int]:
+    return [int(v) for v in np.packbits(bits, axis=1).view('>u8').ravel()]
+
+
+def dhash_many(pixels: List[bytes]) -> List[int]:
+    """dhash_python over many thumbnails in one vectorized pass."""
+    if np is None or not pixels:
+        return [dhash_python(p) for p in pixels]
+    grid = np.frombuffer(b''.join(pixels), dtype=np.uint8).reshape(len(pixels), DHASH_SIZE, DHASH_SIZE + 1)
+    return _pack_rows((grid[:, :, :-1] > grid[:, :, 1:]).reshape(len(pixels), -1))
+
+
+def phash_many(pixels: List[bytes]) -> List[int]:
+    """phash_python over many thumbnails: one batched DCT (matrix products) for all of them."""
+    if np is None or not pixels:
+        return [phash_python(p) for p in pixels]
+    grid = np.frombuffer(b''.join(pixels), dtype=np.uint8).reshape(len(pixels), PHASH_SIZE, PHASH_SIZE).astype(np.float64)
+    dct = np.array(_DCT)
+    low = (dct @ grid @ dct.T).reshape(len(pixels), -1)
+    median = np.median(low[:, 1:], axis=1)
+    return _pack_rows(low > median[:, None])
+
+
+class BKTree:
+    """
+    Burkhard-Keller tree over 64-bit hashes under Hamming distance. A radius
+    search only descends into children whose edge distance lies within
+    radius of the query's distance to their parent, so lookups touch a small
+    part of the tree instead of every hash.
+    """
+
+    def __init__(self):
+        self.root: Optional[List[Any]] = None  # [hash, items, {distance: child}]
+        self.size = 0
+
+    def add(self, value: int, item: Any) -> None:
+        self.size += 1
+        if self.root is None:
+            self.root = [value, [item], {}]
+            return
+        node = self.root
+        while True:
+            distance = hamming(value, node[0])
+            if distance == 0:
+                node[1].append(item)
+                return
+            child = node[2].get(distance)
+            if child is None:
+                node[2][distance] = [value, [item], {}]
+                return
+            node = child
+
+    def search(self, value: int, radius: int) -> List[Tuple[int, Any]]:
+        """(distance, item) for every item whose hash is within radius of value."""
+        found = []
+        stack = [self.root] if self.root is not None else []
+        while stack:
+            node = stack.pop()
+            distance = hamming(value, node[0])
+            if distance <= radius:
+                found += [(distance, item) for item in node[1]]
+            for edge, child in node[2].items():
+                if distance - radius <= edge <= distance + radius:
+                    stack.append(child)
+        return found
+
+
+def group_duplicates(
+    prints: List[Dict[str, Any]],
+    dhash_distance: int = DEFAULT_DHASH_DISTANCE,
+    phash_distance: int = DEFAULT_PHASH_DISTANCE
+) -> List[Dict[str, Any]]:
+    """
+    Groups fingerprints ({path, dhash, phash, width, height, size}) of the
+    same picture: candidates come from a BK-tree radius search on dHash and
+    are confirmed by pHash, then merged transitively. Each group keeps its
+    largest image (the full picture over its preview) and lists as
+    duplicates, with their distances, the members within both distances of
+    it; members linked only through others form groups of their own.
+    """
+    tree = BKTree()
+    for i, fp in enumerate(prints):
+        tree.add(fp['dhash'], i)
+
+    parent = list(range(len(prints)))
+
+    def find(i: int) -> int:
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    for i, fp in enumerate(prints):
+        for _distance, j in tree.search(fp['dhash'], dhash_distance):
+            if j > i and hamming(fp['phash'], prints[j]['phash']) <= phash_distance:
+                parent[find(j)] = find(i)
+
+    members: Dict[int, List[int]] = {}
+    for i in range(len(prints)):
+        members.setdefault(find(i), []).append(i)
+
+    def size_key(i: int) -> Tuple[int, int, str]:
+        return (prints[i]['width'] or 0) * (prints[i]['height'] or 0), prints[i]['size'], prints[i]['path']
+
+    groups = []
+    for remaining in members.values():
+        # Transitive links chain a burst end to end: a member only counts as
+        # a duplicate if it is within both distances of the kept image itself;
+        # the rest of the component is grouped again around its own largest image
+        while len(remaining) > 1:
+            keep = max(remaining, key=size_key)
+            kept = prints[keep]
+            duplicates = []
+            rest = []
+            for i in sorted(remaining, key=lambda i: prints[i]['path']):
+                if i == keep:
+                    continue
+                fp = prints[i]
+                phash_to_kept = hamming(kept['phash'], fp['phash'])
+                dhash_to_kept = hamming(kept['dhash'], fp['dhash'])
+                if phash_to_kept > phash_distance or dhash_to_kept > dhash_distance:
+                    rest.append(i)
+                    continue
+                duplicates.append({
+                    'path': fp['path'],
+                    'phash_distance': phash_to_kept,
+                    'dhash_distance': dhash_to_kept,
+                    'exact': phash_to_kept == 0 and dhash_to_kept == 0
+                })
+            if duplicates:
+                groups.append({'keep': kept['path'], 'duplicates': duplicates})
+            remaining = rest
+    groups.sort(key=lambda g: g['keep'])
+    return groups
+
+
+def fingerprint_paths(paths: List[str], workers: Optional[int] = None) -> Tuple[List[Dict[str, Any]], List[str]]:
+    """(fingerprints, paths that did not decode). Decoding runs in a process pool; hashing is batched."""
+    batches = [paths[i:i + PATHS_PER_TASK] for i in range(0, len(paths), PATHS_PER_TASK)]
+    workers = min(workers or os.cpu_count() or 1, len(batches))
+    if workers > 1:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            loaded = [thumbs for batch in pool.map(_load_task, batches) for thumbs in batch]
+    else:
+        loaded = [load_thumbnails(path) for path in paths]
+
+    decoded = [t for t in loaded if t is not None]
+    failed = [path for path, t in zip(paths, loaded) if t is None]
+    dhashes = dhash_many([t['dhash_pixels'] for t in decoded])
+    phashes = phash_many([t['phash_pixels'] for t in decoded])
+    prints = [
+        {'path': t['path'], 'width': t['width'], 'height': t['height'], 'size': os.path.getsize(t['path']),
+         'dhash': d, 'phash': p}
+        for t, d, p in zip(decoded, dhashes, phashes)
+    ]
+    return prints, failed
+
+
+def dedupe_outputs(
+    input_dir: str,
+    collapse_dir: Optional[str] = None,
+    dhash_distance: int = DEFAULT_DHASH_DISTANCE,
+    phash_distance: int = DEFAULT_PHASH_DISTANCE,
+    workers: Optional[int] = None
+) -> Dict[str, Any]:
+    """
+    Finds duplicate and near-duplicate images among recovered outputs. By
+    default they are only reported; with collapse_dir every duplicate is
+    moved there (mirroring its place under input_dir), leaving one image of
+    each group for review.
+    """
+    if not os.path.isdir(input_dir):
+        raise FileNotFoundError(f"Input directory not found: {input_dir}")
+    paths = [p for p in collect_inputs(input_dir, exclude_dir=collapse_dir)
+             if os.path.splitext(p)[1].lower() in IMAGE_EXTENSIONS]
+    prints, failed = fingerprint_paths(paths, workers)
+    groups = group_duplicates(prints, dhash_distance, phash_distance)
+
+    moved = 0
+    if collapse_dir:
+        for group in groups:
+            for duplicate in group['duplicates']:
+                target = os.path.join(collapse_dir, os.path.relpath(duplicate['path'], input_dir))
+                os.makedirs(os.path.dirname(target), exist_ok=True)
+                shutil.move(duplicate['path'], target)
+                duplicate['moved_to'] = target
+                moved += 1
+
+    return {
+        'success': True,
+        'images': len(prints),
+        'undecodable': failed,
+        'groups': groups,
+        'duplicates': sum(len(g['duplicates']) for g in groups),
+        'moved': moved
+    }
@@ -0,0 +1,289 @@
+import os
+import sys
+import json
+import time
+import random
+import struct
+import hashlib
+import statistics
+import subprocess
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Any, Optional, List, Sequence
+
+try:
+    import numpy as np
+except ImportError:  # Optional: byte diffs fall back to a pure-Python count
+    np = None
+
+from services.telemetry import peak_rss
+from strategies.registry import load_strategy
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+DEFAULT_RUNNER = os.path.join(REPO_ROOT, 'scripts', 'strategy-diff-runner.ts')
+# vite-node ships with vitest, so a plain `npm install` is enough to run the runner
+DEFAULT_NODE_COMMAND = ('npx', '--no-install', 'vite-node')
+RUNNER_TIMEOUT = 1800
+
+# Strategies implemented both here and in electron/strategies
+SHARED_STRATEGIES = ('header-grafting', 'marker-sanitization', 'mcu-alignment', 'preview-extraction')
+DEFAULT_SIZES_MB = (1, 8, 32)
+DEFAULT_ITERATIONS = 3
+
+# Bytes of entropy-coded data between restart markers in generated JPEGs
+RESTART_SPAN = 4096
+# One invalid marker is planted per this many bytes of scan data
+INVALID_MARKER_EVERY = 64 * 1024
+# Bytes dropped from the scan to knock the MCUs out of alignment
+MISALIGN_BYTES = 37
+
+
+def _segment(marker: int, payload: bytes) -> bytes:
+    return struct.pack('>HH', marker, len(payload) + 2) + payload
+
+
+def synthetic_jpeg(size: int, rng: random.Random) -> bytes:
+    """
+    A baseline JPEG of about `size` bytes: a full table header (DQT, SOF0,
+    DHT, DRI) and random entropy-coded data with byte stuffing and RST0-7
+    markers every RESTART_SPAN bytes. It does not decode to a picture, but
+    every strategy parses it the way it parses a real photo.
+    """
+    header = (
+        b'\xff\xd8'
+        + _segment(0xFFE0, b'JFIF\x00\x01\x01\x00\x00\x01\x00\x01\x00\x00')
+        + _segment(0xFFDB, b'\x00' + bytes(rng.randrange(1, 256) for _ in range(64)))
+        + _segment(0xFFC0, struct.pack('>BHHB', 8, 1024, 1024, 1) + b'\x01\x11\x00')
+        + _segment(0xFFC4, b'\x00' + b'\x01' * 16 + bytes(range(16)))
+        + _segment(0xFFDD, struct.pack('>H', 4))
+        + _segment(0xFFDA, b'\x01\x01\x00\x00\x3f\x00')
+    )
+    scan = rng.randbytes(max(size - len(header) - 2, RESTART_SPAN)).replace(b'\xff', b'\xff\x00')
+    intervals = [scan[i:i + RESTART_SPAN] for i in range(0, len(scan), RESTART_SPAN)]
+    # A stuffed FF 00 must not be split by a restart marker
+    intervals = [s[:-1] if s.endswith(b'\xff') else s for s in intervals]
+    body = b''.join(s + bytes([0xFF, 0xD0 + i % 8]) for i, s in enumerate(intervals[:-1])) + intervals[-1]
+    return header + body + b'\xff\xd9'
+
+
+def _scan_start(jpeg: bytes) -> int:
+    sos = jpeg.find(b'\xff\xda')
+    return sos + 2 + struct.unpack('>H', jpeg[sos + 2:sos + 4])[0]
+
+
+def corrupt_for(strategy_name: str, healthy: bytes, rng: random.Random) -> Dict[str, Any]:
+    """
+    The damage each strategy exists to repair, applied to a healthy JPEG:
+    {corruption, data, reference}. The reference (when used) is the healthy file.
+    """
+    scan = _scan_start(healthy)
+    if strategy_name == 'marker-sanitization':
+        data = bytearray(healthy)
+        for start in range(scan, len(data) - 2, INVALID_MARKER_EVERY):
+            stuffed = data.find(b'\xff\x00', start)
+            if stuffed != -1:
+                data[stuffed + 1] = rng.choice((0x01, 0x9A, 0xC5, 0xE7))
+        return {'corruption': 'invalid-markers', 'data': bytes(data), 'reference': None}
+    if strategy_name == 'header-grafting':
+        # Tables wiped out; SOI and the scan survive
+        return {'corruption': 'wiped-header', 'data': b'\xff\xd8' + bytes(scan - 2) + healthy[scan:], 'reference': healthy}
+    if strategy_name == 'mcu-alignment':
+        restart = healthy.find(b'\xff\xd2', scan)
+        cut = restart + 2 if restart != -1 else scan
+        return {'corruption': 'dropped-bytes', 'data': healthy[:cut] + healthy[cut + MISALIGN_BYTES:], 'reference': healthy}
+    if strategy_name == 'preview-extraction':
+        # A RAW-like container: TIFF header, sensor noise, the preview JPEG, more noise
+        preview = healthy[:len(healthy) // 4] + b'\xff\xd9'
+        noise = rng.randbytes(len(healthy) - len(preview)).replace(b'\xff', b'\xfe')
+        half = len(noise) // 2
+        return {'corruption': 'embedded-preview', 'data': b'II*\x00\x08\x00\x00\x00' + noise[:half] + preview + noise[half:],
+                'reference': None}
+    raise ValueError(f"No corrupt corpus generator for {strategy_name}")
+
+
+def build_corpus(work_dir: str, strategy_names: Sequence[str], sizes_mb: Sequence[float], seed: int = 0) -> List[Dict[str, Any]]:
+    """Writes one corrupt input (and its reference) per strategy and size; returns the cases, smallest first."""
+    corpus_dir = os.path.join(work_dir, 'corpus')
+    os.makedirs(corpus_dir, exist_ok=True)
+    cases = []
+    for strategy_name in strategy_names:
+        for size_mb in sorted(sizes_mb):
+            rng = random.Random(f'{seed}:{strategy_name}:{size_mb}')
+            case_id = f'{strategy_name}-{size_mb:g}mb'
+            damaged = corrupt_for(strategy_name, synthetic_jpeg(int(size_mb * 1024 * 1024), rng), rng)
+            case = {'id': case_id, 'strategy': strategy_name, 'corruption': damaged['corruption'],
+                    'input': os.path.join(corpus_dir, f'{case_id}.jpg'), 'reference': None,
+                    'input_size': len(damaged['data'])}
+            with open(case['input'], 'wb') as f:
+                f.write(damaged['data'])
+            if damaged['reference'] is not None:
+                case['reference'] = os.path.join(corpus_dir, f'{case_id}.ref.jpg')
+                with open(case['reference'], 'wb') as f:
+                    f.write(damaged['reference'])
+            cases.append(case)
+    return cases
+
+
+def _run_python_cases(strategy_name: str, cases: List[Dict[str, Any]], iterations: int) -> Dict[str, Any]:
+    """Worker: times the engine strategy over the cases in a fresh process, so its peak RSS is its own."""
+    baseline = peak_rss()
+    strategy = load_strategy(strategy_name)
+    results = []
+    for case in cases:
+        seconds, outcome = [], {}
+        for _ in range(iterations):
+            started = time.perf_counter()
+            try:
+                result = strategy.repair(case['input'], case['output'], case.get('reference'))
+                outcome = {'success': bool(result.get('success')), 'error': result.get('error')}
+            except Exception as e:
+                outcome = {'success': False, 'error': str(e)}
+            seconds.append(time.perf_counter() - started)
+        results.append({'id': case['id'], **outcome, 'seconds': seconds, 'peak_rss': peak_rss()})
+    return {'runtime': f'python {sys.version.split()[0]}', 'baseline_rss': baseline, 'results': results}
+
+
+def run_python(strategy_name: str, cases: List[Dict[str, Any]], iterations: int) -> Dict[str, Any]:
+    with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context('spawn')) as pool:
+        return pool.submit(_run_python_cases, strategy_name, cases, iterations).result()
+
+
+def run_node(strategy_name: str, cases: List[Dict[str, Any]], iterations: int, manifest_path: str,
+             node_command: Sequence[str] = DEFAULT_NODE_COMMAND, runner: str = DEFAULT_RUNNER) -> Dict[str, Any]:
+    """Runs the TypeScript strategy over the cases through the Node runner script; {error} if it cannot run."""
+    manifest = {
+        'strategy': strategy_name,
+        'iterations': iterations,
+        'cases': [{k: case[k] for k in ('id', 'input', 'reference', 'output') if case.get(k)} for case in cases]
+    }
+    with open(manifest_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f)
+    env = {**os.environ, 'STRATEGY_DIFF_MANIFEST': manifest_path}
+    try:
+        proc = subprocess.run([*node_command, runner], cwd=REPO_ROOT, env=env, capture_output=True, text=True,
+                              timeout=RUNNER_TIMEOUT)
+    except (OSError, subprocess.TimeoutExpired) as e:
+        return {'error': f"Node runner could not run: {e}"}
+    lines = proc.stdout.strip().splitlines()
+    try:
+        report = json.loads(lines[-1])
+    except (IndexError, ValueError):
+        return {'error': f"Node runner exited with {proc.returncode}: {proc.stderr.strip()[-500:]}"}
+    return report
+
+
+def diff_outputs(a_path: str, b_path: str) -> Dict[str, Any]:
+    """Byte-for-byte comparison of two outputs (either may be missing)."""
+    sizes = [os.path.getsize(p) if os.path.exists(p) else None for p in (a_path, b_path)]
+    diff: Dict[str, Any] = {'python_size': sizes[0], 'node_size': sizes[1]}
+    if None in sizes:
+        return {**diff, 'identical': sizes[0] is None and sizes[1] is None}
+
+    with open(a_path, 'rb') as f:
+        a = f.read()
+    with open(b_path, 'rb') as f:
+        b = f.read()
+    common = min(len(a), len(b))
+    if np is not None:
+        unequal = np.frombuffer(a, np.uint8, common) != np.frombuffer(b, np.uint8, common)
+        positions = np.flatnonzero(unequal)
+        first = int(positions[0]) if len(positions) else None
+        differing = int(len(positions))
+    else:
+        positions = [i for i in range(common) if a[i] != b[i]]
+        first = positions[0] if positions else None
+        differing = len(positions)
+    if first is None and len(a) != len(b):
+        first = common
+    return {
+        **diff,
+        'identical': a == b,
+        'first_difference': first,
+        'differing_bytes': differing + abs(len(a) - len(b)),
+        'python_sha256': hashlib.sha256(a).hexdigest(),
+        'node_sha256': hashlib.sha256(b).hexdigest()
+    }
+
+
+def _measure(result: Optional[Dict[str, Any]], input_size: int, baseline_rss: Optional[int]) -> Dict[str, Any]:
+    result = result or {'error': 'No result'}
+    median = statistics.median(result['seconds']) if result.get('seconds') else None
+    return {
+        'success': result.get('success', False),
+        'error': result.get('error'),
+        'seconds_median': None if median is None else round(median, 6),
+        'mb_per_s': round(input_size / median / (1024 * 1024), 3) if median else None,
+        'peak_rss': result.get('peak_rss'),
+        'peak_rss_over_baseline': (result['peak_rss'] - baseline_rss) if result.get('peak_rss') and baseline_rss else None
+    }
+
+
+def run_differential(
+    work_dir: str,
+    strategy_names: Sequence[str] = SHARED_STRATEGIES,
+    sizes_mb: Sequence[float] = DEFAULT_SIZES_MB,
+    iterations: int = DEFAULT_ITERATIONS,
+    node_command: Sequence[str] = DEFAULT_NODE_COMMAND,
+    runner: str = DEFAULT_RUNNER,
+    seed: int = 0
+) -> Dict[str, Any]:
+    """
+    Feeds generated corrupt corpora to both the engine strategies and their
+    TypeScript counterparts (through the Node runner), then diffs the outputs
+    byte for byte and reports each side's median MB/s and peak RSS per case.
+    Each side runs one strategy per fresh process; peak RSS is also given
+    above that process's idle baseline, since the runtimes start at very
+    different sizes.
+    """
+    unknown = [name for name in strategy_names if name not in SHARED_STRATEGIES]
+    if unknown:
+        raise ValueError(f"No TypeScript implementation of: {', '.join(unknown)}")
+    for side in ('python', 'node'):
+        os.makedirs(os.path.join(work_dir, side), exist_ok=True)
+
+    corpus = build_corpus(work_dir, strategy_names, sizes_mb, seed)
+    # Outputs of an earlier run must not pass for a side that now writes none
+    for case in corpus:
+        for side in ('python', 'node'):
+            stale = os.path.join(work_dir, side, f"{case['id']}.jpg")
+            if os.path.exists(stale):
+                os.remove(stale)
+    cases, summary = [], []
+    for strategy_name in strategy_names:
+        strategy_cases = [c for c in corpus if c['strategy'] == strategy_name]
+        python_report = run_python(strategy_name, [
+            {**c, 'output': os.path.join(work_dir, 'python', f"{c['id']}.jpg")} for c in strategy_cases
+        ], iterations)
+        node_report = run_node(strategy_name, [
+            {**c, 'output': os.path.join(work_dir, 'node', f"{c['id']}.jpg")} for c in strategy_cases
+        ], iterations, os.path.join(work_dir, f'{strategy_name}.manifest.json'), node_command, runner)
+
+        python_results = {r['id']: r for r in python_report.get('results', [])}
+        node_results = {r['id']: r for r in node_report.get('results', [])}
+        rows = []
+        for case in strategy_cases:
+            python = _measure(python_results.get(case['id']), case['input_size'], python_report.get('baseline_rss'))
+            node = _measure(node_results.get(case['id']), case['input_size'], node_report.get('baseline_rss'))
+            if case['id'] not in node_results and node_report.get('error'):
+                node['error'] = node_report['error']
+            diff = diff_outputs(os.path.join(work_dir, 'python', f"{case['id']}.jpg"),
+                                os.path.join(work_dir, 'node', f"{case['id']}.jpg"))
+            faster = None
+            if python['mb_per_s'] and node['mb_per_s']:
+                faster = 'python' if python['mb_per_s'] >= node['mb_per_s'] else 'node'
+            rows.append({
+                **{k: case[k] for k in ('id', 'strategy', 'corruption', 'input_size')},
+                'python': python, 'node': node, 'diff': diff, 'faster': faster
+            })
+        cases += rows
+        summary.append({
+            'strategy': strategy_name,
+            'cases': len(rows),
+            'identical': sum(1 for r in rows if r['diff']['identical']),
+            'python_faster': sum(1 for r in rows if r['faster'] == 'python'),
+            'node_faster': sum(1 for r in rows if r['faster'] == 'node'),
+            'python_runtime': python_report.get('runtime'),
+            'node_runtime': node_report.get('runtime'),
+            'node_error': node_report.get('error')
+        })
+    return {'success': True, 'iterations': iterations, 'summary': summary, 'cases': cases}
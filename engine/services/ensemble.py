@@ -0,0 +1,113 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Any, Optional, List
+
+from lib.jpeg_decodability import decodability
+from lib.validation import validate_output, EXTENSION_FORMATS
+from strategies.base import write_output, output_size
+from strategies.registry import get_extension, load_strategy
+
+# Worker-process state, set once per worker by _init_worker
+_worker: Dict[str, Any] = {}
+
+
+def _init_worker(target: bytes, strategy_name: str, prepared: Any) -> None:
+    # The parent's copy of the target: workers never re-read the input
+    _worker['target'] = target
+    _worker['strategy'] = load_strategy(strategy_name)
+    _worker['format'] = EXTENSION_FORMATS.get(get_extension(strategy_name))
+    _worker['prepared'] = prepared
+
+
+def score_candidate(output, fmt: Optional[str]) -> Dict[str, Any]:
+    """
+    Structural validation plus, for sequential JPEGs, the Huffman
+    decodability metric. The score is the decodability when available (it
+    catches tables that do not fit the bitstream), else the validation score.
+    """
+    if isinstance(output, memoryview):
+        data = output.tobytes()
+    elif isinstance(output, (bytes, bytearray)):
+        data = output
+    else:
+        data = b''.join(output)
+    validation = validate_output(data, fmt) if fmt else None
+    decode = decodability(data) if fmt == 'jpeg' else None
+    if decode is not None:
+        score = decode['score']
+    else:
+        score = validation['score'] if validation else 0.0
+    return {'score': score, 'validation': validation, 'decodability': decode}
+
+
+def _score_reference(reference_path: str) -> Dict[str, Any]:
+    """Worker task: builds the candidate for one reference and scores it; only the report travels back."""
+    entry: Dict[str, Any] = {'reference_path': reference_path}
+    try:
+        with open(reference_path, 'rb') as f:
+            reference = f.read()
+        output, result = _worker['strategy'].repair_prepared(_worker['target'], _worker['prepared'], reference)
+    except Exception as e:
+        output, result = None, {'success': False, 'error': str(e)}
+    if output is None:
+        entry.update({'success': False, 'score': 0.0, 'error': result.get('error')})
+        return entry
+    entry.update({'success': True, 'output_size': output_size(output), **score_candidate(output, _worker['format'])})
+    return entry
+
+
+def graft_ensemble(
+    input_path: str,
+    reference_paths: List[str],
+    output_path: str,
+    strategy_name: str = 'header-grafting',
+    workers: Optional[int] = None
+) -> Dict[str, Any]:
+    """
+    Runs a reference-based strategy against every candidate reference in
+    parallel, sharing one parsed target (prepare_target runs once). Every
+    candidate is scored; only the best is written, and the result carries the
+    ranked report. Replaces one manual round trip per reference.
+    """
+    if not os.path.exists(input_path):
+        raise FileNotFoundError(f"Input file not found: {input_path}")
+    if not reference_paths:
+        return {"success": False, "error": "No reference files given"}
+
+    strategy = load_strategy(strategy_name)
+    if not strategy.requires_reference:
+        return {"success": False, "error": f"Strategy {strategy_name} does not use a reference"}
+
+    with open(input_path, 'rb') as f:
+        target = f.read()
+    prepared = strategy.prepare_target(target)
+
+    workers = min(workers or os.cpu_count() or 1, len(reference_paths))
+    if workers > 1:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                 initargs=(target, strategy_name, prepared)) as pool:
+            ranking = list(pool.map(_score_reference, reference_paths))
+    else:
+        _init_worker(target, strategy_name, prepared)
+        ranking = [_score_reference(path) for path in reference_paths]
+        _worker.clear()
+
+    # Stable sort: equal scores keep the caller's order of preference
+    ranking.sort(key=lambda entry: (entry['score'], (entry.get('validation') or {}).get('score', 0.0)), reverse=True)
+    best = next((entry for entry in ranking if entry['success']), None)
+    if best is None:
+        return {"success": False, "error": "No reference produced a candidate", "ranking": ranking}
+
+    # Rebuild the winner (cheap next to scoring) instead of shipping every candidate back
+    with open(best['reference_path'], 'rb') as f:
+        output, result = strategy.repair_prepared(target, prepared, f.read())
+    write_output(output, output_path)
+
+    return {
+        **result,
+        "success": True,
+        "output_path": output_path,
+        "reference_path": best['reference_path'],
+        "score": best['score'],
+        "ranking": ranking
+    }
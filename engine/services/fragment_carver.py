@@ -0,0 +1,258 @@
+import os
+import io
+import mmap
+from bisect import bisect_left, bisect_right, insort
+from typing import Dict, Any, Optional, List, Tuple
+
+from lib.jpeg_header import read_jpeg_header, HEADER_READ_LIMIT
+from services.blank_map import load_blank_map, sidecar_path
+from services.carver import find_aligned_headers, MAX_FILE_SIZE, MIN_FILE_SIZE
+from strategies.marker_sanitization import VALID_FOLLOWERS, _next_scan_start
+
+DEFAULT_CLUSTER_SIZE = 32 * 1024
+# Clusters after the split point searched for the second fragment
+DEFAULT_SEARCH_WINDOW = 2048
+# Cluster boundaries before the first break tested as the split point: the
+# first invalid marker usually shows up a few hundred bytes into foreign data
+DEFAULT_MAX_BACKTRACK = 4
+
+EOI_FOLLOWER = 0xD9
+PROGRESSIVE_SOF = {0xC2, 0xC6, 0xCA, 0xCE}
+
+EOI, BREAK, LIMIT = 'eoi', 'break', 'limit'
+
+
+def _walk(view, pos: int, limit: int, rst_next: int, expect_rst: bool, multi_scan: bool) -> Tuple[str, int, int]:
+    """
+    Walks entropy-coded data from pos with the marker sanitizer's rule: 0xFF
+    may only be followed by stuffing, RSTn or EOI. With a restart interval the
+    RST markers must also count up 0..7 without gaps.
+
+    Returns (status, position, rst_next): EOI with the position just past
+    FF D9, BREAK with the position of the offending 0xFF, or LIMIT with the
+    position to resume from (a trailing 0xFF whose follower is past `limit`).
+    """
+    i = view.find(b'\xff', pos, limit)
+    while i != -1:
+        if i + 1 >= limit:
+            return LIMIT, i, rst_next
+        follower = view[i + 1]
+        if follower == EOI_FOLLOWER:
+            return EOI, i + 2, rst_next
+        if 0xD0 <= follower <= 0xD7:
+            if expect_rst and follower - 0xD0 != rst_next:
+                return BREAK, i, rst_next
+            rst_next = (rst_next + 1) % 8
+        elif follower not in VALID_FOLLOWERS:
+            # Between the scans of a progressive file, with the sanitizer's
+            # own rule for what a valid chain of inter-scan segments is
+            scan_start = _next_scan_start(view, i, limit) if multi_scan else -1
+            if scan_start == -1:
+                return BREAK, i, rst_next
+            rst_next = 0
+            i = view.find(b'\xff', scan_start, limit)
+            continue
+        i = view.find(b'\xff', i + 2, limit)
+    return LIMIT, limit, rst_next
+
+
+def _expected_final_rst(header: Dict[str, Any]) -> Optional[int]:
+    """RST index that would follow the last one of a complete interleaved scan."""
+    components = header['components']
+    if not components or not header['width'] or not header['height']:
+        return None
+    h_max = max(c['h'] for c in components)
+    v_max = max(c['v'] for c in components)
+    mcus = -(-header['width'] // (8 * h_max)) * -(-header['height'] // (8 * v_max))
+    restarts = -(-mcus // header['restart_interval']) - 1
+    return restarts % 8
+
+
+class ClusterIndex:
+    """
+    Cluster starts that can never continue a fragment: clusters that begin
+    with a file header, blank (hole/0x00/0xFF) regions and clusters already
+    claimed by a carved file. Built once per image and shared by every
+    reassembly.
+    """
+
+    def __init__(self, view, cluster_size: int, blank: Optional[List[List[Any]]] = None):
+        self.cluster_size = cluster_size
+        found = find_aligned_headers(view, 0, len(view), cluster_size)
+        self.headers = [offset for offset, _fmt in found]
+        self.jpeg_headers = [offset for offset, fmt in found if fmt == 'jpeg']
+        self.blank = [(start, end) for start, end, _fill in blank or []]
+        self._blank_starts = [start for start, _end in self.blank]
+        self._header_set = set(self.headers)
+        # Clusters already attributed to a carved file, as sorted (start, end)
+        self._claimed: List[Tuple[int, int]] = []
+
+    def claim(self, offset: int, length: int) -> None:
+        insort(self._claimed, (offset, offset + length))
+
+    @staticmethod
+    def _inside(ranges: List[Tuple[int, int]], offset: int) -> bool:
+        i = bisect_right(ranges, (offset, float('inf'))) - 1
+        return i >= 0 and offset < ranges[i][1]
+
+    def is_excluded(self, offset: int) -> bool:
+        return offset in self._header_set or self._inside(self.blank, offset) or self._inside(self._claimed, offset)
+
+    def next_boundary(self, offset: int) -> Optional[int]:
+        """First header or blank region strictly after offset: no fragment runs across it."""
+        candidates = []
+        i = bisect_right(self.headers, offset)
+        if i < len(self.headers):
+            candidates.append(self.headers[i])
+        j = bisect_left(self._blank_starts, offset + 1)
+        if j < len(self.blank):
+            candidates.append(self.blank[j][0])
+        return min(candidates) if candidates else None
+
+
+def reassemble_jpeg(
+    view,
+    start: int,
+    index: ClusterIndex,
+    search_window: int = DEFAULT_SEARCH_WINDOW,
+    max_backtrack: int = DEFAULT_MAX_BACKTRACK
+) -> Dict[str, Any]:
+    """
+    Reassembles the JPEG whose SOI sits at `start` from at most two fragments
+    (bifragment gap carving). The bitstream is walked until it breaks; each
+    cluster boundary just before the break is tried as the split point and
+    every non-excluded cluster in the search window as the start of the
+    second fragment, which must then run cleanly to an EOI. Latest split and
+    nearest continuation win.
+
+    Returns {status: 'contiguous'|'bifragment'|'unresolved', fragments, ...}.
+    """
+    cluster_size = index.cluster_size
+    header = read_jpeg_header(io.BytesIO(view[start:start + HEADER_READ_LIMIT]))
+    if not header or header['bitstream_offset'] == -1:
+        return {'status': 'unresolved', 'reason': 'header'}
+    stream_start = start + header['bitstream_offset']
+    expect_rst = header['restart_interval'] > 0
+    multi_scan = header['sof_marker'] in PROGRESSIVE_SOF
+    # With restart markers, a complete baseline scan ends on a known RST count
+    final_rst = _expected_final_rst(header) if expect_rst and not multi_scan else None
+
+    boundary = index.next_boundary(start)
+    limit = min(start + MAX_FILE_SIZE, len(view), boundary if boundary is not None else len(view))
+    status, pos, _rst = _walk(view, stream_start, limit, 0, expect_rst, multi_scan)
+    if status == EOI:
+        return {'status': 'contiguous', 'fragments': [[start, pos - start]]}
+
+    # Nothing after `pos` belongs to this file: try splits at or before it
+    last_split = (min(pos, limit - 1) + 1) // cluster_size * cluster_size
+    splits = [s for s in range(last_split, last_split - (max_backtrack + 1) * cluster_size, -cluster_size) if s > stream_start]
+
+    # Stream state at every candidate split, walking forward once
+    states: Dict[int, Tuple[int, int]] = {}
+    resume, rst_next = stream_start, 0
+    for split in sorted(splits):
+        status, resume, rst_next = _walk(view, resume, split, rst_next, expect_rst, multi_scan)
+        if status != LIMIT:
+            break
+        states[split] = (resume, rst_next)
+
+    walks: Dict[Tuple[int, int, bool], Tuple[str, int, int]] = {}
+    for split in sorted(states, reverse=True):
+        resume, rst_next = states[split]
+        # A 0xFF left pending at the split takes its follower from the second fragment
+        pending = resume < split
+        first_length = split - start
+        window_end = min(split + search_window * cluster_size, len(view))
+        for candidate in range(split + cluster_size, window_end, cluster_size):
+            if index.is_excluded(candidate):
+                continue
+            key = (candidate, rst_next, pending)
+            if key not in walks:
+                walks[key] = _continue(view, candidate, pending, rst_next, first_length, index, expect_rst, multi_scan)
+            status, end, end_rst = walks[key]
+            if status == EOI and final_rst in (None, end_rst):
+                return {
+                    'status': 'bifragment',
+                    'fragments': [[start, first_length], [candidate, end - candidate]],
+                    'gap': candidate - split,
+                    'rst_verified': expect_rst
+                }
+    return {'status': 'unresolved', 'reason': 'no continuation', 'break_offset': pos}
+
+
+def _continue(view, candidate: int, pending: bool, rst_next: int, first_length: int,
+              index: ClusterIndex, expect_rst: bool, multi_scan: bool) -> Tuple[str, int, int]:
+    """Validates a second fragment starting at `candidate`; it must reach an EOI cleanly."""
+    boundary = index.next_boundary(candidate)
+    limit = min(candidate + MAX_FILE_SIZE - first_length, len(view), boundary if boundary is not None else len(view))
+    pos = candidate
+    if pending:
+        # Stitch the split 0xFF with its follower and check the pair
+        pair = b'\xff' + view[candidate:candidate + 1]
+        status, end, rst_next = _walk(pair, 0, 2, rst_next, expect_rst, False)
+        if status == EOI:
+            return EOI, candidate + 1, rst_next
+        if status == BREAK:
+            return BREAK, candidate, rst_next
+        pos = candidate + 1
+    return _walk(view, pos, limit, rst_next, expect_rst, multi_scan)
+
+
+def carve_fragmented(
+    image_path: str,
+    output_dir: Optional[str] = None,
+    cluster_size: int = DEFAULT_CLUSTER_SIZE,
+    search_window: int = DEFAULT_SEARCH_WINDOW,
+    max_backtrack: int = DEFAULT_MAX_BACKTRACK,
+    min_size: int = MIN_FILE_SIZE,
+    skip_blank: bool = True
+) -> Dict[str, Any]:
+    """
+    Carves JPEGs that may be split in two across non-contiguous clusters.
+    Every cluster-aligned SOI is reassembled with reassemble_jpeg; first-EOI
+    matching would instead cut a fragmented file at foreign data.
+
+    With skip_blank, blank regions end fragments; their map is kept in the
+    output directory (never next to the image) and reused by later passes.
+    """
+    if not os.path.exists(image_path):
+        raise FileNotFoundError(f"Image not found: {image_path}")
+    if output_dir:
+        os.makedirs(output_dir, exist_ok=True)
+    if os.path.getsize(image_path) == 0:
+        return {'files': [], 'unresolved': []}
+
+    map_path = sidecar_path(image_path, output_dir) if output_dir else None
+    blank = load_blank_map(image_path, map_path=map_path)['blank'] if skip_blank else None
+    files = []
+    unresolved = []
+    with open(image_path, 'rb') as f:
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as view:
+            index = ClusterIndex(view, cluster_size, blank)
+            # Contiguous files first: their clusters can then never be taken
+            # for the continuation of a fragmented one
+            results = {}
+            for start in index.jpeg_headers:
+                results[start] = reassemble_jpeg(view, start, index, 0, max_backtrack)
+                if results[start]['status'] == 'contiguous':
+                    index.claim(*results[start]['fragments'][0])
+            for start in index.jpeg_headers:
+                result = results[start]
+                if result['status'] == 'unresolved':
+                    result = reassemble_jpeg(view, start, index, search_window, max_backtrack)
+                if result['status'] == 'unresolved':
+                    unresolved.append({'offset': start, **result})
+                    continue
+                if result['status'] == 'bifragment':
+                    index.claim(*result['fragments'][1])
+                length = sum(frag_length for _offset, frag_length in result['fragments'])
+                if length <= min_size:
+                    continue
+                item = {'offset': start, 'length': length, 'format': 'jpeg', **result}
+                if output_dir:
+                    item['output_path'] = os.path.join(output_dir, f"carved_{start:012x}.jpg")
+                    with open(item['output_path'], 'wb') as out_f:
+                        for frag_offset, frag_length in result['fragments']:
+                            out_f.write(view[frag_offset:frag_offset + frag_length])
+                files.append(item)
+    return {'files': files, 'unresolved': unresolved}
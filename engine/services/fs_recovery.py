@@ -0,0 +1,104 @@
+import os
+import mmap
+from typing import Dict, Any, Optional, List
+
+from lib.fat import FatVolume, find_volumes
+from lib.validation import EXTENSION_FORMATS
+from services.carver import ALIGNED_SIGNATURES, EXTENSIONS
+from strategies.base import BaseStrategy, write_output
+
+
+def sniff_format(data) -> Optional[str]:
+    """Format from the file's own header; deleted entries may have lost their name."""
+    for fmt, signatures in ALIGNED_SIGNATURES.items():
+        for sig_offset, sig in signatures:
+            if bytes(data[sig_offset:sig_offset + len(sig)]) == sig:
+                return fmt
+    return None
+
+
+def _output_path(output_dir: str, entry: Dict[str, Any], fmt: str) -> str:
+    parts = [p for p in entry['path'].split('/') if p not in ('', '.', '..')]
+    name, ext = os.path.splitext(parts[-1])
+    if entry['deleted']:
+        # Deleted names are not unique (and may be mangled): keep the first cluster
+        parts = ['deleted'] + parts[:-1] + [f"{name}_{entry['first_cluster']}"]
+    else:
+        parts[-1] = name
+    return os.path.join(output_dir, *parts) + (ext or EXTENSIONS[fmt])
+
+
+def recover_from_filesystem(
+    image_path: str,
+    output_dir: Optional[str] = None,
+    include_deleted: bool = True,
+    strategy: Optional[BaseStrategy] = None,
+    strategy_extension: Optional[str] = None,
+    reference_path: Optional[str] = None
+) -> Dict[str, Any]:
+    """
+    Recovers photos from the FAT32/exFAT volumes of a card image by walking
+    the directory tree and reading each file's extents directly, so the cost
+    is the metadata plus the photo bytes rather than a scan of the card.
+
+    Every photo is handed to `strategy` (when given, for the format it
+    repairs) through the buffer API as a slice of the mmapped image; the
+    others are written out as-is. Without an output_dir nothing is written
+    and the result only lists what was found.
+    """
+    if not os.path.exists(image_path):
+        raise FileNotFoundError(f"Image not found: {image_path}")
+
+    strategy_format = EXTENSION_FORMATS.get(strategy_extension) if strategy else None
+    reference = None
+    if strategy and reference_path:
+        with open(reference_path, 'rb') as f:
+            reference = f.read()
+
+    volumes = []
+    files: List[Dict[str, Any]] = []
+    with open(image_path, 'rb') as f:
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as view:
+            found = find_volumes(view)
+            for offset, fs_type in found:
+                # A single-volume card keeps its directory tree at the top of output_dir
+                volume_dir = output_dir if len(found) == 1 or not output_dir else os.path.join(output_dir, f"volume_{offset:x}")
+                volume = FatVolume(view, offset, fs_type)
+                volumes.append({'offset': offset, 'fs_type': fs_type, 'cluster_size': volume.cluster_size})
+                for entry in volume.walk(include_deleted):
+                    if not entry['extents']:
+                        continue
+                    data = volume.read(entry)
+                    fmt = sniff_format(data)
+                    if fmt is None:
+                        data.release()
+                        continue
+                    item = {k: entry[k] for k in ('path', 'size', 'deleted', 'contiguous_assumed')}
+                    item['format'] = fmt
+                    item['extents'] = [list(extent) for extent in entry['extents']]
+                    files.append(item)
+                    if output_dir:
+                        _recover_file(item, data, volume_dir, entry, strategy if fmt == strategy_format else None, reference)
+                    data.release()
+
+    return {'volumes': volumes, 'files': files}
+
+
+def _recover_file(item: Dict[str, Any], data, output_dir: str, entry: Dict[str, Any],
+                  strategy: Optional[BaseStrategy], reference: Optional[bytes]) -> None:
+    output_path = _output_path(output_dir, entry, item['format'])
+    os.makedirs(os.path.dirname(output_path), exist_ok=True)
+    if strategy is None:
+        write_output(data, output_path)
+        item.update({'success': True, 'output_path': output_path})
+        return
+
+    try:
+        output, result = strategy.repair_buffer(data, reference)
+    except Exception as e:
+        output, result = None, {'success': False, 'error': str(e)}
+    item['strategy'] = strategy.name
+    item.update(result)
+    if output is not None:
+        write_output(output, output_path)
+        item['output_path'] = output_path
@@ -0,0 +1,82 @@
+import os
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Iterable, Optional
+
+# Inputs read ahead of the one being processed
+DEFAULT_READ_AHEAD = 2
+# Outputs that may wait to be written while processing continues
+DEFAULT_WRITE_BEHIND = 2
+# Concurrent reads; more than one helps when inputs sit on different devices
+DEFAULT_READ_THREADS = 2
+
+
+def read_input(path: str, limit: Optional[int] = None) -> bytes:
+    """Whole-file read (or its first `limit` bytes) with sequential read-ahead hinted to the kernel."""
+    with open(path, 'rb') as f:
+        if hasattr(os, 'posix_fadvise'):
+            try:
+                os.posix_fadvise(f.fileno(), 0, limit or 0, os.POSIX_FADV_SEQUENTIAL)
+                os.posix_fadvise(f.fileno(), 0, limit or 0, os.POSIX_FADV_WILLNEED)
+            except OSError:
+                pass
+        return f.read() if limit is None else f.read(limit)
+
+
+def run_pipelined(
+    jobs: Iterable[Any],
+    read: Callable[[Any], Any],
+    process: Callable[[Any, Any], Any],
+    write: Callable[[Any, Any], Any],
+    on_result: Callable[[Any, Any, Optional[BaseException]], None],
+    read_ahead: int = DEFAULT_READ_AHEAD,
+    write_behind: int = DEFAULT_WRITE_BEHIND,
+    read_threads: int = DEFAULT_READ_THREADS
+) -> None:
+    """
+    Three-stage pipeline for a sequential batch: up to `read_ahead` inputs
+    are read by a thread pool while the caller's thread runs
+    process(job, data), and write(job, processed) runs on a write-behind
+    thread with at most `write_behind` outputs queued. Disk and CPU overlap,
+    while memory stays bounded by the queue depths.
+
+    on_result(job, value, error) is called in the caller's thread, in job
+    order, with write()'s return value or the first stage's exception.
+    """
+    upcoming = iter(jobs)
+    reads: deque = deque()
+    writes: deque = deque()
+
+    with ThreadPoolExecutor(max_workers=max(1, read_threads)) as readers, ThreadPoolExecutor(max_workers=1) as writer:
+        def top_up(depth: int) -> None:
+            while len(reads) < depth:
+                job = next(upcoming, None)
+                if job is None:
+                    return
+                reads.append((job, readers.submit(read, job)))
+
+        def drain(limit: int) -> None:
+            while len(writes) > limit:
+                job, future = writes.popleft()
+                error = future.exception()
+                on_result(job, None if error else future.result(), error)
+
+        read_ahead = max(0, read_ahead)
+        while True:
+            # The next input plus the read-ahead, then the read-ahead behind it
+            # while it is processed (read_ahead=0 reads each one on demand)
+            top_up(read_ahead + 1)
+            if not reads:
+                break
+            job, pending_read = reads.popleft()
+            top_up(read_ahead)
+            try:
+                processed = process(job, pending_read.result())
+            except Exception as e:
+                # Keep results in job order: the failure waits behind queued writes
+                drain(0)
+                on_result(job, None, e)
+                continue
+            writes.append((job, writer.submit(write, job, processed)))
+            drain(write_behind)
+        drain(0)
@@ -0,0 +1,202 @@
+import os
+import mmap
+import time
+import queue
+import multiprocessing
+from typing import Dict, Any, Optional, List
+
+from lib.validation import validate_output, EXTENSION_FORMATS
+from services.fs_recovery import sniff_format
+from strategies.base import write_output
+from strategies.registry import STRATEGY_REGISTRY, get_extension, load_strategy
+
+# How often the coordinator checks for crashed workers and the deadline
+POLL_INTERVAL = 0.05
+# Grace period for cancelled workers to exit before they are left to the OS
+JOIN_TIMEOUT = 2.0
+
+
+def applicable_strategies(input_path: str, has_reference: bool, fallback: bool = False) -> List[str]:
+    """
+    Registered strategies for the input's format whose reference needs can
+    be met: the full repairs, or with fallback=True the fallback-only ones.
+    """
+    with open(input_path, 'rb') as f:
+        fmt = sniff_format(f.read(16))
+    return [
+        name for name, entry in STRATEGY_REGISTRY.items()
+        if EXTENSION_FORMATS.get(entry['extension']) == fmt and (has_reference or not entry['requires_reference'])
+        and entry.get('fallback_only', False) == fallback
+    ]
+
+
+def _repair_mapped(name: str, view, reference: Optional[bytes], part_path: str) -> Dict[str, Any]:
+    # Kept separate so every view of the mapping is gone once it returns
+    strategy = load_strategy(name)
+    output, result = strategy.repair_buffer(memoryview(view), reference)
+    attempt = {'result': result, 'validation': None}
+    if output is not None:
+        attempt['validation'] = validate_output(output, EXTENSION_FORMATS[get_extension(name)])
+        if attempt['validation']['valid']:
+            write_output(output, part_path)
+    return attempt
+
+
+def _race_worker(name: str, input_path: str, reference_path: Optional[str], part_path: str, results) -> None:
+    """Worker process: repairs a read-only mapping of the input and reports a validated attempt."""
+    started = time.perf_counter()
+    attempt: Dict[str, Any] = {'strategy': name}
+    try:
+        reference = None
+        if reference_path:
+            with open(reference_path, 'rb') as f:
+                reference = f.read()
+        with open(input_path, 'rb') as f:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as view:
+                try:
+                    attempt.update(_repair_mapped(name, view, reference, part_path))
+                except Exception as e:
+                    attempt['result'] = {'success': False, 'error': str(e)}
+    except Exception as e:
+        attempt['result'] = {'success': False, 'error': str(e)}
+    attempt['elapsed'] = round(time.perf_counter() - started, 4)
+    results.put(attempt)
+
+
+def _drain(results) -> List[Dict[str, Any]]:
+    """Attempts already sitting in the result queue, without waiting for more."""
+    drained = []
+    while True:
+        try:
+            drained.append(results.get_nowait())
+        except queue.Empty:
+            return drained
+
+
+def race_strategies(
+    input_path: str,
+    output_path: str,
+    strategy_names: Optional[List[str]] = None,
+    reference_path: Optional[str] = None,
+    timeout: Optional[float] = None
+) -> Dict[str, Any]:
+    """
+    Runs several strategies on one input concurrently, one worker process
+    each, all reading the same read-only mapping of the file. Each output is
+    checked with the structural validator as it finishes; the first one that
+    passes is moved to output_path and the remaining workers are terminated.
+    Worst-case latency is the fastest successful strategy, not the sum.
+    When the race ends (a winner or the timeout), attempts already reported
+    are still recorded, and a valid one among them wins a timed-out race;
+    only workers still running are terminated and listed as cancelled.
+
+    Without strategy_names every applicable full repair is raced, and the
+    fallback-only strategies (e.g. the EXIF thumbnail) get a second round
+    only if none of them produced a valid output in time.
+    """
+    if not os.path.exists(input_path):
+        raise FileNotFoundError(f"Input file not found: {input_path}")
+    if strategy_names is None:
+        started = time.monotonic()
+        result = race_strategies(input_path, output_path, applicable_strategies(input_path, reference_path is not None),
+                                 reference_path, timeout)
+        fallbacks = applicable_strategies(input_path, reference_path is not None, fallback=True)
+        remaining = timeout - (time.monotonic() - started) if timeout else None
+        if result['success'] or not fallbacks or (remaining is not None and remaining <= 0):
+            return result
+        rescue = race_strategies(input_path, output_path, fallbacks, reference_path, remaining)
+        return {
+            **rescue,
+            "fallback": True,
+            "attempts": result.get('attempts', []) + rescue['attempts'],
+            "cancelled": result.get('cancelled', []) + rescue.get('cancelled', [])
+        }
+
+    attempts: List[Dict[str, Any]] = []
+    runnable = []
+    for name in strategy_names:
+        get_extension(name)
+        if STRATEGY_REGISTRY[name]['requires_reference'] and not reference_path:
+            attempts.append({'strategy': name, 'skipped': 'requires a reference'})
+        else:
+            runnable.append(name)
+    if not runnable:
+        return {"success": False, "error": "No applicable strategy to race", "attempts": attempts}
+
+    ctx = multiprocessing.get_context()
+    results = ctx.Queue()
+    parts = {name: f"{output_path}.{name}.part" for name in runnable}
+    workers = {
+        name: ctx.Process(target=_race_worker, args=(name, input_path, reference_path, parts[name], results), daemon=True)
+        for name in runnable
+    }
+    started = time.perf_counter()
+    for worker in workers.values():
+        worker.start()
+
+    deadline = time.monotonic() + timeout if timeout else None
+    pending = set(runnable)
+    winner = None
+
+    def collect(attempt: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Records a reported attempt; returns it if its output validated."""
+        pending.discard(attempt['strategy'])
+        attempts.append(attempt)
+        return attempt if attempt.get('validation') and attempt['validation']['valid'] else None
+
+    try:
+        while pending and winner is None:
+            try:
+                attempt = results.get(timeout=POLL_INTERVAL)
+            except queue.Empty:
+                for name in list(pending):
+                    # A clean exit always reports; anything else crashed
+                    if workers[name].exitcode not in (None, 0):
+                        pending.discard(name)
+                        attempts.append({'strategy': name, 'result': {'success': False, 'error': f"Worker exited with code {workers[name].exitcode}"}})
+                if deadline is not None and time.monotonic() > deadline:
+                    break
+                continue
+            winner = collect(attempt)
+    finally:
+        # Workers that finished while the race was ending have already queued
+        # their attempt: read those before (and after) terminating the rest,
+        # so only workers that were still running count as cancelled
+        drained = _drain(results)
+        running = [name for name in pending.difference(a['strategy'] for a in drained) if workers[name].exitcode is None]
+        for name in running:
+            workers[name].terminate()
+        for worker in workers.values():
+            worker.join(JOIN_TIMEOUT)
+        drained += _drain(results)
+        results.close()
+
+    for attempt in drained:
+        valid = collect(attempt)
+        winner = winner or valid
+    cancelled = sorted(pending.intersection(running))
+    for name in sorted(pending.difference(running)):
+        attempts.append({'strategy': name, 'result': {'success': False, 'error': f"Worker exited with code {workers[name].exitcode}"}})
+
+    if winner:
+        os.replace(parts[winner['strategy']], output_path)
+    for part in parts.values():
+        if os.path.exists(part):
+            os.remove(part)
+
+    summary = {
+        "attempts": attempts,
+        "cancelled": cancelled,
+        "elapsed": round(time.perf_counter() - started, 4)
+    }
+    if not winner:
+        error = "Race timed out" if cancelled else "No strategy produced a structurally valid output"
+        return {"success": False, "error": error, **summary}
+    return {
+        **winner['result'],
+        "success": True,
+        "output_path": output_path,
+        "winner": winner['strategy'],
+        "validation": winner['validation'],
+        **summary
+    }
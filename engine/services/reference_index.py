@@ -0,0 +1,244 @@
+import os
+import sqlite3
+import hashlib
+from typing import Dict, Any, Optional, List, Iterable
+
+from lib.jpeg_header import read_jpeg_header, sampling_signature
+from lib.exif import read_ifd0_tags
+from lib.heif import read_primary_dimensions
+
+# TIFF-based RAWs keep IFD0 (and its Make/Model strings) at the head of the file.
+TIFF_HEADER_READ = 64 * 1024
+
+REFERENCE_EXTENSIONS = {
+    '.jpg', '.jpeg', '.heic', '.heif', '.tif', '.tiff',
+    '.dng', '.cr2', '.nef', '.arw', '.orf', '.rw2', '.pef', '.srw'
+}
+
+# Score weights. Mismatching dimensions, camera model or chroma sampling make
+# a reference unusable for grafting, so those exclude it instead of scoring.
+WEIGHT_MODEL = 0.25
+WEIGHT_DIMENSIONS = 0.25
+WEIGHT_SAMPLING = 0.15
+WEIGHT_DQT = 0.2
+WEIGHT_DHT = 0.1
+WEIGHT_RESTART = 0.05
+
+FINGERPRINT_FIELDS = (
+    'format', 'width', 'height', 'sampling', 'dqt_hash', 'dht_hash',
+    'restart_interval', 'make', 'model'
+)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS reference_fingerprints (
+    path TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    format TEXT,
+    width INTEGER,
+    height INTEGER,
+    sampling TEXT,
+    dqt_hash TEXT,
+    dht_hash TEXT,
+    restart_interval INTEGER,
+    make TEXT,
+    model TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_ref_dims ON reference_fingerprints(format, width, height);
+CREATE INDEX IF NOT EXISTS idx_ref_dqt ON reference_fingerprints(dqt_hash);
+CREATE INDEX IF NOT EXISTS idx_ref_model ON reference_fingerprints(make, model);
+"""
+
+
+def _hash_segments(payloads: Iterable[bytes]) -> Optional[str]:
+    digest = hashlib.blake2b(digest_size=8)
+    seen = False
+    for payload in payloads:
+        digest.update(payload)
+        seen = True
+    return digest.hexdigest() if seen else None
+
+
+def _empty_fingerprint(file_format: Optional[str]) -> Dict[str, Any]:
+    fp = {field: None for field in FINGERPRINT_FIELDS}
+    fp['format'] = file_format
+    return fp
+
+
+def fingerprint_file(path: str) -> Dict[str, Any]:
+    """
+    Extracts the structural fingerprint of a JPEG, TIFF/RAW or HEIC file by
+    reading header bytes only. Fields that cannot be determined are None.
+    """
+    with open(path, 'rb') as f:
+        magic = f.read(12)
+        f.seek(0)
+
+        if magic[:2] == b'\xff\xd8':
+            fp = _empty_fingerprint('jpeg')
+            header = read_jpeg_header(f)
+            if header:
+                fp['width'] = header['width']
+                fp['height'] = header['height']
+                fp['sampling'] = sampling_signature(header)
+                fp['dqt_hash'] = _hash_segments(header['dqt'])
+                fp['dht_hash'] = _hash_segments(header['dht'])
+                fp['restart_interval'] = header['restart_interval']
+                if header['exif']:
+                    tags = read_ifd0_tags(header['exif'])
+                    fp['make'] = tags['make']
+                    fp['model'] = tags['model']
+            return fp
+
+        if magic[:4] in (b'II*\x00', b'MM\x00*'):
+            fp = _empty_fingerprint('tiff')
+            tags = read_ifd0_tags(f.read(TIFF_HEADER_READ))
+            fp.update({k: tags[k] for k in ('make', 'model', 'width', 'height')})
+            return fp
+
+        if magic[4:8] == b'ftyp':
+            fp = _empty_fingerprint('heic')
+            dims = read_primary_dimensions(f)
+            if dims:
+                fp['width'], fp['height'] = dims
+            return fp
+
+    return _empty_fingerprint(None)
+
+
+def score_reference(target: Dict[str, Any], ref: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """
+    Scores a reference fingerprint against a target fingerprint. Returns None
+    if the reference is incompatible. A field only counts when both sides
+    have it, so a target with a destroyed header still gets ranked results.
+    """
+    score = 0.0
+    reasons = []
+
+    if target['model'] and ref['model']:
+        if (target['make'], target['model']) != (ref['make'], ref['model']):
+            return None
+        score += WEIGHT_MODEL
+        reasons.append('Camera make/model matches.')
+
+    if target['width'] and ref['width']:
+        if (target['width'], target['height']) != (ref['width'], ref['height']):
+            return None
+        score += WEIGHT_DIMENSIONS
+        reasons.append('Dimensions match.')
+
+    if target['sampling'] and ref['sampling']:
+        if target['sampling'] != ref['sampling']:
+            return None
+        score += WEIGHT_SAMPLING
+        reasons.append('Chroma sampling matches (MCU layout compatible).')
+
+    if target['dqt_hash'] and target['dqt_hash'] == ref['dqt_hash']:
+        score += WEIGHT_DQT
+        reasons.append('Quantization tables are identical.')
+
+    if target['dht_hash'] and target['dht_hash'] == ref['dht_hash']:
+        score += WEIGHT_DHT
+        reasons.append('Huffman tables are identical.')
+
+    if target['restart_interval'] is not None and target['restart_interval'] == ref['restart_interval']:
+        score += WEIGHT_RESTART
+        reasons.append('Restart interval matches.')
+
+    return {'score': round(min(score, 1.0), 4), 'reasons': reasons}
+
+
+class ReferenceIndex:
+    """SQLite-backed index of reference fingerprints for fast reference ranking."""
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        self.conn = sqlite3.connect(db_path)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.executescript(SCHEMA)
+
+    def close(self) -> None:
+        self.conn.close()
+
+    def scan(self, library_dir: str) -> Dict[str, int]:
+        """
+        Incrementally indexes every reference under library_dir. Files whose
+        size and mtime are unchanged since the last scan are not opened at all.
+        """
+        known = {
+            row['path']: (row['size'], row['mtime_ns'])
+            for row in self.conn.execute('SELECT path, size, mtime_ns FROM reference_fingerprints')
+        }
+
+        rows = []
+        seen = set()
+        skipped = 0
+        for dirpath, _dirnames, filenames in os.walk(library_dir):
+            for filename in filenames:
+                if os.path.splitext(filename)[1].lower() not in REFERENCE_EXTENSIONS:
+                    continue
+                path = os.path.abspath(os.path.join(dirpath, filename))
+                seen.add(path)
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                if known.get(path) == (st.st_size, st.st_mtime_ns):
+                    skipped += 1
+                    continue
+                try:
+                    fp = fingerprint_file(path)
+                except OSError:
+                    continue
+                rows.append((path, st.st_size, st.st_mtime_ns) + tuple(fp[k] for k in FINGERPRINT_FIELDS))
+
+        library_root = os.path.abspath(library_dir)
+        removed = [(p,) for p in known if p.startswith(library_root + os.sep) and p not in seen]
+
+        with self.conn:
+            self.conn.executemany(
+                'INSERT OR REPLACE INTO reference_fingerprints '
+                '(path, size, mtime_ns, format, width, height, sampling, dqt_hash, dht_hash, '
+                'restart_interval, make, model) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                rows
+            )
+            self.conn.executemany('DELETE FROM reference_fingerprints WHERE path = ?', removed)
+
+        return {'indexed': len(rows), 'unchanged': skipped, 'removed': len(removed)}
+
+    def _candidates(self, target: Dict[str, Any]) -> List[sqlite3.Row]:
+        clauses = []
+        params: List[Any] = []
+        if target['width']:
+            clauses.append('SELECT * FROM reference_fingerprints WHERE format = ? AND width = ? AND height = ?')
+            params += [target['format'], target['width'], target['height']]
+        if target['dqt_hash']:
+            clauses.append('SELECT * FROM reference_fingerprints WHERE dqt_hash = ?')
+            params.append(target['dqt_hash'])
+        if target['model']:
+            clauses.append('SELECT * FROM reference_fingerprints WHERE make IS ? AND model = ?')
+            params += [target['make'], target['model']]
+
+        if not clauses:
+            # Nothing structural survived in the target; fall back to same-format references.
+            return list(self.conn.execute(
+                'SELECT * FROM reference_fingerprints WHERE format IS ?', (target['format'],)
+            ))
+        return list(self.conn.execute(' UNION '.join(clauses), params))
+
+    def rank(self, target_path: str, limit: int = 10) -> List[Dict[str, Any]]:
+        """Returns compatible references for target_path, best first."""
+        target = fingerprint_file(target_path)
+        target_abs = os.path.abspath(target_path)
+
+        ranked = []
+        for row in self._candidates(target):
+            if row['path'] == target_abs:
+                continue
+            result = score_reference(target, dict(row))
+            if result is None:
+                continue
+            ranked.append({'file_path': row['path'], **result})
+
+        ranked.sort(key=lambda r: (-r['score'], r['file_path']))
+        return ranked[:limit]
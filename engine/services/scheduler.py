@@ -0,0 +1,82 @@
+import os
+from concurrent.futures import wait, FIRST_COMPLETED
+from typing import Dict, Any, List, Callable, TypeVar
+
+Job = TypeVar('Job')
+
+# Share of physical memory the batch may plan for when no budget is given
+DEFAULT_BUDGET_FRACTION = 0.5
+# Used when physical memory cannot be queried
+FALLBACK_BUDGET = 2 * 1024 * 1024 * 1024
+
+
+def default_memory_budget() -> int:
+    try:
+        total = os.sysconf('SC_PAGE_SIZE') * os.sysconf('SC_PHYS_PAGES')
+    except (AttributeError, ValueError, OSError):
+        return FALLBACK_BUDGET
+    return int(total * DEFAULT_BUDGET_FRACTION) if total > 0 else FALLBACK_BUDGET
+
+
+def interleave_by_cost(jobs: List[Job], costs: List[int]) -> List[int]:
+    """
+    Job indices alternating largest and smallest remaining: a big job is
+    admitted while memory is free and small ones fill the cores beside it,
+    instead of all the big files landing together at the start or end.
+    """
+    order = sorted(range(len(jobs)), key=lambda i: costs[i], reverse=True)
+    result = []
+    low, high = 0, len(order) - 1
+    while low <= high:
+        result.append(order[low])
+        low += 1
+        if low <= high:
+            result.append(order[high])
+            high -= 1
+    return result
+
+
+def run_within_budget(
+    pool,
+    fn: Callable[[Job], Any],
+    jobs: List[Job],
+    costs: List[int],
+    budget: int,
+    workers: int,
+    on_result: Callable[[Job, Any, BaseException], None]
+) -> Dict[str, Any]:
+    """
+    Submits fn(job) to `pool` only while the estimated peak memory of the
+    running jobs fits the budget and a worker is free. When the next job in
+    line does not fit, later (smaller) ones are backfilled. A job larger than
+    the whole budget still runs, but alone. on_result(job, value, error) is
+    called in the caller's thread as jobs finish.
+
+    Returns admission stats: {budget, peak_estimate, max_concurrency, oversized}.
+    """
+    pending = interleave_by_cost(jobs, costs)
+    running: Dict[Any, int] = {}
+    in_use = 0
+    stats = {'budget': budget, 'peak_estimate': 0, 'max_concurrency': 0, 'oversized': 0}
+    while pending or running:
+        i = 0
+        while i < len(pending) and len(running) < workers:
+            index = pending[i]
+            if running and in_use + costs[index] > budget:
+                i += 1
+                continue
+            del pending[i]
+            if costs[index] > budget:
+                stats['oversized'] += 1
+            running[pool.submit(fn, jobs[index])] = index
+            in_use += costs[index]
+        stats['peak_estimate'] = max(stats['peak_estimate'], in_use)
+        stats['max_concurrency'] = max(stats['max_concurrency'], len(running))
+
+        done, _ = wait(running, return_when=FIRST_COMPLETED)
+        for future in done:
+            index = running.pop(future)
+            in_use -= costs[index]
+            error = future.exception()
+            on_result(jobs[index], None if error else future.result(), error)
+    return stats
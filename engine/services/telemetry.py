@@ -0,0 +1,329 @@
+import os
+import sys
+import json
+import time
+import sqlite3
+from contextlib import contextmanager
+from typing import Dict, Any, Optional, List, Iterator
+
+try:
+    import resource
+except ImportError:  # Not on Windows
+    resource = None
+
+# Path of the telemetry store; unset means runs are not recorded
+TELEMETRY_ENV = 'PHOTO_REPAIR_TELEMETRY'
+# Release tag the app passes down, so trends can be compared across releases
+RELEASE_ENV = 'PHOTO_REPAIR_RELEASE'
+
+# (upper bound in bytes, label); the last bucket is open-ended
+SIZE_BUCKETS = [
+    (1024 * 1024, '<1MB'),
+    (10 * 1024 * 1024, '1-10MB'),
+    (50 * 1024 * 1024, '10-50MB'),
+    (200 * 1024 * 1024, '50-200MB'),
+    (None, '>=200MB'),
+]
+STAGES = ('read', 'repair', 'write')
+# Groups with fewer runs than this (now or in the baseline) are not compared
+MIN_SAMPLES = 5
+# Relative slowdown of a percentile that counts as a regression
+DEFAULT_TOLERANCE = 0.15
+# Records buffered before they are written in one transaction
+FLUSH_EVERY = 200
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    recorded_at REAL NOT NULL,
+    release TEXT,
+    command TEXT NOT NULL,
+    strategy TEXT NOT NULL,
+    format TEXT,
+    input_size INTEGER NOT NULL,
+    bytes_read INTEGER,
+    bytes_written INTEGER,
+    read_s REAL,
+    repair_s REAL,
+    write_s REAL,
+    total_s REAL NOT NULL,
+    peak_rss_delta INTEGER,
+    status TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_runs_strategy ON runs(strategy, recorded_at);
+"""
+
+COLUMNS = (
+    'recorded_at', 'release', 'command', 'strategy', 'format', 'input_size', 'bytes_read', 'bytes_written',
+    'read_s', 'repair_s', 'write_s', 'total_s', 'peak_rss_delta', 'status'
+)
+
+
+def default_store_path() -> Optional[str]:
+    return os.environ.get(TELEMETRY_ENV) or None
+
+
+def _status_kb(field: bytes) -> Optional[int]:
+    """A memory field of /proc/self/status, in bytes (None off Linux)."""
+    try:
+        with open('/proc/self/status', 'rb') as f:
+            for line in f:
+                if line.startswith(field + b':'):
+                    return int(line.split()[1]) * 1024
+    except (OSError, ValueError, IndexError):
+        pass
+    return None
+
+
+def peak_rss() -> Optional[int]:
+    """Peak resident memory of this process so far, in bytes."""
+    # Linux: the high-water mark of this process's own memory. ru_maxrss
+    # survives exec, so a spawned worker would report its parent's peak.
+    peak = _status_kb(b'VmHWM')
+    if peak is not None:
+        return peak
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Kilobytes on Linux, bytes on macOS
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+class JobPeak:
+    """
+    Peak resident memory of one job above the RSS it started with. On Linux
+    the process high-water mark is reset when the job starts, so an earlier,
+    larger job in the same process does not show up in later ones.
+    Elsewhere the peak cannot be isolated per job and delta() is None.
+    """
+
+    def __init__(self):
+        self.start = None
+        try:
+            with open('/proc/self/clear_refs', 'w') as f:
+                f.write('5')
+        except OSError:
+            return
+        self.start = _status_kb(b'VmRSS')
+
+    def delta(self) -> Optional[int]:
+        peak = peak_rss() if self.start is not None else None
+        return None if peak is None else max(0, peak - self.start)
+
+
+class StageTimer:
+    """Wall time per named stage of one job."""
+
+    def __init__(self):
+        self.stages: Dict[str, float] = {}
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.stages[name] = self.stages.get(name, 0.0) + time.perf_counter() - started
+
+
+def run_record(command: str, strategy: str, fmt: Optional[str], input_size: int, status: str,
+               stages: Dict[str, float], bytes_read: Optional[int] = None, bytes_written: Optional[int] = None,
+               peak_delta: Optional[int] = None) -> Dict[str, Any]:
+    record = {
+        'recorded_at': time.time(),
+        'release': os.environ.get(RELEASE_ENV),
+        'command': command,
+        'strategy': strategy,
+        'format': fmt,
+        'input_size': input_size,
+        'bytes_read': bytes_read,
+        'bytes_written': bytes_written,
+        'total_s': round(sum(stages.values()), 6),
+        'peak_rss_delta': peak_delta,
+        'status': status
+    }
+    for name in STAGES:
+        record[f'{name}_s'] = round(stages[name], 6) if name in stages else None
+    return record
+
+
+class TelemetryStore:
+    """Append-only SQLite table of strategy runs, one compact row each."""
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        directory = os.path.dirname(os.path.abspath(db_path))
+        os.makedirs(directory, exist_ok=True)
+        self.conn = sqlite3.connect(db_path)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.executescript(SCHEMA)
+        self._buffer: List[Dict[str, Any]] = []
+
+    def append(self, record: Dict[str, Any]) -> None:
+        self._buffer.append(record)
+        if len(self._buffer) >= FLUSH_EVERY:
+            self.flush()
+
+    def flush(self) -> None:
+        if not self._buffer:
+            return
+        with self.conn:
+            self.conn.executemany(
+                f"INSERT INTO runs ({', '.join(COLUMNS)}) VALUES ({', '.join('?' * len(COLUMNS))})",
+                [tuple(record.get(c) for c in COLUMNS) for record in self._buffer]
+            )
+        self._buffer = []
+
+    def records(self, strategy: Optional[str] = None, release: Optional[str] = None,
+                since: Optional[float] = None) -> List[Dict[str, Any]]:
+        clauses, params = [], []
+        for column, value in (('strategy', strategy), ('release', release)):
+            if value is not None:
+                clauses.append(f'{column} = ?')
+                params.append(value)
+        if since is not None:
+            clauses.append('recorded_at >= ?')
+            params.append(since)
+        where = f" WHERE {' AND '.join(clauses)}" if clauses else ''
+        return [dict(row) for row in self.conn.execute(f'SELECT * FROM runs{where} ORDER BY recorded_at', params)]
+
+    def close(self) -> None:
+        self.flush()
+        self.conn.close()
+
+    def __enter__(self) -> 'TelemetryStore':
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+def open_store(path: Optional[str] = None) -> Optional[TelemetryStore]:
+    """The store at path (default: $PHOTO_REPAIR_TELEMETRY), or None when telemetry is off."""
+    path = path or default_store_path()
+    return TelemetryStore(path) if path else None
+
+
+def record_runs(records: List[Dict[str, Any]], path: Optional[str] = None) -> bool:
+    """
+    Appends finished runs to the store at path (default: $PHOTO_REPAIR_TELEMETRY).
+    Telemetry never fails the command it measures: an unusable store is
+    reported on stderr and the records are dropped. True if they were stored.
+    """
+    try:
+        store = open_store(path)
+        if store is None:
+            return False
+        with store:
+            for record in records:
+                store.append(record)
+        return True
+    except (OSError, sqlite3.Error) as e:
+        print(f"Telemetry not recorded: {e}", file=sys.stderr)
+        return False
+
+
+def size_bucket(size: int) -> str:
+    for bound, label in SIZE_BUCKETS:
+        if bound is None or size < bound:
+            return label
+    return SIZE_BUCKETS[-1][1]
+
+
+def percentile(values: List[float], q: float) -> Optional[float]:
+    """Linearly interpolated q-th percentile (0-100) of the values."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = (len(ordered) - 1) * q / 100
+    low = int(rank)
+    high = min(low + 1, len(ordered) - 1)
+    return ordered[low] + (ordered[high] - ordered[low]) * (rank - low)
+
+
+def summarize(records: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Per (strategy, size bucket): run count, failure rate, wall time
+    percentiles, throughput (MB/s of input) percentiles, mean share of each
+    stage and p90 of the per-job peak memory (above each job's starting RSS).
+    """
+    groups: Dict[tuple, List[Dict[str, Any]]] = {}
+    for record in records:
+        groups.setdefault((record['strategy'], size_bucket(record['input_size'])), []).append(record)
+
+    order = {label: i for i, (_bound, label) in enumerate(SIZE_BUCKETS)}
+    rows = []
+    for (strategy, bucket), runs in sorted(groups.items(), key=lambda item: (item[0][0], order[item[0][1]])):
+        times = [r['total_s'] for r in runs]
+        throughput = [r['input_size'] / r['total_s'] / (1024 * 1024) for r in runs if r['total_s'] > 0]
+        total_time = sum(times) or 1.0
+        peak = percentile([r['peak_rss_delta'] for r in runs if r['peak_rss_delta'] is not None], 90)
+        rows.append({
+            'strategy': strategy,
+            'size_bucket': bucket,
+            'runs': len(runs),
+            'failure_rate': round(sum(1 for r in runs if r['status'] != 'done') / len(runs), 4),
+            'seconds': {f'p{q}': _round(percentile(times, q)) for q in (50, 90, 99)},
+            'mb_per_s': {f'p{q}': _round(percentile(throughput, q)) for q in (10, 50, 90)},
+            'stage_share': {
+                name: round(sum(r[f'{name}_s'] or 0 for r in runs) / total_time, 4) for name in STAGES
+            },
+            'peak_rss_delta_p90': None if peak is None else int(peak)
+        })
+    return rows
+
+
+def _round(value: Optional[float], digits: int = 4) -> Optional[float]:
+    return None if value is None else round(value, digits)
+
+
+def find_regressions(current: List[Dict[str, Any]], baseline: List[Dict[str, Any]],
+                     tolerance: float = DEFAULT_TOLERANCE) -> List[Dict[str, Any]]:
+    """
+    Groups whose p50 or p90 wall time grew, or whose failure rate rose, by
+    more than `tolerance` against the baseline summary. Groups with fewer
+    than MIN_SAMPLES runs on either side are skipped as noise.
+    """
+    previous = {(row['strategy'], row['size_bucket']): row for row in baseline}
+    flagged = []
+    for row in current:
+        before = previous.get((row['strategy'], row['size_bucket']))
+        if not before or row['runs'] < MIN_SAMPLES or before['runs'] < MIN_SAMPLES:
+            continue
+        for q in ('p50', 'p90'):
+            old, new = before['seconds'][q], row['seconds'][q]
+            if old and new and new > old * (1 + tolerance):
+                flagged.append({'strategy': row['strategy'], 'size_bucket': row['size_bucket'], 'metric': f'seconds_{q}',
+                                'baseline': old, 'current': new, 'change': round(new / old - 1, 4)})
+        if row['failure_rate'] > before['failure_rate'] + tolerance:
+            flagged.append({'strategy': row['strategy'], 'size_bucket': row['size_bucket'], 'metric': 'failure_rate',
+                            'baseline': before['failure_rate'], 'current': row['failure_rate'],
+                            'change': round(row['failure_rate'] - before['failure_rate'], 4)})
+    return flagged
+
+
+def perf_report(
+    store_path: str,
+    strategy: Optional[str] = None,
+    release: Optional[str] = None,
+    since: Optional[float] = None,
+    baseline_path: Optional[str] = None,
+    save_baseline: Optional[str] = None,
+    tolerance: float = DEFAULT_TOLERANCE
+) -> Dict[str, Any]:
+    """Summary of the recorded runs, optionally compared with (or saved as) a baseline JSON file."""
+    if not os.path.exists(store_path):
+        raise FileNotFoundError(f"Telemetry store not found: {store_path}")
+    with TelemetryStore(store_path) as store:
+        records = store.records(strategy, release, since)
+    summary = summarize(records)
+    report: Dict[str, Any] = {'runs': len(records), 'summary': summary}
+
+    if baseline_path:
+        with open(baseline_path, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        report['baseline'] = {k: baseline.get(k) for k in ('release', 'saved_at')}
+        report['regressions'] = find_regressions(summary, baseline['summary'], tolerance)
+    if save_baseline:
+        with open(save_baseline, 'w', encoding='utf-8') as f:
+            json.dump({'release': release or os.environ.get(RELEASE_ENV), 'saved_at': time.time(), 'summary': summary}, f)
+    return report
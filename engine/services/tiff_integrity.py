@@ -0,0 +1,211 @@
+import os
+import math
+import mmap
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Any, Optional, List, Tuple
+
+try:
+    import numpy as np
+except ImportError:  # Optional: byte histograms fall back to bytes.count
+    np = None
+
+from strategies.tiff_ifd_rebuilder import (
+    _detect_byte_order,
+    _read_u16,
+    _read_u32,
+    _read_ifd_entries,
+    _get_entry_values,
+    TAG_STRIP_OFFSETS,
+    TAG_STRIP_BYTE_COUNTS,
+    TAG_TILE_OFFSETS,
+    TAG_TILE_BYTE_COUNTS,
+    TAG_SUBFILE_TYPE,
+)
+
+TAG_IMAGE_WIDTH = 0x0100
+TAG_IMAGE_LENGTH = 0x0101
+TAG_COMPRESSION = 0x0103
+TAG_SUB_IFDS = 0x014A
+# Baseline/old-style JPEG and lossy DNG: every strip/tile is a JPEG stream
+JPEG_COMPRESSIONS = {6, 7, 34892}
+# Guards against cyclic or absurd IFD chains
+MAX_IFDS = 64
+
+# A segment this full of 0x00/0xFF bytes is an erased or unwritten region
+BLANK_FILL = 0.95
+# Bits per byte below which sensor data cannot be real (compressed data is ~7.5+)
+MIN_ENTROPY = 1.0
+# Recoverability below which a file is not worth a full repair
+HOPELESS_BELOW = 0.25
+# Total segment bytes under which statistics are computed in-process
+PARALLEL_MIN_BYTES = 16 * 1024 * 1024
+SEGMENTS_PER_TASK = 64
+
+OK, MISSING, TRUNCATED, EMPTY, BLANK, LOW_ENTROPY, BAD_MARKERS, OVERLAP = (
+    'ok', 'missing', 'truncated', 'empty', 'blank', 'low_entropy', 'bad_markers', 'overlap'
+)
+
+
+def _ifd_values(view, by_tag: Dict[int, Dict], tag: int, byte_order: str) -> List[int]:
+    entry = by_tag.get(tag)
+    return _get_entry_values(view, entry, byte_order) if entry else []
+
+
+def read_layout(view) -> Optional[Dict[str, Any]]:
+    """
+    Every image of a TIFF/RAW (the IFD0 chain and SubIFDs) with its strip or
+    tile table: {byte_order, images: [{ifd_offset, kind, width, height,
+    compression, subfile_type, segments: [(offset, length)]}]}.
+    """
+    byte_order = _detect_byte_order(bytes(view[:4]))
+    if not byte_order or len(view) < 8:
+        return None
+
+    images = []
+    queue = [_read_u32(view, 4, byte_order)]
+    visited = set()
+    while queue and len(visited) < MAX_IFDS:
+        offset = queue.pop(0)
+        if not offset or offset in visited or offset + 2 > len(view):
+            continue
+        visited.add(offset)
+        entries = _read_ifd_entries(view, offset, byte_order)
+        by_tag = {e['tag']: e for e in entries}
+        queue.extend(_ifd_values(view, by_tag, TAG_SUB_IFDS, byte_order))
+        link = offset + 2 + _read_u16(view, offset, byte_order) * 12
+        if link + 4 <= len(view):
+            queue.append(_read_u32(view, link, byte_order))
+
+        if TAG_TILE_OFFSETS in by_tag:
+            kind, offsets_tag, counts_tag = 'tile', TAG_TILE_OFFSETS, TAG_TILE_BYTE_COUNTS
+        elif TAG_STRIP_OFFSETS in by_tag:
+            kind, offsets_tag, counts_tag = 'strip', TAG_STRIP_OFFSETS, TAG_STRIP_BYTE_COUNTS
+        else:
+            continue
+        offsets = _ifd_values(view, by_tag, offsets_tag, byte_order)
+        counts = _ifd_values(view, by_tag, counts_tag, byte_order)
+        images.append({
+            'ifd_offset': offset,
+            'kind': kind,
+            'width': (_ifd_values(view, by_tag, TAG_IMAGE_WIDTH, byte_order) or [None])[0],
+            'height': (_ifd_values(view, by_tag, TAG_IMAGE_LENGTH, byte_order) or [None])[0],
+            'compression': (_ifd_values(view, by_tag, TAG_COMPRESSION, byte_order) or [1])[0],
+            'subfile_type': (_ifd_values(view, by_tag, TAG_SUBFILE_TYPE, byte_order) or [0])[0],
+            'segments': list(zip(offsets, counts))
+        })
+    return {'byte_order': byte_order, 'images': images}
+
+
+def _histogram(block) -> List[int]:
+    if np is not None:
+        return np.bincount(np.frombuffer(block, dtype=np.uint8), minlength=256).tolist()
+    data = bytes(block)
+    return [data.count(bytes([value])) for value in range(256)]
+
+
+def segment_stats(view, offset: int, length: int, compression: int) -> Dict[str, Any]:
+    """Entropy, 0x00/0xFF fill and boundary checks of one strip/tile, classified by its worst problem."""
+    size = len(view)
+    if length == 0:
+        return {'status': EMPTY, 'present': 0}
+    if offset >= size:
+        return {'status': MISSING, 'present': 0}
+    present = min(length, size - offset)
+    block = memoryview(view)[offset:offset + present]
+    histogram = _histogram(block)
+    entropy = -sum(c / present * math.log2(c / present) for c in histogram if c)
+    fill = (histogram[0x00] + histogram[0xFF]) / present
+    stats = {'present': present, 'entropy': round(entropy, 3), 'fill': round(fill, 3)}
+    block.release()
+
+    if present < length:
+        status = TRUNCATED
+    elif fill >= BLANK_FILL:
+        status = BLANK
+    elif entropy < MIN_ENTROPY:
+        status = LOW_ENTROPY
+    elif compression in JPEG_COMPRESSIONS and (bytes(view[offset:offset + 2]) != b'\xff\xd8' or bytes(view[offset + length - 2:offset + length]) != b'\xff\xd9'):
+        status = BAD_MARKERS
+    else:
+        status = OK
+    return {'status': status, **stats}
+
+
+def _stats_task(path: str, segments: List[Tuple[int, int]], compression: int) -> List[Dict[str, Any]]:
+    """Worker: statistics for a batch of segments over a read-only mapping of the file."""
+    with open(path, 'rb') as f:
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as view:
+            return [segment_stats(view, offset, length, compression) for offset, length in segments]
+
+
+def _damage_runs(stats: List[Dict[str, Any]]) -> List[List[Any]]:
+    """Consecutive non-ok segments as [first_index, last_index, status]."""
+    runs: List[List[Any]] = []
+    for i, entry in enumerate(stats):
+        if entry['status'] == OK:
+            continue
+        if runs and runs[-1][1] == i - 1 and runs[-1][2] == entry['status']:
+            runs[-1][1] = i
+        else:
+            runs.append([i, i, entry['status']])
+    return runs
+
+
+def scan_tiff(
+    target,
+    reference=None,
+    path: Optional[str] = None,
+    workers: Optional[int] = None
+) -> Dict[str, Any]:
+    """
+    Integrity scan of the sensor data of a TIFF/RAW. The strip/tile table of
+    the main (largest) image is read from the target, or from a reference
+    of the same camera when the target's own IFDs are damaged; every segment
+    is then checked in the target for bounds, overlap, 0x00/0xFF fill,
+    entropy and (JPEG-compressed data) SOI/EOI markers.
+
+    With `path` (the target's file) and enough data, segments are checked by
+    a process pool over read-only mmaps of it. Returns {score, verdict,
+    damage, segments, ...}; score is the share of declared image bytes in
+    intact segments, and 'hopeless' files are not worth a full repair.
+    """
+    layout = read_layout(reference if reference is not None else target)
+    if not layout or not layout['images']:
+        return {'score': 0.0, 'verdict': 'hopeless', 'error': 'No strip or tile table found', 'damage': []}
+    main = max(layout['images'], key=lambda image: ((image['width'] or 0) * (image['height'] or 0), sum(n for _o, n in image['segments'])))
+    segments = main['segments']
+    total = sum(length for _offset, length in segments)
+
+    workers = min(workers or os.cpu_count() or 1, -(-len(segments) // SEGMENTS_PER_TASK))
+    if path and workers > 1 and total >= PARALLEL_MIN_BYTES:
+        batches = [segments[i:i + SEGMENTS_PER_TASK] for i in range(0, len(segments), SEGMENTS_PER_TASK)]
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            per_batch = pool.map(_stats_task, [path] * len(batches), batches, [main['compression']] * len(batches))
+            stats = [entry for batch in per_batch for entry in batch]
+    else:
+        stats = [segment_stats(target, offset, length, main['compression']) for offset, length in segments]
+
+    # Two segments claiming the same bytes: the later one is wrong (or both are)
+    previous_end = -1
+    for index in sorted(range(len(segments)), key=lambda i: segments[i][0]):
+        offset, length = segments[index]
+        if length and offset < previous_end and stats[index]['status'] == OK:
+            stats[index]['status'] = OVERLAP
+        previous_end = max(previous_end, offset + length)
+
+    intact = sum(length for (_offset, length), entry in zip(segments, stats) if entry['status'] == OK)
+    score = round(intact / total, 4) if total else 0.0
+    verdict = 'intact' if total and intact == total else 'partial' if score >= HOPELESS_BELOW else 'hopeless'
+    counts: Dict[str, int] = {}
+    for entry in stats:
+        counts[entry['status']] = counts.get(entry['status'], 0) + 1
+    return {
+        'score': score,
+        'verdict': verdict,
+        'layout_from': 'reference' if reference is not None else 'target',
+        'image': {k: main[k] for k in ('ifd_offset', 'kind', 'width', 'height', 'compression')},
+        'segment_count': len(segments),
+        'status_counts': counts,
+        'damage': _damage_runs(stats),
+        'segments': [{'offset': offset, 'length': length, **entry} for (offset, length), entry in zip(segments, stats)]
+    }
@@ -0,0 +1,303 @@
+import os
+import time
+import sqlite3
+import hashlib
+from typing import Dict, Any, Optional, List, Tuple, Callable
+
+from lib.budget import DEFAULT_JOB_TIMEOUT
+from lib.validation import validate_output, EXTENSION_FORMATS
+from services.batch_journal import FAILED
+from services.batch_runner import repair_data, write_job, output_path_for
+from services.fs_recovery import sniff_format
+from services.pipeline import read_input
+from services.telemetry import StageTimer, JobPeak, TelemetryStore, run_record, open_store
+from strategies.registry import get_extension, get_head_bytes, load_strategy
+
+INDEX_NAME = '.watch-index.sqlite'
+
+# Bytes hashed from each end of a file for its quick hash
+QUICK_HASH_SPAN = 64 * 1024
+# Files modified this recently may still be being copied in; they wait a pass
+DEFAULT_SETTLE_SECONDS = 2.0
+DEFAULT_INTERVAL = 10.0
+# Failed files are tried again once their failure is this old (the failure
+# may have been transient: a share dropping out, a file still locked)
+DEFAULT_RETRY_FAILED = 15 * 60.0
+# Index rows written per transaction
+COMMIT_EVERY = 500
+
+# HEALTHY: already valid, nothing to repair; UNSUPPORTED: not the strategy's format
+HEALTHY, UNSUPPORTED = 'healthy', 'unsupported'
+
+# Keyed by (dir, name): one directory's rows are one index range, so a pass
+# only ever holds the directory it is walking in memory.
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS processed_files (
+    dir TEXT NOT NULL,
+    name TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    quick_hash TEXT NOT NULL,
+    strategy TEXT,
+    status TEXT NOT NULL,
+    output_path TEXT,
+    error TEXT,
+    processed_at REAL NOT NULL,
+    PRIMARY KEY (dir, name)
+) WITHOUT ROWID;
+"""
+
+
+def quick_digest(path: str, size: int) -> str:
+    """BLAKE2b-128 of the size and the first and last QUICK_HASH_SPAN bytes: tells a real change from a touch."""
+    digest = hashlib.blake2b(str(size).encode() + b':', digest_size=16)
+    with open(path, 'rb') as f:
+        digest.update(f.read(QUICK_HASH_SPAN))
+        if size > 2 * QUICK_HASH_SPAN:
+            f.seek(size - QUICK_HASH_SPAN)
+            digest.update(f.read(QUICK_HASH_SPAN))
+        elif size > QUICK_HASH_SPAN:
+            digest.update(f.read())
+    return digest.hexdigest()
+
+
+class WatchIndex:
+    """SQLite record of every file a watch-folder pass has handled, and with what result."""
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        self.conn = sqlite3.connect(db_path)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.executescript(SCHEMA)
+        self._pending = 0
+
+    def close(self) -> None:
+        self.conn.commit()
+        self.conn.close()
+
+    def known(self, directory: str) -> Dict[str, sqlite3.Row]:
+        return {row['name']: row for row in self.conn.execute('SELECT * FROM processed_files WHERE dir = ?', (directory,))}
+
+    def record(self, directory: str, name: str, size: int, mtime_ns: int, quick_hash: str, strategy: str,
+               outcome: Dict[str, Any]) -> None:
+        self.conn.execute(
+            'INSERT OR REPLACE INTO processed_files '
+            '(dir, name, size, mtime_ns, quick_hash, strategy, status, output_path, error, processed_at) '
+            'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+            (directory, name, size, mtime_ns, quick_hash, strategy, outcome['status'],
+             outcome.get('output_path'), outcome.get('error'), time.time())
+        )
+        self._commit_soon()
+
+    def touch(self, directory: str, name: str, mtime_ns: int) -> None:
+        """Same content under a new mtime: remember the mtime so the next pass skips the file on stat alone."""
+        self.conn.execute('UPDATE processed_files SET mtime_ns = ? WHERE dir = ? AND name = ?', (mtime_ns, directory, name))
+        self._commit_soon()
+
+    def remove(self, directory: str, names: List[str]) -> None:
+        self.conn.executemany('DELETE FROM processed_files WHERE dir = ? AND name = ?', [(directory, n) for n in names])
+        self._commit_soon(len(names))
+
+    def remove_directories_except(self, root: str, visited: set) -> int:
+        """Drops the rows of directories under root that no longer exist."""
+        gone = [
+            row['dir'] for row in self.conn.execute('SELECT DISTINCT dir FROM processed_files')
+            if (row['dir'] == root or row['dir'].startswith(root + os.sep)) and row['dir'] not in visited
+        ]
+        for directory in gone:
+            self.conn.execute('DELETE FROM processed_files WHERE dir = ?', (directory,))
+        self.conn.commit()
+        return len(gone)
+
+    def _commit_soon(self, rows: int = 1) -> None:
+        self._pending += rows
+        if self._pending >= COMMIT_EVERY:
+            self.conn.commit()
+            self._pending = 0
+
+
+def _walk(input_dir: str, exclude: Optional[str]):
+    """(directory, [DirEntry of its files]) for every non-hidden directory, via scandir (no extra stat calls)."""
+    stack = [input_dir]
+    while stack:
+        directory = stack.pop()
+        files = []
+        try:
+            with os.scandir(directory) as entries:
+                for entry in entries:
+                    if entry.name.startswith('.'):
+                        continue
+                    if entry.is_dir(follow_symlinks=False):
+                        if os.path.abspath(entry.path) != exclude:
+                            stack.append(entry.path)
+                    elif entry.is_file():
+                        files.append(entry)
+        except OSError:
+            continue
+        yield directory, files
+
+
+def _still_current(row: sqlite3.Row, strategy_name: str, retry_before: float) -> bool:
+    """Whether a file's index row still settles it: handled by this strategy, and not a failure due for a retry."""
+    return row['strategy'] == strategy_name and (row['status'] != FAILED or row['processed_at'] >= retry_before)
+
+
+def process_file(strategy, input_path: str, output_path: str, reference: Optional[bytes], fmt: Optional[str],
+                 head_bytes: Optional[int], triage_below: Optional[float],
+                 job_timeout: Optional[float], timer: Optional[StageTimer] = None) -> Dict[str, Any]:
+    """Analyzes one new or changed file and repairs it when it needs it."""
+    timer = timer or StageTimer()
+    try:
+        with timer.stage('read'):
+            data = read_input(input_path, head_bytes)
+    except OSError as e:
+        return {'status': FAILED, 'error': str(e)}
+    if fmt and sniff_format(data[:16]) not in (fmt, None):
+        return {'status': UNSUPPORTED}
+    with timer.stage('repair'):
+        # Head-only strategies cannot judge the whole file; they always run
+        if fmt and head_bytes is None and data and validate_output(data, fmt)['valid']:
+            return {'status': HEALTHY}
+        output, outcome = repair_data(strategy, data, reference, fmt, triage_below, job_timeout, input_path)
+    with timer.stage('write'):
+        return write_job(output, outcome, output_path)
+
+
+def scan_pass(
+    index: WatchIndex,
+    input_dir: str,
+    strategy_name: str,
+    output_dir: str,
+    reference: Optional[bytes] = None,
+    settle_seconds: float = DEFAULT_SETTLE_SECONDS,
+    triage_below: Optional[float] = None,
+    job_timeout: Optional[float] = DEFAULT_JOB_TIMEOUT,
+    telemetry: Optional[TelemetryStore] = None,
+    retry_failed_after: float = DEFAULT_RETRY_FAILED
+) -> Dict[str, Any]:
+    """
+    One pass over input_dir. Each file is first checked by stat alone: if
+    its size and mtime match the index it is skipped without being opened.
+    Only rows written by this strategy count, and failures are retried once
+    they are retry_failed_after seconds old.
+    Otherwise a quick hash (size, head and tail) tells a touched file from a
+    changed one; new and changed files are checked against the strategy's
+    format, left alone if they already validate, and repaired otherwise.
+    Files modified within settle_seconds are left for the next pass, and
+    index rows of deleted files are dropped. Repairs are recorded in the
+    telemetry store when one is given.
+    """
+    strategy = load_strategy(strategy_name)
+    extension = get_extension(strategy_name)
+    fmt = EXTENSION_FORMATS.get(extension)
+    head_bytes = get_head_bytes(strategy_name)
+    root = os.path.abspath(input_dir)
+    exclude = os.path.abspath(output_dir)
+
+    stats = {'seen': 0, 'unchanged': 0, 'touched': 0, 'settling': 0, 'removed': 0, 'processed': 0}
+    outcomes: Dict[str, int] = {}
+    visited = set()
+    settled_before = time.time_ns() - int(settle_seconds * 1e9)
+    retry_before = time.time() - retry_failed_after
+    for directory, entries in _walk(root, exclude):
+        visited.add(directory)
+        known = index.known(directory)
+        for entry in entries:
+            stats['seen'] += 1
+            row = known.pop(entry.name, None)
+            try:
+                st = entry.stat()
+            except OSError:
+                continue
+            if row is not None and not _still_current(row, strategy_name, retry_before):
+                row = None
+            if row is not None and (row['size'], row['mtime_ns']) == (st.st_size, st.st_mtime_ns):
+                stats['unchanged'] += 1
+                continue
+            if st.st_mtime_ns > settled_before:
+                stats['settling'] += 1
+                continue
+            try:
+                quick_hash = quick_digest(entry.path, st.st_size)
+            except OSError:
+                continue
+            if row is not None and row['quick_hash'] == quick_hash:
+                index.touch(directory, entry.name, st.st_mtime_ns)
+                stats['touched'] += 1
+                continue
+
+            timer, memory = StageTimer(), JobPeak()
+            outcome = process_file(strategy, entry.path, output_path_for(entry.path, root, output_dir, extension),
+                                   reference, fmt, head_bytes, triage_below, job_timeout, timer)
+            if telemetry is not None and outcome['status'] not in (HEALTHY, UNSUPPORTED):
+                telemetry.append(run_record(
+                    'watch', strategy_name, fmt, st.st_size, outcome['status'], timer.stages,
+                    bytes_read=min(st.st_size, head_bytes or st.st_size),
+                    bytes_written=outcome.get('output_size'), peak_delta=memory.delta()
+                ))
+            index.record(directory, entry.name, st.st_size, st.st_mtime_ns, quick_hash, strategy_name, outcome)
+            stats['processed'] += 1
+            outcomes[outcome['status']] = outcomes.get(outcome['status'], 0) + 1
+        if known:
+            # Whatever is left in this directory's rows was deleted
+            index.remove(directory, list(known))
+            stats['removed'] += len(known)
+    stats['removed'] += index.remove_directories_except(root, visited)
+    return {**stats, 'outcomes': outcomes}
+
+
+def watch(
+    input_dir: str,
+    strategy_name: str,
+    output_dir: str,
+    index_path: Optional[str] = None,
+    reference_path: Optional[str] = None,
+    interval: float = DEFAULT_INTERVAL,
+    passes: Optional[int] = None,
+    settle_seconds: float = DEFAULT_SETTLE_SECONDS,
+    triage_below: Optional[float] = None,
+    job_timeout: Optional[float] = DEFAULT_JOB_TIMEOUT,
+    on_pass: Optional[Callable[[Dict[str, Any]], None]] = None,
+    telemetry_path: Optional[str] = None
+) -> Tuple[int, Dict[str, Any]]:
+    """
+    Polls input_dir with scan_pass every `interval` seconds (`passes` times,
+    or until interrupted). Plain polling works on network shares and every
+    OS alike. Returns (passes run, result of the last pass).
+    """
+    if not os.path.isdir(input_dir):
+        raise FileNotFoundError(f"Input directory not found: {input_dir}")
+    if load_strategy(strategy_name).requires_reference and not reference_path:
+        return 0, {"success": False, "error": f"Strategy {strategy_name} requires a reference file"}
+    reference = None
+    if reference_path:
+        with open(reference_path, 'rb') as f:
+            reference = f.read()
+    os.makedirs(output_dir, exist_ok=True)
+
+    index = WatchIndex(index_path or os.path.join(output_dir, INDEX_NAME))
+    telemetry = open_store(telemetry_path)
+    count, last = 0, {}
+    try:
+        while passes is None or count < passes:
+            if count:
+                time.sleep(interval)
+            started = time.perf_counter()
+            last = scan_pass(index, input_dir, strategy_name, output_dir, reference, settle_seconds, triage_below,
+                             job_timeout, telemetry)
+            index.conn.commit()
+            if telemetry is not None:
+                telemetry.flush()
+            last['pass'] = count
+            last['seconds'] = round(time.perf_counter() - started, 3)
+            count += 1
+            if on_pass:
+                on_pass(last)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        index.close()
+        if telemetry is not None:
+            telemetry.close()
+    return count, last
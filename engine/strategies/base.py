@@ -1,5 +1,58 @@
+import os
+import shutil
+import tempfile
 from abc import ABC, abstractmethod
-from typing import Dict, Any, Optional
+from typing import Dict, Any, Optional, Tuple, Union, Sequence
+
+# Bytes-like input accepted by the buffer API (bytes, bytearray, memoryview, mmap)
+Buffer = Union[bytes, bytearray, memoryview]
+
+# A repaired file: one bytes-like object, or a sequence of parts written back
+# to back (lets strategies splice slices of the input without concatenating).
+RepairOutput = Union[bytes, bytearray, memoryview, Sequence[Buffer]]
+
+
+def output_size(output: RepairOutput) -> int:
+    if isinstance(output, (bytes, bytearray, memoryview)):
+        return len(output)
+    return sum(len(part) for part in output)
+
+
+def write_output(output: RepairOutput, output_path: str) -> None:
+    """Writes a buffer-API result to its final location in one pass."""
+    with open(output_path, 'wb') as f:
+        if isinstance(output, (bytes, bytearray, memoryview)):
+            f.write(output)
+        else:
+            f.writelines(output)
+
+
+# Suffix of in-flight atomic writes; anything left with it is from a crashed run
+PARTIAL_SUFFIX = '.partial'
+
+
+def write_output_atomic(output: RepairOutput, output_path: str) -> None:
+    """
+    write_output() through a temporary file in the same directory, synced and
+    then renamed over output_path: the final path only ever holds a complete
+    file, even if the process dies mid-write.
+    """
+    directory, filename = os.path.split(os.path.abspath(output_path))
+    fd, temp_path = tempfile.mkstemp(prefix=f".{filename}.", suffix=PARTIAL_SUFFIX, dir=directory)
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            if isinstance(output, (bytes, bytearray, memoryview)):
+                f.write(output)
+            else:
+                f.writelines(output)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, output_path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
 
 class BaseStrategy(ABC):
     @property
@@ -7,19 +60,61 @@ class BaseStrategy(ABC):
     def name(self) -> str:
         """Name of the strategy"""
         pass
-        
+
     @property
     @abstractmethod
     def requires_reference(self) -> bool:
         """Does it need a reference file?"""
         pass
-        
+
     @abstractmethod
     def can_repair(self, analysis_result: Dict[str, Any]) -> bool:
         """Given an analysis result, check if this strategy applies."""
         pass
-        
+
     @abstractmethod
     def repair(self, input_path: str, output_path: str, reference_path: Optional[str] = None) -> Dict[str, Any]:
         """Perform the actual repair logic. Should return a dictionary with results."""
         pass
+
+    def repair_buffer(self, data: Buffer, reference: Optional[Buffer] = None) -> Tuple[Optional[RepairOutput], Dict[str, Any]]:
+        """
+        Buffer-level repair: takes the input (and reference) as bytes-like
+        objects and returns (output, result). `output` is None when
+        result["success"] is False; result never contains an output_path.
+
+        Strategies should override this. The default round-trips through
+        temporary files so every strategy supports the API.
+        """
+        temp_dir = tempfile.mkdtemp(prefix='prs-buffer-')
+        try:
+            input_path = os.path.join(temp_dir, 'input')
+            output_path = os.path.join(temp_dir, 'output')
+            reference_path = None
+            with open(input_path, 'wb') as f:
+                f.write(data)
+            if reference is not None:
+                reference_path = os.path.join(temp_dir, 'reference')
+                with open(reference_path, 'wb') as f:
+                    f.write(reference)
+
+            result = self.repair(input_path, output_path, reference_path)
+            result.pop('output_path', None)
+            if not result.get('success'):
+                return None, result
+            with open(output_path, 'rb') as f:
+                return f.read(), result
+        finally:
+            shutil.rmtree(temp_dir, ignore_errors=True)
+
+    def prepare_target(self, data: Buffer) -> Any:
+        """
+        Parses whatever the strategy needs from the damaged input alone (e.g.
+        where its bitstream starts). A job that tries many references on one
+        target calls this once and passes the result to repair_prepared().
+        """
+        return None
+
+    def repair_prepared(self, data: Buffer, prepared: Any, reference: Optional[Buffer] = None) -> Tuple[Optional[RepairOutput], Dict[str, Any]]:
+        """repair_buffer() reusing the result of prepare_target(data)."""
+        return self.repair_buffer(data, reference)
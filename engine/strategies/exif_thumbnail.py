@@ -0,0 +1,138 @@
+import os
+from typing import Dict, Any, Optional, Tuple
+
+from lib.jpeg_header import parse_jpeg_header, EXIF_PREFIX
+from .base import BaseStrategy, Buffer, RepairOutput, write_output
+from .tiff_ifd_rebuilder import (
+    _detect_byte_order,
+    _read_u16,
+    _read_u32,
+    _read_ifd_entries,
+    _get_entry_values,
+)
+
+# Bytes read from the head of the file. APP1 is capped at 64 KB by its length
+# field, so the EXIF block (thumbnail included) normally ends well inside it.
+HEAD_READ_LIMIT = 128 * 1024
+
+TAG_JPEG_INTERCHANGE_FORMAT = 0x0201
+TAG_JPEG_INTERCHANGE_FORMAT_LENGTH = 0x0202
+
+
+def _first_value(tiff, by_tag: Dict[int, Dict], tag: int, byte_order: str) -> Optional[int]:
+    entry = by_tag.get(tag)
+    values = _get_entry_values(tiff, entry, byte_order) if entry else []
+    return values[0] if values else None
+
+
+def locate_thumbnail(head: bytes) -> Dict[str, Any]:
+    """
+    Finds the EXIF thumbnail of a JPEG from the head of the file: the APP1
+    TIFF structure is located by walking the marker segments (or, when the
+    marker stream is damaged, by searching for the Exif prefix), then IFD1
+    gives JPEGInterchangeFormat/Length. Offsets in it are relative to the
+    TIFF header, so the result is returned as an absolute file offset:
+    {offset, length, located_by}, or {error}.
+    """
+    header = parse_jpeg_header(head, HEAD_READ_LIMIT)
+    if header and header['exif'] is not None:
+        tiff_start, located_by = header['exif_offset'], 'marker_walk'
+    else:
+        found = head.find(EXIF_PREFIX)
+        if found == -1:
+            return {'error': 'No EXIF APP1 segment in the file head'}
+        tiff_start, located_by = found + len(EXIF_PREFIX), 'exif_search'
+
+    # The thumbnail's offset may point past the head; only the IFDs must be in it
+    tiff = memoryview(head)[tiff_start:]
+    byte_order = _detect_byte_order(bytes(tiff[:4]))
+    if not byte_order or len(tiff) < 8:
+        return {'error': 'EXIF block has no valid TIFF header'}
+
+    ifd0 = _read_u32(tiff, 4, byte_order)
+    if ifd0 + 2 > len(tiff):
+        return {'error': 'EXIF IFD0 lies outside the file head'}
+    link = ifd0 + 2 + _read_u16(tiff, ifd0, byte_order) * 12
+    if link + 4 > len(tiff):
+        return {'error': 'EXIF IFD0 is truncated'}
+    ifd1 = _read_u32(tiff, link, byte_order)
+    if not ifd1 or ifd1 + 2 > len(tiff):
+        return {'error': 'EXIF has no IFD1 (no thumbnail)'}
+
+    by_tag = {e['tag']: e for e in _read_ifd_entries(tiff, ifd1, byte_order)}
+    offset = _first_value(tiff, by_tag, TAG_JPEG_INTERCHANGE_FORMAT, byte_order)
+    length = _first_value(tiff, by_tag, TAG_JPEG_INTERCHANGE_FORMAT_LENGTH, byte_order)
+    if not offset or not length:
+        return {'error': 'IFD1 does not describe a JPEG thumbnail'}
+    return {'offset': tiff_start + offset, 'length': length, 'located_by': located_by}
+
+
+def _check_thumbnail(thumbnail, location: Dict[str, Any]) -> Tuple[Optional[Buffer], Dict[str, Any]]:
+    if len(thumbnail) < location['length']:
+        return None, {"success": False, "error": "Thumbnail extends past the end of the file"}
+    if bytes(thumbnail[:2]) != b'\xff\xd8':
+        return None, {"success": False, "error": "Thumbnail does not start with SOI"}
+    return thumbnail, {
+        "success": True,
+        "located_by": location['located_by'],
+        "thumbnail_offset": location['offset'],
+        "extracted_size_bytes": location['length'],
+        "eoi_present": bytes(thumbnail[-2:]) == b'\xff\xd9'
+    }
+
+
+class ExifThumbnailStrategy(BaseStrategy):
+    @property
+    def name(self) -> str:
+        return "exif-thumbnail-rescue"
+
+    @property
+    def requires_reference(self) -> bool:
+        return False
+
+    def can_repair(self, analysis_result: Dict[str, Any]) -> bool:
+        strats = analysis_result.get('suggestedStrategies', [])
+        return any(s.get('strategy') == 'exif-thumbnail-rescue' for s in strats)
+
+    def repair(self, input_path: str, output_path: str, reference_path: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Writes out the EXIF thumbnail of a JPEG whose main bitstream is lost.
+        Only the head of the file is read, plus one read of the thumbnail
+        if it lies beyond it, so slow or remote storage is barely touched.
+        """
+        if not os.path.exists(input_path):
+            raise FileNotFoundError(f"Input file not found: {input_path}")
+
+        with open(input_path, 'rb') as f:
+            head = f.read(HEAD_READ_LIMIT)
+            location = locate_thumbnail(head)
+            if 'error' in location:
+                return {"success": False, "error": location['error']}
+            start, end = location['offset'], location['offset'] + location['length']
+            if end <= len(head):
+                thumbnail = memoryview(head)[start:end]
+            else:
+                f.seek(start)
+                thumbnail = f.read(location['length'])
+
+        output, result = _check_thumbnail(thumbnail, location)
+        if output is None:
+            return result
+        write_output(output, output_path)
+        return {**result, "output_path": output_path}
+
+    def repair_buffer(self, data: Buffer, reference: Optional[Buffer] = None) -> Tuple[Optional[RepairOutput], Dict[str, Any]]:
+        """
+        In-memory variant of repair; `data` may be just the head of the file.
+        A thumbnail running past the end of `data` fails with `needs_bytes`,
+        the length to read from the start of the file to reach its end.
+        """
+        view = memoryview(data)
+        location = locate_thumbnail(bytes(view[:HEAD_READ_LIMIT]))
+        if 'error' in location:
+            return None, {"success": False, "error": location['error']}
+        end = location['offset'] + location['length']
+        output, result = _check_thumbnail(view[location['offset']:end], location)
+        if output is None and end > len(view):
+            result['needs_bytes'] = end
+        return output, result
@@ -1,8 +1,13 @@
 import os
-from typing import Dict, Any, Optional
-from .base import BaseStrategy
+from typing import Dict, Any, Optional, Tuple, List
+from .base import BaseStrategy, Buffer, RepairOutput, output_size, write_output
 
 class HeaderGraftingStrategy(BaseStrategy):
+    def __init__(self):
+        # Parsed reference headers keyed by (path, size, mtime), so a batch that
+        # grafts many targets onto one reference only reads and parses it once.
+        self._reference_cache: Dict[Tuple[str, int, int], Optional[bytes]] = {}
+
     @property
     def name(self) -> str:
         return "header-grafting"
@@ -81,57 +86,95 @@ class HeaderGraftingStrategy(BaseStrategy):
                 
         return -1
 
-    def repair(self, input_path: str, output_path: str, reference_path: Optional[str] = None) -> Dict[str, Any]:
-        """
-        Splices the functional header of the reference file with the bitstream of the corrupt input file.
-        """
-        if not reference_path or not os.path.exists(reference_path):
-            raise FileNotFoundError(f"Reference file is required and must exist: {reference_path}")
-            
-        if not os.path.exists(input_path):
-            raise FileNotFoundError(f"Input file not found: {input_path}")
-            
-        with open(reference_path, 'rb') as f:
-            ref_data = f.read()
-            
-        with open(input_path, 'rb') as f:
-            target_data = f.read()
-            
-        # 1. Extract Header from Reference
+    def _parse_reference(self, ref_data: bytes) -> Optional[bytes]:
+        """Returns everything up to the end of the reference's SOS header, or None if it has none."""
         ref_sos_idx = self._find_sos(ref_data)
-        if ref_sos_idx == -1:
-            return {
+        return ref_data[:ref_sos_idx] if ref_sos_idx != -1 else None
+
+    def _reference_header(self, reference_path: str) -> Optional[bytes]:
+        st = os.stat(reference_path)
+        key = (os.path.abspath(reference_path), st.st_size, st.st_mtime_ns)
+        if key in self._reference_cache:
+            return self._reference_cache[key]
+
+        with open(reference_path, 'rb') as f:
+            healthy_header = self._parse_reference(f.read())
+        self._reference_cache[key] = healthy_header
+        return healthy_header
+
+    def _graft(self, target_data: bytes, healthy_header: Optional[bytes], target_sos_idx: Optional[int] = None) -> Tuple[Optional[List[Buffer]], Dict[str, Any]]:
+        if healthy_header is None:
+            return None, {
                 "success": False,
                 "error": "Could not identify SOS marker in Reference File. Reference file is invalid."
             }
             
-        healthy_header = ref_data[:ref_sos_idx]
+        ref_sos_idx = len(healthy_header)
         
         # 2. Extract Bitstream from Target
-        target_sos_idx = self._find_sos(target_data, strict=False)
+        if target_sos_idx is None:
+            target_sos_idx = self.prepare_target(target_data)
         
+        # Slices of the target are views, not copies; the parts are written back to back.
+        target_view = memoryview(target_data)
         if target_sos_idx == -1:
             # If target has NO recognizable SOS marker, or it's bizarrely deep (e.g. random 
             # noise in the middle of the file matching FF DA), it's completely destroyed or shifted. 
             # Safest fallback: Assume the target's bitstream starts at the exact same 
             # byte offset as the healthy reference file (since they are from the same camera)
-            target_bitstream = target_data[ref_sos_idx:]
+            target_bitstream = target_view[ref_sos_idx:]
         else:
-            target_bitstream = target_data[target_sos_idx:]
+            target_bitstream = target_view[target_sos_idx:]
             
+        # 3. Graft them together
+        parts: List[Buffer] = [healthy_header, target_bitstream]
+        
         # Make sure target bitstream ends with EOI (FF D9)
-        if not target_bitstream.endswith(b'\xff\xd9'):
+        if target_bitstream[-2:] != b'\xff\xd9':
             # If it's corrupted at the end, append an EOI to satisfy the decoder
-            target_bitstream += b'\xff\xd9'
+            parts.append(b'\xff\xd9')
             
-        # 3. Graft them together
-        grafted_data = healthy_header + target_bitstream
+        return parts, {
+            "success": True,
+            "grafted_size_bytes": output_size(parts)
+        }
+
+    def prepare_target(self, data: Buffer) -> int:
+        """Offset of the target's bitstream (-1 if its SOS is gone)."""
+        return self._find_sos(bytes(data), strict=False)
+
+    def repair_buffer(self, data: Buffer, reference: Optional[Buffer] = None) -> Tuple[Optional[RepairOutput], Dict[str, Any]]:
+        if reference is None:
+            raise ValueError("Reference data is required for header grafting")
+        return self._graft(bytes(data), self._parse_reference(bytes(reference)))
+
+    def repair_prepared(self, data: Buffer, prepared: int, reference: Optional[Buffer] = None) -> Tuple[Optional[RepairOutput], Dict[str, Any]]:
+        if reference is None:
+            raise ValueError("Reference data is required for header grafting")
+        return self._graft(bytes(data), self._parse_reference(bytes(reference)), prepared)
+
+    def repair(self, input_path: str, output_path: str, reference_path: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Splices the functional header of the reference file with the bitstream of the corrupt input file.
+        """
+        if not reference_path or not os.path.exists(reference_path):
+            raise FileNotFoundError(f"Reference file is required and must exist: {reference_path}")
+            
+        if not os.path.exists(input_path):
+            raise FileNotFoundError(f"Input file not found: {input_path}")
+            
+        with open(input_path, 'rb') as f:
+            target_data = f.read()
+            
+        # 1. Extract Header from Reference
+        parts, result = self._graft(target_data, self._reference_header(reference_path))
+        if parts is None:
+            return result
         
-        with open(output_path, 'wb') as out_f:
-            out_f.write(grafted_data)
+        write_output(parts, output_path)
             
         return {
             "success": True,
             "output_path": output_path,
-            "grafted_size_bytes": len(grafted_data)
+            **result
         }
@@ -2,7 +2,15 @@ import os
 import struct
 from typing import Dict, Any, Optional, List, Tuple
 
-from .base import BaseStrategy
+from .base import BaseStrategy, Buffer, RepairOutput, write_output
+from lib.hevc import index_nal_units, split_pictures, parse_sps, build_hvcc, guess_grid, most_common_size, NAL_VPS, NAL_SPS, NAL_PPS
+
+FTYP_PAYLOAD = (
+    b'heic'   # major brand
+    + b'\x00\x00\x00\x00'  # minor version
+    + b'mif1'  # compatible brand
+    + b'heic'  # compatible brand
+)
 
 
 def _read_boxes(data: bytes) -> List[Dict[str, Any]]:
@@ -13,7 +21,7 @@ def _read_boxes(data: bytes) -> List[Dict[str, Any]]:
         size = struct.unpack_from('>I', data, offset)[0]
         if size < 8 or offset + size > len(data):
             break
-        box_type = data[offset + 4: offset + 8].decode('latin-1')
+        box_type = bytes(data[offset + 4: offset + 8]).decode('latin-1')
         payload = data[offset + 8: offset + size]
         boxes.append({
             'type': box_type,
@@ -29,6 +37,104 @@ def _find_box(boxes: List[Dict], box_type: str) -> Optional[Dict]:
     return next((b for b in boxes if b['type'] == box_type), None)
 
 
+def _box(box_type: bytes, *payload: bytes) -> bytes:
+    body = b''.join(payload)
+    return struct.pack('>I', 8 + len(body)) + box_type + body
+
+
+def _full_box(box_type: bytes, version: int, flags: int, *payload: bytes) -> bytes:
+    return _box(box_type, struct.pack('>I', (version << 24) | flags), *payload)
+
+
+def _plan_items(pictures: List[Dict[str, Any]]) -> Tuple[Optional[Dict[str, Any]], Optional[str]]:
+    """
+    Picks the image items to declare from the pictures found in mdat: a grid
+    over the most common picture size when there are several (camera HEICs
+    store the main image as 512x512 tiles), else the largest picture alone.
+    """
+    usable = []
+    for picture in pictures:
+        params = picture['params']
+        if not params[NAL_SPS] or not params[NAL_PPS]:
+            continue
+        picture['info'] = parse_sps(params[NAL_SPS][0])
+        if picture['info']:
+            usable.append(picture)
+    if not usable:
+        reason = "no parameter sets in mdat" if pictures else "no coded pictures in mdat"
+        return None, reason
+
+    size = most_common_size(usable)
+    tiles = [p for p in usable if (p['info']['width'], p['info']['height']) == size]
+    if len(tiles) > 1:
+        rows, columns = guess_grid(len(tiles), *size)
+        return {'tiles': tiles, 'rows': rows, 'columns': columns}, None
+    primary = max(usable, key=lambda p: p['info']['width'] * p['info']['height'])
+    return {'tiles': [primary], 'rows': None, 'columns': None}, None
+
+
+def _build_meta(plan: Dict[str, Any], payload_offset: int) -> bytes:
+    """meta box declaring the planned items; tile extents are made absolute with payload_offset."""
+    tiles = plan['tiles']
+    grid = plan['rows'] is not None
+    tile_ids = list(range(2, 2 + len(tiles))) if grid else [1]
+
+    properties: List[bytes] = []
+
+    def property_index(prop: bytes) -> int:
+        if prop not in properties:
+            properties.append(prop)
+        return len(properties)
+
+    associations = []
+    for item_id, tile in zip(tile_ids, tiles):
+        info, params = tile['info'], tile['params']
+        hvcc = _box(b'hvcC', build_hvcc(params[NAL_VPS], params[NAL_SPS], params[NAL_PPS], info))
+        ispe = _full_box(b'ispe', 0, 0, struct.pack('>II', info['width'], info['height']))
+        associations.append((item_id, [(True, property_index(hvcc)), (False, property_index(ispe))]))
+
+    infe = [_full_box(b'infe', 2, 1 if grid else 0, struct.pack('>HH', item_id, 0), b'hvc1', b'\x00') for item_id in tile_ids]
+    iloc_items = [(item_id, 0, [(payload_offset + offset, length) for offset, length in tile['extents']])
+                  for item_id, tile in zip(tile_ids, tiles)]
+    extra = []
+    if grid:
+        tile_width, tile_height = tiles[0]['info']['width'], tiles[0]['info']['height']
+        width, height = plan['columns'] * tile_width, plan['rows'] * tile_height
+        large = width > 0xFFFF or height > 0xFFFF
+        grid_data = struct.pack('>BBBB', 0, int(large), plan['rows'] - 1, plan['columns'] - 1)
+        grid_data += struct.pack('>II' if large else '>HH', width, height)
+        ispe = _full_box(b'ispe', 0, 0, struct.pack('>II', width, height))
+        associations.insert(0, (1, [(False, property_index(ispe))]))
+        infe.insert(0, _full_box(b'infe', 2, 0, struct.pack('>HH', 1, 0), b'grid', b'\x00'))
+        iloc_items.insert(0, (1, 1, [(0, len(grid_data))]))
+        extra.append(_full_box(b'iref', 0, 0, _box(b'dimg', struct.pack('>HH', 1, len(tile_ids)),
+                                                     *(struct.pack('>H', item_id) for item_id in tile_ids))))
+        extra.append(_box(b'idat', grid_data))
+
+    ipma = struct.pack('>I', len(associations))
+    for item_id, props in associations:
+        ipma += struct.pack('>HB', item_id, len(props))
+        ipma += bytes((0x80 if essential else 0) | index for essential, index in props)
+
+    # iloc v1: 4-byte offsets and lengths, no base offset, construction method per item
+    iloc = struct.pack('>BBH', 0x44, 0x00, len(iloc_items))
+    for item_id, method, extents in iloc_items:
+        iloc += struct.pack('>HHHH', item_id, method, 0, len(extents))
+        iloc += b''.join(struct.pack('>II', offset, length) for offset, length in extents)
+
+    hdlr = _full_box(b'hdlr', 0, 0, struct.pack('>I', 0), b'pict', bytes(12), b'\x00')
+    return _full_box(
+        b'meta', 0, 0,
+        hdlr,
+        _full_box(b'pitm', 0, 0, struct.pack('>H', 1)),
+        _full_box(b'iinf', 0, 0, struct.pack('>H', len(infe)), *infe),
+        *extra[:1],
+        _box(b'iprp', _box(b'ipco', *properties), _full_box(b'ipma', 0, 0, ipma)),
+        *extra[1:],
+        _full_box(b'iloc', 1, 0, iloc)
+    )
+
+
 class HeicBoxRecoveryStrategy(BaseStrategy):
     @property
     def name(self) -> str:
@@ -54,8 +160,9 @@ class HeicBoxRecoveryStrategy(BaseStrategy):
         HEVC bitstream (actual image data) while the ISO container metadata
         comes from a known-good reference shot on the same device model.
 
-        If no reference is available, we attempt to rebuild minimum viable
-        top-level boxes (ftyp + mdat) as a best-effort recovery.
+        If no reference is available, a meta box is synthesized from the NAL
+        units and parameter sets found in mdat; failing that, we rebuild
+        minimum viable top-level boxes (ftyp + mdat) as a best-effort recovery.
         """
         if not os.path.exists(input_path):
             raise FileNotFoundError(f"Input file not found: {input_path}")
@@ -63,69 +170,89 @@ class HeicBoxRecoveryStrategy(BaseStrategy):
         with open(input_path, 'rb') as f:
             corrupted_data = f.read()
 
-        corrupted_boxes = _read_boxes(corrupted_data)
+        reference_data = None
+        if reference_path and os.path.exists(reference_path):
+            with open(reference_path, 'rb') as f:
+                reference_data = f.read()
+
+        output, result = self.repair_buffer(corrupted_data, reference_data)
+        if output is None:
+            return result
+
+        write_output(output, output_path)
+
+        return {
+            "success": True,
+            "output_path": output_path,
+            **result
+        }
+
+    def repair_buffer(self, data: Buffer, reference: Optional[Buffer] = None) -> Tuple[Optional[RepairOutput], Dict[str, Any]]:
+        corrupted_boxes = _read_boxes(memoryview(data))
         corrupted_mdat = _find_box(corrupted_boxes, 'mdat')
 
         if not corrupted_mdat:
-            return {"success": False, "error": "No mdat box found in corrupted file. Cannot recover image payload."}
+            return None, {"success": False, "error": "No mdat box found in corrupted file. Cannot recover image payload."}
 
         mdat_payload = corrupted_mdat['payload']
 
         # --- Strategy A: Transplant into reference shell ---
-        if reference_path and os.path.exists(reference_path):
-            with open(reference_path, 'rb') as f:
-                reference_data = f.read()
-
-            ref_boxes = _read_boxes(reference_data)
+        if reference is not None:
+            ref_boxes = _read_boxes(memoryview(reference))
             ref_mdat = _find_box(ref_boxes, 'mdat')
 
             if not ref_mdat:
-                return {"success": False, "error": "Reference file has no mdat box."}
+                return None, {"success": False, "error": "Reference file has no mdat box."}
 
             # Build the output: copy all reference boxes, but replace mdat payload with corrupted file's payload
-            out = bytearray()
+            out = []
             for box in ref_boxes:
                 if box['type'] == 'mdat':
                     new_size = 8 + len(mdat_payload)
-                    out += struct.pack('>I', new_size)
-                    out += b'mdat'
-                    out += mdat_payload
+                    out.append(struct.pack('>I', new_size) + b'mdat')
+                    out.append(mdat_payload)
                 else:
                     # Rebuild item location offsets would need a full iloc rewriter — that's Phase 4 depth.
                     # For now, copy the reference container metadata as-is with our transplanted payload.
-                    out += struct.pack('>I', box['size'])
-                    out += box['type'].encode('latin-1')
-                    out += box['payload']
-
-            with open(output_path, 'wb') as f:
-                f.write(out)
+                    out.append(struct.pack('>I', box['size']) + box['type'].encode('latin-1'))
+                    out.append(box['payload'])
 
-            return {
+            return out, {
                 "success": True,
-                "output_path": output_path,
                 "mdat_bytes_recovered": len(mdat_payload),
                 "method": "transplant"
             }
 
-        # --- Strategy B: Best-effort minimal container (no reference) ---
+        ftyp_box = _box(b'ftyp', FTYP_PAYLOAD)
+        mdat_header = struct.pack('>I', 8 + len(mdat_payload)) + b'mdat'
+
+        # --- Strategy B: Rebuild meta from the HEVC bitstream itself (no reference) ---
+        # Works when the encoder left the parameter sets in mdat; item
+        # locations come from the NAL-unit index of the payload.
+        nal_index = index_nal_units(mdat_payload)
+        plan, reason = _plan_items(split_pictures(mdat_payload, nal_index['units']))
+        if plan:
+            meta = _build_meta(plan, 0)
+            meta = _build_meta(plan, len(ftyp_box) + len(meta) + len(mdat_header))
+            result = {
+                "success": True,
+                "mdat_bytes_recovered": len(mdat_payload),
+                "method": "synthesized_meta",
+                "nal_units": len(nal_index['units']),
+                "nal_resyncs": nal_index['resyncs'],
+                "items": len(plan['tiles'])
+            }
+            if plan['rows'] is not None:
+                # The tile layout is not stored in mdat: it is a guess
+                result["grid"] = {"rows": plan['rows'], "columns": plan['columns'], "guessed": True}
+            return [ftyp_box, meta, mdat_header, mdat_payload], result
+
+        # --- Strategy C: Best-effort minimal container ---
         # Build: ftyp + mdat only. The file may not open in all viewers but
         # will preserve the raw HEVC bitstream for forensic extraction.
-        ftyp_payload = (
-            b'heic'   # major brand
-            + b'\x00\x00\x00\x00'  # minor version
-            + b'mif1'  # compatible brand
-            + b'heic'  # compatible brand
-        )
-        ftyp_box = struct.pack('>I', 8 + len(ftyp_payload)) + b'ftyp' + ftyp_payload
-        mdat_box = struct.pack('>I', 8 + len(mdat_payload)) + b'mdat' + mdat_payload
-
-        with open(output_path, 'wb') as f:
-            f.write(ftyp_box)
-            f.write(mdat_box)
-
-        return {
+        return [ftyp_box, mdat_header, mdat_payload], {
             "success": True,
-            "output_path": output_path,
             "mdat_bytes_recovered": len(mdat_payload),
-            "method": "minimal_container"
+            "method": "minimal_container",
+            "meta_synthesis_error": reason
         }
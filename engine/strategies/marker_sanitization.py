@@ -1,8 +1,157 @@
 import os
-from typing import Dict, Any, Optional
-from .base import BaseStrategy
+import re
+import mmap
+import shutil
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Any, Optional, List, Tuple
+from lib.budget import current_budget, parse_budget
+from lib.jpeg_header import MARKER_DHT, MARKER_DQT, MARKER_DRI, MARKER_SOS
+from .base import BaseStrategy, Buffer, RepairOutput, write_output
+
+# Bytes allowed to follow 0xFF inside entropy-coded data: stuffing, EOI and RST0-7
+VALID_FOLLOWERS = frozenset({0x00, 0xD9, 0xD0, 0xD1, 0xD2, 0xD3, 0xD4, 0xD5, 0xD6, 0xD7})
+
+# Segments that may sit between the scans of a progressive or multi-scan
+# JPEG: tables, restart interval, DNL, comments, APPn and the next SOS
+INTER_SCAN_MARKERS = frozenset({MARKER_DHT, MARKER_DQT, MARKER_DRI, MARKER_SOS, 0xCC, 0xDC, 0xFE} | set(range(0xE0, 0xF0)))
+# A marker that may open such a run of segments (its fill bytes are walked back in Python:
+# a leading \xff+ would make the search quadratic in long 0xFF runs)
+_INTER_SCAN_CANDIDATE = re.compile(rb'\xff[' + re.escape(bytes(sorted(INTER_SCAN_MARKERS))) + rb']')
+
+# Files at or above this size are sanitized in parallel over an mmap of the output
+PARALLEL_THRESHOLD = 64 * 1024 * 1024
+# Never hand a worker less than this; process start-up would dominate
+MIN_RANGE_SIZE = 8 * 1024 * 1024
+
+_NON_FF = re.compile(rb'[^\xff]')
+
+
+def _sanitize_range(buf, start: int, end: int, length: int) -> int:
+    """
+    Patches every invalid marker whose 0xFF byte lies in [start, end) and
+    returns the patch count. Every 0xFF consumes its follower, so a range may
+    patch (and read) one byte past `end`. `start` must not be the second byte
+    of an 0xFF pair: it is the bitstream offset or follows a non-0xFF byte.
+
+    `buf` is anything with find() and item assignment (bytearray, mmap).
+    """
+    stop = min(end, length - 1)
+    patch_count = 0
+    i = buf.find(b'\xff', start, stop)
+    while i != -1:
+        if buf[i + 1] not in VALID_FOLLOWERS:
+            buf[i + 1] = 0x00
+            patch_count += 1
+        i = buf.find(b'\xff', i + 2, stop)
+    return patch_count
+
+
+def _next_scan_start(buf, pos: int, length: int) -> int:
+    """
+    Walks the marker segments starting at `pos` (an 0xFF byte) by their
+    declared lengths. Returns where the next scan's entropy-coded data starts
+    if they form a valid chain of inter-scan segments ending in an SOS, else -1
+    (the bytes were damage inside the entropy-coded data, not a marker).
+    """
+    while pos + 4 <= length:
+        if buf[pos] != 0xFF:
+            return -1
+        marker = buf[pos + 1]
+        if marker == 0xFF:
+            pos += 1
+            continue
+        if marker not in INTER_SCAN_MARKERS:
+            return -1
+        seg_len = (buf[pos + 2] << 8) + buf[pos + 3]
+        end = pos + 2 + seg_len
+        if seg_len < 2 or end > length:
+            return -1
+        if marker == MARKER_SOS:
+            components = buf[pos + 4] if seg_len > 2 else 0
+            return end if 1 <= components <= 4 and seg_len == 6 + 2 * components else -1
+        pos = end
+    return -1
+
+
+def plan_entropy_ranges(buf, start: int, length: int) -> List[Tuple[int, int]]:
+    """
+    The entropy-coded ranges of a JPEG whose first scan starts at `start`:
+    one per scan of a progressive or multi-scan file. Candidate markers are
+    found with one regex pass; each one that opens a valid chain of
+    inter-scan segments (see _next_scan_start) ends the current range, and
+    the next begins after the chain's SOS. Every range ends on a byte that
+    follows a non-0xFF byte, so ranges are sanitized independently.
+    """
+    ranges = []
+    range_start = start
+    match = _INTER_SCAN_CANDIDATE.search(buf, start, length)
+    while match:
+        next_start = _next_scan_start(buf, match.start(), length)
+        if next_start == -1:
+            match = _INTER_SCAN_CANDIDATE.search(buf, match.end(), length)
+            continue
+        marker_start = match.start()
+        while marker_start > range_start and buf[marker_start - 1] == 0xFF:
+            marker_start -= 1
+        ranges.append((range_start, marker_start))
+        range_start = next_start
+        match = _INTER_SCAN_CANDIDATE.search(buf, range_start, length)
+    ranges.append((range_start, length))
+    return [(s, e) for s, e in ranges if s < e]
+
+
+def _split_ranges(buf, start: int, length: int, parts: int) -> List[Tuple[int, int]]:
+    """
+    Splits [start, length) into roughly equal ranges whose boundaries sit
+    right after a non-0xFF byte, so the 0xFF pairing state at every boundary is
+    known without scanning from the beginning. Inside a long 0xFF run the
+    boundary moves forward (ranges merge if the run swallows a whole range).
+    """
+    size = max(1, (length - start) // parts)
+    bounds = [start]
+    for k in range(1, parts):
+        nominal = start + k * size
+        if nominal <= bounds[-1]:
+            continue
+        match = _NON_FF.search(buf, nominal - 1)
+        if not match:
+            break
+        boundary = match.start() + 1
+        if bounds[-1] < boundary < length:
+            bounds.append(boundary)
+    bounds.append(length)
+    return [(bounds[i], bounds[i + 1]) for i in range(len(bounds) - 1) if bounds[i] < bounds[i + 1]]
+
+
+def _split_scans(buf, scans: List[Tuple[int, int]], parts: int) -> List[Tuple[int, int]]:
+    """Splits every scan's range with _split_ranges, giving each scan a share of the parts by size."""
+    total = sum(end - start for start, end in scans) or 1
+    ranges = []
+    for start, end in scans:
+        ranges += _split_ranges(buf, start, end, max(1, round(parts * (end - start) / total)))
+    return ranges
+
+
+def _sanitize_file_range(path: str, start: int, end: int, length: int, timeout: Optional[float] = None) -> int:
+    """
+    Worker entry point: sanitizes one range of the file in place. `timeout`
+    is what was left of the parent job's deadline when the range was
+    submitted; a range that only starts after it fails the job.
+    """
+    with parse_budget(timeout=timeout) as budget:
+        budget.check_deadline()
+        with open(path, 'r+b') as f:
+            with mmap.mmap(f.fileno(), 0) as view:
+                patch_count = _sanitize_range(view, start, end, length)
+                view.flush()
+    return patch_count
+
 
 class MarkerSanitizationStrategy(BaseStrategy):
+    def __init__(self, workers: Optional[int] = None, parallel_threshold: int = PARALLEL_THRESHOLD):
+        self.workers = workers
+        self.parallel_threshold = parallel_threshold
+
     @property
     def name(self) -> str:
         return "marker-sanitization"
@@ -50,48 +199,99 @@ class MarkerSanitizationStrategy(BaseStrategy):
             
         return -1
 
+    def _worker_count(self, size: int) -> int:
+        if size < self.parallel_threshold:
+            return 1
+        workers = self.workers or os.cpu_count() or 1
+        return max(1, min(workers, size // MIN_RANGE_SIZE))
+
     def repair(self, input_path: str, output_path: str, reference_path: Optional[str] = None) -> Dict[str, Any]:
         if not os.path.exists(input_path):
             raise FileNotFoundError(f"Input file not found: {input_path}")
+
+        workers = self._worker_count(os.path.getsize(input_path))
+        if workers > 1:
+            return self._repair_parallel(input_path, output_path, workers)
             
         with open(input_path, 'rb') as f:
-            data = bytearray(f.read())
+            output, result = self.repair_buffer(f.read())
+
+        if output is None:
+            return result
+
+        write_output(output, output_path)
             
+        return {
+            "success": True,
+            "output_path": output_path,
+            **result
+        }
+
+    def repair_buffer(self, data: Buffer, reference: Optional[Buffer] = None) -> Tuple[Optional[RepairOutput], Dict[str, Any]]:
+        data = bytearray(data)
         bitstream_offset = self._find_bitstream_offset(data)
         
         if bitstream_offset == -1:
-            return {
+            return None, {
                 "success": False,
                 "error": "Could not identify SOS marker. Sanitization requires an intact header."
             }
             
-        valid_followers = {0x00, 0xD9, 0xD0, 0xD1, 0xD2, 0xD3, 0xD4, 0xD5, 0xD6, 0xD7}
-        
-        i = bitstream_offset
         length = len(data)
-        patch_count = 0
-        
-        while i < length - 1:
-            if data[i] == 0xFF:
-                next_byte = data[i + 1]
-                if next_byte not in valid_followers:
-                    # Invalid marker, patch it out
-                    data[i + 1] = 0x00
-                    patch_count += 1
-                    i += 2
-                else:
-                    i += 1
-                    if next_byte in {0x00, 0xD9, 0xD0, 0xD1, 0xD2, 0xD3, 0xD4, 0xD5, 0xD6, 0xD7}:
-                        i += 1
-            else:
-                i += 1
-                
-        with open(output_path, 'wb') as f:
-            f.write(data)
+        current_budget().scan(length)
+        scans = plan_entropy_ranges(data, bitstream_offset, length)
+        patch_count = sum(_sanitize_range(data, start, end, length) for start, end in scans)
             
+        return data, {
+            "success": True,
+            "patch_count": patch_count,
+            "processed_bytes": length,
+            "scans": len(scans)
+        }
+
+    def _repair_parallel(self, input_path: str, output_path: str, workers: int) -> Dict[str, Any]:
+        """
+        Sanitizes a copy of the input in place: the entropy-coded range of
+        each scan is split into ranges and worker processes patch them through
+        their own writable mmap of the output file. Output is byte-identical
+        to the serial path. The job's budget is charged here; workers only
+        get its remaining time.
+        """
+        budget = current_budget()
+        budget.scan(os.path.getsize(input_path))
+        shutil.copyfile(input_path, output_path)
+
+        with open(output_path, 'r+b') as f:
+            length = os.fstat(f.fileno()).st_size
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as view:
+                bitstream_offset = self._find_bitstream_offset(view)
+                scans = plan_entropy_ranges(view, bitstream_offset, length) if bitstream_offset != -1 else []
+                ranges = _split_scans(view, scans, workers)
+
+        if bitstream_offset == -1:
+            os.remove(output_path)
+            return {
+                "success": False,
+                "error": "Could not identify SOS marker. Sanitization requires an intact header."
+            }
+
+        workers = max(1, min(workers, len(ranges)))
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = [pool.submit(_sanitize_file_range, output_path, start, end, length, budget.remaining())
+                       for start, end in ranges]
+            try:
+                patch_count = sum(f.result() for f in futures)
+            except BaseException:
+                # A half-sanitized copy is not an output
+                pool.shutdown(cancel_futures=True)
+                os.remove(output_path)
+                raise
+
         return {
             "success": True,
             "output_path": output_path,
             "patch_count": patch_count,
-            "processed_bytes": length
+            "processed_bytes": length,
+            "scans": len(scans),
+            "workers": workers
         }
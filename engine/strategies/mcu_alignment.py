@@ -1,6 +1,10 @@
-from typing import Dict, Any, Optional
+from typing import Dict, Any, Optional, Tuple
 import os
-from .base import BaseStrategy
+import re
+from .base import BaseStrategy, Buffer, RepairOutput, write_output
+from lib.budget import current_budget
+
+_RST_MARKER = re.compile(rb'\xff[\xd0-\xd7]')
 
 class McuAlignmentStrategy(BaseStrategy):
     @property
@@ -17,23 +21,18 @@ class McuAlignmentStrategy(BaseStrategy):
         return "mcu_misalignment" in corruption_types
 
     def _find_sos_offset(self, data: bytes) -> int:
-        offset = 0
-        while offset < len(data) - 1:
-            if data[offset] == 0xFF and data[offset+1] == 0xDA:
-                # SOS marker length
-                if offset + 3 < len(data):
-                    length = (data[offset+2] << 8) | data[offset+3]
-                    return offset + 2 + length
-            offset += 1
-        return -1
+        offset = data.find(b'\xff\xda')
+        current_budget().scan(len(data) if offset == -1 else offset)
+        # SOS marker length
+        if offset == -1 or offset + 3 >= len(data):
+            return -1
+        length = (data[offset+2] << 8) | data[offset+3]
+        return offset + 2 + length
 
     def _find_first_rst_marker(self, data: bytes, start_offset: int) -> int:
-        offset = start_offset
-        while offset < len(data) - 1:
-            if data[offset] == 0xFF and 0xD0 <= data[offset+1] <= 0xD7:
-                return offset
-            offset += 1
-        return -1
+        match = _RST_MARKER.search(data, max(start_offset, 0))
+        current_budget().scan((match.start() if match else len(data)) - start_offset)
+        return match.start() if match else -1
 
     def repair(self, input_path: str, output_path: str, reference_path: Optional[str] = None) -> Dict[str, Any]:
         if not reference_path or not os.path.exists(reference_path):
@@ -45,14 +44,44 @@ class McuAlignmentStrategy(BaseStrategy):
         with open(reference_path, "rb") as f:
             ref_data = f.read()
 
+        final_data, result = self.repair_buffer(corrupt_data, ref_data)
+        if final_data is None:
+            return result
+
+        write_output(final_data, output_path)
+
+        return {
+            "success": True,
+            "output_path": output_path,
+            **result
+        }
+
+    def prepare_target(self, data: Buffer) -> Tuple[int, int]:
+        """(SOS end, first RST) of the damaged file; shared across references."""
+        corrupt_data = bytes(data)
         corrupt_sos = self._find_sos_offset(corrupt_data)
+        corrupt_rst = self._find_first_rst_marker(corrupt_data, corrupt_sos) if corrupt_sos != -1 else -1
+        return corrupt_sos, corrupt_rst
+
+    def repair_buffer(self, data: Buffer, reference: Optional[Buffer] = None) -> Tuple[Optional[RepairOutput], Dict[str, Any]]:
+        if reference is None:
+            return None, {"success": False, "error": "Reference file missing or invalid"}
+        return self.repair_prepared(data, self.prepare_target(data), reference)
+
+    def repair_prepared(self, data: Buffer, prepared: Tuple[int, int], reference: Optional[Buffer] = None) -> Tuple[Optional[RepairOutput], Dict[str, Any]]:
+        if reference is None:
+            return None, {"success": False, "error": "Reference file missing or invalid"}
+
+        corrupt_data = bytes(data)
+        ref_data = bytes(reference)
+
+        corrupt_sos, corrupt_rst = prepared
         ref_sos = self._find_sos_offset(ref_data)
 
         if corrupt_sos == -1 or ref_sos == -1:
-            return {"success": False, "error": "Could not find SOS marker"}
+            return None, {"success": False, "error": "Could not find SOS marker"}
 
-        # Find first RST marker in both
-        corrupt_rst = self._find_first_rst_marker(corrupt_data, corrupt_sos)
+        # Find first RST marker in the reference (the target's was found by prepare_target)
         ref_rst = self._find_first_rst_marker(ref_data, ref_sos)
 
         # Huffman Pseudo-Decoding Logic (MVP):
@@ -86,12 +115,8 @@ class McuAlignmentStrategy(BaseStrategy):
                 
             final_data = bytes(out_buffer)
 
-        with open(output_path, "wb") as f:
-            f.write(final_data)
-
-        return {
+        return final_data, {
             "success": True,
-            "output_path": output_path,
             "metrics": {
                 "patch_applied": "rst_sync" if corrupt_rst != -1 and ref_rst != -1 else "fixed_1024_bytes",
                 "corrupt_rst_offset": corrupt_rst,
@@ -1,12 +1,42 @@
+import io
 import os
 import struct
 import binascii
-from typing import Dict, Any, Optional, List
-from .base import BaseStrategy
+from typing import Dict, Any, Optional, List, Tuple, BinaryIO
+from concurrent.futures import ThreadPoolExecutor
+from .base import BaseStrategy, Buffer, RepairOutput, write_output
+from lib.png_deflate import parallel_deflate, idat_chunks, inflated_length, inflate_partial
+from lib.budget import current_budget
+
+# IDAT chunks above this are split into fixed-size chunks on rebuild
+MAX_IDAT_CHUNK = 8 * 1024 * 1024
+# Payload of every IDAT chunk the rebuilder writes
+IDAT_CHUNK_SIZE = 1024 * 1024
+
+# Samples per pixel by colour type
+CHANNELS = {0: 1, 2: 3, 3: 1, 4: 2, 6: 4}
+# Adam7 passes as (x0, y0, dx, dy)
+ADAM7 = [(0, 0, 8, 8), (4, 0, 8, 8), (0, 4, 4, 8), (2, 0, 4, 4), (0, 2, 2, 4), (1, 0, 2, 2), (0, 1, 1, 2)]
 
 def calculate_crc(data: bytes) -> int:
     return binascii.crc32(data) & 0xFFFFFFFF
 
+def raw_image_size(ihdr: bytes) -> Optional[int]:
+    """Filtered (pre-deflate) size of the image described by an IHDR payload."""
+    if len(ihdr) < 13:
+        return None
+    width, height, depth, color_type, _compression, _filter, interlace = struct.unpack('>IIBBBBB', ihdr[:13])
+    if color_type not in CHANNELS or not width or not height:
+        return None
+    bits_per_pixel = CHANNELS[color_type] * depth
+
+    def scanlines(w: int, h: int) -> int:
+        return h * (1 + (w * bits_per_pixel + 7) // 8) if w and h else 0
+
+    if not interlace:
+        return scanlines(width, height)
+    return sum(scanlines(max(0, -(-(width - x0) // dx)), max(0, -(-(height - y0) // dy))) for x0, y0, dx, dy in ADAM7)
+
 class PngChunkRebuilderStrategy(BaseStrategy):
     @property
     def name(self) -> str:
@@ -21,35 +51,45 @@ class PngChunkRebuilderStrategy(BaseStrategy):
         return any(c in corruptions for c in ['png_missing_ihdr', 'png_broken_idat', 'png_crc_mismatch'])
         
     def _read_chunks(self, filepath: str) -> List[Dict[str, Any]]:
-        chunks = []
         with open(filepath, 'rb') as f:
-            signature = f.read(8)
-            if signature != b'\x89PNG\r\n\x1a\n':
-                return chunks
+            return self._read_chunk_stream(f)
+
+    def _read_chunk_stream(self, f: BinaryIO) -> List[Dict[str, Any]]:
+        chunks = []
+        signature = f.read(8)
+        if signature != b'\x89PNG\r\n\x1a\n':
+            return chunks
+
+        # A corrupt length may claim up to 4 GB; never read (or allocate) past the end
+        end = f.seek(0, io.SEEK_END)
+        f.seek(8)
+        budget = current_budget()
+        while True:
+            length_bytes = f.read(4)
+            if not length_bytes or len(length_bytes) < 4:
+                break
+            length = struct.unpack('>I', length_bytes)[0]
             
-            while True:
-                length_bytes = f.read(4)
-                if not length_bytes or len(length_bytes) < 4:
-                    break
-                length = struct.unpack('>I', length_bytes)[0]
-                
-                type_bytes = f.read(4)
-                if len(type_bytes) < 4:
-                    break
-                
-                data = f.read(length)
+            type_bytes = f.read(4)
+            if len(type_bytes) < 4:
+                break
+
+            length = min(length, end - f.tell())
+            budget.count(1, 'PNG chunks')
+            budget.alloc(length, 'PNG chunk')
+            data = f.read(length)
+            
+            crc_bytes = f.read(4)
+            if len(crc_bytes) < 4:
+                expected_crc = 0
+            else:
+                expected_crc = struct.unpack('>I', crc_bytes)[0]
                 
-                crc_bytes = f.read(4)
-                if len(crc_bytes) < 4:
-                    expected_crc = 0
-                else:
-                    expected_crc = struct.unpack('>I', crc_bytes)[0]
-                    
-                chunks.append({
-                    'type': type_bytes,
-                    'data': data,
-                    'expected_crc': expected_crc
-                })
+            chunks.append({
+                'type': type_bytes,
+                'data': data,
+                'expected_crc': expected_crc
+            })
         return chunks
 
     def repair(self, input_path: str, output_path: str, reference_path: Optional[str] = None) -> Dict[str, Any]:
@@ -66,7 +106,25 @@ class PngChunkRebuilderStrategy(BaseStrategy):
         ref_chunks = []
         if reference_path and os.path.exists(reference_path):
             ref_chunks = self._read_chunks(reference_path)
-            
+
+        output, result = self._rebuild(chunks, ref_chunks)
+        if output is None:
+            return result
+
+        write_output(output, output_path)
+                
+        return {
+            "success": True,
+            "output_path": output_path,
+            **result
+        }
+
+    def repair_buffer(self, data: Buffer, reference: Optional[Buffer] = None) -> Tuple[Optional[RepairOutput], Dict[str, Any]]:
+        chunks = self._read_chunk_stream(io.BytesIO(data))
+        ref_chunks = self._read_chunk_stream(io.BytesIO(reference)) if reference is not None else []
+        return self._rebuild(chunks, ref_chunks)
+
+    def _rebuild(self, chunks: List[Dict[str, Any]], ref_chunks: List[Dict[str, Any]]) -> Tuple[Optional[List[bytes]], Dict[str, Any]]:
         new_chunks = []
         has_ihdr = any(c['type'] == b'IHDR' for c in chunks)
         
@@ -76,7 +134,7 @@ class PngChunkRebuilderStrategy(BaseStrategy):
             if ref_ihdr:
                 new_chunks.append(ref_ihdr)
             else:
-                return {"success": False, "error": "IHDR missing and no valid reference provided."}
+                return None, {"success": False, "error": "IHDR missing and no valid reference provided."}
                 
         # 2. Add remaining valid chunks
         for chunk in chunks:
@@ -86,27 +144,72 @@ class PngChunkRebuilderStrategy(BaseStrategy):
             # If IDAT CRC is wrong, we recalculate it to trick viewers into reading it anyway
             new_chunks.append(chunk)
             
-        # 3. Always append valid IEND
+        # 3. Re-deflate a truncated/corrupt image stream, re-chunk an oversized one
+        idat_parts, idat_result = self._rewrite_idat(new_chunks)
+
+        # 4. Always append valid IEND
         new_chunks.append({
             'type': b'IEND',
             'data': b'',
             'expected_crc': calculate_crc(b'IEND')
         })
         
-        # Write output
-        with open(output_path, 'wb') as f:
-            f.write(b'\x89PNG\r\n\x1a\n') # Signature
-            
-            for c in new_chunks:
-                f.write(struct.pack('>I', len(c['data'])))
-                f.write(c['type'])
-                f.write(c['data'])
-                # Recalculate CRC for all chunks to ensure valid container
-                chunk_crc = calculate_crc(c['type'] + c['data'])
-                f.write(struct.pack('>I', chunk_crc))
+        # Serialize as parts, written back to back
+        parts = [b'\x89PNG\r\n\x1a\n'] # Signature
+        
+        idat_written = False
+        for c in new_chunks:
+            if idat_parts is not None and c['type'] == b'IDAT':
+                # IDATs must be consecutive: the rewritten stream takes the first one's place
+                if not idat_written:
+                    parts.extend(idat_parts)
+                    idat_written = True
+                continue
+            parts.append(struct.pack('>I', len(c['data'])))
+            parts.append(c['type'])
+            parts.append(c['data'])
+            # Recalculate CRC for all chunks to ensure valid container
+            chunk_crc = binascii.crc32(c['data'], binascii.crc32(c['type'])) & 0xFFFFFFFF
+            parts.append(struct.pack('>I', chunk_crc))
                 
-        return {
+        return parts, {
             "success": True,
-            "output_path": output_path,
-            "chunks_processed": len(new_chunks)
+            "chunks_processed": len(new_chunks),
+            **idat_result
+        }
+
+    def _rewrite_idat(self, chunks: List[Dict[str, Any]]) -> Tuple[Optional[List[bytes]], Dict[str, Any]]:
+        """
+        IDAT output parts when the image stream needs rewriting, else None.
+        A stream that does not inflate to the full image is inflated as far as
+        it goes, zero-padded to the IHDR size and re-deflated in parallel; an
+        intact stream with oversized chunks is only re-chunked. Either way the
+        new chunks are fixed-size with CRCs computed in parallel.
+        """
+        idats = [c['data'] for c in chunks if c['type'] == b'IDAT']
+        ihdr = next((c['data'] for c in chunks if c['type'] == b'IHDR'), b'')
+        expected = raw_image_size(ihdr)
+        if not idats or expected is None:
+            return None, {"idat_rewrite": None}
+
+        stream = idats[0] if len(idats) == 1 else b''.join(idats)
+        length, ended = inflated_length(stream)
+        if ended and length >= expected:
+            if max(len(data) for data in idats) <= MAX_IDAT_CHUNK:
+                return None, {"idat_rewrite": None}
+            with ThreadPoolExecutor() as pool:
+                return idat_chunks(stream, IDAT_CHUNK_SIZE, pool=pool), {"idat_rewrite": "rechunked"}
+
+        current_budget().alloc(expected, 'raw image')
+        raw, _ended = inflate_partial(stream, limit=expected)
+        recovered = min(len(raw), expected)
+        # Missing scanlines decode as filter-0 zero rows
+        del raw[expected:]
+        raw.extend(bytes(expected - len(raw)))
+        with ThreadPoolExecutor() as pool:
+            parts = idat_chunks(b''.join(parallel_deflate(raw, pool=pool)), IDAT_CHUNK_SIZE, pool=pool)
+        return parts, {
+            "idat_rewrite": "redeflated",
+            "raw_bytes_recovered": recovered,
+            "raw_bytes_expected": expected
         }
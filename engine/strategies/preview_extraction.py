@@ -1,6 +1,7 @@
 import os
-from typing import Dict, Any, Optional
-from .base import BaseStrategy
+import mmap
+from typing import Dict, Any, Optional, Tuple
+from .base import BaseStrategy, Buffer, RepairOutput, write_output
 
 class PreviewExtractionStrategy(BaseStrategy):
     @property
@@ -97,11 +98,42 @@ class PreviewExtractionStrategy(BaseStrategy):
         # Select the largest jpeg found (most likely the full resolution proxy)
         largest_jpeg = max(found_jpegs, key=lambda j: j['length'])
         
-        with open(output_path, 'wb') as out_f:
-            out_f.write(largest_jpeg['data'])
+        write_output(largest_jpeg['data'], output_path)
             
         return {
             "success": True,
             "output_path": output_path,
             "extracted_size_bytes": largest_jpeg['length']
         }
+
+    def repair_buffer(self, data: Buffer, reference: Optional[Buffer] = None) -> Tuple[Optional[RepairOutput], Dict[str, Any]]:
+        """In-memory variant of repair: the whole input is already addressable, so no chunking."""
+        # mmap and bytes can be searched in place; other buffers are copied once
+        buffer = data if isinstance(data, (bytes, bytearray, mmap.mmap)) else bytes(data)
+        view = memoryview(buffer)
+
+        largest_start, largest_length = -1, 0
+        search_idx = 0
+        while True:
+            start_idx = buffer.find(b'\xff\xd8', search_idx)
+            if start_idx == -1:
+                break
+            end_idx = buffer.find(b'\xff\xd9', start_idx + 2)
+            if end_idx == -1:
+                break
+            length = end_idx + 2 - start_idx
+            # Only keep realistic image sizes (e.g., > 10KB to avoid thumbnails)
+            if length > 10 * 1024 and length > largest_length:
+                largest_start, largest_length = start_idx, length
+            search_idx = end_idx + 2
+
+        if largest_start == -1:
+            return None, {
+                "success": False,
+                "error": "No embedded JPEG images found in the file."
+            }
+
+        return view[largest_start:largest_start + largest_length], {
+            "success": True,
+            "extracted_size_bytes": largest_length
+        }
@@ -0,0 +1,123 @@
+import importlib
+from typing import Dict, Any, List, Optional
+
+from .base import BaseStrategy
+
+# Declarative description of every strategy. Nothing here imports a strategy
+# module: load_strategy() imports only the one a job actually asks for, so a
+# cold engine spawn pays for a single strategy (and its dependencies).
+#
+# memory_factor: peak resident memory of one job as a multiple of its input
+# size (the input read, working copies, the output and its validation), used
+# by the batch scheduler. The reference, when one is used, comes on top.
+#
+# head_bytes (optional): the strategy normally needs only this many bytes from
+# the start of the input, so batches read, hash and budget just that much. A
+# repair_buffer result with needs_bytes asks for a longer read of the input.
+#
+# fallback_only (optional): a last resort whose output is valid but lossy (a
+# thumbnail instead of the photo). It is never raced against full repairs;
+# a race only tries it once none of them produced a valid output.
+STRATEGY_REGISTRY: Dict[str, Dict[str, Any]] = {
+    "preview-extraction": {
+        "extension": ".jpg",
+        "requires_reference": False,
+        "module": "strategies.preview_extraction",
+        "class_name": "PreviewExtractionStrategy",
+        "memory_factor": 1.5,
+    },
+    "header-grafting": {
+        "extension": ".jpg",
+        "requires_reference": True,
+        "module": "strategies.header_grafting",
+        "class_name": "HeaderGraftingStrategy",
+        "memory_factor": 2,
+    },
+    "marker-sanitization": {
+        "extension": ".jpg",
+        "requires_reference": False,
+        "module": "strategies.marker_sanitization",
+        "class_name": "MarkerSanitizationStrategy",
+        "memory_factor": 2,
+    },
+    "mcu-alignment": {
+        "extension": ".jpg",
+        "requires_reference": True,
+        "module": "strategies.mcu_alignment",
+        "class_name": "McuAlignmentStrategy",
+        "memory_factor": 2,
+    },
+    "png-chunk-rebuilder": {
+        "extension": ".png",
+        "requires_reference": False,
+        "module": "strategies.png_chunk_rebuilder",
+        "class_name": "PngChunkRebuilderStrategy",
+        "memory_factor": 3,
+    },
+    "heic-box-recovery": {
+        "extension": ".heic",
+        "requires_reference": True,
+        "module": "strategies.heic_box_recovery",
+        "class_name": "HeicBoxRecoveryStrategy",
+        "memory_factor": 2,
+    },
+    "tiff-ifd-rebuilder": {
+        "extension": ".tiff",
+        "requires_reference": True,
+        "module": "strategies.tiff_ifd_rebuilder",
+        "class_name": "TiffIfdRebuilderStrategy",
+        "memory_factor": 2,
+    },
+    "exif-thumbnail-rescue": {
+        "extension": ".jpg",
+        "requires_reference": False,
+        "module": "strategies.exif_thumbnail",
+        "class_name": "ExifThumbnailStrategy",
+        "memory_factor": 2,
+        "head_bytes": 128 * 1024,
+        "fallback_only": True,
+    },
+}
+
+# Baseline resident memory of a worker process with one strategy loaded
+WORKER_OVERHEAD = 48 * 1024 * 1024
+
+
+def list_strategies() -> List[Dict[str, Any]]:
+    """Capability listing for the Node side; imports nothing."""
+    return [
+        {"name": name, "extension": entry["extension"], "requires_reference": entry["requires_reference"]}
+        for name, entry in STRATEGY_REGISTRY.items()
+    ]
+
+
+def get_extension(name: str) -> str:
+    entry = STRATEGY_REGISTRY.get(name)
+    if not entry:
+        raise ValueError(f"Unknown strategy requested: {name}")
+    return entry["extension"]
+
+
+def get_head_bytes(name: str) -> Optional[int]:
+    """Bytes of the input the strategy reads, or None when it needs the whole file."""
+    entry = STRATEGY_REGISTRY.get(name)
+    if not entry:
+        raise ValueError(f"Unknown strategy requested: {name}")
+    return entry.get("head_bytes")
+
+
+def estimate_job_memory(name: str, input_size: int, reference_size: int = 0) -> int:
+    """Expected peak bytes of one repair job, including the worker process itself."""
+    head_bytes = get_head_bytes(name)
+    if head_bytes is not None:
+        input_size = min(input_size, head_bytes)
+    return int(WORKER_OVERHEAD + STRATEGY_REGISTRY[name]["memory_factor"] * input_size + reference_size)
+
+
+def load_strategy(name: str) -> BaseStrategy:
+    """Imports the selected strategy's module on demand and instantiates it."""
+    entry = STRATEGY_REGISTRY.get(name)
+    if not entry:
+        raise ValueError(f"Unknown strategy requested: {name}")
+    module = importlib.import_module(entry["module"])
+    return getattr(module, entry["class_name"])()
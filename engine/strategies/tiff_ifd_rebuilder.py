@@ -2,7 +2,8 @@ import os
 import struct
 from typing import Dict, Any, Optional, List, Tuple
 
-from .base import BaseStrategy
+from .base import BaseStrategy, Buffer, RepairOutput, write_output
+from lib.budget import current_budget
 
 # TIFF Tag IDs we care about for repairing a broken RAW
 TAG_STRIP_OFFSETS = 0x0111       # StripOffsets
@@ -51,11 +52,11 @@ def _read_ifd_entries(data: bytes, ifd_offset: int, byte_order: str) -> List[Dic
     if ifd_offset + 2 > len(data):
         return entries
 
-    count = _read_u16(data, ifd_offset, byte_order)
+    # A corrupt count cannot make us read past the entries the data holds
+    count = min(_read_u16(data, ifd_offset, byte_order), (len(data) - ifd_offset - 2) // 12)
+    current_budget().count(count, 'IFD entries')
     for i in range(count):
         base = ifd_offset + 2 + i * 12
-        if base + 12 > len(data):
-            break
         tag = _read_u16(data, base, byte_order)
         field_type = _read_u16(data, base + 2, byte_order)
         field_count = _read_u32(data, base + 4, byte_order)
@@ -85,10 +86,13 @@ def _get_entry_values(data: bytes, entry: Dict, byte_order: str) -> List[int]:
         offset = entry['value_offset']
         if offset + total > len(data):
             return []
+        budget = current_budget()
+        budget.alloc(total, 'IFD value array')
+        budget.count(count, 'IFD values')
         raw = data[offset: offset + total]
 
     fmt_char = {1: 'B', 2: 'B', 3: 'H', 4: 'I', 5: 'I'}
-    fc = ('<' if byte_order == 'LE' else '>') + fmt_char.get(field_type, 'B') * count
+    fc = ('<' if byte_order == 'LE' else '>') + f"{count}{fmt_char.get(field_type, 'B')}"
     try:
         return list(struct.unpack(fc, raw[:count * type_size]))
     except struct.error:
@@ -138,14 +142,33 @@ class TiffIfdRebuilderStrategy(BaseStrategy):
             return {"success": False, "error": "A reference RAW file from the same camera is required for IFD rebuilding."}
 
         with open(input_path, 'rb') as f:
-            corrupted = bytearray(f.read())
+            corrupted = f.read()
         with open(reference_path, 'rb') as f:
             reference = f.read()
 
+        output, result = self.repair_buffer(corrupted, reference)
+        if output is None:
+            return result
+
+        write_output(output, output_path)
+
+        return {
+            "success": True,
+            "output_path": output_path,
+            **result
+        }
+
+    def repair_buffer(self, data: Buffer, reference: Optional[Buffer] = None) -> Tuple[Optional[RepairOutput], Dict[str, Any]]:
+        if reference is None:
+            return None, {"success": False, "error": "A reference RAW file from the same camera is required for IFD rebuilding."}
+
+        corrupted = bytearray(data)
+        reference = bytes(reference)
+
         byte_order = _detect_byte_order(corrupted)
         ref_byte_order = _detect_byte_order(reference)
         if not byte_order or not ref_byte_order:
-            return {"success": False, "error": "Could not detect byte order. Files may not be valid TIFF/RAW."}
+            return None, {"success": False, "error": "Could not detect byte order. Files may not be valid TIFF/RAW."}
 
         # Find the first IFD offset in the reference
         ref_ifd_offset = _read_u32(reference, 4, ref_byte_order)
@@ -174,7 +197,7 @@ class TiffIfdRebuilderStrategy(BaseStrategy):
         # Find the same IFD in the corrupted file (same relative location)
         # We use the first IFD offset from the corrupted file
         if len(corrupted) < 8:
-            return {"success": False, "error": "Corrupted file too small to be a valid TIFF."}
+            return None, {"success": False, "error": "Corrupted file too small to be a valid TIFF."}
 
         corrupt_ifd_offset = _read_u32(bytes(corrupted), 4, byte_order)
         if corrupt_ifd_offset + 2 + ref_count * 12 > len(corrupted):
@@ -199,12 +222,8 @@ class TiffIfdRebuilderStrategy(BaseStrategy):
             new_offset_bytes = _write_u32(new_ifd_offset, byte_order)
             corrupted[4:8] = new_offset_bytes
 
-        with open(output_path, 'wb') as f:
-            f.write(corrupted)
-
-        return {
+        return corrupted, {
             "success": True,
-            "output_path": output_path,
             "ifd_entries_patched": ref_count,
             "method": "ifd_transplant"
         }
@@ -0,0 +1,105 @@
+import os
+import sys
+import struct
+import tempfile
+import unittest
+from unittest import mock
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from lib.jpeg_header import parse_jpeg_header
+from services.batch_clustering import header_signature, cluster_files, repair_clusters
+from strategies.header_grafting import HeaderGraftingStrategy
+from strategies.marker_sanitization import MarkerSanitizationStrategy
+
+
+def _segment(marker: int, payload: bytes) -> bytes:
+    return bytes([0xFF, marker]) + struct.pack('>H', len(payload) + 2) + payload
+
+
+def _jpeg(quality=1, comment=b'shot-1', bitstream=b'\x12\x34' * 200) -> bytes:
+    sof = struct.pack('>BHHB', 8, 48, 64, 1) + bytes([1, 0x11, 0])
+    dqt = bytes([0]) + bytes([quality] * 64)
+    return (
+        b'\xff\xd8'
+        + _segment(0xFE, comment)
+        + _segment(0xDB, dqt)
+        + _segment(0xC0, sof)
+        + _segment(0xDA, bytes([1, 1, 0, 0, 63, 0]))
+        + bitstream
+        + b'\xff\xd9'
+    )
+
+
+class TestBatchClustering(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def _write(self, name, data):
+        path = os.path.join(self.temp_dir.name, name)
+        with open(path, 'wb') as f:
+            f.write(data)
+        return path
+
+    def test_signature_covers_header_up_to_bitstream_offset(self):
+        data = _jpeg()
+        path = self._write('a.jpg', data)
+        sig = header_signature(path)
+        self.assertEqual(sig['header_bytes'], MarkerSanitizationStrategy()._find_bitstream_offset(data))
+        self.assertEqual(sig['header_bytes'], parse_jpeg_header(data)['bitstream_offset'])
+
+    def test_groups_by_encoder_settings(self):
+        a = self._write('a.jpg', _jpeg(comment=b'shot-1'))
+        b = self._write('b.jpg', _jpeg(comment=b'a different per-shot comment'))
+        c = self._write('c.jpg', _jpeg(quality=9))
+        broken = self._write('broken.jpg', b'\xff\xd8\x00\x00garbage')
+
+        grouping = cluster_files([a, b, c, broken])
+        self.assertEqual([g['files'] for g in grouping['clusters']], [[a, b], [c]])
+        self.assertEqual(grouping['unclustered'], [broken])
+
+    def test_reference_parsed_once_per_cluster(self):
+        reference = self._write('reference.jpg', _jpeg())
+        targets = [self._write(f't{i}.jpg', _jpeg(bitstream=bytes([i]) * 50)) for i in range(3)]
+        out_dir = os.path.join(self.temp_dir.name, 'out')
+        os.makedirs(out_dir)
+
+        strategy = HeaderGraftingStrategy()
+        clusters = cluster_files(targets)['clusters']
+        lookups = []
+
+        def reference_for(cluster):
+            lookups.append(cluster['signature'])
+            return reference
+
+        with mock.patch.object(strategy, '_find_sos', wraps=strategy._find_sos) as find_sos:
+            results = repair_clusters(clusters, strategy, out_dir, '.jpg', reference_for)
+            reference_parses = [c for c in find_sos.call_args_list if c.kwargs.get('strict', True) and len(c.args) == 1]
+
+        self.assertTrue(all(r['success'] for r in results))
+        self.assertEqual(len(lookups), 1)
+        self.assertEqual(len(reference_parses), 1)
+        self.assertEqual(len(os.listdir(out_dir)), 3)
+
+    def test_same_names_in_subfolders_do_not_collide(self):
+        reference = self._write('reference.jpg', _jpeg())
+        for folder in ('a', 'b'):
+            os.makedirs(os.path.join(self.temp_dir.name, 'in', folder))
+        targets = [self._write(os.path.join('in', folder, 'IMG_0001.JPG'), _jpeg(bitstream=bytes([i + 1]) * 50))
+                   for i, folder in enumerate(('a', 'b'))]
+        out_dir = os.path.join(self.temp_dir.name, 'out')
+
+        results = repair_clusters(cluster_files(targets)['clusters'], HeaderGraftingStrategy(), out_dir, '.jpg',
+                                  lambda cluster: reference, input_dir=os.path.join(self.temp_dir.name, 'in'))
+
+        self.assertTrue(all(r['success'] for r in results))
+        outputs = sorted(r['output_path'] for r in results)
+        self.assertEqual(outputs, [os.path.join(out_dir, folder, 'IMG_0001_repaired.jpg') for folder in ('a', 'b')])
+        with open(outputs[0], 'rb') as a, open(outputs[1], 'rb') as b:
+            self.assertNotEqual(a.read(), b.read())
+
+
+if __name__ == '__main__':
+    unittest.main()
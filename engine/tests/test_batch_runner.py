@@ -0,0 +1,149 @@
+import os
+import sys
+import json
+import struct
+import tempfile
+import unittest
+from unittest import mock
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from services.batch_journal import BatchJournal, file_digest, job_key
+from services.batch_runner import run_batch, JOURNAL_NAME
+from strategies.base import write_output_atomic, PARTIAL_SUFFIX
+
+
+def _jpeg(bitstream: bytes) -> bytes:
+    dqt = b'\xff\xdb' + struct.pack('>H', 67) + b'\x00' + bytes(range(1, 65))
+    sof = b'\xff\xc0' + struct.pack('>HBHHB', 11, 8, 16, 16, 1) + b'\x01\x11\x00'
+    dht = b'\xff\xc4' + struct.pack('>H', 20) + b'\x00' + b'\x01' + b'\x00' * 15 + b'\x00'
+    sos = b'\xff\xda' + struct.pack('>H', 8) + b'\x01\x01\x00\x00\x3f\x00'
+    return b'\xff\xd8' + dqt + sof + dht + sos + bitstream + b'\xff\xd9'
+
+
+class TestAtomicWrite(unittest.TestCase):
+    def test_failed_write_leaves_nothing_behind(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'out.jpg')
+            with self.assertRaises(TypeError):
+                write_output_atomic([b'abc', None], path)
+            self.assertEqual(os.listdir(tmp), [])
+
+            write_output_atomic([b'abc', b'def'], path)
+            with open(path, 'rb') as f:
+                self.assertEqual(f.read(), b'abcdef')
+            self.assertEqual(os.listdir(tmp), ['out.jpg'])
+
+
+class TestBatchJournal(unittest.TestCase):
+    def test_last_record_wins_and_torn_line_is_ignored(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'journal.jsonl')
+            with BatchJournal(path) as journal:
+                journal.record({'input_hash': 'h', 'strategy': 's', 'status': 'failed', 'error': 'x'})
+                journal.record({'input_hash': 'h', 'strategy': 's', 'status': 'done', 'output_path': None})
+            with open(path, 'a') as f:
+                f.write('{"input_hash": "h", "strat')
+
+            with BatchJournal(path) as journal:
+                self.assertEqual(len(journal), 1)
+                self.assertEqual(journal.latest(job_key('h', 's'))['status'], 'done')
+                # Done, but no output on disk: not complete
+                self.assertIsNone(journal.completed_output(job_key('h', 's')))
+
+
+class TestRunBatch(unittest.TestCase):
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.input_dir = os.path.join(self._tmp.name, 'in')
+        self.output_dir = os.path.join(self._tmp.name, 'out')
+        os.makedirs(os.path.join(self.input_dir, 'sub'))
+        self.inputs = {
+            'a.jpg': _jpeg(b'\x11\xff\x22\x33'),
+            'b.jpg': _jpeg(b'\x44\x55'),
+            os.path.join('sub', 'a.jpg'): _jpeg(b'\x66\xff\x99\x77'),
+        }
+        for name, data in self.inputs.items():
+            with open(os.path.join(self.input_dir, name), 'wb') as f:
+                f.write(data)
+
+    def tearDown(self):
+        self._tmp.cleanup()
+
+    def _run(self):
+        return run_batch(self.input_dir, 'marker-sanitization', self.output_dir)
+
+    def test_restart_skips_completed_jobs(self):
+        first = self._run()
+        self.assertTrue(first['success'])
+        self.assertEqual(first['done'], 3)
+        outputs = sorted(r['output_path'] for r in first['results'])
+        self.assertIn(os.path.join(self.output_dir, 'sub', 'a_repaired.jpg'), outputs)
+        for result in first['results']:
+            self.assertTrue(result['validation']['valid'])
+
+        second = self._run()
+        self.assertEqual((second['done'], second['skipped']), (0, 3))
+
+        with open(os.path.join(self.output_dir, JOURNAL_NAME)) as f:
+            records = [json.loads(line) for line in f]
+        self.assertEqual(len(records), 3)
+        self.assertEqual(records[0]['input_hash'], file_digest(os.path.join(self.input_dir, 'a.jpg')))
+
+    def test_parallel_run_under_memory_budget(self):
+        result = run_batch(self.input_dir, 'marker-sanitization', self.output_dir, workers=2, memory_budget=1 << 30)
+        self.assertEqual(result['done'], 3)
+        self.assertEqual(result['scheduling']['max_concurrency'], 2)
+        self.assertEqual(self._run()['skipped'], 3)
+
+    def test_damaged_or_missing_outputs_are_redone(self):
+        self._run()
+        # A truncated output (e.g. copied over by hand) and a deleted one
+        with open(os.path.join(self.output_dir, 'a_repaired.jpg'), 'r+b') as f:
+            f.truncate(10)
+        os.remove(os.path.join(self.output_dir, 'b_repaired.jpg'))
+        stale = os.path.join(self.output_dir, f'.b_repaired.jpg.x1y2{PARTIAL_SUFFIX}')
+        with open(stale, 'wb') as f:
+            f.write(b'half')
+
+        result = self._run()
+        self.assertEqual((result['done'], result['skipped']), (2, 1))
+        self.assertEqual(result['partials_removed'], [stale])
+        self.assertFalse(os.path.exists(stale))
+        self.assertGreater(os.path.getsize(os.path.join(self.output_dir, 'a_repaired.jpg')), 10)
+
+    def test_changed_input_is_a_new_job(self):
+        self._run()
+        with open(os.path.join(self.input_dir, 'b.jpg'), 'wb') as f:
+            f.write(_jpeg(b'\x01\x02\x03'))
+        result = self._run()
+        self.assertEqual((result['done'], result['skipped']), (1, 2))
+
+    def test_failed_jobs_are_journaled_and_retried(self):
+        with open(os.path.join(self.input_dir, 'junk.jpg'), 'wb') as f:
+            f.write(b'not a jpeg at all')
+        first = self._run()
+        self.assertFalse(first['success'])
+        self.assertEqual(first['failed'], 1)
+
+        with mock.patch('strategies.marker_sanitization.MarkerSanitizationStrategy.repair_buffer') as repair:
+            repair.return_value = (b'\xff\xd8\xff\xd9', {'success': True})
+            second = self._run()
+        self.assertEqual((second['done'], second['skipped'], second['failed']), (1, 3, 0))
+        self.assertEqual(repair.call_count, 1)
+
+    def test_unreadable_input_fails_only_its_job(self):
+        vanished = os.path.join(self.input_dir, 'vanished.jpg')
+        listed = sorted([vanished] + [os.path.join(self.input_dir, name) for name in self.inputs])
+        with mock.patch('services.batch_runner.collect_inputs', return_value=listed):
+            result = self._run()
+        self.assertEqual((result['done'], result['failed']), (3, 1))
+        failed = [r for r in result['results'] if r['status'] == 'failed']
+        self.assertEqual([r['input_path'] for r in failed], [vanished])
+
+        with open(os.path.join(self.output_dir, JOURNAL_NAME)) as f:
+            records = [json.loads(line) for line in f]
+        self.assertEqual([r['status'] for r in records if r['input_path'] == vanished], ['failed'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,105 @@
+import os
+import sys
+import random
+import tempfile
+import unittest
+from unittest import mock
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from services import blank_map
+from services.blank_map import build_blank_map, load_blank_map, data_ranges, blank_bytes, sidecar_path
+from services.carver import carve_image
+
+BLOCK = 4096
+
+
+def _fake_jpeg(size: int, fill: int) -> bytes:
+    return b'\xff\xd8\xff\xe0' + bytes([fill]) * (size - 6) + b'\xff\xd9'
+
+
+class TestBlankMap(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.image_path = os.path.join(self.temp_dir.name, 'card.img')
+
+        rng = random.Random(7)
+        noise = bytes(rng.randrange(1, 0xFF) for _ in range(BLOCK))
+        # noise | 3 zero blocks | noise | 2 erased (0xFF) blocks | jpeg | zero tail
+        self.jpeg_offset = 7 * BLOCK
+        image = noise + b'\x00' * 3 * BLOCK + noise + b'\xff' * 2 * BLOCK
+        image += _fake_jpeg(20000, fill=0x55)
+        image += b'\x00' * (-len(image) % BLOCK) + b'\x00' * 2 * BLOCK
+        self.size = len(image)
+        with open(self.image_path, 'wb') as f:
+            f.write(image)
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def _expected_blank(self):
+        # The jpeg's padding is shorter than a block, so only the two tail blocks count
+        return [[BLOCK, 4 * BLOCK, 0], [5 * BLOCK, 7 * BLOCK, 255], [self.size - 2 * BLOCK, self.size, 0]]
+
+    def test_uniform_blocks(self):
+        self.assertEqual(build_blank_map(self.image_path, BLOCK)['blank'], self._expected_blank())
+
+    def test_bytes_fallback_matches(self):
+        with mock.patch.object(blank_map, 'np', None):
+            self.assertEqual(build_blank_map(self.image_path, BLOCK)['blank'], self._expected_blank())
+
+    def test_data_ranges_are_the_complement(self):
+        result = build_blank_map(self.image_path, BLOCK)
+        ranges = data_ranges(result)
+        self.assertEqual(ranges[0], (0, BLOCK))
+        self.assertEqual(sum(end - start for start, end in ranges) + blank_bytes(result), self.size)
+
+    def test_sidecar_is_reused_until_the_image_changes(self):
+        map_path = os.path.join(self.temp_dir.name, 'card.map')
+        self.assertFalse(load_blank_map(self.image_path, BLOCK, map_path)['reused'])
+        self.assertTrue(os.path.exists(map_path))
+        self.assertTrue(load_blank_map(self.image_path, BLOCK, map_path)['reused'])
+
+        with open(self.image_path, 'ab') as f:
+            f.write(b'\x01')
+        self.assertFalse(load_blank_map(self.image_path, BLOCK, map_path)['reused'])
+
+    def test_no_sidecar_without_a_destination(self):
+        self.assertFalse(load_blank_map(self.image_path, BLOCK)['reused'])
+        self.assertEqual(os.listdir(self.temp_dir.name), ['card.img'])
+
+    def test_sparse_holes_are_blank(self):
+        sparse_path = os.path.join(self.temp_dir.name, 'sparse.img')
+        with open(sparse_path, 'wb') as f:
+            f.write(b'\x01' * BLOCK)
+            f.truncate(64 * 1024 * 1024)
+        result = build_blank_map(sparse_path, BLOCK)
+        # Whether the hole is reported by SEEK_HOLE or read as zero blocks, it is blank
+        self.assertEqual(data_ranges(result), [(0, BLOCK)])
+
+    def test_carve_skips_blank_regions(self):
+        skipped = carve_image(self.image_path, workers=1, range_size=BLOCK, overlap=0, blank_block_size=BLOCK)
+        for sector_size in (0, 512):
+            full = carve_image(self.image_path, workers=1, sector_size=sector_size, skip_blank=False)
+            result = carve_image(self.image_path, workers=2, range_size=BLOCK, overlap=0, sector_size=sector_size,
+                                 blank_block_size=BLOCK)
+            self.assertEqual(result['files'], full['files'])
+        self.assertEqual(skipped['files'][0]['offset'], self.jpeg_offset)
+        self.assertEqual(skipped['blank_bytes_skipped'], blank_bytes({'blank': self._expected_blank()}))
+        self.assertLess(skipped['bytes_scanned'], self.size)
+
+    def test_carve_keeps_the_map_in_the_output_dir(self):
+        out_dir = os.path.join(self.temp_dir.name, 'out')
+        os.makedirs(out_dir)
+        first = carve_image(self.image_path, out_dir, workers=2, range_size=BLOCK, overlap=0, blank_block_size=BLOCK)
+        self.assertFalse(first['blank_map_reused'])
+        self.assertEqual(sorted(os.listdir(self.temp_dir.name)), ['card.img', 'out'])
+        self.assertEqual(load_blank_map(self.image_path, BLOCK, sidecar_path(self.image_path, out_dir))['blank'],
+                         self._expected_blank())
+
+        second = carve_image(self.image_path, out_dir, workers=2, range_size=BLOCK, overlap=0, blank_block_size=BLOCK)
+        self.assertTrue(second['blank_map_reused'])
+        self.assertEqual(second['files'], first['files'])
+        self.assertEqual(second['bytes_scanned'], first['bytes_scanned'])
+
+if __name__ == '__main__':
+    unittest.main()
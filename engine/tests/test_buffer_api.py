@@ -0,0 +1,106 @@
+import os
+import sys
+import struct
+import zlib
+import tempfile
+import unittest
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from strategies.base import BaseStrategy, write_output
+from strategies.registry import load_strategy
+
+SOS = b'\xff\xda\x00\x03\x01'
+
+
+def _jpeg(header: bytes, bitstream: bytes) -> bytes:
+    return header + SOS + bitstream + b'\xff\xd9'
+
+
+def _png() -> bytes:
+    def chunk(kind, data):
+        return struct.pack('>I', len(data)) + kind + data + struct.pack('>I', zlib.crc32(kind + data))
+    ihdr = struct.pack('>IIBBBBB', 1, 1, 8, 0, 0, 0, 0)
+    return b'\x89PNG\r\n\x1a\n' + chunk(b'IHDR', ihdr) + chunk(b'IDAT', zlib.compress(b'\x00\x00'))
+
+
+class _PathOnlyStrategy(BaseStrategy):
+    """A strategy that only implements the path API, to exercise the fallback."""
+    name = "path-only"
+    requires_reference = False
+
+    def can_repair(self, analysis_result):
+        return True
+
+    def repair(self, input_path, output_path, reference_path=None):
+        with open(input_path, 'rb') as f:
+            data = f.read()
+        with open(output_path, 'wb') as f:
+            f.write(data[::-1])
+        return {"success": True, "output_path": output_path, "reversed": len(data)}
+
+
+class TestBufferApi(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def _path(self, name, data=None):
+        path = os.path.join(self.temp_dir.name, name)
+        if data is not None:
+            with open(path, 'wb') as f:
+                f.write(data)
+        return path
+
+    def _assert_same_as_path_api(self, strategy_name, data, reference=None):
+        strategy = load_strategy(strategy_name)
+        input_path = self._path('input', data)
+        reference_path = self._path('reference', reference) if reference is not None else None
+        output_path = self._path('output')
+
+        path_result = strategy.repair(input_path, output_path, reference_path)
+        with open(output_path, 'rb') as f:
+            expected = f.read()
+
+        output, result = strategy.repair_buffer(memoryview(data), memoryview(reference) if reference else None)
+        buffer_path = self._path('buffer-output')
+        write_output(output, buffer_path)
+        with open(buffer_path, 'rb') as f:
+            self.assertEqual(f.read(), expected)
+
+        path_result.pop('output_path')
+        self.assertEqual(result, path_result)
+
+    def test_header_grafting(self):
+        reference = _jpeg(b'\xff\xd8\xff\xe1\x00\x0eEXIF_HEALTHY', b'\x11' * 8)
+        target = _jpeg(b'\xff\xd8\xff\xe1\x00\x0eEXIF_CORRUPT', b'\x99' * 8)[:-2]
+        self._assert_same_as_path_api('header-grafting', target, reference)
+
+    def test_marker_sanitization(self):
+        self._assert_same_as_path_api('marker-sanitization', _jpeg(b'\xff\xd8', b'\x12\xff\xaa\x34\xff\x00'))
+
+    def test_png_chunk_rebuilder(self):
+        self._assert_same_as_path_api('png-chunk-rebuilder', _png())
+
+    def test_preview_extraction(self):
+        data = b'\x00' * 100 + b'\xff\xd8' + b'\xbb' * 20000 + b'\xff\xd9' + b'\x00' * 100
+        self._assert_same_as_path_api('preview-extraction', data)
+
+    def test_heic_minimal_container(self):
+        data = struct.pack('>I', 16) + b'ftypheic\x00\x00\x00\x00' + struct.pack('>I', 12) + b'mdat\x01\x02\x03\x04'
+        self._assert_same_as_path_api('heic-box-recovery', data)
+
+    def test_failure_returns_no_output(self):
+        output, result = load_strategy('marker-sanitization').repair_buffer(b'not a jpeg')
+        self.assertIsNone(output)
+        self.assertFalse(result['success'])
+
+    def test_default_implementation_round_trips_through_path_api(self):
+        output, result = _PathOnlyStrategy().repair_buffer(b'abc')
+        self.assertEqual(output, b'cba')
+        self.assertEqual(result, {"success": True, "reversed": 3})
+
+
+if __name__ == '__main__':
+    unittest.main()
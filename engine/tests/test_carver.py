@@ -0,0 +1,117 @@
+import os
+import sys
+import mmap
+import random
+import struct
+import tempfile
+import unittest
+from unittest import mock
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from services import carver
+from services.carver import carve_image, find_aligned_headers
+
+SECTOR = 512
+
+
+def _fake_jpeg(size: int, fill: int) -> bytes:
+    return b'\xff\xd8\xff\xe0' + bytes([fill]) * (size - 6) + b'\xff\xd9'
+
+
+class TestCarver(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.image_path = os.path.join(self.temp_dir.name, 'card.img')
+
+        rng = random.Random(3)
+        self.layout = []
+        image = bytearray()
+        for size in (15000, 40000, 12000, 90000, 11000):
+            image += bytes(rng.randrange(0, 0xFF) for _ in range(rng.randrange(100, 3000)))
+            self.layout.append({'offset': len(image), 'length': size, 'format': 'jpeg'})
+            image += _fake_jpeg(size, fill=0x55)
+        # A thumbnail (too small) and an SOI that never ends
+        image += _fake_jpeg(2000, fill=0x66) + b'\xff\xd8\xff\xe1' + b'\x22' * 5000
+        with open(self.image_path, 'wb') as f:
+            f.write(image)
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def test_serial_carve(self):
+        result = carve_image(self.image_path, workers=1)
+        self.assertEqual(result['files'], self.layout)
+
+    def test_parallel_result_is_independent_of_range_split(self):
+        # Tiny ranges and overlap force many files to cross range boundaries
+        expected = carve_image(self.image_path, workers=1)['files']
+        for range_size, overlap in ((4096, 1024), (10000, 0), (70000, 30000)):
+            result = carve_image(self.image_path, workers=3, range_size=range_size, overlap=overlap)
+            self.assertEqual(result['files'], expected)
+
+    def test_size_limit_is_independent_of_range_split(self):
+        # One file ends past MAX_FILE_SIZE (inside a worker's overlap window), one within it
+        image = _fake_jpeg(1500, fill=0x55) + b'\x11' * 200 + _fake_jpeg(800, fill=0x55)
+        with open(self.image_path, 'wb') as f:
+            f.write(image)
+        with mock.patch.object(carver, 'MAX_FILE_SIZE', 1000):
+            wide = carve_image(self.image_path, workers=1, range_size=4096, overlap=1024, min_size=0, skip_blank=False)
+            narrow = carve_image(self.image_path, workers=1, range_size=512, overlap=256, min_size=0, skip_blank=False)
+        self.assertEqual(wide['files'], narrow['files'])
+        self.assertEqual(wide['files'], [{'offset': 1700, 'length': 800, 'format': 'jpeg'}])
+
+    def test_writes_carved_files(self):
+        # A missing output directory is created
+        out_dir = os.path.join(self.temp_dir.name, 'out', 'carved')
+        result = carve_image(self.image_path, output_dir=out_dir, workers=1)
+        first = result['files'][0]
+        with open(first['output_path'], 'rb') as f:
+            self.assertEqual(f.read(), _fake_jpeg(15000, fill=0x55))
+
+
+class TestAlignedCarving(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.image_path = os.path.join(self.temp_dir.name, 'card.img')
+
+        png = b'\x89PNG\r\n\x1a\n' + b'\x10' * 12000 + b'IEND\xaeB`\x82'
+        heic = struct.pack('>I', 16) + b'ftypheic\x00\x00\x00\x00' + struct.pack('>I', 20008) + b'mdat' + b'\x20' * 20000
+        tiff = b'II*\x00' + b'\x30' * 14000
+        # An unaligned SOI buried in data must not be picked up in aligned mode
+        junk = b'\x01' * 700 + _fake_jpeg(11000, fill=0x44)
+
+        self.layout = []
+        image = bytearray()
+        for fmt, blob in (('jpeg', _fake_jpeg(15000, fill=0x55)), ('png', png), ('heic', heic), ('tiff', tiff), (None, junk)):
+            if fmt:
+                self.layout.append({'offset': len(image), 'length': len(blob), 'format': fmt})
+            image += blob
+            image += b'\x00' * (-len(image) % SECTOR)
+        # The TIFF has no end marker: it runs up to the next aligned header (none), i.e. the image end
+        self.layout[3]['length'] = len(image) - self.layout[3]['offset']
+        with open(self.image_path, 'wb') as f:
+            f.write(image)
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def test_only_aligned_headers_are_carved(self):
+        result = carve_image(self.image_path, workers=1, sector_size=SECTOR)
+        self.assertEqual(result['files'], self.layout)
+
+    def test_parallel_aligned_matches_serial(self):
+        result = carve_image(self.image_path, workers=3, sector_size=SECTOR, range_size=5000, overlap=1000)
+        self.assertEqual(result['files'], self.layout)
+
+    def test_strided_fallback_matches(self):
+        with open(self.image_path, 'rb') as f:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as view:
+                expected = [(item['offset'], item['format']) for item in self.layout]
+                with mock.patch.object(carver, 'np', None):
+                    self.assertEqual(find_aligned_headers(view, 0, len(view), SECTOR), expected)
+                if carver.np is not None:
+                    self.assertEqual(find_aligned_headers(view, 0, len(view), SECTOR), expected)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,118 @@
+import os
+import sys
+import random
+import tempfile
+import unittest
+from unittest import mock
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from services import dedupe
+from services.dedupe import (
+    BKTree, hamming, group_duplicates, dhash_many, phash_many, dhash_python, phash_python,
+    DHASH_SIZE, PHASH_SIZE
+)
+
+
+def _scene(seed: int, size: int) -> bytes:
+    """Smooth greyscale scene: a few random gradients, sampled on a size x size grid."""
+    rng = random.Random(seed)
+    waves = [(rng.uniform(-3, 3), rng.uniform(-3, 3), rng.uniform(0, 6)) for _ in range(3)]
+    pixels = []
+    for y in range(size):
+        for x in range(size):
+            u, v = x / size, y / size
+            value = sum(abs((a * u + b * v + c) % 2 - 1) for a, b, c in waves) / 3
+            pixels.append(int(value * 255))
+    return bytes(pixels)
+
+
+def _print(path, dhash, phash, width=100, height=100, size=1000):
+    return {'path': path, 'dhash': dhash, 'phash': phash, 'width': width, 'height': height, 'size': size}
+
+
+class TestHashes(unittest.TestCase):
+    def test_vectorized_matches_reference(self):
+        phash_pixels = [_scene(i, PHASH_SIZE) for i in range(4)]
+        dhash_pixels = [bytes(random.Random(i).randrange(256) for _ in range(DHASH_SIZE * (DHASH_SIZE + 1))) for i in range(4)]
+        self.assertEqual(phash_many(phash_pixels), [phash_python(p) for p in phash_pixels])
+        self.assertEqual(dhash_many(dhash_pixels), [dhash_python(p) for p in dhash_pixels])
+        with mock.patch.object(dedupe, 'np', None):
+            self.assertEqual(phash_many(phash_pixels), [phash_python(p) for p in phash_pixels])
+
+    def test_phash_tolerates_small_changes(self):
+        original = _scene(7, PHASH_SIZE)
+        brighter = bytes(min(255, p + 12) for p in original)
+        other = _scene(8, PHASH_SIZE)
+        a, b, c = phash_many([original, brighter, other])
+        self.assertLessEqual(hamming(a, b), 4)
+        self.assertGreater(hamming(a, c), 16)
+
+
+class TestBKTree(unittest.TestCase):
+    def test_radius_search_matches_brute_force(self):
+        rng = random.Random(1)
+        values = [rng.getrandbits(64) for _ in range(500)]
+        # Near copies of the first few
+        values += [v ^ (1 << rng.randrange(64)) ^ (1 << rng.randrange(64)) for v in values[:20]]
+        tree = BKTree()
+        for i, value in enumerate(values):
+            tree.add(value, i)
+        for query in values[:30]:
+            expected = sorted(i for i, v in enumerate(values) if hamming(query, v) <= 6)
+            self.assertEqual(sorted(i for _d, i in tree.search(query, 6)), expected)
+
+
+class TestGrouping(unittest.TestCase):
+    def test_groups_keep_the_largest_image(self):
+        prints = [
+            _print('a_preview.jpg', 0x0F0F, 0xFF00, width=160, height=120),
+            _print('a_full.jpg', 0x0F0F, 0xFF01, width=4000, height=3000),
+            _print('a_resaved.jpg', 0x0F1F, 0xFF03, width=4000, height=3000, size=900),
+            _print('burst_b.jpg', 0xF0F0_0000_0000, 0x00FF_0000_0000),
+            _print('unrelated.jpg', 0xFFFF_FFFF_FFFF_FFFF, 0xFFFF_0000_FFFF_0000),
+        ]
+        groups = group_duplicates(prints, dhash_distance=4, phash_distance=4)
+        self.assertEqual(len(groups), 1)
+        self.assertEqual(groups[0]['keep'], 'a_full.jpg')
+        self.assertEqual([d['path'] for d in groups[0]['duplicates']], ['a_preview.jpg', 'a_resaved.jpg'])
+        self.assertEqual(groups[0]['duplicates'][0]['phash_distance'], 1)
+
+    def test_chained_members_stay_within_distance_of_the_kept_image(self):
+        # A burst: each frame is 3 bits from the next, so the ends are 9 apart
+        prints = [_print(f'burst_{n}.jpg', (1 << 3 * n) - 1, (1 << 3 * n) - 1, width=100 + n) for n in range(4)]
+        groups = group_duplicates(prints, dhash_distance=4, phash_distance=4)
+        self.assertEqual([(g['keep'], [d['path'] for d in g['duplicates']]) for g in groups],
+                         [('burst_1.jpg', ['burst_0.jpg']), ('burst_3.jpg', ['burst_2.jpg'])])
+        for group in groups:
+            for duplicate in group['duplicates']:
+                self.assertLessEqual(duplicate['dhash_distance'], 4)
+                self.assertLessEqual(duplicate['phash_distance'], 4)
+
+    def test_dhash_candidates_need_phash_confirmation(self):
+        prints = [_print('x.jpg', 0, 0), _print('y.jpg', 0, (1 << 64) - 1)]
+        self.assertEqual(group_duplicates(prints), [])
+
+
+@unittest.skipIf(dedupe.Image is None, "Pillow is not installed")
+class TestDedupeOutputs(unittest.TestCase):
+    def test_collapse_moves_duplicates(self):
+        Image = dedupe.Image
+        with tempfile.TemporaryDirectory() as tmp:
+            input_dir = os.path.join(tmp, 'out')
+            os.makedirs(input_dir)
+            scene = Image.frombytes('L', (256, 256), _scene(3, 256)).convert('RGB')
+            scene.save(os.path.join(input_dir, 'full.jpg'), quality=95)
+            scene.resize((64, 64)).save(os.path.join(input_dir, 'preview.jpg'), quality=70)
+            Image.frombytes('L', (256, 256), _scene(4, 256)).save(os.path.join(input_dir, 'other.png'))
+
+            collapse_dir = os.path.join(tmp, 'dupes')
+            result = dedupe.dedupe_outputs(input_dir, collapse_dir=collapse_dir, workers=1)
+            self.assertEqual(result['images'], 3)
+            self.assertEqual([(g['keep'], len(g['duplicates'])) for g in result['groups']],
+                             [(os.path.join(input_dir, 'full.jpg'), 1)])
+            self.assertEqual(os.listdir(collapse_dir), ['preview.jpg'])
+            self.assertEqual(sorted(os.listdir(input_dir)), ['full.jpg', 'other.png'])
+
+
+if __name__ == '__main__':
+    unittest.main()
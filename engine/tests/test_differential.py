@@ -0,0 +1,112 @@
+import os
+import sys
+import json
+import random
+import tempfile
+import subprocess
+import unittest
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from services.differential import build_corpus, diff_outputs, synthetic_jpeg, MISALIGN_BYTES, SHARED_STRATEGIES
+
+MAIN_PY = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "main.py")
+
+# Stands in for the Node runner: follows its manifest protocol and "repairs" by copying the input
+FAKE_RUNNER = """
+import os, json, shutil
+manifest = json.load(open(os.environ['STRATEGY_DIFF_MANIFEST']))
+results = []
+for case in manifest['cases']:
+    shutil.copyfile(case['input'], case['output'])
+    results.append({'id': case['id'], 'success': True, 'seconds': [0.001] * manifest['iterations'], 'peak_rss': 2048})
+print(json.dumps({'runtime': 'fake', 'baseline_rss': 1024, 'results': results}))
+"""
+
+
+class TestCorpus(unittest.TestCase):
+    def test_synthetic_jpeg_has_restart_markers_and_stuffing(self):
+        data = synthetic_jpeg(64 * 1024, random.Random(1))
+        self.assertTrue(data.startswith(b'\xff\xd8') and data.endswith(b'\xff\xd9'))
+        self.assertAlmostEqual(len(data), 64 * 1024, delta=2048)
+        scan = data[data.find(b'\xff\xda') + 10:-2]
+        followers = {scan[i + 1] for i in range(len(scan) - 1) if scan[i] == 0xFF}
+        self.assertTrue(followers <= {0x00} | set(range(0xD0, 0xD8)))
+        self.assertIn(0xD0, followers)
+
+    def test_each_strategy_gets_its_damage(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            cases = {c['strategy']: c for c in build_corpus(tmpdir, SHARED_STRATEGIES, [0.25])}
+            read = lambda path: open(path, 'rb').read()
+
+            damaged = read(cases['marker-sanitization']['input'])
+            self.assertRegex(damaged, b'\xff[\x01\x9a\xc5\xe7]')
+
+            self.assertIsNotNone(cases['header-grafting']['reference'])
+            self.assertNotIn(b'\xff\xdb', read(cases['header-grafting']['input']))
+
+            mcu = cases['mcu-alignment']
+            self.assertEqual(len(read(mcu['reference'])) - len(read(mcu['input'])), MISALIGN_BYTES)
+
+            raw = read(cases['preview-extraction']['input'])
+            self.assertTrue(raw.startswith(b'II*\x00'))
+            self.assertGreater(raw.find(b'\xff\xd8'), 0)
+
+
+class TestDiffOutputs(unittest.TestCase):
+    def test_reports_first_difference_and_count(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            a, b, c = (os.path.join(tmpdir, name) for name in 'abc')
+            for path, data in ((a, b'abcdef'), (b, b'abXdeY'), (c, b'abcdef!!')):
+                with open(path, 'wb') as f:
+                    f.write(data)
+
+            self.assertTrue(diff_outputs(a, a)['identical'])
+            diff = diff_outputs(a, b)
+            self.assertEqual((diff['identical'], diff['first_difference'], diff['differing_bytes']), (False, 2, 2))
+            diff = diff_outputs(a, c)
+            self.assertEqual((diff['first_difference'], diff['differing_bytes']), (6, 2))
+            self.assertEqual(diff_outputs(a, os.path.join(tmpdir, 'missing')),
+                             {'python_size': 6, 'node_size': None, 'identical': False})
+
+
+class TestDiffStrategiesCommand(unittest.TestCase):
+    def test_runs_both_sides_and_diffs(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            runner = os.path.join(tmpdir, 'runner.py')
+            with open(runner, 'w') as f:
+                f.write(FAKE_RUNNER)
+            proc = subprocess.run(
+                [sys.executable, MAIN_PY, "diff-strategies", "--work-dir", os.path.join(tmpdir, 'work'),
+                 "--strategy", "mcu-alignment", "--strategy", "marker-sanitization", "--sizes", "0.1",
+                 "--iterations", "1", "--node-command", sys.executable, "--runner", runner],
+                capture_output=True, text=True
+            )
+            self.assertEqual(proc.returncode, 0, proc.stderr)
+            result = json.loads(proc.stdout.strip().splitlines()[-1])
+
+            cases = {c['strategy']: c for c in result['cases']}
+            # The engine leaves an aligned-looking stream alone, just like the copy
+            self.assertTrue(cases['mcu-alignment']['diff']['identical'])
+            sanitized = cases['marker-sanitization']
+            self.assertFalse(sanitized['diff']['identical'])
+            self.assertTrue(sanitized['python']['success'] and sanitized['node']['success'])
+            self.assertEqual(sanitized['node']['peak_rss_over_baseline'], 1024)
+            self.assertGreater(sanitized['python']['mb_per_s'], 0)
+            self.assertEqual([s['node_runtime'] for s in result['summary']], ['fake', 'fake'])
+
+    def test_missing_node_runtime_is_reported_per_case(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            proc = subprocess.run(
+                [sys.executable, MAIN_PY, "diff-strategies", "--work-dir", tmpdir, "--strategy", "header-grafting",
+                 "--sizes", "0.1", "--iterations", "1", "--node-command", os.path.join(tmpdir, 'no-such-node')],
+                capture_output=True, text=True
+            )
+            self.assertEqual(proc.returncode, 0, proc.stderr)
+            case = json.loads(proc.stdout.strip().splitlines()[-1])['cases'][0]
+            self.assertTrue(case['python']['success'])
+            self.assertFalse(case['node']['success'])
+            self.assertIn('could not run', case['node']['error'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,62 @@
+import os
+import sys
+import json
+import subprocess
+import unittest
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from strategies.registry import STRATEGY_REGISTRY, list_strategies, load_strategy
+
+ENGINE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MAIN_PY = os.path.join(ENGINE_DIR, "main.py")
+
+# Self time (microseconds) that main.py may add to interpreter start-up.
+# Measured at ~25 ms; the headroom absorbs slow CI machines, not new heavy imports.
+IMPORT_BUDGET_US = 120_000
+
+# Modules that must never be imported just to start the engine
+HEAVY_MODULES = {"PIL", "numpy", "sqlite3", "multiprocessing", "concurrent"} | {
+    entry["module"] for entry in STRATEGY_REGISTRY.values()
+}
+
+
+def _import_times(args):
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime"] + args,
+        capture_output=True, text=True, cwd=ENGINE_DIR, check=True
+    )
+    times = {}
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, _cumulative, name = line[len("import time:"):].split("|")
+        times[name.strip()] = int(self_us)
+    return times, proc.stdout
+
+
+class TestEngineStartup(unittest.TestCase):
+    def test_list_strategies_imports_nothing_heavy(self):
+        baseline, _ = _import_times(["-c", "pass"])
+        times, stdout = _import_times([MAIN_PY, "--list-strategies"])
+
+        added = {name: us for name, us in times.items() if name not in baseline}
+        heavy = {name for name in added if name.split(".")[0] in HEAVY_MODULES or name in HEAVY_MODULES}
+        self.assertEqual(heavy, set())
+        self.assertLess(sum(added.values()), IMPORT_BUDGET_US, f"import budget exceeded: {added}")
+
+        listed = json.loads(stdout)["strategies"]
+        self.assertEqual([s["name"] for s in listed], list(STRATEGY_REGISTRY))
+
+    def test_registry_matches_strategy_classes(self):
+        for entry in list_strategies():
+            strategy = load_strategy(entry["name"])
+            self.assertEqual(strategy.name, entry["name"])
+            self.assertEqual(strategy.requires_reference, entry["requires_reference"])
+
+    def test_unknown_strategy(self):
+        with self.assertRaises(ValueError):
+            load_strategy("does-not-exist")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,160 @@
+import os
+import sys
+import random
+import struct
+import tempfile
+import unittest
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from lib.jpeg_decodability import decodability
+from services.ensemble import graft_ensemble
+
+# (counts per code length, symbols): the tables the test bitstream is encoded with
+DC_TABLE = ([0, 4] + [0] * 14, bytes([0, 1, 2, 3]))
+AC_TABLE = ([0, 3, 1] + [0] * 13, bytes([0x00, 0x01, 0x11, 0xF0]))
+# Tables from "another camera": shorter codes and holes in the code space
+WRONG_DC_TABLE = ([1, 1] + [0] * 14, bytes([5, 11]))
+WRONG_AC_TABLE = ([1] + [0] * 15, bytes([0x00]))
+
+SIZE = 64
+
+
+def _codes(table):
+    counts, symbols = table
+    codes, code, k = {}, 0, 0
+    for length in range(1, 17):
+        for _ in range(counts[length - 1]):
+            codes[symbols[k]] = (code, length)
+            code += 1
+            k += 1
+        code <<= 1
+    return codes
+
+
+def _bitstream(seed: int, restart_interval: int = 0) -> bytes:
+    """Random blocks Huffman-coded with DC_TABLE/AC_TABLE, byte-stuffed, with RSTn when asked."""
+    rng = random.Random(seed)
+    dc, ac = _codes(DC_TABLE), _codes(AC_TABLE)
+    out = bytearray()
+    bits = []
+
+    def flush():
+        bits.extend([1] * (-len(bits) % 8))
+        for i in range(0, len(bits), 8):
+            byte = int(''.join(map(str, bits[i:i + 8])), 2)
+            out.extend(b'\xff\x00' if byte == 0xFF else bytes([byte]))
+        bits.clear()
+
+    def put(code, length):
+        bits.extend(int(b) for b in format(code, f'0{length}b'))
+
+    blocks = (SIZE // 8) ** 2
+    for n in range(blocks):
+        if restart_interval and n and n % restart_interval == 0:
+            flush()
+            out.extend(bytes([0xFF, 0xD0 + (n // restart_interval - 1) % 8]))
+        s = rng.randrange(4)
+        put(*dc[s])
+        if s:
+            put(rng.getrandbits(s), s)
+        k = 1
+        for _ in range(rng.randrange(6)):
+            symbol = rng.choice([0x01, 0x11, 0xF0])
+            step = {0x01: 1, 0x11: 2, 0xF0: 16}[symbol]
+            if k + step > 63:
+                break
+            put(*ac[symbol])
+            if symbol != 0xF0:
+                put(rng.getrandbits(1), 1)
+            k += step
+        put(*ac[0x00])
+    flush()
+    return bytes(out)
+
+
+def _header(dc_table, ac_table, restart_interval: int = 0) -> bytes:
+    def dht(tc, table):
+        counts, symbols = table
+        return b'\xff\xc4' + struct.pack('>H', 19 + len(symbols)) + bytes([tc << 4]) + bytes(counts) + symbols
+    header = b'\xff\xd8'
+    header += b'\xff\xdb' + struct.pack('>H', 67) + b'\x00' + bytes(range(1, 65))
+    header += b'\xff\xc0' + struct.pack('>HBHHB', 11, 8, SIZE, SIZE, 1) + b'\x01\x11\x00'
+    header += dht(0, dc_table) + dht(1, ac_table)
+    if restart_interval:
+        header += b'\xff\xdd' + struct.pack('>HH', 4, restart_interval)
+    return header + b'\xff\xda' + struct.pack('>H', 8) + b'\x01\x01\x00\x00\x3f\x00'
+
+
+class TestDecodability(unittest.TestCase):
+    def test_matching_tables_decode_fully(self):
+        for interval in (0, 4):
+            data = _header(DC_TABLE, AC_TABLE, interval) + _bitstream(1, interval) + b'\xff\xd9'
+            result = decodability(data)
+            self.assertEqual(result['score'], 1.0, result)
+            self.assertEqual(result['mcus_attempted'], (SIZE // 8) ** 2)
+
+    def test_wrong_tables_fail_early(self):
+        data = _header(WRONG_DC_TABLE, WRONG_AC_TABLE) + _bitstream(1) + b'\xff\xd9'
+        result = decodability(data)
+        self.assertLess(result['score'], 0.5)
+        self.assertIsNotNone(result['error'])
+
+    def test_truncated_stream(self):
+        data = _header(DC_TABLE, AC_TABLE) + _bitstream(2)[:40] + b'\xff\xd9'
+        self.assertLess(decodability(data)['score'], 1.0)
+
+    def test_restart_markers_out_of_sequence(self):
+        stream = bytearray(_bitstream(3, 4))
+        rst = stream.index(b'\xff\xd1')
+        stream[rst + 1] = 0xD5
+        data = _header(DC_TABLE, AC_TABLE, 4) + bytes(stream) + b'\xff\xd9'
+        self.assertLess(decodability(data, samples=1)['score'], 1.0)
+
+    def test_progressive_is_not_handled(self):
+        data = _header(DC_TABLE, AC_TABLE).replace(b'\xff\xc0', b'\xff\xc2') + _bitstream(1) + b'\xff\xd9'
+        self.assertIsNone(decodability(data))
+
+
+class TestGraftEnsemble(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        # Damaged target: its tables are gone, only the SOS and the bitstream remain
+        self.bitstream = _bitstream(4)
+        self.target = self._write('target.jpg', b'\xff\xd8\xff\xe0\x00\x06JUNK' + b'\xff\xda\x00\x08\x01\x01\x00\x00\x3f\x00' + self.bitstream + b'\xff\xd9')
+        self.wrong = self._write('wrong.jpg', _header(WRONG_DC_TABLE, WRONG_AC_TABLE) + _bitstream(5) + b'\xff\xd9')
+        self.right = self._write('right.jpg', _header(DC_TABLE, AC_TABLE) + _bitstream(6) + b'\xff\xd9')
+        self.broken = self._write('broken.jpg', b'not a jpeg at all')
+        self.output = os.path.join(self.temp_dir.name, 'out.jpg')
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def _write(self, name, data):
+        path = os.path.join(self.temp_dir.name, name)
+        with open(path, 'wb') as f:
+            f.write(data)
+        return path
+
+    def _assert_best_reference_wins(self, workers):
+        result = graft_ensemble(self.target, [self.broken, self.wrong, self.right], self.output, workers=workers)
+        self.assertTrue(result['success'])
+        self.assertEqual(result['reference_path'], self.right)
+        self.assertEqual([entry['reference_path'] for entry in result['ranking']], [self.right, self.wrong, self.broken])
+        self.assertFalse(result['ranking'][-1]['success'])
+        with open(self.output, 'rb') as f:
+            self.assertEqual(f.read(), _header(DC_TABLE, AC_TABLE) + self.bitstream + b'\xff\xd9')
+
+    def test_serial(self):
+        self._assert_best_reference_wins(workers=1)
+
+    def test_parallel(self):
+        self._assert_best_reference_wins(workers=3)
+
+    def test_no_usable_reference(self):
+        result = graft_ensemble(self.target, [self.broken], self.output)
+        self.assertFalse(result['success'])
+        self.assertFalse(os.path.exists(self.output))
+
+
+if __name__ == '__main__':
+    unittest.main()
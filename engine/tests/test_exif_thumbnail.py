@@ -0,0 +1,172 @@
+import os
+import sys
+import struct
+import random
+import tempfile
+import unittest
+from unittest import mock
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from services.batch_runner import run_batch
+from services.pipeline import read_input
+from strategies.exif_thumbnail import ExifThumbnailStrategy, locate_thumbnail, HEAD_READ_LIMIT
+
+THUMBNAIL = b'\xff\xd8\xff\xdb' + bytes(random.Random(3).randrange(0, 256) for _ in range(3000)) + b'\xff\xd9'
+
+
+def _exif(thumbnail_offset=None, thumbnail=THUMBNAIL, with_ifd1=True) -> bytes:
+    """Big-endian EXIF TIFF block: IFD0 with one tag, IFD1 pointing at the thumbnail appended after it."""
+    ifd0 = struct.pack('>H', 1) + struct.pack('>HHII', 0x0112, 3, 1, 1 << 16)
+    ifd1_at = 8 + len(ifd0) + 4
+    ifd1_size = 2 + 3 * 12 + 4
+    offset = ifd1_at + ifd1_size if thumbnail_offset is None else thumbnail_offset
+    ifd0 += struct.pack('>I', ifd1_at if with_ifd1 else 0)
+    ifd1 = struct.pack('>H', 3) + b''.join([
+        struct.pack('>HHII', 0x0103, 3, 1, 6 << 16),
+        struct.pack('>HHII', 0x0201, 4, 1, offset),
+        struct.pack('>HHII', 0x0202, 4, 1, len(thumbnail)),
+    ]) + struct.pack('>I', 0)
+    return b'MM\x00\x2a' + struct.pack('>I', 8) + ifd0 + ifd1 + (thumbnail if thumbnail_offset is None else b'')
+
+
+def _segment(marker: int, payload: bytes) -> bytes:
+    return bytes([0xFF, marker]) + struct.pack('>H', len(payload) + 2) + payload
+
+
+def _jpeg(exif: bytes, before: bytes = b'', bitstream_size: int = 300000) -> bytes:
+    """A JPEG whose header survived but whose bitstream is noise."""
+    return (b'\xff\xd8' + before + _segment(0xE1, b'Exif\x00\x00' + exif)
+            + _segment(0xDA, b'\x01\x01\x00\x00\x3f\x00') + os.urandom(bitstream_size))
+
+
+def _far_thumbnail_jpeg():
+    """(data, thumbnail offset) of a JPEG whose thumbnail is stored after the bitstream, past the head."""
+    # APP2 padding pushes APP1 close to the end of the head
+    padding = _segment(0xE2, bytes(60000)) * 2
+    head = b'\xff\xd8' + padding + b'\xff\xe1'
+    exif_length = len(_exif(thumbnail_offset=0))
+    data = bytearray(_jpeg(_exif(thumbnail_offset=0), before=padding, bitstream_size=200000))
+    thumbnail_at = len(data)
+    tiff_start = len(head) + 2 + 6
+    data[tiff_start:tiff_start + exif_length] = _exif(thumbnail_offset=thumbnail_at - tiff_start)
+    return bytes(data + THUMBNAIL), thumbnail_at
+
+
+class _CountingFile:
+    """Wraps a binary file and counts the bytes read through it."""
+    read_bytes = 0
+
+    def __init__(self, f):
+        self._f = f
+
+    def read(self, size=-1):
+        data = self._f.read(size)
+        _CountingFile.read_bytes += len(data)
+        return data
+
+    def __getattr__(self, name):
+        return getattr(self._f, name)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self._f.close()
+
+
+def _counting_open(path, mode='r'):
+    return _CountingFile(open(path, mode))
+
+
+class TestExifThumbnail(unittest.TestCase):
+    def setUp(self):
+        self.strategy = ExifThumbnailStrategy()
+        self.tmp = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def _write(self, name, data):
+        path = os.path.join(self.tmp.name, name)
+        with open(path, 'wb') as f:
+            f.write(data)
+        return path
+
+    def test_reads_only_the_head(self):
+        input_path = self._write('broken.jpg', _jpeg(_exif(), bitstream_size=2 * 1024 * 1024))
+        output_path = os.path.join(self.tmp.name, 'thumb.jpg')
+        _CountingFile.read_bytes = 0
+        with mock.patch('strategies.exif_thumbnail.open', _counting_open, create=True):
+            result = self.strategy.repair(input_path, output_path)
+
+        self.assertTrue(result['success'])
+        self.assertEqual(result['located_by'], 'marker_walk')
+        self.assertTrue(result['eoi_present'])
+        self.assertLessEqual(_CountingFile.read_bytes, HEAD_READ_LIMIT)
+        with open(output_path, 'rb') as f:
+            self.assertEqual(f.read(), THUMBNAIL)
+
+    def test_thumbnail_past_the_head_is_one_extra_read(self):
+        data, thumbnail_at = _far_thumbnail_jpeg()
+        input_path = self._write('far.jpg', data)
+
+        output_path = os.path.join(self.tmp.name, 'thumb.jpg')
+        result = self.strategy.repair(input_path, output_path)
+        self.assertTrue(result['success'])
+        self.assertEqual(result['thumbnail_offset'], thumbnail_at)
+        with open(output_path, 'rb') as f:
+            self.assertEqual(f.read(), THUMBNAIL)
+
+        output, result = self.strategy.repair_buffer(data[:HEAD_READ_LIMIT])
+        self.assertIsNone(output)
+        self.assertEqual(result['needs_bytes'], len(data))
+
+    def test_batch_reads_on_for_a_thumbnail_past_the_head(self):
+        input_dir = os.path.join(self.tmp.name, 'in')
+        os.makedirs(input_dir)
+        self._write(os.path.join('in', 'far.jpg'), _far_thumbnail_jpeg()[0])
+        self._write(os.path.join('in', 'near.jpg'), _jpeg(_exif()))
+        output_dir = os.path.join(self.tmp.name, 'out')
+
+        for workers in (1, 2):
+            result = run_batch(input_dir, 'exif-thumbnail-rescue', output_dir,
+                               journal_path=os.path.join(self.tmp.name, f'journal{workers}.jsonl'), workers=workers)
+            self.assertEqual((result['done'], result['scheduling'] is not None), (2, workers > 1))
+            with open(os.path.join(output_dir, 'far_repaired.jpg'), 'rb') as f:
+                self.assertEqual(f.read(), THUMBNAIL)
+
+    def test_damaged_marker_stream_falls_back_to_search(self):
+        data = b'\x00\x00' + _jpeg(_exif())[2:]
+        output, result = self.strategy.repair_buffer(data)
+        self.assertEqual(result['located_by'], 'exif_search')
+        self.assertEqual(bytes(output), THUMBNAIL)
+
+    def test_no_thumbnail(self):
+        self.assertEqual(locate_thumbnail(_jpeg(_exif(with_ifd1=False))), {'error': 'EXIF has no IFD1 (no thumbnail)'})
+        output, result = self.strategy.repair_buffer(_jpeg(_exif(thumbnail=b'\x00' * 100)))
+        self.assertIsNone(output)
+        self.assertFalse(result['success'])
+
+    def test_batch_keys_jobs_on_the_head(self):
+        input_dir = os.path.join(self.tmp.name, 'in')
+        os.makedirs(input_dir)
+        for i in range(3):
+            self._write(os.path.join('in', f'{i}.jpg'), _jpeg(_exif()))
+        output_dir = os.path.join(self.tmp.name, 'out')
+
+        with mock.patch('services.batch_runner.read_input', wraps=read_input) as read:
+            result = run_batch(input_dir, 'exif-thumbnail-rescue', output_dir)
+        self.assertEqual(result['done'], 3)
+        self.assertTrue(all(call.args[1] == HEAD_READ_LIMIT for call in read.call_args_list))
+        with open(os.path.join(output_dir, '0_repaired.jpg'), 'rb') as f:
+            self.assertEqual(f.read(), THUMBNAIL)
+
+        # Changing bytes past the head does not invalidate finished jobs
+        with open(os.path.join(input_dir, '1.jpg'), 'r+b') as f:
+            f.seek(HEAD_READ_LIMIT + 10)
+            f.write(b'\x00' * 16)
+        self.assertEqual(run_batch(input_dir, 'exif-thumbnail-rescue', output_dir)['skipped'], 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
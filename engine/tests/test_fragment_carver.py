@@ -0,0 +1,134 @@
+import os
+import sys
+import random
+import struct
+import tempfile
+import unittest
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from services.fragment_carver import carve_fragmented, _walk, EOI, BREAK
+
+CLUSTER = 512
+
+
+def _jpeg(size: int, seed: int, restart_interval: int = 0, width: int = 64, height: int = 64) -> bytes:
+    """A baseline JPEG whose bitstream is random stuffed data (with RSTn every ~200 bytes when DRI is set)."""
+    header = b'\xff\xd8'
+    header += b'\xff\xc0' + struct.pack('>HBHHB', 17, 8, height, width, 3) + b'\x01\x22\x00\x02\x11\x01\x03\x11\x01'
+    if restart_interval:
+        header += b'\xff\xdd' + struct.pack('>HH', 4, restart_interval)
+    header += b'\xff\xda' + struct.pack('>H', 12) + b'\x03\x01\x00\x02\x11\x03\x11\x00\x3f\x00'
+
+    rng = random.Random(seed)
+    body = bytearray()
+    rst = 0
+    # 16x16 MCUs: the scan holds (64/16)^2 = 16 MCUs, i.e. 16/interval - 1 restarts
+    restarts = -(-(width // 16) * (height // 16) // restart_interval) - 1 if restart_interval else 0
+    segment = (size - len(header) - 2) // (restarts + 1)
+    for n in range(restarts + 1):
+        while len(body) < segment * (n + 1):
+            b = rng.randrange(256)
+            body += b'\xff\x00' if b == 0xFF else bytes([b])
+        if n < restarts:
+            body += bytes([0xFF, 0xD0 + rst])
+            rst = (rst + 1) % 8
+    return header + bytes(body) + b'\xff\xd9'
+
+
+def _noise(size: int, seed: int) -> bytes:
+    rng = random.Random(seed)
+    return bytes(rng.randrange(256) for _ in range(size))
+
+
+def _pad(data: bytes) -> bytes:
+    return data + b'\x00' * (-len(data) % CLUSTER)
+
+
+class TestEntropyWalk(unittest.TestCase):
+    def test_rst_sequence_must_be_continuous(self):
+        data = b'\x12\xff\xd0\x34\xff\xd1\x56\xff\xd3\x78\xff\xd9'
+        self.assertEqual(_walk(data, 0, len(data), 0, True, False)[:2], (BREAK, 7))
+        self.assertEqual(_walk(data, 0, len(data), 0, False, False)[:2], (EOI, len(data)))
+
+    def test_invalid_marker_breaks(self):
+        data = b'\x12\xff\x00\x34\xff\x47\xff\xd9'
+        self.assertEqual(_walk(data, 0, len(data), 0, False, False)[:2], (BREAK, 4))
+
+    def test_app_and_comment_segments_between_scans(self):
+        app1 = b'\xff\xe1' + struct.pack('>H', 6) + b'Exif'
+        comment = b'\xff\xfe' + struct.pack('>H', 5) + b'abc'
+        dht = b'\xff\xc4' + struct.pack('>H', 4) + b'\x00\x00'
+        sos = b'\xff\xda' + struct.pack('>H', 8) + b'\x01\x01\x00\x00\x3f\x00'
+        data = b'\x12\xff\x00\x34' + app1 + comment + dht + sos + b'\x56\xff\xd0\x78\xff\xd9'
+        self.assertEqual(_walk(data, 0, len(data), 3, True, True), (EOI, len(data), 1))
+        # Not a multi-scan file: the same bytes are damage
+        self.assertEqual(_walk(data, 0, len(data), 3, True, False)[:2], (BREAK, 4))
+
+    def test_segment_chain_must_end_in_a_scan(self):
+        app1 = b'\xff\xe1' + struct.pack('>H', 6) + b'Exif'
+        data = b'\x12' + app1 + b'\x34\x56\xff\xd9'
+        self.assertEqual(_walk(data, 0, len(data), 0, False, True)[:2], (BREAK, 1))
+
+
+class TestFragmentCarver(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.image_path = os.path.join(self.temp_dir.name, 'card.img')
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def _write(self, image: bytes):
+        with open(self.image_path, 'wb') as f:
+            f.write(image)
+
+    def _carve(self, **kwargs):
+        # Created by the carver when missing
+        out_dir = os.path.join(self.temp_dir.name, 'out')
+        return carve_fragmented(self.image_path, out_dir, cluster_size=CLUSTER, min_size=1000, **kwargs)
+
+    def _read(self, path):
+        with open(path, 'rb') as f:
+            return f.read()
+
+    def _assert_fragmented_file(self, split_clusters: int, restart_interval: int):
+        fragmented = _jpeg(12 * CLUSTER - 100, seed=1, restart_interval=restart_interval)
+        other = _pad(_jpeg(5 * CLUSTER - 50, seed=2))
+        split = split_clusters * CLUSTER
+        # Another file's clusters, then foreign non-JPEG data, then the second fragment
+        noise = _noise(2 * CLUSTER, seed=3)
+        image = fragmented[:split] + other + noise + _pad(fragmented[split:]) + _pad(_jpeg(4 * CLUSTER, seed=4))
+        self._write(image)
+
+        result = self._carve()
+        by_offset = {item['offset']: item for item in result['files']}
+        self.assertEqual(by_offset[0]['status'], 'bifragment')
+        self.assertEqual(by_offset[0]['fragments'], [[0, split], [split + len(other) + len(noise), len(fragmented) - split]])
+        self.assertEqual(self._read(by_offset[0]['output_path']), fragmented)
+        self.assertEqual(by_offset[split]['status'], 'contiguous')
+        self.assertEqual(result['unresolved'], [])
+
+    def test_reassembles_with_restart_markers(self):
+        self._assert_fragmented_file(split_clusters=7, restart_interval=2)
+
+    def test_reassembles_without_restart_markers(self):
+        self._assert_fragmented_file(split_clusters=5, restart_interval=0)
+
+    def test_contiguous_files_are_unchanged(self):
+        first = _pad(_jpeg(6 * CLUSTER, seed=5))
+        second = _jpeg(3 * CLUSTER, seed=6, restart_interval=4)
+        self._write(first + second)
+        result = self._carve()
+        self.assertEqual([(item['offset'], item['length'], item['status']) for item in result['files']],
+                         [(0, 6 * CLUSTER, 'contiguous'), (len(first), len(second), 'contiguous')])
+
+    def test_unresolvable_fragment_is_reported(self):
+        truncated = _jpeg(8 * CLUSTER, seed=7, restart_interval=2)[:4 * CLUSTER]
+        noise = _noise(CLUSTER, seed=8)
+        self._write(truncated + noise + _pad(_jpeg(4 * CLUSTER, seed=9)))
+        result = self._carve()
+        self.assertEqual([item['offset'] for item in result['unresolved']], [0])
+
+
+if __name__ == '__main__':
+    unittest.main()
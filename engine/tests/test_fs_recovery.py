@@ -0,0 +1,197 @@
+import os
+import sys
+import struct
+import tempfile
+import unittest
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from lib.fat import FatVolume, find_volumes
+from services.fs_recovery import recover_from_filesystem
+from strategies.registry import get_extension, load_strategy
+
+SECTOR = 512
+CLUSTER = 1024
+RESERVED = 4
+FAT_SECTORS = 2
+CLUSTERS = 64
+FAT32_EOC = 0x0FFFFFFF
+EXFAT_EOC = 0xFFFFFFFF
+
+
+def _jpeg(size: int, fill: int) -> bytes:
+    # Contains an invalid FF 12 marker that marker sanitization byte-stuffs
+    return b'\xff\xd8\xff\xda\x00\x02' + bytes([fill]) * (size - 10) + b'\xff\x12' + b'\xff\xd9'
+
+
+def _png(size: int) -> bytes:
+    return b'\x89PNG\r\n\x1a\n' + b'\x21' * (size - 8)
+
+
+def _short_entry(name: bytes, attr: int, cluster: int, size: int) -> bytes:
+    return name + bytes([attr]) + b'\x00' * 8 + struct.pack('<H', cluster >> 16) + b'\x00' * 4 + struct.pack('<HI', cluster & 0xFFFF, size)
+
+
+def _lfn_entries(long_name: str, deleted: bool = False) -> bytes:
+    chars = long_name.encode('utf-16-le') + b'\x00\x00'
+    chars += b'\xff' * (-len(chars) % 26)
+    parts = [chars[i:i + 26] for i in range(0, len(chars), 26)]
+    entries = b''
+    for order in range(len(parts), 0, -1):
+        part = parts[order - 1]
+        seq = 0xE5 if deleted else order | (0x40 if order == len(parts) else 0)
+        entries += bytes([seq]) + part[:10] + bytes([0x0F, 0, 0]) + part[10:22] + b'\x00\x00' + part[22:26]
+    return entries
+
+
+class _Fat32Image:
+    """Builds a tiny FAT32 volume cluster by cluster."""
+
+    def __init__(self):
+        self.fat = [0] * (CLUSTERS + 2)
+        self.fat[0], self.fat[1] = 0x0FFFFFF8, FAT32_EOC
+        self.heap = bytearray(CLUSTERS * CLUSTER)
+
+    def put(self, clusters, data, chain=True):
+        for i, cluster in enumerate(clusters):
+            chunk = data[i * CLUSTER:(i + 1) * CLUSTER]
+            start = (cluster - 2) * CLUSTER
+            self.heap[start:start + len(chunk)] = chunk
+            if chain:
+                self.fat[cluster] = clusters[i + 1] if i + 1 < len(clusters) else FAT32_EOC
+
+    def build(self) -> bytes:
+        boot = bytearray(SECTOR)
+        boot[0:3] = b'\xeb\x58\x90'
+        struct.pack_into('<HBHB', boot, 11, SECTOR, CLUSTER // SECTOR, RESERVED, 1)
+        total = RESERVED + FAT_SECTORS + CLUSTERS * CLUSTER // SECTOR
+        struct.pack_into('<IIHHI', boot, 32, total, FAT_SECTORS, 0, 0, 2)
+        boot[82:90] = b'FAT32   '
+        boot[510:512] = b'\x55\xaa'
+        fat = struct.pack(f'<{len(self.fat)}I', *self.fat).ljust(FAT_SECTORS * SECTOR, b'\x00')
+        return bytes(boot) + b'\x00' * (RESERVED - 1) * SECTOR + fat + bytes(self.heap)
+
+
+class TestFat32Recovery(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.image_path = os.path.join(self.temp_dir.name, 'card.img')
+
+        self.fragmented = _jpeg(2500, 0x11)
+        self.deleted = _jpeg(1800, 0x22)
+        self.png = _png(900)
+
+        image = _Fat32Image()
+        root = _short_entry(b'DCIM       ', 0x10, 3, 0)
+        root += _lfn_entries('IMG_0001.JPG') + _short_entry(b'IMG_0001JPG', 0x20, 4, len(self.fragmented))
+        root += _lfn_entries('IMG_0002.JPG', deleted=True) + _short_entry(b'\xe5MG_0002JPG', 0x20, 20, len(self.deleted))
+        root += _short_entry(b'NOTES   TXT', 0x20, 30, 5)
+        image.put([2], root)
+        subdir = _short_entry(b'.          ', 0x10, 3, 0) + _short_entry(b'..         ', 0x10, 0, 0)
+        subdir += _short_entry(b'SHOT    PNG', 0x20, 40, len(self.png))
+        image.put([3], subdir)
+        # Fragmented around another file's clusters
+        image.put([4, 5, 9], self.fragmented)
+        # Deleted: chain already freed in the FAT
+        image.put([20, 21], self.deleted, chain=False)
+        image.put([30], b'hello')
+        image.put([40], self.png)
+        with open(self.image_path, 'wb') as f:
+            f.write(image.build())
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def _read(self, path):
+        with open(path, 'rb') as f:
+            return f.read()
+
+    def test_walk_follows_chains_and_deleted_entries(self):
+        with open(self.image_path, 'rb') as f:
+            data = f.read()
+        self.assertEqual(find_volumes(data), [(0, 'fat32')])
+        entries = {e['path']: e for e in FatVolume(data).walk()}
+        self.assertEqual(set(entries), {'/IMG_0001.JPG', '/IMG_0002.JPG', '/NOTES.TXT', '/DCIM/SHOT.PNG'})
+
+        heap = (RESERVED + FAT_SECTORS) * SECTOR
+        fragmented = entries['/IMG_0001.JPG']
+        self.assertEqual(fragmented['extents'], [(heap + 2 * CLUSTER, 2 * CLUSTER), (heap + 7 * CLUSTER, 2500 - 2 * CLUSTER)])
+        self.assertTrue(entries['/IMG_0002.JPG']['deleted'])
+        self.assertTrue(entries['/IMG_0002.JPG']['contiguous_assumed'])
+        self.assertEqual(bytes(FatVolume(data).read(fragmented)), self.fragmented)
+
+        live_only = [e['path'] for e in FatVolume(data).walk(include_deleted=False)]
+        self.assertNotIn('/IMG_0002.JPG', live_only)
+
+    def test_recovers_photos_as_is(self):
+        out_dir = os.path.join(self.temp_dir.name, 'out')
+        result = recover_from_filesystem(self.image_path, out_dir)
+        by_path = {item['path']: item for item in result['files']}
+        self.assertEqual(set(by_path), {'/IMG_0001.JPG', '/IMG_0002.JPG', '/DCIM/SHOT.PNG'})
+        self.assertEqual(self._read(by_path['/IMG_0001.JPG']['output_path']), self.fragmented)
+        self.assertEqual(self._read(by_path['/IMG_0002.JPG']['output_path']), self.deleted)
+        self.assertEqual(self._read(by_path['/DCIM/SHOT.PNG']['output_path']), self.png)
+        self.assertIn(os.sep + 'deleted' + os.sep, by_path['/IMG_0002.JPG']['output_path'])
+
+    def test_feeds_extents_to_strategy(self):
+        out_dir = os.path.join(self.temp_dir.name, 'out')
+        result = recover_from_filesystem(
+            self.image_path, out_dir,
+            strategy=load_strategy('marker-sanitization'),
+            strategy_extension=get_extension('marker-sanitization')
+        )
+        by_path = {item['path']: item for item in result['files']}
+        repaired = by_path['/IMG_0001.JPG']
+        self.assertTrue(repaired['success'])
+        self.assertEqual(repaired['strategy'], 'marker-sanitization')
+        self.assertEqual(self._read(repaired['output_path']), self.fragmented.replace(b'\xff\x12', b'\xff\x00'))
+        # Formats the strategy does not handle are recovered untouched
+        self.assertNotIn('strategy', by_path['/DCIM/SHOT.PNG'])
+
+
+class TestExfatRecovery(unittest.TestCase):
+    def test_walks_exfat_directory_sets(self):
+        heap_sector = 8
+        fat = [0xFFFFFFF8, EXFAT_EOC] + [0] * CLUSTERS
+        fat[2] = EXFAT_EOC
+        fat[3], fat[6] = 6, EXFAT_EOC
+        photo = _jpeg(1500, 0x33)
+        deleted = _jpeg(900, 0x44)
+
+        def file_set(name, first_cluster, size, no_fat_chain, in_use=True):
+            flag = 0x80 if in_use else 0
+            encoded = name.encode('utf-16-le')
+            names = [encoded[i:i + 30].ljust(30, b'\x00') for i in range(0, len(encoded), 30)]
+            entries = bytes([0x05 | flag, 1 + len(names)]) + b'\x00\x00' + struct.pack('<H', 0x20) + b'\x00' * 26
+            stream = bytes([0x40 | flag, 0x03 if no_fat_chain else 0x01, 0, len(name)]) + b'\x00' * 4
+            stream += struct.pack('<Q', size) + b'\x00' * 4 + struct.pack('<IQ', first_cluster, size)
+            entries += stream
+            for chunk in names:
+                entries += bytes([0x41 | flag, 0]) + chunk
+            return entries
+
+        root = file_set('fragmented.jpg', 3, len(photo), False) + file_set('gone.jpg', 10, len(deleted), True, in_use=False)
+
+        boot = bytearray(SECTOR)
+        boot[3:11] = b'EXFAT   '
+        struct.pack_into('<IIIII', boot, 80, 4, 1, heap_sector, CLUSTERS, 2)
+        struct.pack_into('<BB', boot, 108, 9, 1)
+        boot[510:512] = b'\x55\xaa'
+        heap = bytearray(CLUSTERS * CLUSTER)
+        heap[0:len(root)] = root
+        heap[CLUSTER:2 * CLUSTER] = photo[:CLUSTER]
+        heap[4 * CLUSTER:4 * CLUSTER + len(photo) - CLUSTER] = photo[CLUSTER:]
+        heap[8 * CLUSTER:8 * CLUSTER + len(deleted)] = deleted
+        fat_bytes = struct.pack(f'<{len(fat)}I', *fat).ljust(4 * SECTOR, b'\x00')
+        image = bytes(boot) + b'\x00' * 3 * SECTOR + fat_bytes + bytes(heap)
+
+        volume = FatVolume(image)
+        self.assertEqual(volume.fs_type, 'exfat')
+        entries = {e['path']: e for e in volume.walk()}
+        self.assertEqual(bytes(volume.read(entries['/fragmented.jpg'])), photo)
+        self.assertEqual(len(entries['/fragmented.jpg']['extents']), 2)
+        self.assertTrue(entries['/gone.jpg']['deleted'])
+        self.assertEqual(bytes(volume.read(entries['/gone.jpg'])), deleted)
+
+
+if __name__ == '__main__':
+    unittest.main()
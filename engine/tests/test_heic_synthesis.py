@@ -0,0 +1,171 @@
+import os
+import sys
+import struct
+import random
+import unittest
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from lib.heif import find_ispe_sizes
+from lib.hevc import index_nal_units, parse_sps, unescape_rbsp, guess_grid, split_pictures
+from lib.validation import validate_heic
+from strategies.heic_box_recovery import HeicBoxRecoveryStrategy, _read_boxes, _find_box
+
+
+class _BitWriter:
+    def __init__(self):
+        self.bits = []
+
+    def u(self, n, value):
+        self.bits += [(value >> (n - 1 - i)) & 1 for i in range(n)]
+
+    def ue(self, value):
+        code = value + 1
+        self.u(2 * code.bit_length() - 1, code)
+
+    def rbsp(self):
+        self.bits.append(1)
+        while len(self.bits) % 8:
+            self.bits.append(0)
+        return bytes(int(''.join(map(str, self.bits[i:i + 8])), 2) for i in range(0, len(self.bits), 8))
+
+
+PTL = bytes([0x01, 0x60, 0, 0, 0, 0x90, 0, 0, 0, 0, 0, 0x5A])
+
+
+def _sps(width, height, crop=None):
+    w = _BitWriter()
+    w.u(4, 0)
+    w.u(3, 0)
+    w.u(1, 1)
+    for byte in PTL:
+        w.u(8, byte)
+    w.ue(0)
+    w.ue(1)  # 4:2:0
+    w.ue(width)
+    w.ue(height)
+    w.u(1, 1 if crop else 0)
+    for value in crop or ():
+        w.ue(value)
+    w.ue(0)
+    w.ue(0)
+    return bytes([33 << 1, 1]) + w.rbsp()
+
+
+def _nal(nal_type, body):
+    nal = bytes([nal_type << 1, 1]) + body
+    return struct.pack('>I', len(nal)) + nal
+
+
+def _unit(nal):
+    return struct.pack('>I', len(nal)) + nal
+
+
+def _slice(first, size, seed):
+    rng = random.Random(seed)
+    return _nal(19, bytes([0x80 if first else 0x00]) + bytes(rng.randrange(1, 256) for _ in range(size)))
+
+
+def _params(width=512, height=512):
+    return _nal(32, b'\x0c\x01\xff\xff') + _unit(_sps(width, height)) + _nal(34, b'\xc1\x72\xb4\x62\x40')
+
+
+def _heic(mdat_payload):
+    ftyp = struct.pack('>I', 24) + b'ftypheic\x00\x00\x00\x00mif1heic'
+    return ftyp + struct.pack('>I', 8 + len(mdat_payload)) + b'mdat' + mdat_payload
+
+
+def _iloc(meta_payload):
+    """item_id -> (construction_method, [(offset, length)]) from a v1 iloc with 4-byte fields."""
+    iloc = _find_box(_read_boxes(meta_payload[4:]), 'iloc')['payload']
+    count, = struct.unpack_from('>H', iloc, 6)
+    pos, items = 8, {}
+    for _ in range(count):
+        item_id, method, _ref, extent_count = struct.unpack_from('>HHHH', iloc, pos)
+        pos += 8
+        extents = [struct.unpack_from('>II', iloc, pos + 8 * i) for i in range(extent_count)]
+        pos += 8 * extent_count
+        items[item_id] = (method, extents)
+    return items
+
+
+class TestHevcIndex(unittest.TestCase):
+    def test_sps_dimensions(self):
+        info = parse_sps(_sps(4032, 3024))
+        self.assertEqual((info['width'], info['height'], info['chroma_format']), (4032, 3024, 1))
+        self.assertEqual(info['profile_tier_level'], PTL)
+        # Conformance window in chroma units (2 luma samples for 4:2:0)
+        cropped = parse_sps(_sps(4096, 3072, crop=(0, 32, 0, 24)))
+        self.assertEqual((cropped['width'], cropped['height']), (4032, 3024))
+
+    def test_unescape(self):
+        self.assertEqual(unescape_rbsp(b'\x00\x00\x03\x01\x00\x00\x03\x00'), b'\x00\x00\x01\x00\x00\x00')
+
+    def test_index_resyncs_past_foreign_data(self):
+        junk = b'Exif\x00\x00' + bytes(random.Random(5).randrange(1, 256) for _ in range(3000))
+        payload = _params() + _slice(True, 500, 1) + junk + _slice(True, 400, 2) + _slice(False, 300, 3)
+        index = index_nal_units(payload)
+        self.assertEqual([t for _o, _l, t in index['units']], [32, 33, 34, 19, 19, 19])
+        self.assertEqual(index['resyncs'], 1)
+        self.assertEqual(index['skipped_bytes'], len(junk))
+
+        pictures = split_pictures(payload, index['units'])
+        self.assertEqual(len(pictures), 2)
+        self.assertEqual(len(pictures[1]['extents']), 1)
+        self.assertEqual(pictures[1]['extents'][0][1], (4 + 2 + 401) + (4 + 2 + 301))
+
+    def test_guess_grid(self):
+        self.assertEqual(guess_grid(48, 512, 512), (6, 8))
+        self.assertEqual(guess_grid(6, 512, 512), (2, 3))
+        self.assertEqual(guess_grid(1, 512, 512), (1, 1))
+
+
+class TestMetaSynthesis(unittest.TestCase):
+    def setUp(self):
+        self.strategy = HeicBoxRecoveryStrategy()
+
+    def _repair(self, payload):
+        output, result = self.strategy.repair_buffer(_heic(payload))
+        self.assertTrue(result['success'])
+        return b''.join(bytes(p) for p in output), result
+
+    def test_grid_of_tiles(self):
+        tiles = [_slice(True, 200 + i, i) for i in range(6)]
+        payload = _params() + b''.join(tiles)
+        output, result = self._repair(payload)
+        self.assertEqual(result['method'], 'synthesized_meta')
+        self.assertEqual(result['grid'], {'rows': 2, 'columns': 3, 'guessed': True})
+        self.assertTrue(validate_heic(output)['valid'])
+
+        meta = _find_box(_read_boxes(output), 'meta')['payload']
+        self.assertEqual(sorted(find_ispe_sizes(meta)), [(512, 512), (1536, 1024)])
+        items = _iloc(meta)
+        self.assertEqual(items[1][0], 1)  # grid data lives in idat
+        for item_id, tile in zip(range(2, 8), tiles):
+            method, extents = items[item_id]
+            self.assertEqual(method, 0)
+            (offset, length), = extents
+            self.assertEqual(output[offset:offset + length], tile)
+
+    def test_single_picture(self):
+        payload = _params(640, 480) + _slice(True, 1000, 9) + _slice(False, 1000, 10)
+        output, result = self._repair(payload)
+        self.assertEqual(result['items'], 1)
+        self.assertNotIn('grid', result)
+        meta = _find_box(_read_boxes(output), 'meta')['payload']
+        self.assertEqual(find_ispe_sizes(meta), [(640, 480)])
+        (offset, length), = _iloc(meta)[1][1]
+        self.assertEqual(output[offset:offset + length], payload[len(_params(640, 480)):])
+        ipco = _find_box(_read_boxes(_find_box(_read_boxes(meta[4:]), 'iprp')['payload']), 'ipco')
+        hvcc = _find_box(_read_boxes(ipco['payload']), 'hvcC')['payload']
+        self.assertEqual(hvcc[1:13], PTL)
+        self.assertEqual(hvcc[22], 3)  # VPS, SPS and PPS arrays
+
+    def test_without_parameter_sets_falls_back(self):
+        payload = b''.join(_slice(True, 300, i) for i in range(4))
+        output, result = self._repair(payload)
+        self.assertEqual(result['method'], 'minimal_container')
+        self.assertEqual(result['meta_synthesis_error'], 'no parameter sets in mdat')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,7 +1,11 @@
 import os
+import random
 import pytest
 import tempfile
-from strategies.marker_sanitization import MarkerSanitizationStrategy
+from unittest import mock
+from strategies.marker_sanitization import MarkerSanitizationStrategy, VALID_FOLLOWERS, _split_ranges, plan_entropy_ranges
+from lib.budget import BudgetExceededError, ParseBudget, parse_budget
+from lib.validation import validate_jpeg
 
 class TestMarkerSanitizationStrategy:
     def setup_method(self):
@@ -65,3 +69,145 @@ class TestMarkerSanitizationStrategy:
         finally:
             os.remove(input_path)
             os.remove(output_path)
+
+
+def _reference_sanitize(data: bytearray, offset: int) -> int:
+    # The original byte-by-byte loop, kept as the oracle for the fast paths
+    i = offset
+    patch_count = 0
+    while i < len(data) - 1:
+        if data[i] == 0xFF:
+            if data[i + 1] not in VALID_FOLLOWERS:
+                data[i + 1] = 0x00
+                patch_count += 1
+            i += 2
+        else:
+            i += 1
+    return patch_count
+
+
+def _noisy_jpeg(size: int, seed: int = 7) -> bytes:
+    rng = random.Random(seed)
+    # Heavy on 0xFF (including long runs) to stress pairing across range boundaries
+    body = bytearray(rng.choice([0xFF, 0xFF, 0x00, 0xD0, 0xD9, 0xC4, 0x12]) for _ in range(size))
+    body[size // 3: size // 3 + 5000] = b'\xff' * 5000
+    return bytes([0xFF, 0xD8, 0xFF, 0xDA, 0x00, 0x02]) + bytes(body)
+
+
+class TestParallelSanitization:
+    def test_serial_matches_reference_loop(self, tmp_path):
+        data = _noisy_jpeg(50000)
+        input_path = tmp_path / "in.jpg"
+        output_path = tmp_path / "out.jpg"
+        input_path.write_bytes(data)
+
+        expected = bytearray(data)
+        expected_patches = _reference_sanitize(expected, 6)
+
+        result = MarkerSanitizationStrategy().repair(str(input_path), str(output_path))
+        assert result["patch_count"] == expected_patches
+        assert output_path.read_bytes() == bytes(expected)
+
+    def test_split_ranges_start_after_non_ff(self):
+        data = bytearray(_noisy_jpeg(20000))
+        ranges = _split_ranges(data, 6, len(data), 7)
+        assert ranges[0][0] == 6 and ranges[-1][1] == len(data)
+        for (start, end), (next_start, _) in zip(ranges, ranges[1:]):
+            assert end == next_start
+            assert data[next_start - 1] != 0xFF
+
+    def test_parallel_is_byte_identical(self, tmp_path):
+        data = _noisy_jpeg(200000, seed=11)
+        input_path = tmp_path / "in.jpg"
+        input_path.write_bytes(data)
+        serial_out = tmp_path / "serial.jpg"
+        parallel_out = tmp_path / "parallel.jpg"
+
+        serial = MarkerSanitizationStrategy().repair(str(input_path), str(serial_out))
+        with mock.patch("strategies.marker_sanitization.MIN_RANGE_SIZE", 1024):
+            strategy = MarkerSanitizationStrategy(workers=3, parallel_threshold=1)
+            parallel = strategy.repair(str(input_path), str(parallel_out))
+
+        assert parallel["workers"] == 3
+        assert parallel["patch_count"] == serial["patch_count"]
+        assert parallel_out.read_bytes() == serial_out.read_bytes()
+
+    def test_workers_get_the_job_deadline(self, tmp_path):
+        input_path = tmp_path / "in.jpg"
+        input_path.write_bytes(_noisy_jpeg(200000, seed=12))
+        output_path = tmp_path / "out.jpg"
+
+        # The deadline passes between submitting the ranges and running them
+        with mock.patch("strategies.marker_sanitization.MIN_RANGE_SIZE", 1024), \
+                mock.patch.object(ParseBudget, "remaining", return_value=-1.0), parse_budget(timeout=60):
+            strategy = MarkerSanitizationStrategy(workers=3, parallel_threshold=1)
+            with pytest.raises(BudgetExceededError):
+                strategy.repair(str(input_path), str(output_path))
+        assert not output_path.exists()
+
+    def test_failed_worker_leaves_no_output(self, tmp_path):
+        input_path = tmp_path / "in.jpg"
+        input_path.write_bytes(_noisy_jpeg(200000, seed=13))
+        output_path = tmp_path / "out.jpg"
+
+        # Workers are forked inside the patch, so one of them fails mid-file
+        with mock.patch("strategies.marker_sanitization.MIN_RANGE_SIZE", 1024), \
+                mock.patch("strategies.marker_sanitization._sanitize_range", side_effect=OSError("I/O error")):
+            strategy = MarkerSanitizationStrategy(workers=3, parallel_threshold=1)
+            with pytest.raises(OSError):
+                strategy.repair(str(input_path), str(output_path))
+        assert not output_path.exists()
+
+
+def _progressive_jpeg(scan_size: int = 3000, seed: int = 5) -> bytes:
+    rng = random.Random(seed)
+    segment = lambda marker, payload: bytes([0xFF, marker]) + (len(payload) + 2).to_bytes(2, 'big') + payload
+    dqt = segment(0xDB, b'\x00' + bytes(range(1, 65)))
+    sof = segment(0xC2, b'\x08\x00\x10\x00\x10\x01\x01\x11\x00')
+    dht = segment(0xC4, b'\x00' + b'\x01' + b'\x00' * 15 + b'\x00')
+    sos = lambda al: segment(0xDA, b'\x01\x01\x00\x00\x00' + bytes([al]))
+
+    def scan():
+        return bytes(rng.randrange(256) for _ in range(scan_size)).replace(b'\xff', b'\xff\x00')
+
+    # Scans separated by the tables of the next one (with fill bytes), a comment and a bare SOS
+    return (b'\xff\xd8' + dqt + sof + dht + sos(1) + scan()
+            + b'\xff\xff' + dht + segment(0xFE, b'pass 2') + sos(2) + scan()
+            + sos(3) + scan() + b'\xff\xd9')
+
+
+class TestMultiScanSanitization:
+    def test_plan_finds_every_scan(self):
+        data = _progressive_jpeg()
+        offset = MarkerSanitizationStrategy()._find_bitstream_offset(data)
+        scans = plan_entropy_ranges(data, offset, len(data))
+        assert len(scans) == 3
+        for _start, end in scans[:-1]:
+            assert data[end:end + 2] == b'\xff\xff' or data[end:end + 2] == b'\xff\xda'
+            assert data[end - 1] != 0xFF
+
+    def test_inter_scan_segments_survive_and_damage_is_patched(self, tmp_path):
+        clean = _progressive_jpeg()
+        assert validate_jpeg(clean)['checks']['entropy'] is True
+
+        damaged = bytearray(clean)
+        second_scan = clean.index(b'pass 2')
+        damaged[second_scan + 100:second_scan + 102] = b'\xff\xaa'
+        # A DHT-looking pair whose length leads nowhere is damage too
+        damaged[second_scan + 400:second_scan + 404] = b'\xff\xc4\x00\x05'
+        input_path = tmp_path / "in.jpg"
+        input_path.write_bytes(bytes(damaged))
+
+        serial_out = tmp_path / "serial.jpg"
+        result = MarkerSanitizationStrategy().repair(str(input_path), str(serial_out))
+        assert (result["scans"], result["patch_count"]) == (3, 2)
+        expected = bytearray(damaged)
+        expected[second_scan + 101] = 0x00
+        expected[second_scan + 401] = 0x00
+        assert serial_out.read_bytes() == bytes(expected)
+
+        parallel_out = tmp_path / "parallel.jpg"
+        with mock.patch("strategies.marker_sanitization.MIN_RANGE_SIZE", 1024):
+            parallel = MarkerSanitizationStrategy(workers=6, parallel_threshold=1).repair(str(input_path), str(parallel_out))
+        assert parallel["workers"] == 6
+        assert parallel_out.read_bytes() == serial_out.read_bytes()
@@ -0,0 +1,95 @@
+import io
+import os
+import sys
+import time
+import zlib
+import struct
+import unittest
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from lib.budget import ParseBudget, BudgetExceededError, parse_budget, current_budget
+from lib.png_deflate import parallel_deflate
+from services.batch_runner import repair_data
+from strategies.mcu_alignment import McuAlignmentStrategy
+from strategies.png_chunk_rebuilder import PngChunkRebuilderStrategy
+from strategies.tiff_ifd_rebuilder import _read_ifd_entries, _get_entry_values
+
+
+def _chunk(kind: bytes, data: bytes) -> bytes:
+    return struct.pack('>I', len(data)) + kind + data + struct.pack('>I', zlib.crc32(kind + data))
+
+
+class TestParseBudget(unittest.TestCase):
+    def test_limits(self):
+        budget = ParseBudget(max_scan_bytes=100, max_entries=10, max_alloc=50)
+        budget.scan(100)
+        with self.assertRaises(BudgetExceededError):
+            budget.scan(1)
+        with self.assertRaises(BudgetExceededError):
+            budget.count(11)
+        with self.assertRaisesRegex(BudgetExceededError, 'Declared chunk size 51'):
+            budget.alloc(51, 'chunk')
+
+    def test_deadline(self):
+        with parse_budget(timeout=0.01) as budget:
+            self.assertIs(current_budget(), budget)
+            time.sleep(0.02)
+            with self.assertRaisesRegex(BudgetExceededError, 'deadline'):
+                budget.count(1)
+        self.assertIsNot(current_budget(), budget)
+
+    def test_zero_timeout_is_already_expired(self):
+        with parse_budget(timeout=0.0) as budget:
+            time.sleep(0.001)
+            with self.assertRaisesRegex(BudgetExceededError, 'deadline'):
+                budget.check_deadline()
+        self.assertIsNone(ParseBudget(timeout=None).deadline)
+
+    def test_deadline_reaches_deflate_threads(self):
+        raw = bytes(range(256)) * 64
+        self.assertEqual(zlib.decompress(b''.join(parallel_deflate(raw, block_size=4096))), raw)
+        with parse_budget(timeout=0.01):
+            time.sleep(0.02)
+            with self.assertRaisesRegex(BudgetExceededError, 'deadline'):
+                parallel_deflate(raw, block_size=4096)
+
+    def test_marker_scans_are_linear(self):
+        strategy = McuAlignmentStrategy()
+        data = b'\x00' * (32 * 1024 * 1024)
+        started = time.perf_counter()
+        self.assertEqual(strategy._find_sos_offset(data), -1)
+        self.assertEqual(strategy._find_first_rst_marker(data, 0), -1)
+        self.assertLess(time.perf_counter() - started, 1.0)
+        self.assertEqual(strategy._find_first_rst_marker(b'\x00\xff\x00\xff\xd3', 0), 3)
+        with parse_budget(max_scan_bytes=1024):
+            with self.assertRaises(BudgetExceededError):
+                strategy._find_sos_offset(data)
+
+    def test_ifd_counts_are_bounded_by_the_data(self):
+        data = b'II*\x00' + struct.pack('<IH', 8, 0xFFFF) + struct.pack('<HHII', 0x0100, 4, 1, 64) * 2
+        self.assertEqual(len(_read_ifd_entries(data, 8, 'LE')), 2)
+        # 2^30 LONG values "stored" past the end of the data
+        entry = {'tag': 0x0111, 'type': 4, 'count': 1 << 30, 'value_offset': 8}
+        self.assertEqual(_get_entry_values(data, entry, 'LE'), [])
+        entry = {'tag': 0x0111, 'type': 3, 'count': 8, 'value_offset': 10}
+        with parse_budget(max_alloc=8):
+            with self.assertRaises(BudgetExceededError):
+                _get_entry_values(data, entry, 'LE')
+
+    def test_png_chunk_length_is_clamped(self):
+        data = b'\x89PNG\r\n\x1a\n' + struct.pack('>I', 0xFFFFFFF0) + b'IDAT' + b'\x01' * 100
+        with parse_budget(max_alloc=1024):
+            chunks = PngChunkRebuilderStrategy()._read_chunk_stream(io.BytesIO(data))
+        self.assertEqual(len(chunks[0]['data']), 100)
+
+    def test_absurd_ihdr_fails_the_job(self):
+        ihdr = struct.pack('>IIBBBBB', 0x7FFFFFFF, 0x7FFFFFFF, 8, 6, 0, 0, 0)
+        png = b'\x89PNG\r\n\x1a\n' + _chunk(b'IHDR', ihdr) + _chunk(b'IDAT', zlib.compress(b'\x00' * 100))
+        output, outcome = repair_data(PngChunkRebuilderStrategy(), png, None, 'png')
+        self.assertIsNone(output)
+        self.assertEqual(outcome['status'], 'failed')
+        self.assertIn('raw image size', outcome['error'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,76 @@
+import os
+import sys
+import time
+import tempfile
+import threading
+import unittest
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from services.pipeline import run_pipelined, read_input
+
+
+class TestPipeline(unittest.TestCase):
+    def test_results_arrive_in_job_order(self):
+        results = []
+        run_pipelined(
+            range(10),
+            read=lambda job: (time.sleep(0.005 * (job % 3)), job)[1],
+            process=lambda job, data: data * 2,
+            write=lambda job, value: value + 1,
+            on_result=lambda job, value, error: results.append((job, value, error))
+        )
+        self.assertEqual(results, [(i, 2 * i + 1, None) for i in range(10)])
+
+    def test_reads_overlap_processing_within_the_read_ahead(self):
+        lock = threading.Lock()
+        state = {'read': 0, 'processed': 0, 'max_ahead': 0}
+
+        def read(job):
+            with lock:
+                state['read'] += 1
+            return job
+
+        def process(job, data):
+            time.sleep(0.02)
+            with lock:
+                state['max_ahead'] = max(state['max_ahead'], state['read'] - state['processed'])
+                state['processed'] += 1
+            return data
+
+        run_pipelined(range(6), read, process, lambda job, value: value, lambda *a: None, read_ahead=2)
+        # The current input plus two read ahead, never more
+        self.assertEqual(state['max_ahead'], 3)
+
+    def test_without_read_ahead_every_job_runs(self):
+        results = []
+        run_pipelined(range(5), lambda job: job, lambda job, data: data, lambda job, value: value,
+                      lambda job, value, error: results.append(value), read_ahead=0)
+        self.assertEqual(results, [0, 1, 2, 3, 4])
+
+    def test_stage_errors_are_reported_per_job(self):
+        def process(job, data):
+            if job == 1:
+                raise ValueError('bad input')
+            return data
+
+        def write(job, value):
+            if job == 2:
+                raise OSError('disk full')
+            return value
+
+        results = []
+        run_pipelined(range(4), lambda job: job, process, write,
+                      lambda job, value, error: results.append((job, value, type(error).__name__ if error else None)))
+        self.assertEqual(results, [(0, 0, None), (1, None, 'ValueError'), (2, None, 'OSError'), (3, 3, None)])
+
+    def test_read_input(self):
+        with tempfile.NamedTemporaryFile(delete=False) as f:
+            f.write(b'x' * 1000)
+        try:
+            self.assertEqual(read_input(f.name), b'x' * 1000)
+        finally:
+            os.remove(f.name)
+
+
+if __name__ == '__main__':
+    unittest.main()
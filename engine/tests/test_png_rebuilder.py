@@ -0,0 +1,141 @@
+import os
+import sys
+import zlib
+import struct
+import random
+import unittest
+from unittest import mock
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from lib.png_deflate import parallel_deflate, idat_chunks, adler32_combine, inflate_partial
+from lib.validation import validate_png
+from strategies.png_chunk_rebuilder import PngChunkRebuilderStrategy, raw_image_size
+
+
+def _noise(seed: int, n: int, top: int = 256) -> bytes:
+    rng = random.Random(seed)
+    return bytes(rng.randrange(0, top) for _ in range(n))
+
+
+def _chunk(kind: bytes, data: bytes) -> bytes:
+    return struct.pack('>I', len(data)) + kind + data + struct.pack('>I', zlib.crc32(kind + data))
+
+
+def _png(width: int, height: int, idat_sizes=None, truncate_stream: int = 0):
+    """Greyscale 8-bit PNG with noisy rows; returns (file, raw filtered data)."""
+    rng = random.Random(width * height)
+    raw = b''.join(b'\x00' + bytes(rng.randrange(0, 64) for _ in range(width)) for _ in range(height))
+    stream = zlib.compress(raw)
+    if truncate_stream:
+        stream = stream[:-truncate_stream]
+    sizes = idat_sizes or [len(stream)]
+    idats = []
+    pos = 0
+    for size in sizes:
+        idats.append(_chunk(b'IDAT', stream[pos:pos + size]))
+        pos += size
+    if pos < len(stream):
+        idats.append(_chunk(b'IDAT', stream[pos:]))
+    ihdr = struct.pack('>IIBBBBB', width, height, 8, 0, 0, 0, 0)
+    return b'\x89PNG\r\n\x1a\n' + _chunk(b'IHDR', ihdr) + b''.join(idats) + _chunk(b'IEND', b''), raw
+
+
+def _chunk_types(data: bytes):
+    pos, types = 8, []
+    while pos + 8 <= len(data):
+        length, = struct.unpack_from('>I', data, pos)
+        types.append((data[pos + 4:pos + 8], length))
+        pos += 12 + length
+    return types
+
+
+class TestParallelDeflate(unittest.TestCase):
+    def test_blocks_join_into_one_stream(self):
+        data = _noise(1, 300_000, 16)
+        stream = b''.join(parallel_deflate(data, block_size=64 * 1024))
+        self.assertEqual(zlib.decompress(stream), data)
+
+    def test_empty_and_single_block(self):
+        self.assertEqual(zlib.decompress(b''.join(parallel_deflate(b''))), b'')
+        self.assertEqual(zlib.decompress(b''.join(parallel_deflate(b'abc' * 10))), b'abc' * 10)
+
+    def test_adler32_combine(self):
+        a, b = b'hello ' * 1000, b'world' * 7919
+        self.assertEqual(adler32_combine(zlib.adler32(a), zlib.adler32(b), len(b)), zlib.adler32(a + b))
+
+    def test_idat_chunks_have_valid_crcs(self):
+        stream = bytes(range(256)) * 10
+        parts = idat_chunks(stream, chunk_size=1000)
+        data = b''.join(bytes(p) for p in parts)
+        self.assertEqual([length for _t, length in _chunk_types(b'\x00' * 8 + data)], [1000, 1000, 560])
+        for i in range(0, len(parts), 3):
+            payload = bytes(parts[i + 1])
+            self.assertEqual(struct.unpack('>I', parts[i + 2])[0], zlib.crc32(b'IDAT' + payload))
+
+    def test_inflate_partial_keeps_decoded_prefix(self):
+        data = _noise(2, 200_000)
+        raw, ended = inflate_partial(zlib.compress(data)[:50_000])
+        self.assertFalse(ended)
+        self.assertTrue(data.startswith(bytes(raw)))
+        self.assertGreater(len(raw), 30_000)
+
+
+class TestPngChunkRebuilder(unittest.TestCase):
+    def setUp(self):
+        self.strategy = PngChunkRebuilderStrategy()
+
+    def _repair(self, data: bytes):
+        output, result = self.strategy.repair_buffer(data)
+        self.assertTrue(result['success'])
+        return b''.join(bytes(p) for p in output), result
+
+    def test_raw_image_size(self):
+        self.assertEqual(raw_image_size(struct.pack('>IIBBBBB', 10, 4, 8, 2, 0, 0, 0)), 4 * 31)
+        # Adam7 on 1x1: only the first pass has a pixel
+        self.assertEqual(raw_image_size(struct.pack('>IIBBBBB', 1, 1, 8, 0, 0, 0, 1)), 2)
+        self.assertIsNone(raw_image_size(b'short'))
+
+    def test_intact_stream_is_left_alone(self):
+        data, _raw = _png(64, 32)
+        output, result = self._repair(data)
+        self.assertIsNone(result['idat_rewrite'])
+        self.assertEqual(output, data)
+
+    def test_truncated_stream_is_redeflated(self):
+        data, raw = _png(300, 200, truncate_stream=400)
+        output, result = self._repair(data)
+        self.assertEqual(result['idat_rewrite'], 'redeflated')
+        self.assertEqual(result['raw_bytes_expected'], len(raw))
+        self.assertTrue(validate_png(output)['valid'])
+
+        stream = b''.join(output[pos + 8:pos + 8 + length] for pos, length in _idat_positions(output))
+        repaired = zlib.decompress(stream)
+        self.assertEqual(len(repaired), len(raw))
+        recovered = result['raw_bytes_recovered']
+        self.assertEqual(repaired[:recovered], raw[:recovered])
+        self.assertEqual(repaired[recovered:], bytes(len(raw) - recovered))
+
+    def test_oversized_chunk_is_rechunked(self):
+        data, raw = _png(200, 100, idat_sizes=[3000, 7000])
+        with mock.patch('strategies.png_chunk_rebuilder.MAX_IDAT_CHUNK', 4096), \
+                mock.patch('strategies.png_chunk_rebuilder.IDAT_CHUNK_SIZE', 1024):
+            output, result = self._repair(data)
+        self.assertEqual(result['idat_rewrite'], 'rechunked')
+        self.assertTrue(validate_png(output)['valid'])
+        types = _chunk_types(output)
+        self.assertEqual([t for t, _l in types][0], b'IHDR')
+        self.assertEqual(types[-1][0], b'IEND')
+        self.assertTrue(all(length <= 1024 for t, length in types if t == b'IDAT'))
+
+
+def _idat_positions(data: bytes):
+    pos = 8
+    while pos + 8 <= len(data):
+        length, = struct.unpack_from('>I', data, pos)
+        if data[pos + 4:pos + 8] == b'IDAT':
+            yield pos, length
+        pos += 12 + length
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,171 @@
+import os
+import sys
+import time
+import struct
+import zlib
+import queue
+import tempfile
+import unittest
+import multiprocessing.queues
+from unittest import mock
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from lib.validation import validate_output
+from services.race import race_strategies, applicable_strategies
+from strategies.base import BaseStrategy
+from strategies.registry import STRATEGY_REGISTRY
+
+
+def _jpeg(bitstream: bytes) -> bytes:
+    dqt = b'\xff\xdb' + struct.pack('>H', 67) + b'\x00' + bytes(range(1, 65))
+    sof = b'\xff\xc0' + struct.pack('>HBHHB', 11, 8, 16, 16, 1) + b'\x01\x11\x00'
+    dht = b'\xff\xc4' + struct.pack('>H', 20) + b'\x00' + b'\x01' + b'\x00' * 15 + b'\x00'
+    sos = b'\xff\xda' + struct.pack('>H', 8) + b'\x01\x01\x00\x00\x3f\x00'
+    return b'\xff\xd8' + dqt + sof + dht + sos + bitstream + b'\xff\xd9'
+
+
+def _png(crc_ok: bool = True) -> bytes:
+    def chunk(kind, data):
+        crc = zlib.crc32(kind + data) ^ (0 if crc_ok else 1)
+        return struct.pack('>I', len(data)) + kind + data + struct.pack('>I', crc)
+    ihdr = struct.pack('>IIBBBBB', 1, 1, 8, 0, 0, 0, 0)
+    return b'\x89PNG\r\n\x1a\n' + chunk(b'IHDR', ihdr) + chunk(b'IDAT', zlib.compress(b'\x00\x00')) + chunk(b'IEND', b'')
+
+
+THUMBNAIL = _jpeg(b'\x12\xff\x00\x34')
+
+
+def _with_thumbnail(jpeg: bytes) -> bytes:
+    """jpeg with an APP1 EXIF block right after SOI whose IFD1 carries THUMBNAIL."""
+    ifd0 = struct.pack('>H', 0) + struct.pack('>I', 14)
+    ifd1 = struct.pack('>H', 2) + struct.pack('>HHII', 0x0201, 4, 1, 44) + struct.pack('>HHII', 0x0202, 4, 1, len(THUMBNAIL)) + struct.pack('>I', 0)
+    exif = b'Exif\x00\x00MM\x00\x2a' + struct.pack('>I', 8) + ifd0 + ifd1 + THUMBNAIL
+    return jpeg[:2] + b'\xff\xe1' + struct.pack('>H', len(exif) + 2) + exif + jpeg[2:]
+
+
+class _SlowStrategy(BaseStrategy):
+    """Never finishes within a test: must be cancelled by the race."""
+    name = "slow-test-strategy"
+    requires_reference = False
+
+    def can_repair(self, analysis_result):
+        return True
+
+    def repair(self, input_path, output_path, reference_path=None):
+        time.sleep(60)
+        return {"success": False}
+
+    def repair_buffer(self, data, reference=None):
+        time.sleep(60)
+        return None, {"success": False}
+
+
+SLOW_ENTRY = {
+    "slow-test-strategy": {
+        "extension": ".jpg",
+        "requires_reference": False,
+        "module": __name__,
+        "class_name": "_SlowStrategy",
+    }
+}
+
+
+class TestValidation(unittest.TestCase):
+    def test_jpeg(self):
+        self.assertTrue(validate_output(_jpeg(b'\x12\xff\x00\x34'), 'jpeg')['valid'])
+        broken = validate_output(_jpeg(b'\x12\xff\xaa\x34'), 'jpeg')
+        self.assertFalse(broken['valid'])
+        self.assertEqual(broken['reason'], 'entropy')
+        self.assertFalse(validate_output(_jpeg(b'\x12')[:-2], 'jpeg')['valid'])
+
+    def test_png(self):
+        self.assertTrue(validate_output(_png(), 'png')['valid'])
+        self.assertEqual(validate_output(_png(crc_ok=False), 'png')['reason'], 'crc')
+
+    def test_accepts_output_parts(self):
+        data = _jpeg(b'\x12\xff\x00\x34')
+        self.assertTrue(validate_output([memoryview(data)[:10], data[10:]], 'jpeg')['valid'])
+
+
+class TestRace(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.input_path = os.path.join(self.temp_dir.name, 'broken.jpg')
+        self.output_path = os.path.join(self.temp_dir.name, 'fixed.jpg')
+        with open(self.input_path, 'wb') as f:
+            f.write(_jpeg(b'\x12\xff\xaa\x34\xff\x00'))
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def test_first_verified_output_wins_and_losers_are_cancelled(self):
+        with mock.patch.dict(STRATEGY_REGISTRY, SLOW_ENTRY):
+            started = time.monotonic()
+            result = race_strategies(self.input_path, self.output_path, ['slow-test-strategy', 'marker-sanitization'])
+        self.assertLess(time.monotonic() - started, 30)
+        self.assertTrue(result['success'])
+        self.assertEqual(result['winner'], 'marker-sanitization')
+        self.assertEqual(result['cancelled'], ['slow-test-strategy'])
+        with open(self.output_path, 'rb') as f:
+            self.assertEqual(f.read(), _jpeg(b'\x12\xff\x00\x34\xff\x00'))
+        self.assertEqual(sorted(os.listdir(self.temp_dir.name)), ['broken.jpg', 'fixed.jpg'])
+
+    def test_no_valid_output(self):
+        # Preview extraction finds nothing large enough to carve
+        result = race_strategies(self.input_path, self.output_path, ['preview-extraction', 'mcu-alignment'])
+        self.assertFalse(result['success'])
+        self.assertEqual([a['strategy'] for a in result['attempts'] if 'skipped' in a], ['mcu-alignment'])
+        self.assertFalse(os.path.exists(self.output_path))
+
+    def test_timeout_cancels_everything(self):
+        with mock.patch.dict(STRATEGY_REGISTRY, SLOW_ENTRY):
+            result = race_strategies(self.input_path, self.output_path, ['slow-test-strategy'], timeout=0.5)
+        self.assertFalse(result['success'])
+        self.assertEqual(result['cancelled'], ['slow-test-strategy'])
+
+    def test_timeout_keeps_finished_attempts(self):
+        # The coordinator never gets to read a result before the deadline
+        read_nowait = multiprocessing.queues.Queue.get
+
+        def blocked_get(results, block=True, timeout=None):
+            if block:
+                time.sleep(timeout)
+                raise queue.Empty
+            return read_nowait(results, block, timeout)
+
+        with mock.patch.dict(STRATEGY_REGISTRY, SLOW_ENTRY), \
+                mock.patch.object(multiprocessing.queues.Queue, 'get', blocked_get):
+            result = race_strategies(self.input_path, self.output_path, ['slow-test-strategy', 'marker-sanitization'],
+                                     timeout=2.0)
+        self.assertTrue(result['success'])
+        self.assertEqual(result['winner'], 'marker-sanitization')
+        self.assertEqual(result['cancelled'], ['slow-test-strategy'])
+        self.assertEqual([a['strategy'] for a in result['attempts']], ['marker-sanitization'])
+
+    def test_applicable_strategies(self):
+        self.assertEqual(applicable_strategies(self.input_path, False), ['preview-extraction', 'marker-sanitization'])
+        self.assertIn('header-grafting', applicable_strategies(self.input_path, True))
+        self.assertEqual(applicable_strategies(self.input_path, False, fallback=True), ['exif-thumbnail-rescue'])
+
+    def test_full_repair_beats_thumbnail(self):
+        with open(self.input_path, 'wb') as f:
+            f.write(_with_thumbnail(_jpeg(b'\x12\xff\xaa\x34\xff\x00')))
+        result = race_strategies(self.input_path, self.output_path)
+        self.assertTrue(result['success'])
+        self.assertEqual(result['winner'], 'marker-sanitization')
+        self.assertNotIn('exif-thumbnail-rescue', [a['strategy'] for a in result['attempts']])
+
+    def test_thumbnail_is_the_last_resort(self):
+        with open(self.input_path, 'wb') as f:
+            # The scan is gone entirely; only the EXIF thumbnail is left
+            f.write(_with_thumbnail(b'\xff\xd8') + b'\x00' * 3000)
+        result = race_strategies(self.input_path, self.output_path)
+        self.assertTrue(result['success'])
+        self.assertTrue(result['fallback'])
+        self.assertEqual(result['winner'], 'exif-thumbnail-rescue')
+        with open(self.output_path, 'rb') as f:
+            self.assertEqual(f.read(), THUMBNAIL)
+
+
+if __name__ == '__main__':
+    unittest.main()
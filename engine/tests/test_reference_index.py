@@ -0,0 +1,107 @@
+import os
+import sys
+import struct
+import tempfile
+import unittest
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from lib.jpeg_header import parse_jpeg_header
+from services.reference_index import ReferenceIndex, fingerprint_file
+
+
+def _segment(marker: int, payload: bytes) -> bytes:
+    return bytes([0xFF, marker]) + struct.pack('>H', len(payload) + 2) + payload
+
+
+def _exif_app1(make: bytes, model: bytes) -> bytes:
+    # Little-endian TIFF with an IFD0 holding Make and Model (both stored out of line)
+    make += b'\x00'
+    model += b'\x00'
+    ifd_offset = 8
+    data_offset = ifd_offset + 2 + 2 * 12 + 4
+    tiff = b'II*\x00' + struct.pack('<I', ifd_offset)
+    tiff += struct.pack('<H', 2)
+    tiff += struct.pack('<HHII', 0x010F, 2, len(make), data_offset)
+    tiff += struct.pack('<HHII', 0x0110, 2, len(model), data_offset + len(make))
+    tiff += struct.pack('<I', 0)
+    tiff += make + model
+    return _segment(0xE1, b'Exif\x00\x00' + tiff)
+
+
+def _jpeg(width=64, height=48, sampling=0x22, quality=1, model=b'EOS 5D', restart=0, bitstream=b'\x12\x34' * 1000) -> bytes:
+    sof = struct.pack('>BHHB', 8, height, width, 3) + bytes([1, sampling, 0, 2, 0x11, 1, 3, 0x11, 1])
+    dqt = bytes([0]) + bytes([quality] * 64)
+    dht = bytes([0]) + bytes([0, 1] + [0] * 14) + bytes([0])
+    data = b'\xff\xd8' + _exif_app1(b'Canon', model) + _segment(0xDB, dqt) + _segment(0xC0, sof) + _segment(0xC4, dht)
+    if restart:
+        data += _segment(0xDD, struct.pack('>H', restart))
+    data += _segment(0xDA, bytes([1, 1, 0, 0, 63, 0]))
+    return data + bitstream + b'\xff\xd9'
+
+
+class TestReferenceIndex(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.library = os.path.join(self.temp_dir.name, 'library')
+        os.makedirs(self.library)
+        self.index = ReferenceIndex(os.path.join(self.temp_dir.name, 'index.sqlite'))
+
+    def tearDown(self):
+        self.index.close()
+        self.temp_dir.cleanup()
+
+    def _write(self, path, data):
+        with open(path, 'wb') as f:
+            f.write(data)
+        return path
+
+    def test_header_walk_stops_at_bitstream(self):
+        data = _jpeg(bitstream=b'\xff\xc4\x00\x10' * 50000)
+        header = parse_jpeg_header(data)
+        self.assertEqual(header['bitstream_offset'], header['header_bytes_read'])
+        self.assertLess(header['header_bytes_read'], 512)
+        self.assertEqual((header['width'], header['height']), (64, 48))
+
+    def test_jpeg_fingerprint(self):
+        path = self._write(os.path.join(self.library, 'a.jpg'), _jpeg(restart=4))
+        fp = fingerprint_file(path)
+        self.assertEqual(fp['format'], 'jpeg')
+        self.assertEqual((fp['make'], fp['model']), ('Canon', 'EOS 5D'))
+        self.assertEqual(fp['sampling'], '2x2,1x1,1x1')
+        self.assertEqual(fp['restart_interval'], 4)
+        self.assertIsNotNone(fp['dqt_hash'])
+
+    def test_tiff_fingerprint(self):
+        tiff = _exif_app1(b'Nikon', b'D850')[10:]
+        path = self._write(os.path.join(self.library, 'a.nef'), tiff + b'\x00' * 1024)
+        fp = fingerprint_file(path)
+        self.assertEqual((fp['format'], fp['make'], fp['model']), ('tiff', 'Nikon', 'D850'))
+
+    def test_rank_prefers_identical_tables(self):
+        self._write(os.path.join(self.library, 'same_quality.jpg'), _jpeg(quality=1))
+        self._write(os.path.join(self.library, 'other_quality.jpg'), _jpeg(quality=7))
+        self._write(os.path.join(self.library, 'other_model.jpg'), _jpeg(model=b'EOS R5'))
+        self._write(os.path.join(self.library, 'other_size.jpg'), _jpeg(width=128))
+        target = self._write(os.path.join(self.temp_dir.name, 'target.jpg'), _jpeg(quality=1, bitstream=b'\xff\x13' * 10))
+
+        stats = self.index.scan(self.library)
+        self.assertEqual(stats['indexed'], 4)
+
+        ranked = self.index.rank(target)
+        names = [os.path.basename(r['file_path']) for r in ranked]
+        self.assertEqual(names, ['same_quality.jpg', 'other_quality.jpg'])
+        self.assertGreater(ranked[0]['score'], ranked[1]['score'])
+
+    def test_rescan_skips_unchanged_and_drops_deleted(self):
+        keep = self._write(os.path.join(self.library, 'keep.jpg'), _jpeg())
+        gone = self._write(os.path.join(self.library, 'gone.jpg'), _jpeg())
+        self.index.scan(self.library)
+        os.remove(gone)
+
+        stats = self.index.scan(self.library)
+        self.assertEqual(stats, {'indexed': 0, 'unchanged': 1, 'removed': 1})
+        self.assertTrue(os.path.exists(keep))
+
+
+if __name__ == '__main__':
+    unittest.main()
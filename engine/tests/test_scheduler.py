@@ -0,0 +1,84 @@
+import os
+import sys
+import time
+import threading
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from services.scheduler import run_within_budget, interleave_by_cost, default_memory_budget
+from strategies.registry import STRATEGY_REGISTRY, estimate_job_memory, WORKER_OVERHEAD
+
+
+class _Tracker:
+    """Records the summed cost of jobs that were actually running at once."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.in_use = 0
+        self.peak = 0
+        self.concurrent_with_big = 0
+
+    def run(self, job):
+        name, cost = job
+        with self.lock:
+            self.in_use += cost
+            self.peak = max(self.peak, self.in_use)
+        time.sleep(0.01)
+        with self.lock:
+            self.in_use -= cost
+        return name
+
+
+class TestScheduler(unittest.TestCase):
+    def test_interleaves_large_and_small(self):
+        costs = [5, 100, 1, 50, 10]
+        self.assertEqual(interleave_by_cost(costs, costs), [1, 2, 3, 0, 4])
+
+    def test_running_jobs_stay_within_budget(self):
+        jobs = [(f'big{i}', 600) for i in range(4)] + [(f'small{i}', 50) for i in range(20)]
+        tracker = _Tracker()
+        finished = []
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            stats = run_within_budget(pool, tracker.run, jobs, [cost for _name, cost in jobs], 1000, 8,
+                                      lambda job, value, error: finished.append(value))
+        self.assertEqual(sorted(finished), sorted(name for name, _cost in jobs))
+        self.assertLessEqual(tracker.peak, 1000)
+        self.assertLessEqual(stats['peak_estimate'], 1000)
+        # Small files run next to a big one instead of waiting for it
+        self.assertGreater(stats['max_concurrency'], 2)
+        self.assertEqual(stats['oversized'], 0)
+
+    def test_oversized_job_runs_alone(self):
+        jobs = [('huge', 5000), ('a', 10), ('b', 10)]
+        tracker = _Tracker()
+        errors = []
+        with ThreadPoolExecutor(max_workers=4) as pool:
+            stats = run_within_budget(pool, tracker.run, jobs, [cost for _name, cost in jobs], 1000, 4,
+                                      lambda job, value, error: errors.append(error))
+        self.assertEqual(errors, [None, None, None])
+        self.assertEqual(stats['oversized'], 1)
+        self.assertEqual(tracker.peak, 5000)
+
+    def test_errors_are_reported_per_job(self):
+        def fail(job):
+            raise RuntimeError(job)
+        reported = []
+        with ThreadPoolExecutor(max_workers=2) as pool:
+            run_within_budget(pool, fail, ['x', 'y'], [1, 1], 10, 2,
+                              lambda job, value, error: reported.append((job, str(error))))
+        self.assertEqual(sorted(reported), [('x', 'x'), ('y', 'y')])
+
+    def test_memory_estimates(self):
+        for name, entry in STRATEGY_REGISTRY.items():
+            self.assertGreaterEqual(entry['memory_factor'], 1, name)
+        size = 120 * 1024 * 1024
+        estimate = estimate_job_memory('tiff-ifd-rebuilder', size, reference_size=size)
+        self.assertEqual(estimate, WORKER_OVERHEAD + 3 * size)
+        self.assertGreater(default_memory_budget(), 0)
+        with self.assertRaises(ValueError):
+            estimate_job_memory('no-such-strategy', 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,141 @@
+import os
+import sys
+import json
+import struct
+import tempfile
+import subprocess
+import unittest
+from unittest import mock
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from services.batch_runner import run_batch
+from services.telemetry import (
+    TelemetryStore, JobPeak, run_record, record_runs, summarize, find_regressions, perf_report, percentile, size_bucket, RELEASE_ENV
+)
+
+MAIN_PY = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "main.py")
+MB = 1024 * 1024
+
+
+def _jpeg(bitstream: bytes) -> bytes:
+    sos = b'\xff\xda' + struct.pack('>H', 8) + b'\x01\x01\x00\x00\x3f\x00'
+    return b'\xff\xd8' + sos + bitstream + b'\xff\xd9'
+
+
+def _runs(strategy, size, seconds, status='done'):
+    return [run_record('batch', strategy, 'jpeg', size, status, {'read': s * 0.25, 'repair': s * 0.75}) for s in seconds]
+
+
+class TestSummary(unittest.TestCase):
+    def test_percentiles_and_buckets(self):
+        self.assertEqual(percentile([1, 2, 3, 4], 50), 2.5)
+        self.assertEqual(percentile([5], 90), 5)
+        self.assertEqual((size_bucket(MB - 1), size_bucket(MB), size_bucket(500 * MB)), ('<1MB', '1-10MB', '>=200MB'))
+
+        records = _runs('a', 4 * MB, [1, 2, 3, 4, 5]) + _runs('a', 100, [0.1], status='failed') + _runs('b', 2 * MB, [2])
+        summary = summarize(records)
+        self.assertEqual([(r['strategy'], r['size_bucket'], r['runs']) for r in summary],
+                         [('a', '<1MB', 1), ('a', '1-10MB', 5), ('b', '1-10MB', 1)])
+        row = summary[1]
+        self.assertEqual(row['seconds']['p50'], 3)
+        self.assertEqual(row['mb_per_s']['p90'], 3.2)
+        self.assertEqual(row['stage_share'], {'read': 0.25, 'repair': 0.75, 'write': 0.0})
+        self.assertEqual(summary[0]['failure_rate'], 1.0)
+
+    def test_regressions_need_enough_samples(self):
+        baseline = summarize(_runs('a', 4 * MB, [1.0] * 5) + _runs('b', 4 * MB, [1.0] * 2))
+        current = summarize(_runs('a', 4 * MB, [1.5] * 5) + _runs('b', 4 * MB, [9.0] * 2))
+        flagged = find_regressions(current, baseline)
+        self.assertEqual([(f['strategy'], f['metric']) for f in flagged], [('a', 'seconds_p50'), ('a', 'seconds_p90')])
+        self.assertEqual(flagged[0]['change'], 0.5)
+        self.assertEqual(find_regressions(current, baseline, tolerance=0.6), [])
+
+
+class TestJobPeak(unittest.TestCase):
+    def test_earlier_large_job_does_not_leak_into_later_ones(self):
+        large = JobPeak()
+        if large.start is None:
+            self.skipTest("Per-job peak memory is only measured on Linux")
+        buffer = bytearray(64 * MB)
+        buffer[::4096] = b'\x01' * len(buffer[::4096])
+        self.assertGreater(large.delta(), 32 * MB)
+        del buffer
+
+        small = JobPeak()
+        data = bytearray(MB)
+        self.assertLess(small.delta(), 16 * MB)
+        del data
+
+
+class TestTelemetryStore(unittest.TestCase):
+    def test_batch_runs_are_recorded_and_reported(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            input_dir = os.path.join(tmp, 'in')
+            os.makedirs(input_dir)
+            for i in range(3):
+                with open(os.path.join(input_dir, f'{i}.jpg'), 'wb') as f:
+                    f.write(_jpeg(b'\x12\xff\xaa\x34' * (100 + i)))
+            store_path = os.path.join(tmp, 'telemetry.sqlite')
+
+            with mock.patch.dict(os.environ, {RELEASE_ENV: '1.4.0'}):
+                run_batch(input_dir, 'marker-sanitization', os.path.join(tmp, 'out'), telemetry_path=store_path)
+            run_batch(input_dir, 'marker-sanitization', os.path.join(tmp, 'out2'), telemetry_path=store_path, workers=2)
+
+            with TelemetryStore(store_path) as store:
+                records = store.records()
+                self.assertEqual(len(store.records(release='1.4.0')), 3)
+            self.assertEqual(len(records), 6)
+            for record in records:
+                self.assertEqual((record['strategy'], record['command'], record['status']), ('marker-sanitization', 'batch', 'done'))
+                self.assertGreater(record['total_s'], 0)
+                self.assertIsNotNone(record['repair_s'])
+                self.assertEqual(record['bytes_read'], record['input_size'])
+                self.assertGreater(record['bytes_written'], 0)
+            # The journal does not carry the telemetry
+            with open(os.path.join(tmp, 'out', '.repair-journal.jsonl')) as f:
+                self.assertNotIn('telemetry', json.loads(f.readline()))
+
+            baseline_path = os.path.join(tmp, 'baseline.json')
+            report = perf_report(store_path, save_baseline=baseline_path)
+            self.assertEqual(report['summary'][0]['runs'], 6)
+            compared = perf_report(store_path, baseline_path=baseline_path)
+            self.assertEqual(compared['regressions'], [])
+
+            out = subprocess.run([sys.executable, MAIN_PY, 'perf-report', '--store', store_path, '--strategy', 'marker-sanitization'],
+                                 capture_output=True, text=True, check=True).stdout
+            self.assertEqual(json.loads(out)['runs'], 6)
+
+    def test_unusable_store_does_not_fail_a_repair(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            input_path = os.path.join(tmp, 'broken.jpg')
+            with open(input_path, 'wb') as f:
+                f.write(_jpeg(b'\x12\xff\xaa\x34'))
+            blocker = os.path.join(tmp, 'not-a-dir')
+            open(blocker, 'w').close()
+            self.assertFalse(record_runs([run_record('repair', 'x', None, 1, 'done', {})], os.path.join(blocker, 'runs.sqlite')))
+
+            proc = subprocess.run([sys.executable, MAIN_PY, '--job-id', 'j1', '--file-path', input_path,
+                                   '--strategy', 'marker-sanitization', '--telemetry', os.path.join(blocker, 'runs.sqlite')],
+                                  capture_output=True, text=True)
+            self.assertEqual(proc.returncode, 0)
+            self.assertEqual(json.loads(proc.stdout.splitlines()[-1])['status'], 'done')
+            self.assertIn('Telemetry not recorded', proc.stderr)
+
+    def test_sub_commands_are_recorded(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            input_path = os.path.join(tmp, 'broken.jpg')
+            with open(input_path, 'wb') as f:
+                f.write(_jpeg(b'\x12\xff\xaa\x34'))
+            store_path = os.path.join(tmp, 'telemetry.sqlite')
+            # No frame header: the race has no valid output, and is recorded as failed
+            subprocess.run([sys.executable, MAIN_PY, 'race', '--file-path', input_path, '--strategies', 'marker-sanitization',
+                            '--telemetry', store_path], capture_output=True)
+            subprocess.run([sys.executable, MAIN_PY, 'carve', '--image', input_path, '--telemetry', store_path],
+                           capture_output=True, check=True)
+            with TelemetryStore(store_path) as store:
+                self.assertEqual([(r['command'], r['strategy'], r['status']) for r in store.records()],
+                                 [('race', 'race', 'failed'), ('carve', 'carve', 'done')])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,137 @@
+import os
+import sys
+import struct
+import random
+import tempfile
+import unittest
+from unittest import mock
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from services.batch_runner import run_batch
+from services.tiff_integrity import scan_tiff, read_layout
+
+STRIP_SIZE = 4096
+STRIPS = 8
+
+
+def _noise(seed: int, n: int) -> bytes:
+    rng = random.Random(seed)
+    return bytes(rng.randrange(0, 256) for _ in range(n))
+
+
+def _tiff(strips=None, compression=1) -> bytes:
+    """Little-endian TIFF with one IFD and STRIPS strips of sensor noise after it."""
+    strips = strips or [_noise(i, STRIP_SIZE) for i in range(STRIPS)]
+    entry_count = 6
+    ifd_size = 2 + entry_count * 12 + 4
+    offsets_at = 8 + ifd_size
+    counts_at = offsets_at + 4 * len(strips)
+    data_at = counts_at + 4 * len(strips)
+    offsets, pos = [], data_at
+    for strip in strips:
+        offsets.append(pos)
+        pos += len(strip)
+
+    def entry(tag, field_type, count, value):
+        return struct.pack('<HHII', tag, field_type, count, value)
+
+    ifd = struct.pack('<H', entry_count) + b''.join([
+        entry(0x00FE, 4, 1, 0),
+        entry(0x0100, 4, 1, 256),
+        entry(0x0101, 4, 1, 128),
+        entry(0x0103, 3, 1, compression),
+        entry(0x0111, 4, len(strips), offsets_at),
+        entry(0x0117, 4, len(strips), counts_at),
+    ]) + struct.pack('<I', 0)
+    return (b'II*\x00' + struct.pack('<I', 8) + ifd
+            + struct.pack(f'<{len(strips)}I', *offsets) + struct.pack(f'<{len(strips)}I', *(len(s) for s in strips))
+            + b''.join(strips))
+
+
+class TestTiffIntegrity(unittest.TestCase):
+    def test_intact_file(self):
+        report = scan_tiff(_tiff())
+        self.assertEqual(report['verdict'], 'intact')
+        self.assertEqual(report['score'], 1.0)
+        self.assertEqual(report['damage'], [])
+        self.assertEqual(report['image']['kind'], 'strip')
+        self.assertGreater(report['segments'][0]['entropy'], 7.5)
+
+    def test_damage_map(self):
+        data = bytearray(_tiff())
+        layout = read_layout(data)['images'][0]['segments']
+        # Strips 2-3 erased, strip 5 low entropy, file cut inside strip 7
+        for index in (2, 3):
+            offset, length = layout[index]
+            data[offset:offset + length] = bytes(length)
+        offset, length = layout[5]
+        data[offset:offset + length] = b'\x10' * length
+        del data[layout[7][0] + 100:]
+
+        report = scan_tiff(bytes(data))
+        self.assertEqual(report['damage'], [[2, 3, 'blank'], [5, 5, 'low_entropy'], [7, 7, 'truncated']])
+        self.assertEqual(report['score'], 0.5)
+        self.assertEqual(report['verdict'], 'partial')
+        self.assertEqual(report['segments'][7]['present'], 100)
+
+    def test_hopeless_and_missing(self):
+        data = _tiff()
+        cut = read_layout(data)['images'][0]['segments'][1][0] + 10
+        report = scan_tiff(data[:cut])
+        self.assertEqual(report['verdict'], 'hopeless')
+        self.assertEqual(report['damage'][-1], [2, 7, 'missing'])
+
+    def test_jpeg_strips_need_markers(self):
+        good = b'\xff\xd8' + _noise(1, 1000) + b'\xff\xd9'
+        bad = b'\x00\x00' + _noise(2, 1000) + b'\xff\xd9'
+        report = scan_tiff(_tiff([good, bad, good], compression=7))
+        self.assertEqual(report['damage'], [[1, 1, 'bad_markers']])
+
+    def test_layout_from_reference(self):
+        reference = _tiff()
+        target = bytearray(reference)
+        target[4:8] = struct.pack('<I', 0xFFFFFF)  # broken IFD pointer
+        self.assertEqual(scan_tiff(bytes(target))['verdict'], 'hopeless')
+        report = scan_tiff(bytes(target), reference)
+        self.assertEqual(report['layout_from'], 'reference')
+        self.assertEqual(report['verdict'], 'intact')
+
+    def test_parallel_scan_over_mmap(self):
+        data = bytearray(_tiff())
+        offset, length = read_layout(data)['images'][0]['segments'][4]
+        data[offset:offset + length] = b'\xff' * length
+        with tempfile.NamedTemporaryFile(delete=False) as f:
+            f.write(data)
+        try:
+            with mock.patch('services.tiff_integrity.PARALLEL_MIN_BYTES', 0), \
+                    mock.patch('services.tiff_integrity.SEGMENTS_PER_TASK', 2):
+                report = scan_tiff(bytes(data), path=f.name, workers=2)
+        finally:
+            os.remove(f.name)
+        self.assertEqual(report['damage'], [[4, 4, 'blank']])
+        self.assertEqual(report, scan_tiff(bytes(data)))
+
+    def test_batch_triage_skips_hopeless_files(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            input_dir = os.path.join(tmp, 'in')
+            os.makedirs(input_dir)
+            reference_path = os.path.join(tmp, 'reference.tif')
+            healthy = _tiff()
+            with open(reference_path, 'wb') as f:
+                f.write(healthy)
+            with open(os.path.join(input_dir, 'ok.tif'), 'wb') as f:
+                f.write(healthy[:4] + b'\xff\xff\xff\x00' + healthy[8:])
+            erased = bytearray(healthy)
+            erased[200:] = bytes(len(erased) - 200)
+            with open(os.path.join(input_dir, 'erased.tif'), 'wb') as f:
+                f.write(erased)
+
+            result = run_batch(input_dir, 'tiff-ifd-rebuilder', os.path.join(tmp, 'out'),
+                               reference_path=reference_path, triage_below=0.25)
+            statuses = {os.path.basename(r['input_path']): r['status'] for r in result['results']}
+            self.assertEqual(statuses, {'erased.tif': 'hopeless', 'ok.tif': 'done'})
+            self.assertEqual(result['hopeless'], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,142 @@
+import os
+import sys
+import json
+import struct
+import sqlite3
+import tempfile
+import subprocess
+import unittest
+from unittest import mock
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from services.watch_index import WatchIndex, scan_pass, watch, quick_digest, INDEX_NAME
+
+MAIN_PY = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "main.py")
+
+
+def _jpeg(bitstream: bytes) -> bytes:
+    dqt = b'\xff\xdb' + struct.pack('>H', 67) + b'\x00' + bytes(range(1, 65))
+    sof = b'\xff\xc0' + struct.pack('>HBHHB', 11, 8, 16, 16, 1) + b'\x01\x11\x00'
+    dht = b'\xff\xc4' + struct.pack('>H', 20) + b'\x00' + b'\x01' + b'\x00' * 15 + b'\x00'
+    sos = b'\xff\xda' + struct.pack('>H', 8) + b'\x01\x01\x00\x00\x3f\x00'
+    return b'\xff\xd8' + dqt + sof + dht + sos + bitstream + b'\xff\xd9'
+
+
+# Invalid markers inside the bitstream that marker-sanitization strips
+DAMAGED = _jpeg(b'\x12\xff\xaa\x34\xff\x00' * 50)
+
+
+class TestWatchIndex(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.input_dir = os.path.join(self.tmp.name, 'share')
+        self.output_dir = os.path.join(self.tmp.name, 'out')
+        os.makedirs(os.path.join(self.input_dir, 'card1'))
+        os.makedirs(self.output_dir)
+        self.index = WatchIndex(os.path.join(self.output_dir, INDEX_NAME))
+
+    def tearDown(self):
+        self.index.close()
+        self.tmp.cleanup()
+
+    def _write(self, relative, data, mtime=None):
+        path = os.path.join(self.input_dir, relative)
+        with open(path, 'wb') as f:
+            f.write(data)
+        # Old enough to be settled
+        mtime = mtime or 1_600_000_000
+        os.utime(path, (mtime, mtime))
+        return path
+
+    def _pass(self, **kwargs):
+        return scan_pass(self.index, self.input_dir, 'marker-sanitization', self.output_dir, **kwargs)
+
+    def test_only_new_or_changed_files_are_processed(self):
+        self._write('card1/a.jpg', DAMAGED)
+        self._write('card1/b.jpg', DAMAGED)
+        self._write('notes.txt', b'not a photo')
+        self._write('card1/c.jpg', b'\x89PNG\r\n\x1a\n' + bytes(100))
+        first = self._pass()
+        self.assertEqual(first['processed'], 4)
+        # A file whose header cannot be recognized is still tried: it may be the damaged part
+        self.assertEqual(first['outcomes'], {'done': 2, 'failed': 1, 'unsupported': 1})
+        self.assertTrue(os.path.exists(os.path.join(self.output_dir, 'card1', 'a_repaired.jpg')))
+
+        # Unchanged stat: nothing is opened
+        with mock.patch('services.watch_index.quick_digest') as digest:
+            second = self._pass()
+        digest.assert_not_called()
+        self.assertEqual((second['unchanged'], second['processed']), (4, 0))
+
+        # Touched (same content) vs changed
+        self._write('card1/a.jpg', DAMAGED, mtime=1_600_000_100)
+        self._write('card1/b.jpg', _jpeg(b'\x01\x02\x03' * 40), mtime=1_600_000_100)
+        third = self._pass()
+        self.assertEqual((third['touched'], third['processed']), (1, 1))
+        self.assertEqual(third['outcomes'], {'healthy': 1})
+        self.assertEqual(self._pass()['unchanged'], 4)
+
+    def test_unsettled_and_deleted_files(self):
+        path = self._write('card1/a.jpg', DAMAGED)
+        os.utime(path)  # just written
+        self.assertEqual(self._pass(settle_seconds=60)['settling'], 1)
+        self.assertEqual(self._pass(settle_seconds=0)['processed'], 1)
+
+        os.remove(path)
+        os.rmdir(os.path.join(self.input_dir, 'card1'))
+        self._write('c.jpg', DAMAGED)
+        result = self._pass()
+        self.assertEqual(result['removed'], 1)
+        rows = self.index.conn.execute('SELECT dir, name, status FROM processed_files').fetchall()
+        self.assertEqual([tuple(r) for r in rows], [(self.input_dir, 'c.jpg', 'done')])
+
+    def test_another_strategy_reprocesses_the_files(self):
+        self._write('card1/a.jpg', DAMAGED)
+        self.assertEqual(self._pass()['processed'], 1)
+        other = scan_pass(self.index, self.input_dir, 'preview-extraction', self.output_dir)
+        self.assertEqual((other['unchanged'], other['touched'], other['processed']), (0, 0, 1))
+        row = self.index.conn.execute('SELECT strategy FROM processed_files').fetchone()
+        self.assertEqual(row['strategy'], 'preview-extraction')
+
+    def test_failures_are_retried_once_they_expire(self):
+        self._write('notes.txt', b'not a photo')
+        self.assertEqual(self._pass()['outcomes'], {'failed': 1})
+        self.assertEqual(self._pass()['unchanged'], 1)
+        retried = self._pass(retry_failed_after=0)
+        self.assertEqual((retried['unchanged'], retried['processed']), (0, 1))
+
+    def test_quick_digest_sees_head_and_tail(self):
+        data = bytearray(os.urandom(300 * 1024))
+        path = self._write('big.jpg', bytes(data))
+        before = quick_digest(path, len(data))
+        data[-1] ^= 0xFF
+        self._write('big.jpg', bytes(data))
+        self.assertNotEqual(quick_digest(path, len(data)), before)
+
+
+class TestWatchCommand(unittest.TestCase):
+    def test_scan_command_persists_the_index(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            input_dir = os.path.join(tmp, 'share')
+            output_dir = os.path.join(input_dir, 'repaired')  # inside the watched tree: excluded
+            os.makedirs(input_dir)
+            path = os.path.join(input_dir, 'a.jpg')
+            with open(path, 'wb') as f:
+                f.write(DAMAGED)
+            os.utime(path, (1_600_000_000, 1_600_000_000))
+
+            args = [sys.executable, MAIN_PY, 'scan', '--input-dir', input_dir, '--strategy', 'marker-sanitization',
+                    '--output-dir', output_dir]
+            first = json.loads(subprocess.run(args, capture_output=True, text=True, check=True).stdout)
+            second = json.loads(subprocess.run(args, capture_output=True, text=True, check=True).stdout)
+            self.assertEqual((first['processed'], first['seen']), (1, 1))
+            self.assertEqual((second['unchanged'], second['processed']), (1, 0))
+
+            count, last = watch(input_dir, 'marker-sanitization', output_dir, passes=2, interval=0)
+            self.assertEqual((count, last['pass'], last['unchanged']), (2, 1, 1))
+            with sqlite3.connect(os.path.join(output_dir, INDEX_NAME)) as conn:
+                self.assertEqual(conn.execute('SELECT COUNT(*) FROM processed_files').fetchone()[0], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,84 @@
+/**
+ * Node side of the engine's differential harness (engine/services/differential.py).
+ *
+ * Runs one TypeScript strategy over every case of a manifest and prints a JSON
+ * report on stdout. The manifest path comes from STRATEGY_DIFF_MANIFEST:
+ *
+ *   { "strategy": "marker-sanitization", "iterations": 3,
+ *     "cases": [{ "id": "...", "input": "...", "reference": "...", "output": "..." }] }
+ *
+ * Cases are run in the order given (smallest first), so the peak RSS read after
+ * each case is the peak of the runs up to and including it.
+ *
+ *   STRATEGY_DIFF_MANIFEST=manifest.json npx vite-node scripts/strategy-diff-runner.ts
+ */
+import fs from 'fs';
+import { IRepairStrategy } from '../electron/strategies/IRepairStrategy';
+import { HeaderGraftingStrategy } from '../electron/strategies/HeaderGraftingStrategy';
+import { MarkerSanitizationStrategy } from '../electron/strategies/MarkerSanitizationStrategy';
+import { McuAlignmentStrategy } from '../electron/strategies/McuAlignmentStrategy';
+import { PreviewExtractionStrategy } from '../electron/strategies/PreviewExtractionStrategy';
+import { ExifToolService } from '../electron/lib/exiftool/ExifToolService';
+
+interface DiffCase {
+    id: string;
+    input: string;
+    reference?: string;
+    output: string;
+}
+
+interface DiffManifest {
+    strategy: string;
+    iterations: number;
+    cases: DiffCase[];
+}
+
+const STRATEGIES: Record<string, () => IRepairStrategy> = {
+    'header-grafting': () => new HeaderGraftingStrategy(),
+    'marker-sanitization': () => new MarkerSanitizationStrategy(),
+    'mcu-alignment': () => new McuAlignmentStrategy(),
+    'preview-extraction': () => new PreviewExtractionStrategy()
+};
+
+// maxRSS is reported in kilobytes
+const peakRss = () => process.resourceUsage().maxRSS * 1024;
+
+async function main() {
+    const manifestPath = process.env.STRATEGY_DIFF_MANIFEST;
+    if (!manifestPath) {
+        throw new Error('STRATEGY_DIFF_MANIFEST is not set');
+    }
+    const manifest: DiffManifest = JSON.parse(fs.readFileSync(manifestPath, 'utf-8'));
+    const create = STRATEGIES[manifest.strategy];
+    if (!create) {
+        throw new Error(`No TypeScript implementation of ${manifest.strategy}`);
+    }
+
+    const strategy = create();
+    const baselineRss = process.memoryUsage().rss;
+    const results = [];
+    for (const diffCase of manifest.cases) {
+        const seconds: number[] = [];
+        let outcome: { success: boolean; error?: string } = { success: false };
+        for (let i = 0; i < manifest.iterations; i++) {
+            const started = process.hrtime.bigint();
+            const result = await strategy.repair({
+                jobId: diffCase.id,
+                sourceFilePath: diffCase.input,
+                outputFilePath: diffCase.output,
+                referenceFilePath: diffCase.reference
+            });
+            seconds.push(Number(process.hrtime.bigint() - started) / 1e9);
+            outcome = { success: result.success, error: result.error };
+        }
+        results.push({ id: diffCase.id, ...outcome, seconds, peak_rss: peakRss() });
+    }
+
+    await ExifToolService.shutdown();
+    process.stdout.write(JSON.stringify({ runtime: `node ${process.version}`, baseline_rss: baselineRss, results }) + '\n');
+}
+
+main().catch((err) => {
+    process.stdout.write(JSON.stringify({ error: err.message }) + '\n');
+    process.exit(1);
+});